@@ -7,14 +7,17 @@ These settings are shared across all environments.
 import os
 from pathlib import Path
 from django.core.exceptions import ImproperlyConfigured
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 
+# Load environment variables from .env file, if there is one. Deployments
+# that inject the environment directly skip importing python-dotenv.
+if (BASE_DIR / '.env').exists():
+    from dotenv import load_dotenv
+    load_dotenv(BASE_DIR / '.env')
+
 
 def get_env_variable(var_name, default=None):
     """Get environment variable or return default value."""
@@ -27,6 +30,24 @@ def get_env_variable(var_name, default=None):
         raise ImproperlyConfigured(error_msg)
 
 
+def replica_databases(primary, hosts):
+    """Return DATABASES entries for read replicas of a primary database.
+
+    ``hosts`` is a comma-separated list of replica hosts (``host`` or
+    ``host:port``) sharing the primary's name and credentials.
+    """
+    replicas = {}
+    for i, host in enumerate(filter(None, (h.strip() for h in hosts.split(','))), 1):
+        host, _, port = host.partition(':')
+        replicas[f'replica{i}'] = {
+            **primary,
+            'HOST': host,
+            'PORT': port or primary.get('PORT', ''),
+            'TEST': {'MIRROR': 'default'},
+        }
+    return replicas
+
+
 # Application definition
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -45,15 +66,29 @@ INSTALLED_APPS = [
     'formbuilder',
 ]
 
+# Apps only needed for development tooling; removed from INSTALLED_APPS in
+# production to keep worker startup lean
+DEVELOPMENT_ONLY_APPS = [
+    'django_extensions',
+]
+
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",            # put high
-    "whitenoise.middleware.WhiteNoiseMiddleware",       # for static serving
+    "formbuilder.middleware.WhiteNoiseMiddleware",      # for static serving and published forms
+    "formbuilder.ratelimit.ConcurrencyLimitMiddleware", # shed load before doing any work
+    "formbuilder.middleware.CompressionMiddleware",     # negotiated gzip/br/zstd for dynamic responses
+    "django.middleware.http.ConditionalGetMiddleware",  # ETag / 304 handling, runs before compression
 
     'django.middleware.security.SecurityMiddleware',
+    'formbuilder.log.RequestLogContextMiddleware',  # request id, view and form id on log records
+    'formbuilder.routers.ReplicaPinningMiddleware',  # read-your-writes across requests
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'formbuilder.workspaces.WorkspaceMiddleware',  # scopes queries to the request's workspace
+    'formbuilder.ratelimit.RateLimitMiddleware',  # after auth, keys buckets by user or IP
+    'formbuilder.profiler.ProfilingMiddleware',  # removed from the chain unless profiling is enabled
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -91,6 +126,16 @@ DATABASES = {
     }
 }
 
+# Read replicas, e.g. DB_REPLICA_HOSTS=replica-1,replica-2:5433
+DATABASES.update(replica_databases(DATABASES['default'], get_env_variable('DB_REPLICA_HOSTS', '')))
+
+# Reads go to replicas, writes to the primary (see formbuilder/routers.py)
+DATABASE_ROUTERS = ['formbuilder.routers.ReplicaRouter']
+FORMBUILDER_REPLICAS = {
+    'MAX_LAG': float(get_env_variable('DB_REPLICA_MAX_LAG', '5')),  # seconds behind before falling back to the primary
+    'PIN_SECONDS': 10,  # seconds a client reads from the primary after writing
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -130,13 +175,124 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Published form snapshots (fingerprinted JSON served by WhiteNoise)
+FORMBUILDER_PUBLISH_ROOT = BASE_DIR / "published"
+FORMBUILDER_PUBLISH_URL = '/published/'
+
+# Store identical form schemas once, shared through SchemaBlob rows
+FORMBUILDER_DEDUPLICATE_SCHEMAS = False
+
+# Submission partitioning (PostgreSQL only; see formbuilder/partitions.py)
+FORMBUILDER_SUBMISSION_PARTITIONS_AHEAD = 3  # months
+FORMBUILDER_SUBMISSION_HASH_PARTITIONS = 0  # hash subpartitions by form per month, 0 to disable
+FORMBUILDER_SUBMISSION_RETENTION_MONTHS = None  # keep forever
+
+# In-process LRU in front of the Django cache for hot forms (see formbuilder/cache.py)
+FORMBUILDER_LOCAL_CACHE = {
+    'MAX_BYTES': 32 * 1024 * 1024,  # per process
+    'TTL': 300,  # seconds an entry may stay in the local tier
+    'REMOTE_TTL': 3600,  # seconds an entry may stay in the Django cache
+    'REVALIDATE_AFTER': 1.0,  # seconds before a local hit re-checks the version stamp
+}
+
+# Response compression (brotli/zstd require the optional brotli/zstandard packages)
+FORMBUILDER_COMPRESS_MIN_SIZE = 1024  # bytes
+FORMBUILDER_COMPRESS_ENCODINGS = ['br', 'zstd', 'gzip']  # in order of preference
+FORMBUILDER_COMPRESS_LEVELS = {}  # per-encoding overrides, e.g. {'gzip': 5}
+
+# Soft delete of forms and purging of their rows (see formbuilder/softdelete.py)
+FORMBUILDER_SOFT_DELETE = {
+    'TOMBSTONE_DAYS': 30,  # days deleted forms stay in the ?since= delta feed
+    'BATCH_SIZE': 5000,  # largest number of rows per purge DELETE
+    'BATCH_SECONDS': 0.25,  # target duration of a purge batch
+    'PAUSE_RATIO': 1.0,  # pause after a batch, relative to its duration
+}
+
+# Token-bucket rate limits and admission control for the API (see formbuilder/ratelimit.py)
+FORMBUILDER_RATE_LIMITS = {
+    'BACKEND': 'auto',  # Redis when the default cache is Redis, in-memory otherwise
+    'CLIENT': {'rate': 10.0, 'burst': 50},  # per user or IP: tokens per second, bucket size
+    'FORM': {'rate': 100.0, 'burst': 300},  # per form, across all clients
+    'WORKSPACE': {'rate': 200.0, 'burst': 600},  # per workspace, across all clients
+    'TRUST_X_FORWARDED_FOR': False,  # enable only behind a proxy that sets it
+    'MAX_CONCURRENT_REQUESTS': 0,  # in flight per process before shedding with 503, 0 to disable
+}
+
+# Per-request sampling profiler (see formbuilder/profiler.py). Profiles are
+# written to logs/profiles/ and listed for staff at /formbuilder/profiles/
+FORMBUILDER_PROFILING = {
+    'ENABLED': get_env_variable('FORMBUILDER_PROFILING', 'False') == 'True',
+    'INTERVAL': 0.005,  # seconds between stack samples
+    'TOKEN_MAX_AGE': 3600,  # seconds a signed X-Formbuilder-Profile token is valid
+}
+
+# Incremental parsing of bulk submission and form import bodies (see formbuilder/streaming.py)
+FORMBUILDER_STREAMING = {
+    'MAX_BODY_SIZE': 512 * 1024 * 1024,  # bytes per request, checked while reading
+    'MAX_ITEM_SIZE': 1024 * 1024,  # bytes per submission or imported form
+    'BATCH_SIZE': 500,  # submissions stored per transaction
+}
+
+# Resumable chunked uploads of file-upload components (see formbuilder/uploads.py)
+FORMBUILDER_UPLOADS = {
+    'ROOT': BASE_DIR / "uploads",
+    'MAX_SIZE': 2 * 1024 * 1024 * 1024,  # bytes per file
+    'FSYNC': True,  # flush each chunk to disk before acknowledging it
+    'EXPIRE_HOURS': 24,  # unfinished or never submitted uploads are removed after this
+}
+
+# Server-side evaluation of form conditions and calculated fields (see formbuilder/logic.py)
+FORMBUILDER_LOGIC = {
+    'CACHE_NODES': 1_000_000,  # compiled logic kept per process, in graph nodes
+    'CACHE_TTL': 3600,  # seconds
+}
+
+# Webhook delivery from the outbox by the deliver_webhooks worker (see formbuilder/webhooks.py)
+FORMBUILDER_WEBHOOKS = {
+    'BATCH_SIZE': 100,  # events per request to an endpoint
+    'CONCURRENCY': 32,  # requests in flight per worker
+    'TIMEOUT': 10,  # seconds per request
+    'MAX_ATTEMPTS': 10,  # failed attempts before an event is dead-lettered
+    'BACKOFF_BASE': 5,  # seconds before the first retry, doubled on each attempt
+    'RETENTION_HOURS': 72,  # delivered events are deleted after this
+}
+
+# Tenants: requests are scoped to the workspace named by the
+# X-Formbuilder-Workspace header, or the default one, if the user is one of
+# its members (see formbuilder/workspaces.py)
+FORMBUILDER_WORKSPACES = {
+    'DEFAULT': 'default',  # slug of the workspace of requests naming none, open to everyone
+    'MAX_FORMS': 10000,  # per workspace unless overridden on it, None for no limit
+    'MAX_FRAGMENTS': 1000,
+}
+
+# Let the frontend send the workspace header cross-origin
+CORS_ALLOW_HEADERS = (*default_headers, 'x-formbuilder-workspace')
+
+# Page shells: the static parts of the builder, viewer, list and detail
+# pages are rendered once per process (see formbuilder/shells.py)
+FORMBUILDER_SHELLS = {
+    'ENABLED': True,  # never with DEBUG, so template edits show up
+}
+
+# Live form change notifications over Server-Sent Events (see formbuilder/events.py)
+FORMBUILDER_EVENTS = {
+    # InProcessBackend for a single worker; RedisBackend relays events
+    # between workers through the Redis cache
+    'BACKEND': 'formbuilder.events.InProcessBackend',
+    'QUEUE_SIZE': 16,  # events buffered per subscriber
+    'KEEPALIVE': 15,  # seconds
+}
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Logging configuration
+# Logging configuration. The file handler writes JSON lines from a background
+# thread through a bounded queue, so slow disks do not block requests (see
+# formbuilder/log.py)
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -149,13 +305,19 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'formbuilder.log.JSONFormatter',
+        },
     },
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'formbuilder.log.QueuedFileHandler',
             'filename': BASE_DIR / 'logs' / 'django.log',
-            'formatter': 'verbose',
+            'formatter': 'json',
+            'max_bytes': 50 * 1024 * 1024,  # rotate at 50 MB
+            'backup_count': 5,
+            'queue_size': 10000,  # records buffered before lower levels are dropped
         },
         'console': {
             'level': 'DEBUG',
@@ -172,5 +334,16 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'formbuilder': {
+            'handlers': ['file', 'console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'formbuilder.requests': {
+            # One record per request; file only
+            'handlers': ['file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
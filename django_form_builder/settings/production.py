@@ -6,6 +6,9 @@ These settings are used for production environment.
 
 from .base import *
 
+# Slim app profile: drop development tooling
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in DEVELOPMENT_ONLY_APPS]
+
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = get_env_variable('SECRET_KEY')
 
@@ -35,6 +38,9 @@ DATABASES = {
     }
 }
 
+# Read replicas (comma-separated hosts)
+DATABASES.update(replica_databases(DATABASES['default'], get_env_variable('DB_REPLICA_HOSTS', '')))
+
 # Email settings for production
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = get_env_variable('EMAIL_HOST')
@@ -55,6 +61,9 @@ CACHES = {
     }
 }
 
+# Relay live form events between workers through Redis
+FORMBUILDER_EVENTS = {**FORMBUILDER_EVENTS, 'BACKEND': 'formbuilder.events.RedisBackend'}
+
 # Security settings for production
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
@@ -69,6 +78,18 @@ SESSION_COOKIE_SECURE = True
 CSRF_COOKIE_SECURE = True
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
+# Templates are compiled once per process by the cached loader. Django
+# would add it implicitly with DEBUG off, but only when no loaders are set
+# and APP_DIRS is left to decide them. Setting it here keeps the caching
+# explicit, whatever the base settings or DEBUG say.
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
 # Static files
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
@@ -76,6 +97,7 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 LOGGING['handlers']['file']['filename'] = BASE_DIR / 'logs' / 'production.log'
 LOGGING['loggers']['django']['level'] = 'ERROR'
 LOGGING['loggers']['django']['handlers'] = ['file']  # Only file logging in production
+LOGGING['loggers']['formbuilder']['handlers'] = ['file']
 
 # Additional production settings
 ADMINS = [
@@ -32,6 +32,9 @@ DATABASES = {
     }
 }
 
+# Read replicas (comma-separated hosts)
+DATABASES.update(replica_databases(DATABASES['default'], get_env_variable('DB_REPLICA_HOSTS', '')))
+
 # Email settings for staging
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = get_env_variable('EMAIL_HOST', 'smtp.gmail.com')
@@ -49,6 +52,9 @@ CACHES = {
     }
 }
 
+# Relay live form events between workers through Redis
+FORMBUILDER_EVENTS = {**FORMBUILDER_EVENTS, 'BACKEND': 'formbuilder.events.RedisBackend'}
+
 # Security settings for staging
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
@@ -0,0 +1,35 @@
+"""
+Test settings for django_form_builder project.
+
+These settings run the test suite on SQLite, without PostgreSQL or Redis:
+
+    DJANGO_ENV=test python manage.py test formbuilder
+"""
+
+import os
+
+# The base settings read the PostgreSQL credentials; the tests do not use them
+for name in ('DB_NAME', 'DB_USER', 'DB_PASSWORD'):
+    os.environ.setdefault(name, 'unused')
+
+from .development import *
+
+# A replica that is a separate database, not a mirror of the primary: nothing
+# replicates between them, so the replica routing tests can tell which
+# database a read went to
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test.sqlite3',
+    },
+    'replica1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test-replica.sqlite3',
+    },
+}
+
+# Faster user creation
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+LOGGING['loggers']['django']['level'] = 'WARNING'
+LOGGING['handlers']['console']['level'] = 'WARNING'
@@ -1,23 +1,158 @@
+from django import forms
 from django.contrib import admin
-from .models import Form
+from .fragments import FragmentError, check_components, create_version
+from .models import Form, Fragment, FragmentVersion, OutboxEvent, Submission, Upload, WebhookEndpoint, Workspace
+from .publishing import publish_form
+from .webhooks import retry_dead
+
+
+class WorkspaceOwnedAdmin(admin.ModelAdmin):
+
+    def get_readonly_fields(self, request, obj=None):
+        # Cached data and references are keyed by workspace: no moving
+        readonly = super().get_readonly_fields(request, obj)
+        return [*readonly, 'workspace'] if obj is not None else readonly
+
+
+@admin.register(Workspace)
+class WorkspaceAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug', 'max_forms', 'max_fragments', 'created']
+    search_fields = ['name', 'slug']
+    prepopulated_fields = {'slug': ['name']}
+    filter_horizontal = ['members']
+    readonly_fields = ['created', 'modified']
 
 
 @admin.register(Form)
-class FormAdmin(admin.ModelAdmin):
-    list_display = ['name', 'is_active', 'created', 'modified']
-    list_filter = ['is_active', 'created']
+class FormAdmin(WorkspaceOwnedAdmin):
+    list_display = ['name', 'workspace', 'is_active', 'published_at', 'created', 'modified']
+    list_filter = ['workspace', 'is_active', 'created']
+    list_select_related = ['workspace']
     search_fields = ['name']
-    readonly_fields = ['created', 'modified']
+    readonly_fields = ['created', 'modified', 'published_snapshot', 'published_at']
+    actions = ['publish_forms']
 
     fieldsets = (
         ('Basic Information', {
-            'fields': ('name', 'is_active')
+            'fields': ('workspace', 'name', 'is_active')
         }),
         ('Schema', {
             'fields': ('schema',)
         }),
+        ('Publishing', {
+            'fields': ('published_snapshot', 'published_at'),
+            'classes': ('collapse',)
+        }),
         ('Timestamps', {
             'fields': ('created', 'modified'),
             'classes': ('collapse',)
         }),
     )
+
+    def delete_queryset(self, request, queryset):
+        # Soft-delete like Form.delete(); purge_deleted_forms removes the rows later
+        for form in queryset:
+            form.delete()
+
+    @admin.action(description="Publish selected forms")
+    def publish_forms(self, request, queryset):
+        forms = list(queryset)
+        for form in forms:
+            publish_form(form)
+        self.message_user(request, f"Published {len(forms)} form(s).")
+
+
+@admin.register(Submission)
+class SubmissionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'form', 'created']
+    list_filter = ['created']
+    list_select_related = ['form']
+    raw_id_fields = ['form']
+    readonly_fields = ['created', 'modified']
+
+
+@admin.register(Upload)
+class UploadAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'form', 'component_key', 'size', 'offset', 'completed_at', 'submission']
+    list_filter = ['completed_at']
+    list_select_related = ['form']
+    raw_id_fields = ['form', 'submission']
+    readonly_fields = ['created', 'modified', 'size', 'offset', 'completed_at']
+
+
+@admin.register(WebhookEndpoint)
+class WebhookEndpointAdmin(WorkspaceOwnedAdmin):
+    list_display = ['url', 'workspace', 'form', 'is_active', 'created']
+    list_filter = ['workspace', 'is_active']
+    list_select_related = ['workspace', 'form']
+    raw_id_fields = ['form']
+    readonly_fields = ['created', 'modified']
+    actions = ['retry_dead_events']
+
+    @admin.action(description="Retry dead-lettered events of selected endpoints")
+    def retry_dead_events(self, request, queryset):
+        retried = sum(retry_dead(endpoint.pk) for endpoint in queryset)
+        self.message_user(request, f"Queued {retried} event(s) again.")
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'event', 'endpoint', 'attempts', 'next_attempt_at', 'delivered_at', 'dead_at']
+    list_filter = ['event', 'delivered_at', 'dead_at']
+    list_select_related = ['endpoint']
+    raw_id_fields = ['endpoint']
+    readonly_fields = ['created', 'attempts', 'delivered_at', 'dead_at', 'last_error']
+
+
+class FragmentVersionInline(admin.TabularInline):
+    model = FragmentVersion
+    fields = ['version', 'components', 'created']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    ordering = ['-version']
+
+    def has_add_permission(self, request, obj=None):
+        # New versions go through the API, which invalidates dependent forms
+        return False
+
+
+class FragmentAddForm(forms.ModelForm):
+    """
+    Create a fragment with its first version: a fragment without versions
+    cannot be referenced
+    """
+    components = forms.JSONField(help_text="Components of the first version, as a JSON list")
+
+    class Meta:
+        model = Fragment
+        fields = ['workspace', 'name']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('workspace') is not None and 'components' in cleaned_data:
+            try:
+                check_components(cleaned_data['components'], cleaned_data['workspace'].pk)
+            except FragmentError as e:
+                self.add_error('components', str(e))
+        return cleaned_data
+
+
+@admin.register(Fragment)
+class FragmentAdmin(WorkspaceOwnedAdmin):
+    list_display = ['name', 'workspace', 'version', 'modified']
+    list_filter = ['workspace']
+    list_select_related = ['workspace']
+    search_fields = ['name']
+    readonly_fields = ['version', 'created', 'modified']
+    inlines = [FragmentVersionInline]
+
+    def get_form(self, request, obj=None, **kwargs):
+        if obj is None:
+            kwargs['form'] = FragmentAddForm
+        return super().get_form(request, obj, **kwargs)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            create_version(obj, form.cleaned_data['components'])
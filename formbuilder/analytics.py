@@ -0,0 +1,371 @@
+"""
+Incremental per-field submission analytics.
+
+Each form keeps one FormAggregate row holding a mergeable state per field:
+fill count, value counts for choice-like values, numeric count/sum/min/max,
+a t-digest for numeric quantiles and a HyperLogLog sketch for distinct
+counts. Ingested batches are aggregated in memory and merged into that row,
+so the summary endpoint reads a single row no matter how many submissions
+exist. Backfills use NumPy for numeric columns when it is installed.
+
+Aggregates only grow: they cover every submission ever ingested, including
+those removed since by retention (``manage_partitions``). Sketches cannot
+subtract values; ``rebuild_aggregates`` recomputes them from the stored
+submissions. Purging a deleted form removes its aggregate with its rows.
+"""
+import base64
+import bisect
+import hashlib
+import json
+import math
+
+from django.db import transaction
+
+from .models import FormAggregate, Submission
+from .uploads import link_uploads
+from .webhooks import enqueue_submissions
+
+
+_numpy = False
+
+
+def get_numpy():
+    """
+    Return the numpy module, or None if it is not installed. Imported on
+    first use since it adds noticeably to worker startup.
+    """
+    global _numpy
+    if _numpy is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy = numpy
+    return _numpy
+
+
+# Value counts are tracked for at most this many distinct values per field;
+# further values are counted under OTHER_VALUE
+MAX_TRACKED_VALUES = 100
+OTHER_VALUE = '__other__'
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct-count sketch with 2**precision one-byte registers
+    """
+
+    def __init__(self, precision=10, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+
+    def add(self, value):
+        h = int.from_bytes(hashlib.blake2b(_value_bytes(value), digest_size=8).digest(), 'big')
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size * self.size / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # Small-range correction (linear counting)
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def to_state(self):
+        return {'p': self.precision, 'r': base64.b64encode(bytes(self.registers)).decode('ascii')}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state['p'], base64.b64decode(state['r']))
+
+
+class TDigest:
+    """
+    Merging t-digest for approximate quantiles of a numeric stream
+    """
+
+    def __init__(self, compression=100, centroids=None):
+        self.compression = compression
+        self.centroids = [list(c) for c in centroids] if centroids else []  # [mean, weight], sorted by mean
+        self._buffer = []
+
+    def add(self, value, weight=1):
+        self._buffer.append([float(value), weight])
+        if len(self._buffer) >= self.compression * 5:
+            self._compress()
+
+    def add_sorted(self, values):
+        """
+        Add many values at once; ``values`` may be a sorted NumPy array
+        """
+        self._buffer.extend([float(value), 1] for value in values)
+        self._compress()
+
+    def merge(self, other):
+        other._compress()
+        self._buffer.extend(list(c) for c in other.centroids)
+        self._compress()
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(self.centroids + self._buffer, key=lambda c: c[0])
+        self._buffer = []
+        total = sum(c[1] for c in points)
+        merged = [points[0]]
+        cumulative = 0.0
+        for mean, weight in points[1:]:
+            current = merged[-1]
+            q = (cumulative + current[1] / 2) / total
+            limit = max(1.0, 4 * total * q * (1 - q) / self.compression)
+            if current[1] + weight <= limit:
+                combined = current[1] + weight
+                current[0] += (mean - current[0]) * weight / combined
+                current[1] = combined
+            else:
+                cumulative += current[1]
+                merged.append([mean, weight])
+        self.centroids = merged
+
+    def quantile(self, q):
+        self._compress()
+        if not self.centroids:
+            return None
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+        total = sum(c[1] for c in self.centroids)
+        target = q * total
+        # Cumulative weight at the centre of each centroid
+        centres = []
+        cumulative = 0.0
+        for mean, weight in self.centroids:
+            centres.append(cumulative + weight / 2)
+            cumulative += weight
+        i = bisect.bisect_left(centres, target)
+        if i == 0:
+            return self.centroids[0][0]
+        if i == len(centres):
+            return self.centroids[-1][0]
+        left, right = centres[i - 1], centres[i]
+        fraction = (target - left) / (right - left)
+        return self.centroids[i - 1][0] + fraction * (self.centroids[i][0] - self.centroids[i - 1][0])
+
+    def to_state(self):
+        self._compress()
+        return {'c': self.centroids}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(centroids=state['c'])
+
+
+class FieldStats:
+    """
+    Mergeable statistics of one submission field
+    """
+
+    def __init__(self):
+        self.filled = 0
+        self.values = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.digest = TDigest()
+        self.distinct = HyperLogLog()
+
+    def add_many(self, values):
+        """
+        Add a column of values, using NumPy for the numeric ones if available
+        """
+        numbers = []
+        for value in values:
+            if _is_empty(value):
+                continue
+            self.filled += 1
+            self.distinct.add(value)
+            if _is_number(value):
+                numbers.append(value)
+            else:
+                for item in (value if isinstance(value, list) else [value]):
+                    self._count_value(item)
+        if numbers:
+            self._add_numbers(numbers)
+
+    def _add_numbers(self, numbers):
+        numpy = get_numpy() if len(numbers) > 1 else None
+        if numpy is not None:
+            array = numpy.sort(numpy.asarray(numbers, dtype=float))
+            self._update_range(len(array), float(array.sum()), float(array[0]), float(array[-1]))
+            self.digest.add_sorted(array)
+            return
+        for number in numbers:
+            self._update_range(1, float(number), float(number), float(number))
+            self.digest.add(number)
+
+    def _update_range(self, count, total, low, high):
+        self.count += count
+        self.sum += total
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def _count_value(self, value):
+        key = value if isinstance(value, str) else json.dumps(value)
+        if key not in self.values and len(self.values) >= MAX_TRACKED_VALUES:
+            key = OTHER_VALUE
+        self.values[key] = self.values.get(key, 0) + 1
+
+    def merge(self, other):
+        self.filled += other.filled
+        for key, count in other.values.items():
+            if key not in self.values and len(self.values) >= MAX_TRACKED_VALUES:
+                key = OTHER_VALUE
+            self.values[key] = self.values.get(key, 0) + count
+        if other.count:
+            self._update_range(other.count, other.sum, other.min, other.max)
+        self.digest.merge(other.digest)
+        self.distinct.merge(other.distinct)
+
+    def to_state(self):
+        return {
+            'filled': self.filled,
+            'values': self.values,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'digest': self.digest.to_state(),
+            'distinct': self.distinct.to_state(),
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        stats = cls()
+        stats.filled = state['filled']
+        stats.values = dict(state['values'])
+        stats.count = state['count']
+        stats.sum = state['sum']
+        stats.min = state['min']
+        stats.max = state['max']
+        stats.digest = TDigest.from_state(state['digest'])
+        stats.distinct = HyperLogLog.from_state(state['distinct'])
+        return stats
+
+    def summary(self, total):
+        """
+        Return the JSON-serializable summary of the field
+        """
+        summary = {
+            'filled': self.filled,
+            'fill_rate': self.filled / total if total else 0.0,
+            'distinct': self.distinct.count() if self.filled else 0,
+        }
+        if self.values:
+            summary['values'] = dict(sorted(self.values.items(), key=lambda item: item[1], reverse=True))
+        if self.count:
+            summary['numeric'] = {
+                'count': self.count,
+                'min': self.min,
+                'max': self.max,
+                'mean': self.sum / self.count,
+                'p50': self.digest.quantile(0.5),
+                'p90': self.digest.quantile(0.9),
+                'p99': self.digest.quantile(0.99),
+            }
+        return summary
+
+
+def _value_bytes(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def _is_empty(value):
+    return value is None or value == '' or value == [] or value == {}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def aggregate_records(records):
+    """
+    Aggregate a batch of submission data dicts into {field key: FieldStats}
+    """
+    columns = {}
+    for record in records:
+        for key, value in (record or {}).items():
+            columns.setdefault(key, []).append(value)
+    aggregates = {}
+    for key, values in columns.items():
+        stats = FieldStats()
+        stats.add_many(values)
+        aggregates[key] = stats
+    return aggregates
+
+
+def merge_into(aggregate, count, field_stats):
+    """
+    Merge a batch of field statistics into a FormAggregate (not saved)
+    """
+    fields = aggregate.fields
+    for key, stats in field_stats.items():
+        if key in fields:
+            merged = FieldStats.from_state(fields[key])
+            merged.merge(stats)
+            stats = merged
+        fields[key] = stats.to_state()
+    aggregate.submission_count += count
+
+
+def ingest_submissions(form, records):
+    """
+    Store a batch of submissions for a form and update its aggregates in the
+    same transaction, linking the uploads the submissions refer to and
+    queueing webhook events. Returns the created submissions.
+    """
+    field_stats = aggregate_records(records)
+    with transaction.atomic():
+        # Lock before inserting: rebuild_aggregates relies on a form's
+        # submissions being committed in the order of their pks
+        aggregate = FormAggregate.objects.select_for_update().filter(form=form).first()
+        if aggregate is None:
+            # First submission of the form
+            FormAggregate.objects.get_or_create(form=form)
+            aggregate = FormAggregate.objects.select_for_update().get(form=form)
+        submissions = Submission.objects.bulk_create(
+            Submission(form=form, data=record) for record in records
+        )
+        merge_into(aggregate, len(records), field_stats)
+        aggregate.save()
+        link_uploads(form, submissions)
+        enqueue_submissions(form, submissions)
+    return submissions
+
+
+def summarize(form):
+    """
+    Return the per-field summary of a form's submissions from its aggregate
+    """
+    aggregate = FormAggregate.objects.filter(form=form).first()
+    total = aggregate.submission_count if aggregate else 0
+    fields = aggregate.fields if aggregate else {}
+
+    summary = {}
+    for key, state in fields.items():
+        summary[key] = FieldStats.from_state(state).summary(total)
+    # Input fields of the form nobody has filled in yet
+    index = form.get_component_index()
+    containers = {entry['parent'] for entry in index}
+    for entry in index:
+        if entry['id'] not in containers and entry['key'] and entry['key'] not in summary:
+            summary[entry['key']] = FieldStats().summary(total)
+    return {'submission_count': total, 'fields': summary}
@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def create_submission_partitions(sender, using, **kwargs):
+    """
+    Make sure upcoming submission partitions exist after every migrate
+    """
+    from django.db import connections
+    from .partitions import ensure_partitions
+
+    ensure_partitions(connection=connections[using])
 
 
 class FormbuilderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'formbuilder'
+
+    def ready(self):
+        post_migrate.connect(create_submission_partitions, sender=self)
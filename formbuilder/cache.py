@@ -0,0 +1,201 @@
+"""
+Two-tier cache for hot form data.
+
+Reads are served from a bounded in-process LRU (tier 1) in front of the
+Django cache (tier 2, Redis in production), which avoids both the network
+round trip and the deserialization for the handful of forms that get most
+of the traffic.
+
+Invalidation works across processes through version stamps kept in the
+Django cache: ``invalidate()`` bumps the stamp of a key, and every process
+re-checks the stamp of a locally cached entry at most once per
+``revalidate_after`` seconds, so stale local copies live at most that long.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by total size in bytes, with a TTL
+    """
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()  # key -> [value, size, expires_at, version, checked_at]
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key, now=None):
+        """
+        Return the entry list of a key, or None
+        """
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[2] <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key, value, size, version, now=None):
+        now = now if now is not None else time.monotonic()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = [value, size, now + self.ttl, version, now]
+            self.size += size
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.size -= entry[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TieredCache:
+    """
+    In-process LRU in front of a Django cache, with version-stamp invalidation
+    """
+
+    def __init__(self, namespace, max_bytes=None, local_ttl=None, remote_ttl=None,
+                 revalidate_after=None, cache_alias='default'):
+        options = getattr(settings, 'FORMBUILDER_LOCAL_CACHE', {})
+        self.namespace = namespace
+        self.local = LRUCache(
+            max_bytes if max_bytes is not None else options.get('MAX_BYTES', 32 * 1024 * 1024),
+            local_ttl if local_ttl is not None else options.get('TTL', 300),
+        )
+        self.remote_ttl = remote_ttl if remote_ttl is not None else options.get('REMOTE_TTL', 3600)
+        self.revalidate_after = (
+            revalidate_after if revalidate_after is not None else options.get('REVALIDATE_AFTER', 1.0)
+        )
+        self.cache_alias = cache_alias
+        self.remote_hits = self.remote_misses = self.revalidations = 0
+
+    @property
+    def remote(self):
+        return caches[self.cache_alias]
+
+    def _version_key(self, key):
+        return f"{self.namespace}:v:{key}"
+
+    def _data_key(self, key):
+        return f"{self.namespace}:d:{key}"
+
+    def get(self, key, loader=None):
+        """
+        Return the cached value of a key, calling ``loader()`` on a miss in
+        both tiers and caching its result. Returns None on a miss without a
+        loader. None values are not cached.
+        """
+        now = time.monotonic()
+        entry = self.local.get(key, now)
+        if entry is not None:
+            if now - entry[4] < self.revalidate_after:
+                return entry[0]
+            # Check that no other process invalidated the key meanwhile
+            self.revalidations += 1
+            if self.remote.get(self._version_key(key), 0) == entry[3]:
+                entry[4] = now
+                return entry[0]
+            self.local.delete(key)
+
+        version_key, data_key = self._version_key(key), self._data_key(key)
+        found = self.remote.get_many([version_key, data_key])
+        version = found.get(version_key, 0)
+        stored = found.get(data_key)
+        if stored is not None and stored[0] == version:
+            self.remote_hits += 1
+            payload = stored[1]
+            value = pickle.loads(payload)
+        else:
+            self.remote_misses += 1
+            if loader is None:
+                return None
+            value = loader()
+            if value is None:
+                return None
+            payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            self.remote.set(data_key, (version, payload), self.remote_ttl)
+
+        self.local.set(key, value, len(payload), version, now)
+        return value
+
+    def invalidate(self, key):
+        """
+        Invalidate a key in this process and, through its version stamp, in
+        every other process
+        """
+        self.local.delete(key)
+        version_key = self._version_key(key)
+        # Also drop the data: if the stamp was evicted, it restarts at a
+        # version the stored data may carry
+        self.remote.delete(self._data_key(key))
+        # add() is a no-op if the stamp exists; incr() then bumps it atomically
+        self.remote.add(version_key, 0, None)
+        try:
+            self.remote.incr(version_key)
+        except ValueError:
+            # The stamp was evicted between add() and incr()
+            self.remote.set(version_key, 1, None)
+
+    def stats(self):
+        """
+        Return hit/miss counters and hit ratios per tier for this process
+        """
+        local_total = self.local.hits + self.local.misses
+        remote_total = self.remote_hits + self.remote_misses
+        return {
+            'local': {
+                'hits': self.local.hits,
+                'misses': self.local.misses,
+                'hit_ratio': self.local.hits / local_total if local_total else 0.0,
+                'evictions': self.local.evictions,
+                'expirations': self.local.expirations,
+                'revalidations': self.revalidations,
+                'entries': len(self.local),
+                'bytes': self.local.size,
+                'max_bytes': self.local.max_bytes,
+            },
+            'remote': {
+                'hits': self.remote_hits,
+                'misses': self.remote_misses,
+                'hit_ratio': self.remote_hits / remote_total if remote_total else 0.0,
+            },
+        }
+
+
+# Shared instances, one per process
+form_cache = TieredCache('formbuilder:form')
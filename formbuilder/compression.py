@@ -0,0 +1,172 @@
+"""
+Content-encoding helpers for compressing API responses.
+
+gzip is always available. Brotli and zstd are used when the optional
+``brotli`` and ``zstandard`` packages are installed.
+"""
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Levels tuned for dynamic responses: close to the best ratio per CPU cost
+DEFAULT_LEVELS = {
+    'br': 4,
+    'zstd': 3,
+    'gzip': 6,
+}
+
+# Levels accepted by each encoding, used by the compression report
+LEVEL_RANGES = {
+    'br': range(0, 12),
+    'zstd': range(1, 20),
+    'gzip': range(1, 10),
+}
+
+
+def is_available(encoding):
+    """
+    Return whether the given content-coding can be produced
+    """
+    if encoding == 'gzip':
+        return True
+    if encoding == 'br':
+        return brotli is not None
+    if encoding == 'zstd':
+        return zstandard is not None
+    return False
+
+
+def available_encodings(preferred):
+    """
+    Filter a preference-ordered list of encodings down to the available ones
+    """
+    return [encoding for encoding in preferred if is_available(encoding)]
+
+
+def parse_accept_encoding(header):
+    """
+    Parse an Accept-Encoding header into a dict of coding -> q-value
+    """
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate_encoding(header, preferred):
+    """
+    Pick the best encoding for an Accept-Encoding header.
+
+    The client's q-values take precedence; ties are broken by the server's
+    preference order. Returns None if no acceptable encoding is available.
+    """
+    accepted = parse_accept_encoding(header or '')
+    best = None
+    best_q = 0.0
+    for encoding in available_encodings(preferred):
+        q = accepted.get(encoding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def get_compressor(encoding, level=None):
+    """
+    Return an incremental compressor object with ``compress`` and ``flush``
+    """
+    if level is None:
+        level = DEFAULT_LEVELS[encoding]
+    if encoding == 'gzip':
+        # wbits=31 selects the gzip container
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+    if encoding == 'br':
+        return _BrotliCompressor(level)
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class _BrotliCompressor:
+    """
+    Adapt brotli.Compressor to the zlib-style compress/flush interface
+    """
+
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+    def sync_flush(self):
+        return self._compressor.flush()
+
+
+def sync_flush(compressor, encoding):
+    """
+    Return the output buffered in an incremental compressor, so everything
+    compressed so far can be decoded, keeping the stream open
+    """
+    if encoding == 'gzip':
+        return compressor.flush(zlib.Z_SYNC_FLUSH)
+    if encoding == 'br':
+        return compressor.sync_flush()
+    if encoding == 'zstd':
+        return compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def compress(data, encoding, level=None):
+    """
+    Compress a complete body
+    """
+    compressor = get_compressor(encoding, level)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks, encoding, level=None):
+    """
+    Compress an iterable of byte chunks, yielding one compressed chunk per
+    chunk, so the client receives each one as soon as it is produced
+    """
+    compressor = get_compressor(encoding, level)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + sync_flush(compressor, encoding)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def compress_async_stream(chunks, encoding, level=None):
+    """
+    Async variant of compress_stream for async streaming responses
+    """
+    compressor = get_compressor(encoding, level)
+    async for chunk in chunks:
+        data = compressor.compress(chunk) + sync_flush(compressor, encoding)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,348 @@
+"""
+Live change notifications for forms, delivered as Server-Sent Events.
+
+Saving or deleting a form publishes an event on the form's channel once the
+transaction commits. The broker fans events out to the subscribers of this
+process, each an SSE connection waiting on an asyncio queue. Events are
+rendered to their SSE wire format once, at publish time.
+
+Backends decide how events reach the broker of every process: the in-process
+backend delivers directly (enough for a single worker), the Redis backend
+relays them through Redis pub/sub. Set FORMBUILDER_EVENTS['BACKEND'] to the
+dotted path of either, or of a custom class with the same interface.
+"""
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_EVENTS = {
+    'BACKEND': 'formbuilder.events.InProcessBackend',
+    'CACHE_ALIAS': 'default',  # Redis connection used by RedisBackend
+    'QUEUE_SIZE': 16,  # events buffered per subscriber before the oldest are dropped
+    'KEEPALIVE': 15,  # seconds between comment lines on idle connections
+    'RETRY': 3000,  # reconnection delay advised to clients, in milliseconds
+}
+
+
+def get_config():
+    """
+    Return the event settings merged over the defaults
+    """
+    return {**DEFAULT_EVENTS, **getattr(settings, 'FORMBUILDER_EVENTS', {})}
+
+
+def format_event(event, data, event_id=None):
+    """
+    Render an event in the text/event-stream format
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.extend(f"data: {line}" for line in data.splitlines() or [''])
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+def _escape_pointer(key):
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+# JSON nesting levels diffed member by member; a change deeper down replaces
+# the whole value at this depth. Each component level of a schema is two
+# JSON levels, so the recursion stays far below Python's limit for any
+# schema the database stores.
+MAX_PATCH_DEPTH = 100
+
+
+def json_patch(old, new, path='', depth=0):
+    """
+    Return a JSON Patch (RFC 6902) turning ``old`` into ``new``. Values
+    nested deeper than MAX_PATCH_DEPTH are replaced rather than diffed.
+    """
+    if type(old) is not type(new) or (depth >= MAX_PATCH_DEPTH and old != new):
+        return [{'op': 'replace', 'path': path, 'value': new}]
+
+    if isinstance(old, dict):
+        operations = []
+        for key in old:
+            child = f"{path}/{_escape_pointer(key)}"
+            if key not in new:
+                operations.append({'op': 'remove', 'path': child})
+            elif old[key] != new[key]:
+                operations.extend(json_patch(old[key], new[key], child, depth + 1))
+        for key in new:
+            if key not in old:
+                operations.append({'op': 'add', 'path': f"{path}/{_escape_pointer(key)}", 'value': new[key]})
+        return operations
+
+    if isinstance(old, list):
+        operations = []
+        common = min(len(old), len(new))
+        for i in range(common):
+            if old[i] != new[i]:
+                operations.extend(json_patch(old[i], new[i], f"{path}/{i}", depth + 1))
+        # Remove from the end so earlier indexes stay valid
+        for i in range(len(old) - 1, common - 1, -1):
+            operations.append({'op': 'remove', 'path': f"{path}/{i}"})
+        for i in range(common, len(new)):
+            operations.append({'op': 'add', 'path': f"{path}/-", 'value': new[i]})
+        return operations
+
+    if old != new:
+        return [{'op': 'replace', 'path': path, 'value': new}]
+    return []
+
+
+class Subscription:
+    """
+    One subscriber of a channel, read from a single event loop
+    """
+
+    def __init__(self, channel, loop, queue_size):
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(queue_size)
+        self.dropped = 0
+
+    def put(self, frame):
+        # Runs in the subscriber's loop. A slow reader loses its oldest
+        # events; each event names its base version, so clients notice the
+        # gap and refetch.
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class Broker:
+    """
+    Fan events out to the subscribers of this process
+    """
+
+    def __init__(self, backend, queue_size=16):
+        self.backend = backend
+        self.queue_size = queue_size
+        self._channels = {}  # channel -> {loop: set of subscriptions}
+        self._lock = threading.Lock()
+        backend.start(self)
+
+    def subscribe(self, channel):
+        """
+        Subscribe the running event loop to a channel
+        """
+        subscription = Subscription(channel, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            loops = self._channels.setdefault(channel, {})
+            loops.setdefault(subscription.loop, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            loops = self._channels.get(subscription.channel, {})
+            subscriptions = loops.get(subscription.loop, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                loops.pop(subscription.loop, None)
+            if not loops:
+                self._channels.pop(subscription.channel, None)
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            channels = [self._channels.get(channel, {})] if channel is not None else self._channels.values()
+            return sum(len(subscriptions) for loops in channels for subscriptions in loops.values())
+
+    def publish(self, channel, frame):
+        """
+        Publish a rendered event to a channel in every process
+        """
+        self.backend.publish(channel, frame)
+
+    def dispatch(self, channel, frame):
+        """
+        Deliver a rendered event to the local subscribers of a channel.
+        Safe to call from any thread.
+        """
+        with self._lock:
+            targets = [(loop, tuple(subscriptions)) for loop, subscriptions in self._channels.get(channel, {}).items()]
+        # One wakeup per event loop, not per subscriber
+        for loop, subscriptions in targets:
+            try:
+                loop.call_soon_threadsafe(_deliver, subscriptions, frame)
+            except RuntimeError:
+                # The loop was closed without unsubscribing
+                pass
+
+
+def _deliver(subscriptions, frame):
+    for subscription in subscriptions:
+        subscription.put(frame)
+
+
+class InProcessBackend:
+    """
+    Deliver events to subscribers of this process only
+    """
+
+    def start(self, broker):
+        self.broker = broker
+
+    def publish(self, channel, frame):
+        self.broker.dispatch(channel, frame)
+
+
+class RedisBackend:
+    """
+    Relay events between processes through Redis pub/sub
+    """
+    prefix = 'formbuilder:events:'
+
+    def start(self, broker):
+        from .ratelimit import get_redis_client
+
+        self.broker = broker
+        self.client = get_redis_client(get_config()['CACHE_ALIAS'])
+        if self.client is None:
+            raise RuntimeError("RedisBackend needs a Redis cache")
+        thread = threading.Thread(target=self.listen, name='formbuilder-events', daemon=True)
+        thread.start()
+
+    def publish(self, channel, frame):
+        try:
+            self.client.publish(f"{self.prefix}{channel}", frame)
+        except Exception as e:
+            logger.warning(f"Could not publish event on {channel}: {e}")
+
+    def listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f"{self.prefix}*")
+                for message in pubsub.listen():
+                    channel = message['channel']
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    self.broker.dispatch(channel[len(self.prefix):], message['data'])
+            except Exception as e:
+                logger.warning(f"Event listener disconnected, reconnecting: {e}")
+                threading.Event().wait(1)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """
+    Return the process-wide broker
+    """
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = get_config()
+                _broker = Broker(import_string(config['BACKEND'])(), config['QUEUE_SIZE'])
+    return _broker
+
+
+def form_channel(form_id):
+    return f"form:{form_id}"
+
+
+def form_version(form):
+    """
+    Return the version of a form as exposed by the API (its ``updated_at``)
+    """
+    return form.modified.isoformat()
+
+
+def publish_form_changed(form, previous_schema=None, previous_version=None):
+    """
+    Notify subscribers that a form was saved. The event includes a JSON
+    patch of the schema when the previous schema is known.
+    """
+    from .fragments import find_references
+
+    data = {
+        'form_id': form.pk,
+        'version': form_version(form),
+        'fingerprint': form.schema_fingerprint,
+    }
+    # Clients hold the schema with shared fragments resolved, which a patch
+    # of the stored schema does not apply to
+    if previous_schema is not None and previous_version is not None and not (
+        form.fragment_refs or find_references(previous_schema)
+    ):
+        data['base_version'] = previous_version
+        data['patch'] = json_patch(previous_schema, form.get_schema())
+    frame = format_event('changed', json.dumps(data, separators=(',', ':')), data['version'])
+    get_broker().publish(form_channel(form.pk), frame)
+
+
+def publish_form_deleted(form_id):
+    """
+    Notify subscribers that a form was deleted
+    """
+    frame = format_event('deleted', json.dumps({'form_id': form_id}))
+    get_broker().publish(form_channel(form_id), frame)
+
+
+async def stream_form_events(form_id, version, last_event_id=None):
+    """
+    Yield the SSE stream of a form: its current version, then its change
+    events, with keepalive comments in between.
+
+    ``last_event_id`` is the Last-Event-ID of a reconnecting client, the
+    version it last saw. If the form changed since, the stream starts with
+    a ``changed`` event without a patch so the client refetches.
+    """
+    config = get_config()
+    broker = get_broker()
+    subscription = broker.subscribe(form_channel(form_id))
+    try:
+        yield f"retry: {config['RETRY']}\n\n".encode()
+        data = json.dumps({'form_id': form_id, 'version': version})
+        if last_event_id is not None and last_event_id != version:
+            yield format_event('changed', data, version)
+        else:
+            yield format_event('version', data, version)
+        while True:
+            try:
+                frame = await asyncio.wait_for(subscription.get(), config['KEEPALIVE'])
+            except asyncio.TimeoutError:
+                yield b': keepalive\n\n'
+                continue
+            yield frame
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def iter_sync(stream):
+    """
+    Iterate an async event stream from a WSGI server's thread.
+
+    Django consumes an async iterator to its end before sending anything
+    under WSGI, which an endless event stream never reaches. The stream
+    runs on an event loop of its own instead, so each connection holds a
+    worker thread for as long as it stays open.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(anext(stream))
+            except StopAsyncIteration:
+                return
+    finally:
+        # Closed by the server when the client disconnects
+        loop.run_until_complete(stream.aclose())
+        loop.close()
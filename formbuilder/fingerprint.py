@@ -0,0 +1,140 @@
+"""
+Schema fingerprints for duplicate and near-duplicate form detection.
+
+Every saved form stores:
+    - an exact fingerprint: a hash of the canonical JSON of its schema, so
+      identical schemas match regardless of key order
+    - a MinHash signature over per-component shingles, whose agreement
+      estimates the Jaccard similarity of two schemas
+    - LSH buckets (bands of the signature) in an indexed table, so that
+      near-duplicate candidates are found by index lookups instead of
+      comparing every pair of forms
+"""
+import hashlib
+import json
+import random
+
+from .schema import iter_components
+
+
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed seed: signatures must be identical across processes and deploys
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def canonical_json(value):
+    """
+    Serialize a value to JSON that does not depend on key order
+    """
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def schema_fingerprint(schema):
+    """
+    Return the exact fingerprint (sha256 hex digest) of a schema
+    """
+    return hashlib.sha256(canonical_json(schema or {}).encode('utf-8')).hexdigest()
+
+
+def schema_shingles(schema):
+    """
+    Return the set of shingles of a schema: one per component, made of its
+    depth and its own properties (without nested children)
+    """
+    shingles = set()
+    # Every property of every component goes into the shingles, which the
+    # component index does not hold; computed once per save
+    for component, parent, depth, position in iter_components(schema):
+        own = {key: value for key, value in component.items() if key != 'children'}
+        shingles.add(f"{depth}:{canonical_json(own)}")
+    return shingles
+
+
+def _hash_shingle(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'big')
+
+
+def minhash_signature(shingles):
+    """
+    Compute the MinHash signature of a set of shingles.
+
+    Returns an empty list for an empty set, which never matches anything.
+    """
+    if not shingles:
+        return []
+    hashes = [_hash_shingle(shingle) for shingle in shingles]
+    return [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def lsh_buckets(signature):
+    """
+    Split a signature into LSH bands and return one bucket id per band.
+
+    Two schemas share at least one bucket with high probability once their
+    similarity exceeds roughly (1 / LSH_BANDS) ** (1 / LSH_ROWS).
+    """
+    if len(signature) != NUM_PERMUTATIONS:
+        return []
+    buckets = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(','.join(map(str, rows)).encode('ascii'), digest_size=8).hexdigest()
+        buckets.append(f"{band:02d}{digest}")
+    return buckets
+
+
+def estimate_similarity(signature, other):
+    """
+    Estimate the Jaccard similarity of two schemas from their signatures
+    """
+    if not signature or len(signature) != len(other):
+        return 0.0
+    return sum(1 for a, b in zip(signature, other) if a == b) / len(signature)
+
+
+def find_duplicates(form, threshold=0.8):
+    """
+    Find forms of the same workspace whose schema duplicates or nearly
+    duplicates the given form.
+
+    Returns a list of (form, similarity) pairs, most similar first. Exact
+    duplicates have a similarity of 1.0.
+    """
+    from .models import Form, SchemaBucket
+
+    candidate_ids = set(
+        Form.objects.filter(workspace=form.workspace_id, schema_fingerprint=form.schema_fingerprint)
+        .exclude(pk=form.pk)
+        .values_list('pk', flat=True)
+    ) if form.schema_fingerprint else set()
+    candidate_ids.update(
+        SchemaBucket.objects.filter(bucket__in=lsh_buckets(form.minhash))
+        .exclude(form_id=form.pk)
+        .values_list('form_id', flat=True)
+    )
+
+    duplicates = []
+    candidates = Form.objects.filter(workspace=form.workspace_id, pk__in=candidate_ids).defer('schema')
+    for candidate in candidates:
+        if candidate.schema_fingerprint == form.schema_fingerprint:
+            similarity = 1.0
+        else:
+            similarity = estimate_similarity(form.minhash, candidate.minhash)
+        if similarity >= threshold:
+            duplicates.append((candidate, similarity))
+
+    duplicates.sort(key=lambda pair: pair[1], reverse=True)
+    return duplicates
@@ -0,0 +1,380 @@
+"""
+Shared component fragments referenced from form schemas.
+
+A fragment is a list of components (an address block, contact details,
+...) stored once, in immutable numbered versions. A schema refers to it
+with a placeholder component in any ``children`` list::
+
+    {"$fragment": 3, "version": 2, "keyPrefix": "billing_"}
+
+``version`` pins a version; without it the reference follows the latest
+one. ``keyPrefix`` is prepended to the keys of the fragment's components,
+so a fragment can be used twice in one form. Fragments may reference other
+fragments, but only pinned versions, so a fragment version never changes
+once stored. Fragments belong to a workspace, and only forms and
+fragments of the same workspace can reference them.
+
+Schemas are stored with their references and resolved at read time
+(``resolve_form``): the placeholders are replaced by the fragment's
+components. Forms without references skip all of this. For the others,
+the resolved schema is memoized per form version in a two-tier cache.
+Expanded fragment versions are memoized per process, since they never
+change. ``Form.fragment_refs`` lists the references of a
+form, and the ``FragmentReference`` rows are their reverse index. A new
+version of a fragment touches only the forms that follow its latest
+version. It gives them a new modification time, which retires every
+cache keyed by the form version (resolved schema, component index,
+compiled logic) and lists them in the delta feed.
+"""
+import copy
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import LRUCache, TieredCache, form_cache
+from .events import publish_form_changed
+from .schema import iter_components
+from .webhooks import enqueue_forms_updated
+from .workspaces import cache_key
+
+# Nesting depth of fragments referencing fragments
+MAX_DEPTH = 8
+
+resolved_cache = TieredCache('formbuilder:resolved')
+
+# (fragment id, version) -> components with nested references expanded
+_expanded = LRUCache(16 * 1024 * 1024, 24 * 3600)
+
+
+class FragmentError(ValueError):
+    pass
+
+
+def is_reference(component):
+    return isinstance(component, dict) and '$fragment' in component
+
+
+def parse_reference(component):
+    """
+    Return ``(fragment id, version or None, key prefix)`` of a reference
+    """
+    fragment_id, version = component.get('$fragment'), component.get('version')
+    if not isinstance(fragment_id, int) or isinstance(fragment_id, bool):
+        raise FragmentError(f"Invalid fragment reference {component!r}: $fragment must be an id")
+    if version is not None and (not isinstance(version, int) or isinstance(version, bool) or version < 1):
+        raise FragmentError(f"Invalid fragment reference {component!r}: version must be a positive integer")
+    prefix = component.get('keyPrefix') or ''
+    if not isinstance(prefix, str):
+        raise FragmentError(f"Invalid fragment reference {component!r}: keyPrefix must be a string")
+    return fragment_id, version, prefix
+
+
+def find_references(schema):
+    """
+    Return the sorted, distinct ``[fragment id, version or None]`` pairs a
+    schema references directly
+    """
+    # The component index describes the resolved schema, with references
+    # already expanded; this reads the stored one, once per save (readers
+    # use the form's fragment_refs)
+    references = {parse_reference(component)[:2] for component, *_ in iter_components(schema) if is_reference(component)}
+    return sorted([list(reference) for reference in references], key=lambda ref: (ref[0], ref[1] or 0))
+
+
+def check_references(references, workspace_id, pinned=False):
+    """
+    Check that referenced fragments and versions exist in a workspace; with
+    ``pinned``, that every reference names a version. A fragment without
+    versions cannot be referenced.
+    """
+    from .models import Fragment
+
+    if not references:
+        return
+    latest = dict(
+        Fragment.objects.filter(workspace=workspace_id, pk__in={ref[0] for ref in references})
+        .values_list('pk', 'version')
+    )
+    for fragment_id, version in references:
+        if fragment_id not in latest:
+            raise FragmentError(f"Fragment {fragment_id} does not exist")
+        if not latest[fragment_id]:
+            raise FragmentError(f"Fragment {fragment_id} has no versions")
+        if version is None and pinned:
+            raise FragmentError(f"References inside fragments must name a version (fragment {fragment_id})")
+        if version is not None and version > latest[fragment_id]:
+            raise FragmentError(f"Fragment {fragment_id} has no version {version}")
+
+
+def expand_versions(pairs):
+    """
+    Return ``{(fragment id, version): components}`` for the given pairs, with
+    the references inside them expanded. Versions missing from the process
+    memo are loaded one nesting level per query.
+    """
+    from .models import FragmentVersion
+
+    available = {}
+
+    def cached(wanted):
+        missing = set()
+        for pair in wanted:
+            entry = _expanded.get(pair)
+            if entry is not None:
+                available[pair] = entry[0]
+            elif pair not in available:
+                missing.add(pair)
+        return missing
+
+    levels = []
+    wanted = cached(pairs)
+    for _ in range(MAX_DEPTH + 1):
+        if not wanted:
+            break
+        rows = FragmentVersion.objects.filter(
+            fragment_id__in={pair[0] for pair in wanted}, version__in={pair[1] for pair in wanted}
+        ).values_list('fragment_id', 'version', 'components')
+        found = {(fragment_id, version): components for fragment_id, version, components in rows}
+        found = {pair: components for pair, components in found.items() if pair in wanted}
+        if len(found) < len(wanted):
+            raise FragmentError(f"Fragment version(s) not found: {sorted(wanted - set(found))}")
+        levels.append(found)
+        wanted = cached({
+            parse_reference(component)[:2]
+            for components in found.values()
+            for component, *_ in iter_components({'form': {'children': components}})
+            if is_reference(component)
+        }) - {pair for level in levels for pair in level}
+    else:
+        raise FragmentError(f"Fragments nested deeper than {MAX_DEPTH} levels")
+
+    # Innermost first, so the versions they reference are expanded already
+    for level in reversed(levels):
+        for pair, components in level.items():
+            expanded = _expand_children(components, available.__getitem__)
+            available[pair] = expanded
+            _expanded.set(pair, expanded, len(json.dumps(expanded)), None)
+    return {pair: available[pair] for pair in pairs}
+
+
+def _expand_children(children, lookup):
+    """
+    Return ``children`` with references replaced by the components of the
+    versions ``lookup`` returns, recursing into containers
+    """
+    result = []
+    changed = False
+    for child in children:
+        if is_reference(child):
+            fragment_id, version, prefix = parse_reference(child)
+            components = lookup((fragment_id, version))
+            result.extend(prefix_keys(components, prefix) if prefix else components)
+            changed = True
+        elif isinstance(child, dict) and child.get('children'):
+            expanded = _expand_children(child['children'], lookup)
+            if expanded is not child['children']:
+                child = {**child, 'children': expanded}
+                changed = True
+            result.append(child)
+        else:
+            result.append(child)
+    # Untouched subtrees are shared, not copied
+    return result if changed else children
+
+
+def prefix_keys(components, prefix):
+    """
+    Return a copy of ``components`` with ``prefix`` prepended to every key
+    """
+    components = copy.deepcopy(components)
+    for component, *_ in iter_components({'form': {'children': components}}):
+        if component.get('key'):
+            component['key'] = prefix + component['key']
+    return components
+
+
+def latest_versions(references, strict=True):
+    """
+    Return ``{fragment id: latest version}`` of the fragments that
+    ``references`` follow without a pinned version. Unless ``strict``,
+    fragments that do not exist or have no versions are left out instead of
+    raising FragmentError.
+    """
+    from .models import Fragment
+
+    floating = {ref[0] for ref in references if ref[1] is None}
+    latest = dict(Fragment.objects.filter(pk__in=floating, version__gt=0).values_list('pk', 'version')) if floating else {}
+    missing = floating - set(latest)
+    if missing and strict:
+        raise FragmentError(f"Fragment(s) without versions: {sorted(missing)}")
+    return latest
+
+
+def _pairs(references, latest):
+    """
+    Return the (fragment id, version) pairs of references, following the
+    ``latest`` versions
+    """
+    missing = {ref[0] for ref in references if ref[1] is None and ref[0] not in latest}
+    if missing:
+        raise FragmentError(f"Fragment(s) without versions: {sorted(missing)}")
+    return {(ref[0], ref[1] or latest[ref[0]]) for ref in references}
+
+
+def _resolve(schema, references, latest, expanded):
+    def pair(ref):
+        return ref[0], ref[1] if ref[1] is not None else latest[ref[0]]
+
+    root = schema.get('form') or {}
+    children = _expand_children(root.get('children') or [], lambda ref: expanded[pair(ref)])
+    return {**schema, 'form': {**root, 'children': children}}, sorted(set(map(pair, references)))
+
+
+def resolve_schema(schema, references=None):
+    """
+    Return the resolved schema and the sorted (fragment id, version) pairs
+    it was resolved with
+    """
+    references = find_references(schema) if references is None else references
+    if not references:
+        return schema, []
+    latest = latest_versions(references)
+    return _resolve(schema, references, latest, expand_versions(_pairs(references, latest)))
+
+
+def resolve_form(form):
+    """
+    Return the schema of a form with its fragment references resolved
+    """
+    return resolve_forms([form])[form.pk]
+
+
+def resolve_forms(forms, errors=None):
+    """
+    Return ``{form pk: resolved schema}`` of several forms. Those not cached
+    are resolved together, with one query per nesting level of the
+    fragments they use.
+
+    A form that cannot be resolved raises FragmentError, or, when an
+    ``errors`` dict is given, is left out of the result with its error
+    message in ``errors[pk]``, so one broken form does not fail the others.
+    """
+    schemas = {}
+    pending = []
+    for form in forms:
+        if not form.fragment_refs:
+            schemas[form.pk] = form.get_schema()
+            continue
+        modified = form.modified.timestamp() if form.modified else None
+        key = cache_key(form.workspace_id, form.pk)
+        cached = resolved_cache.get(key) if form.pk else None
+        if cached is not None and cached['modified'] == modified:
+            schemas[form.pk] = cached['schema']
+        else:
+            pending.append((form, key, modified, cached))
+    if not pending:
+        return schemas
+
+    def failed(form, error):
+        if errors is None:
+            raise error
+        errors[form.pk] = str(error)
+
+    latest = latest_versions([ref for form, *_ in pending for ref in form.fragment_refs], strict=False)
+    resolvable = []
+    for entry in pending:
+        try:
+            resolvable.append((entry, _pairs(entry[0].fragment_refs, latest)))
+        except FragmentError as e:
+            failed(entry[0], e)
+    try:
+        expanded = expand_versions(set().union(*(pairs for _, pairs in resolvable)))
+    except FragmentError:
+        # Expand per form to tell the broken ones; the versions expanded
+        # already are memoized
+        expanded = None
+    for (form, key, modified, cached), pairs in resolvable:
+        try:
+            schema = _resolve(
+                form.get_schema(), form.fragment_refs, latest, expanded if expanded is not None else expand_versions(pairs)
+            )[0]
+        except FragmentError as e:
+            failed(form, e)
+            continue
+        schemas[form.pk] = schema
+        if form.pk and (cached is None or (cached['modified'] or 0) < (modified or 0)):
+            # Not when the cached entry is newer: this instance is outdated
+            if cached is not None:
+                resolved_cache.invalidate(key)
+            resolved_cache.get(key, lambda: {'schema': schema, 'modified': modified})
+    return schemas
+
+
+def update_references(form, previous):
+    """
+    Rewrite the reverse index rows of a form whose references changed from
+    ``previous``. Runs inside the transaction saving the form.
+    """
+    from .models import FragmentReference
+
+    if previous:
+        FragmentReference.objects.filter(form=form).delete()
+    if form.fragment_refs:
+        FragmentReference.objects.bulk_create(
+            FragmentReference(form=form, fragment_id=fragment_id, version=version)
+            for fragment_id, version in form.fragment_refs
+        )
+    key = cache_key(form.workspace_id, form.pk)
+    transaction.on_commit(lambda: resolved_cache.invalidate(key))
+
+
+def check_components(components, workspace_id, fragment_id=None):
+    """
+    Check that ``components`` can be stored as a version of a fragment
+    """
+    if not isinstance(components, list) or not all(isinstance(c, dict) for c in components):
+        raise FragmentError("Fragment components must be a list of objects")
+    references = find_references({'form': {'children': components}})
+    if fragment_id is not None and any(ref[0] == fragment_id for ref in references):
+        raise FragmentError("A fragment cannot reference itself")
+    check_references(references, workspace_id, pinned=True)
+
+
+def create_version(fragment, components):
+    """
+    Store ``components`` as the next version of a fragment and invalidate
+    the forms that follow its latest version. Returns the version.
+    """
+    from .models import Form, Fragment, FragmentReference, FragmentVersion
+
+    check_components(components, fragment.workspace_id, fragment.pk)
+
+    with transaction.atomic():
+        # Serializes concurrent edits of the fragment
+        version = Fragment.objects.select_for_update().values_list('version', flat=True).get(pk=fragment.pk) + 1
+        FragmentVersion.objects.create(fragment=fragment, version=version, components=components)
+        Fragment.objects.filter(pk=fragment.pk).update(version=version)
+        fragment.version = version
+        dependents = list(
+            FragmentReference.objects.filter(fragment=fragment, version__isnull=True)
+            .values_list('form_id', flat=True)
+        )
+        if dependents:
+            # A new version of the form as a whole: caches of data derived
+            # from its schema are keyed by modification time, and clients
+            # syncing with the delta feed or listening to change events
+            # pick it up
+            forms = Form.objects.filter(pk__in=dependents)
+            forms.update(modified=timezone.now())
+            forms = list(forms.only('pk', 'workspace', 'modified', 'schema_fingerprint', 'fragment_refs'))
+            enqueue_forms_updated(forms)
+
+            def invalidate():
+                for form in forms:
+                    resolved_cache.invalidate(cache_key(form.workspace_id, form.pk))
+                    form_cache.invalidate(cache_key(form.workspace_id, form.pk))
+                    publish_form_changed(form)
+            transaction.on_commit(invalidate)
+    return version
+
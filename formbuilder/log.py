@@ -0,0 +1,255 @@
+"""
+Non-blocking structured logging.
+
+QueuedFileHandler puts log records on a bounded in-memory queue and
+returns; a background listener thread formats them and writes them to a
+size-rotated file. A slow or stalled disk therefore delays log lines, not
+requests. When the queue is full, records below ERROR are dropped at once
+and ERROR records wait up to ``block_timeout`` seconds for room. The number
+of dropped records is logged as soon as the queue has room again.
+
+JSONFormatter writes one JSON object per line. RequestLogContextMiddleware
+adds request-scoped fields (request id, method, path, view, form id, user)
+to every record logged while a request is handled, and logs one
+``formbuilder.requests`` record per request with its status and duration.
+
+This module is imported while settings are configured, so it must not
+import Django models.
+"""
+import contextvars
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from logging.handlers import QueueListener, RotatingFileHandler
+
+from django.utils.functional import empty
+
+# Request-scoped fields added to log records, see RequestLogContextMiddleware
+_context = contextvars.ContextVar('formbuilder_log_context', default={})
+
+REQUEST_ID_HEADER = 'HTTP_X_REQUEST_ID'
+
+# Attributes every LogRecord has; anything else was passed with extra={...}
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+request_logger = logging.getLogger('formbuilder.requests')
+
+
+def get_context():
+    """
+    Return the log context fields of the current request
+    """
+    return _context.get()
+
+
+def bind_context(**fields):
+    """
+    Add fields to the log context of the current request
+    """
+    _context.set({**_context.get(), **fields})
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Format records as single-line JSON objects, including context fields
+    and extra attributes
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class WatchedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that reopens its file when another process rotated
+    it, so several worker processes can share one log file
+    """
+
+    def emit(self, record):
+        if self.stream is not None:
+            try:
+                rotated = os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+            except OSError:
+                rotated = True
+            if rotated:
+                self.stream.close()
+                self.stream = self._open()
+        super().emit(record)
+
+
+class _Listener(QueueListener):
+
+    def enqueue_sentinel(self):
+        # The queue may be full: wait for the listener to make room
+        self.queue.put(self._sentinel, timeout=5)
+
+
+class QueuedFileHandler(logging.Handler):
+    """
+    Write records to a size-rotated file from a background thread, through
+    a bounded queue.
+
+    Like logging.handlers.QueueHandler, but not a subclass of it: dictConfig
+    configures QueueHandler subclasses differently.
+    """
+
+    def __init__(self, filename, max_bytes=50 * 1024 * 1024, backup_count=5, queue_size=10000, block_timeout=0.1):
+        super().__init__()
+        self.queue = queue.Queue(queue_size)
+        self.queue_size = queue_size
+        self.block_timeout = block_timeout
+        self.file_handler = WatchedRotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+        )
+        self.dropped = 0
+        self._unreported = 0
+        self._lock = threading.Lock()
+        self._listener = None
+        self._pid = None
+        self.addFilter(add_context)
+
+    def setFormatter(self, fmt):
+        # Records are formatted by the file handler, in the listener thread
+        self.file_handler.setFormatter(fmt)
+
+    def setLevel(self, level):
+        super().setLevel(level)
+        self.file_handler.setLevel(level)
+
+    def start(self):
+        """
+        Start the listener thread of this process
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Forked: the parent's thread did not survive, start afresh
+                self.queue = queue.Queue(self.queue_size)
+            self._listener = _Listener(self.queue, self.file_handler, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self.start()
+        try:
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def prepare(self, record):
+        """
+        Resolve the message and exception text in the logging thread, where
+        the arguments are still valid, and keep the other attributes for
+        the formatter
+        """
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if record.levelno >= logging.ERROR:
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self._unreported += 1
+            return
+        if self._unreported:
+            self.report_dropped()
+
+    def report_dropped(self):
+        count, self._unreported = self._unreported, 0
+        record = logging.LogRecord(
+            __name__, logging.WARNING, __file__, 0,
+            f"Dropped {count} log record(s): the log queue was full", None, None,
+        )
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._unreported += count
+
+    def close(self):
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+        self.file_handler.close()
+        super().close()
+
+
+def add_context(record):
+    """
+    Log filter adding the fields of the current request to a record
+    """
+    for key, value in _context.get().items():
+        if not hasattr(record, key):
+            setattr(record, key, value)
+    return True
+
+
+class RequestLogContextMiddleware:
+    """
+    Bind request fields to the log context and log each request with its
+    status and duration
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.META.get(REQUEST_ID_HEADER, '')[:64] or uuid.uuid4().hex
+        token = _context.set({'request_id': request_id, 'method': request.method, 'path': request.path})
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            user = getattr(request, 'user', None)
+            # Only a user the request already loaded: loading it costs queries
+            if user is not None and getattr(user, '_wrapped', user) is not empty and user.is_authenticated:
+                bind_context(user_id=user.pk)
+            request_logger.info(
+                f"{request.method} {request.path} {response.status_code}",
+                extra={'status': response.status_code, 'duration_ms': round((time.perf_counter() - start) * 1000, 2)},
+            )
+        finally:
+            _context.reset(token)
+        response['X-Request-ID'] = request_id
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        fields = {'view': match.view_name if match else view_func.__name__}
+        form_id = view_kwargs.get('form_id') or view_kwargs.get('pk')
+        if form_id is not None:
+            fields['form_id'] = form_id
+        bind_context(**fields)
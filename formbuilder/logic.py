@@ -0,0 +1,815 @@
+"""
+Server-side evaluation of form conditions and calculated fields.
+
+FormEngine schemas attach logic to components as JavaScript:
+
+- ``renderWhen: {"value": "form.data.age >= 18"}`` shows a component only
+  while the expression is truthy; the children of a hidden container are
+  hidden as well.
+- ``props.value: {"computeType": "function", "fnSource": "return form.data.price * form.data.quantity"}``
+  computes the value of a field.
+- ``schema.validations: [{"key": "required"}]`` makes a field required,
+  which only applies while it is shown.
+
+The FormViewer evaluates these in the browser. This module compiles the
+same expressions, restricted to a safe subset of JavaScript (literals,
+``form.data.<key>``, arithmetic, comparison and logical operators, the
+ternary operator, ``.length``, ``.includes()`` and ``Math.*`` functions),
+so the server can tell which fields applied to a submission. Computed
+functions must consist of a single ``return <expression>``; anything else
+is reported in ``FormLogic.errors`` and left to the client.
+
+``compile_logic`` turns a schema into a dependency graph of nodes, one per
+field value and one per conditionally shown component, and numbers the
+nodes in topological order, so a full evaluation is a single pass over a
+list. ``FormLogic.update`` re-evaluates only the nodes downstream of the
+changed inputs, and stops propagating where a recomputed value did not
+change. ``evaluate_many`` evaluates a batch of submissions that way, each
+as an update of the previous one. Compiled forms are kept per process for
+each form version (see ``get_logic``).
+
+Components inside repeaters hold per-item data and are not evaluated.
+"""
+import heapq
+import json
+import math
+import re
+
+from django.conf import settings
+
+from .cache import LRUCache
+from .schema import iter_components, normalize_schema
+
+DEFAULT_LOGIC = {
+    'CACHE_NODES': 1_000_000,  # graph nodes of compiled forms kept per process
+    'CACHE_TTL': 3600,  # seconds
+}
+
+REPEATER_TYPES = {'RsRepeater', 'Repeater'}
+
+# Parsing, building and evaluating recurse once per level of an expression;
+# deeper or longer expressions are reported as errors instead
+MAX_DEPTH = 128
+MAX_LENGTH = 10000  # characters
+
+
+def _integral(function):
+    # math.floor and friends return ints and fail on infinities and NaN
+    return lambda x: float(function(x)) if math.isfinite(x) else x
+
+
+def _pow(base, exponent):
+    try:
+        return math.pow(base, exponent)
+    except OverflowError:
+        return -math.inf if base < 0 and exponent % 2 == 1 else math.inf
+    except ValueError:
+        # 0 to a negative power, or a negative base to a fractional one
+        return math.inf if base == 0 else math.nan
+
+
+# Arguments are floats (see to_number)
+MATH_FUNCTIONS = {
+    'abs': abs, 'ceil': _integral(math.ceil), 'floor': _integral(math.floor),
+    'round': _integral(lambda x: math.floor(x + 0.5)), 'sqrt': math.sqrt, 'pow': _pow,
+    'min': min, 'max': max, 'trunc': _integral(math.trunc),
+}
+
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+      | (?P<name>[A-Za-z_$][\w$]*)
+      | (?P<op>===|!==|==|!=|<=|>=|&&|\|\||\?\?|[-+*/%<>!?:().,\[\]])
+    )""", re.VERBOSE)
+
+BINARY_PRECEDENCE = {
+    '??': 2, '||': 3, '&&': 4,
+    '==': 5, '!=': 5, '===': 5, '!==': 5,
+    '<': 6, '<=': 6, '>': 6, '>=': 6,
+    '+': 7, '-': 7, '*': 8, '/': 8, '%': 8,
+}
+
+
+class LogicError(ValueError):
+    """
+    An expression is invalid or uses unsupported JavaScript
+    """
+
+
+def get_config():
+    """
+    Return the logic settings merged over the defaults
+    """
+    return {**DEFAULT_LOGIC, **getattr(settings, 'FORMBUILDER_LOGIC', {})}
+
+
+# JavaScript value semantics. undefined and null are both None.
+
+def truthy(value):
+    if isinstance(value, float) and math.isnan(value):
+        return False
+    if isinstance(value, (list, dict)):
+        return True
+    return bool(value)
+
+
+def to_number(value):
+    """
+    Convert a value to a float, the double of JavaScript numbers: unlike
+    Python ints, a submitted value cannot make arithmetic arbitrarily
+    large and slow, and results past 2 ** 53 round as in the browser
+    """
+    if value is None:
+        return 0.0
+    if isinstance(value, (bool, int, float)):
+        try:
+            return float(value)
+        except OverflowError:
+            return math.inf if value > 0 else -math.inf
+    if isinstance(value, str):
+        text = value.strip()
+        if not text:
+            return 0.0
+        try:
+            return float(text)
+        except ValueError:
+            return math.nan
+    return math.nan
+
+
+def to_string(value):
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return str(value)
+
+
+def number_result(value):
+    """
+    Normalize a numeric result: integral floats become ints, like the
+    single number type of JavaScript
+    """
+    if isinstance(value, float) and value.is_integer() and abs(value) < 2 ** 53:
+        return int(value)
+    return value
+
+
+def same(a, b):
+    """
+    Strict equality (===), which unlike Python's does not equate True and 1
+    """
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a == b
+    return type(a) is type(b) and a == b
+
+
+def loose_equal(a, b):
+    if a is None or b is None:
+        return a is None and b is None
+    if isinstance(a, str) and isinstance(b, str):
+        return a == b
+    if isinstance(a, (list, dict)) or isinstance(b, (list, dict)):
+        return a is b
+    return to_number(a) == to_number(b)
+
+
+def compare(op, a, b):
+    if isinstance(a, str) and isinstance(b, str):
+        pass
+    else:
+        a, b = to_number(a), to_number(b)
+        if isinstance(a, float) and math.isnan(a) or isinstance(b, float) and math.isnan(b):
+            return False
+    if op == '<':
+        return a < b
+    if op == '<=':
+        return a <= b
+    if op == '>':
+        return a > b
+    return a >= b
+
+
+def arithmetic(op, a, b):
+    if op == '+' and (isinstance(a, str) or isinstance(b, str)):
+        return to_string(a) + to_string(b)
+    a, b = to_number(a), to_number(b)
+    try:
+        if op == '+':
+            return number_result(a + b)
+        if op == '-':
+            return number_result(a - b)
+        if op == '*':
+            return number_result(a * b)
+        if op == '/':
+            return number_result(a / b)
+        return number_result(math.fmod(a, b))
+    except ZeroDivisionError:
+        if op == '%' or a == 0 or math.isnan(a):
+            return math.nan
+        return math.inf if a > 0 else -math.inf
+    except (OverflowError, TypeError, ValueError):
+        return math.nan
+
+
+def tokenize(source):
+    tokens = []
+    position = 0
+    source = source.rstrip().rstrip(';')
+    while position < len(source):
+        match = TOKEN_PATTERN.match(source, position)
+        if match is None or match.end() == position:
+            if source[position:].strip():
+                raise LogicError(f"Unexpected character at {position}: {source[position:position + 10]!r}")
+            break
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == 'number':
+            tokens.append(('value', number_result(float(text))))
+        elif kind == 'string':
+            tokens.append(('value', unescape(text[1:-1])))
+        else:
+            tokens.append((kind, text))
+        position = match.end()
+    tokens.append(('end', None))
+    return tokens
+
+
+def unescape(text):
+    escapes = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v', '0': '\0'}
+    return re.sub(r'\\(.)', lambda match: escapes.get(match.group(1), match.group(1)), text)
+
+
+class Parser:
+    """
+    Pratt parser of the supported JavaScript subset into nested tuples:
+    ('value', v), ('ref', key), ('unary', op, a), ('binary', op, a, b),
+    ('if', test, then, else), ('length', a), ('includes', a, b),
+    ('math', name, args)
+    """
+
+    def __init__(self, source):
+        if len(source) > MAX_LENGTH:
+            raise LogicError(f"Expression longer than {MAX_LENGTH} characters")
+        self.source = source
+        self.tokens = tokenize(source)
+        self.position = 0
+        self.depth = 0
+        self.refs = set()
+
+    def peek(self):
+        return self.tokens[self.position]
+
+    def take(self, text=None):
+        token = self.tokens[self.position]
+        if text is not None and token[1] != text:
+            raise LogicError(f"Expected {text!r} in {self.source!r}")
+        self.position += 1
+        return token
+
+    def parse(self):
+        node = self.expression()
+        if self.peek()[0] != 'end':
+            raise LogicError(f"Unexpected {self.peek()[1]!r} in {self.source!r}")
+        # Chains of binary operators nest without recursing while parsing
+        if expression_depth(node) > MAX_DEPTH:
+            raise LogicError(f"Expression nested deeper than {MAX_DEPTH} levels")
+        return node
+
+    def expression(self, min_precedence=0):
+        node = self.unary()
+        while True:
+            kind, text = self.peek()
+            if kind == 'op' and text == '?' and min_precedence <= 1:
+                self.take()
+                then = self.expression(1)
+                self.take(':')
+                node = ('if', node, then, self.expression(1))
+                continue
+            precedence = BINARY_PRECEDENCE.get(text) if kind == 'op' else None
+            if precedence is None or precedence <= min_precedence:
+                return node
+            self.take()
+            node = ('binary', text, node, self.expression(precedence))
+
+    def unary(self):
+        # Every recursion of the parser (parentheses, operands, arguments,
+        # unary operators) goes through here
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise LogicError(f"Expression nested deeper than {MAX_DEPTH} levels")
+        kind, text = self.peek()
+        if kind == 'op' and text in ('!', '-', '+'):
+            self.take()
+            node = ('unary', text, self.unary())
+        else:
+            node = self.postfix(self.primary())
+        self.depth -= 1
+        return node
+
+    def primary(self):
+        kind, text = self.take()
+        if kind == 'value':
+            return ('value', text)
+        if kind == 'op' and text == '(':
+            node = self.expression()
+            self.take(')')
+            return node
+        if kind == 'name':
+            constants = {'true': True, 'false': False, 'null': None, 'undefined': None,
+                         'NaN': math.nan, 'Infinity': math.inf}
+            if text in constants:
+                return ('value', constants[text])
+            if text == 'form':
+                self.take('.')
+                if self.take()[1] != 'data':
+                    raise LogicError(f"Only form.data can be read, in {self.source!r}")
+                return self.reference()
+            if text == 'Math':
+                self.take('.')
+                name = self.take()[1]
+                if name not in MATH_FUNCTIONS:
+                    raise LogicError(f"Unsupported function Math.{name}")
+                return ('math', name, self.arguments())
+            raise LogicError(f"Unknown name {text!r} in {self.source!r}")
+        if kind == 'end':
+            raise LogicError(f"Unexpected end of {self.source!r}")
+        raise LogicError(f"Unexpected {text!r} in {self.source!r}")
+
+    def reference(self):
+        kind, text = self.take()
+        if text == '.':
+            key = self.take()[1]
+        elif text == '[':
+            kind, key = self.take()
+            if kind != 'value' or not isinstance(key, str):
+                raise LogicError(f"form.data[...] needs a string key, in {self.source!r}")
+            self.take(']')
+        else:
+            raise LogicError(f"Expected a field of form.data in {self.source!r}")
+        self.refs.add(key)
+        return ('ref', key)
+
+    def arguments(self):
+        self.take('(')
+        args = []
+        while self.peek()[1] != ')':
+            args.append(self.expression())
+            if self.peek()[1] != ')':
+                self.take(',')
+        self.take(')')
+        return args
+
+    def postfix(self, node):
+        while self.peek()[1] == '.':
+            self.take()
+            name = self.take()[1]
+            if name == 'length':
+                node = ('length', node)
+            elif name == 'includes':
+                args = self.arguments()
+                if len(args) != 1:
+                    raise LogicError("includes() takes one argument")
+                node = ('includes', node, args[0])
+            else:
+                raise LogicError(f"Unsupported property {name!r} in {self.source!r}")
+        return node
+
+
+def expression_depth(node):
+    """
+    Return the nesting depth of a parsed expression
+    """
+    deepest = 0
+    stack = [(node, 1)]
+    while stack:
+        node, depth = stack.pop()
+        deepest = max(deepest, depth)
+        kind = node[0]
+        if kind in ('unary', 'binary'):
+            children = node[2:]
+        elif kind in ('if', 'length', 'includes'):
+            children = node[1:]
+        elif kind == 'math':
+            children = node[2]
+        else:
+            children = ()
+        stack.extend((child, depth + 1) for child in children)
+    return deepest
+
+
+def build(node, index_of):
+    """
+    Turn a parsed expression into a function of the node values, reading
+    field ``key`` from ``values[index_of[key]]``
+    """
+    kind = node[0]
+    if kind == 'value':
+        value = node[1]
+        return lambda values: value
+    if kind == 'ref':
+        index = index_of[node[1]]
+        return lambda values: values[index]
+    if kind == 'unary':
+        operand = build(node[2], index_of)
+        if node[1] == '!':
+            return lambda values: not truthy(operand(values))
+        if node[1] == '-':
+            return lambda values: number_result(-to_number(operand(values)))
+        return lambda values: number_result(to_number(operand(values)))
+    if kind == 'if':
+        test, then, otherwise = (build(part, index_of) for part in node[1:])
+        return lambda values: then(values) if truthy(test(values)) else otherwise(values)
+    if kind == 'length':
+        operand = build(node[1], index_of)
+        return lambda values: len(v) if isinstance(v := operand(values), (str, list)) else None
+    if kind == 'includes':
+        container, item = build(node[1], index_of), build(node[2], index_of)
+
+        def includes(values):
+            found = container(values)
+            needle = item(values)
+            if isinstance(found, str):
+                return isinstance(needle, str) and needle in found
+            return isinstance(found, list) and any(same(element, needle) for element in found)
+        return includes
+    if kind == 'math':
+        function = MATH_FUNCTIONS[node[1]]
+        args = [build(arg, index_of) for arg in node[2]]
+
+        def call(values):
+            try:
+                return number_result(function(*(to_number(arg(values)) for arg in args)))
+            except (TypeError, ValueError, OverflowError):
+                return math.nan
+        return call
+
+    op, left, right = node[1], build(node[2], index_of), build(node[3], index_of)
+    if op == '&&':
+        return lambda values: right(values) if truthy(a := left(values)) else a
+    if op == '||':
+        return lambda values: a if truthy(a := left(values)) else right(values)
+    if op == '??':
+        return lambda values: right(values) if (a := left(values)) is None else a
+    if op == '===':
+        return lambda values: same(left(values), right(values))
+    if op == '!==':
+        return lambda values: not same(left(values), right(values))
+    if op == '==':
+        return lambda values: loose_equal(left(values), right(values))
+    if op == '!=':
+        return lambda values: not loose_equal(left(values), right(values))
+    if op in ('<', '<=', '>', '>='):
+        return lambda values: compare(op, left(values), right(values))
+    return lambda values: arithmetic(op, left(values), right(values))
+
+
+def expression_source(spec):
+    """
+    Return the expression of a renderWhen or computed value spec, or None
+    if it is not logic. Function sources must be a single return statement.
+    """
+    if not isinstance(spec, dict):
+        return None
+    if spec.get('computeType') == 'function':
+        source = (spec.get('fnSource') or '').strip()
+        match = re.fullmatch(r'return\b(.*?);?', source, re.DOTALL)
+        if match is None:
+            raise LogicError(f"Only 'return <expression>' functions are evaluated: {source[:60]!r}")
+        return match.group(1)
+    if spec.get('computeType') in (None, 'expression') and isinstance(spec.get('value'), str):
+        return spec['value']
+    return None
+
+
+def is_empty(value):
+    return value is None or value == '' or value == [] or value == {}
+
+
+class Evaluation:
+    """
+    Result of evaluating one submission: the value of every node, by index
+    """
+    __slots__ = ('logic', 'data', 'values')
+
+    def __init__(self, logic, data, values):
+        self.logic = logic
+        self.data = data
+        self.values = values
+
+    def value(self, key):
+        """
+        Value of a field as the form sees it: None while it is hidden
+        """
+        index = self.logic.value_index.get(key)
+        return self.values[index] if index is not None else self.data.get(key)
+
+    def visible(self, key):
+        index = self.logic.visibility_of.get(key)
+        return True if index is None else bool(self.values[index])
+
+    def computed(self):
+        """
+        Values of the computed fields, with values JSON cannot hold (NaN,
+        Infinity) as None
+        """
+        result = {}
+        for key in self.logic.computed:
+            value = self.values[self.logic.value_index[key]]
+            if isinstance(value, float) and not math.isfinite(value):
+                value = None
+            result[key] = value
+        return result
+
+    def missing_required(self):
+        """
+        Keys of the required fields that are shown but empty
+        """
+        values = self.values
+        return [
+            key for key, index, visibility in self.logic.required_nodes
+            if (visibility is None or values[visibility]) and is_empty(values[index])
+        ]
+
+
+class FormLogic:
+    """
+    Conditions and calculated fields of a schema, compiled into a graph
+    whose nodes are numbered in topological order
+    """
+
+    def __init__(self, schema):
+        self.errors = []
+        self.required = []
+        self.computed = []
+        self.value_index = {}
+        self.visibility_of = {}
+        self.has_logic = False
+        self._compile(schema)
+
+    def _compile(self, schema):
+        # name -> (dependencies, parsed expression or None, kind)
+        nodes = {}
+        visibility_of_entry = {}
+        skipped = set()
+        # Walks the schema itself rather than Form.get_component_index():
+        # index entries hold no expressions or validations, and compiled
+        # forms are kept per version already (see get_logic)
+        for entry_id, (component, parent, _, _) in enumerate(iter_components(schema)):
+            if parent in skipped:
+                skipped.add(entry_id)
+                continue
+            if component.get('type') in REPEATER_TYPES:
+                # Evaluated as a whole, its children hold per-item values
+                skipped.add(entry_id)
+            key = component.get('key')
+            parent_visibility = visibility_of_entry.get(parent)
+
+            condition = None
+            try:
+                source = expression_source(component.get('renderWhen'))
+                if source is not None:
+                    condition = self._parse(source)
+            except LogicError as e:
+                self.errors.append(f"{key or entry_id}: renderWhen: {e}")
+            if condition is not None or parent_visibility is not None:
+                name = f'visible:{entry_id}'
+                dependencies = set(condition[1]) if condition else set()
+                if parent_visibility is not None:
+                    dependencies.add(parent_visibility)
+                nodes[name] = (dependencies, condition[0] if condition else None, ('visible', parent_visibility))
+                visibility_of_entry[entry_id] = name
+                self.has_logic = True
+            visibility = visibility_of_entry.get(entry_id)
+
+            if not key:
+                continue
+            if key in nodes:
+                self.errors.append(f"{key}: duplicate key, only the first component is evaluated")
+                continue
+            computed = None
+            try:
+                source = expression_source((component.get('props') or {}).get('value'))
+                if source is not None:
+                    computed = self._parse(source)
+            except LogicError as e:
+                self.errors.append(f"{key}: value: {e}")
+            dependencies = set(computed[1]) if computed else set()
+            if visibility is not None:
+                dependencies.add(visibility)
+                self.visibility_of[key] = visibility
+            nodes[key] = (dependencies, computed[0] if computed else None, ('value', key, visibility))
+            if computed:
+                self.computed.append(key)
+                self.has_logic = True
+            validations = (component.get('schema') or {}).get('validations') or []
+            if any(isinstance(rule, dict) and rule.get('key') == 'required' for rule in validations):
+                self.required.append(key)
+                self.has_logic = True
+
+        # Fields referenced but not in the schema are plain inputs
+        for dependencies, _, _ in list(nodes.values()):
+            for name in dependencies:
+                if name not in nodes:
+                    nodes[name] = (set(), None, ('value', name, None))
+
+        order, cyclic = self._sort(nodes)
+        for name in cyclic:
+            self.errors.append(f"{name}: depends on itself")
+        names = order + cyclic
+        index_of = {name: index for index, name in enumerate(names)}
+        self.size = len(names)
+        self.functions = []
+        self.dependents = [[] for _ in names]
+        self.inputs = {}
+        for index, name in enumerate(names):
+            dependencies, expression, kind = nodes[name]
+            if index >= len(order):
+                function = (lambda values, data: None)
+            else:
+                function = self._node_function(kind, expression, index_of)
+                for dependency in dependencies:
+                    self.dependents[index_of[dependency]].append(index)
+            self.functions.append(function)
+            if kind[0] == 'value':
+                self.value_index[kind[1]] = index
+                if expression is None:
+                    self.inputs[kind[1]] = index
+        self.visibility_of = {key: index_of[name] for key, name in self.visibility_of.items()}
+        self.required_nodes = [(key, self.value_index[key], self.visibility_of.get(key)) for key in self.required]
+
+    def _parse(self, source):
+        parser = Parser(source)
+        return parser.parse(), parser.refs
+
+    @staticmethod
+    def _sort(nodes):
+        """
+        Kahn's algorithm; returns the sorted names and the names on or
+        behind a cycle
+        """
+        dependents = {name: [] for name in nodes}
+        waiting = {}
+        for name, (dependencies, _, _) in nodes.items():
+            waiting[name] = len(dependencies)
+            for dependency in dependencies:
+                dependents[dependency].append(name)
+        ready = [name for name, count in waiting.items() if count == 0]
+        order = []
+        while ready:
+            name = ready.pop()
+            order.append(name)
+            for dependent in dependents[name]:
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    ready.append(dependent)
+        placed = set(order)
+        return order, [name for name in nodes if name not in placed]
+
+    @staticmethod
+    def _node_function(kind, expression, index_of):
+        function = build(expression, index_of) if expression is not None else None
+        if kind[0] == 'visible':
+            parent = index_of[kind[1]] if kind[1] is not None else None
+            if function is None:
+                return lambda values, data: values[parent]
+            if parent is None:
+                return lambda values, data: truthy(function(values))
+            return lambda values, data: values[parent] and truthy(function(values))
+
+        key, visibility = kind[1], kind[2]
+        visibility = index_of[visibility] if visibility is not None else None
+        if function is None:
+            if visibility is None:
+                return lambda values, data: data.get(key)
+            return lambda values, data: data.get(key) if values[visibility] else None
+        if visibility is None:
+            return lambda values, data: function(values)
+        return lambda values, data: function(values) if values[visibility] else None
+
+    def evaluate(self, data):
+        """
+        Evaluate every node for a submission
+        """
+        values = [None] * self.size
+        for index, function in enumerate(self.functions):
+            values[index] = function(values, data)
+        return Evaluation(self, data, values)
+
+    def update(self, evaluation, data, changed=None):
+        """
+        Evaluate ``data`` as a change of a previous evaluation, recomputing
+        only the nodes downstream of the inputs that changed (``changed``
+        keys, or found by comparing the inputs). Returns a new Evaluation.
+        """
+        previous = evaluation.data
+        if changed is None:
+            changed = [key for key in self.inputs if not same(data.get(key), previous.get(key))]
+        values = evaluation.values.copy()
+        heap = [self.inputs[key] for key in changed if key in self.inputs]
+        heapq.heapify(heap)
+        done = set()
+        functions, dependents = self.functions, self.dependents
+        while heap:
+            index = heapq.heappop(heap)
+            if index in done:
+                continue
+            done.add(index)
+            value = functions[index](values, data)
+            if not same(value, values[index]):
+                values[index] = value
+                for dependent in dependents[index]:
+                    heapq.heappush(heap, dependent)
+        return Evaluation(self, data, values)
+
+    def evaluate_many(self, records):
+        """
+        Yield the evaluation of each record, evaluating each as an update
+        of the previous one
+        """
+        evaluation = None
+        for data in records:
+            evaluation = self.evaluate(data) if evaluation is None else self.update(evaluation, data)
+            yield evaluation
+
+
+def compile_logic(schema):
+    return FormLogic(schema)
+
+
+_compiled = None
+
+
+def get_logic(form):
+    """
+    Return the compiled logic of a form, compiled once per form version
+    and process
+    """
+    global _compiled
+    if _compiled is None:
+        config = get_config()
+        # Sized in graph nodes rather than bytes
+        _compiled = LRUCache(config['CACHE_NODES'], config['CACHE_TTL'])
+    version = (form.pk, form.modified.timestamp() if form.modified else None)
+    entry = _compiled.get(form.pk) if form.pk else None
+    if entry is not None and entry[3] == version:
+        return entry[0]
+    # Rows not yet converted by normalize_schemas are in the legacy layout
+    logic = compile_logic(normalize_schema(form.get_resolved_schema()))
+    if form.pk:
+        _compiled.set(form.pk, logic, max(1, logic.size), version)
+    return logic
+
+
+def check_submissions(form, records):
+    """
+    Evaluate the logic of a form for submitted records, storing the values
+    of calculated fields in the records. Returns {record index: [keys of
+    required fields that are shown but empty]} for the invalid records.
+    """
+    logic = get_logic(form)
+    if not logic.has_logic:
+        return {}
+    invalid = {}
+    for index, evaluation in enumerate(logic.evaluate_many(records)):
+        missing = evaluation.missing_required()
+        if missing:
+            invalid[index] = missing
+        if logic.computed:
+            # Stored values of calculated fields come from the server
+            evaluation.data.update(evaluation.computed())
+    return invalid
+
+
+def evaluate_stored(form, batch_size=5000, incremental=True):
+    """
+    Yield ``(submission id, evaluation)`` for the stored submissions of a
+    form in id order, read in batches of ``batch_size``. Consecutive
+    submissions are evaluated as updates of each other unless
+    ``incremental`` is off.
+    """
+    from .models import Submission
+
+    logic = get_logic(form)
+    evaluation = None
+    last_pk = 0
+    while True:
+        rows = list(
+            Submission.objects.filter(form=form, pk__gt=last_pk).order_by('pk').values_list('pk', 'data')[:batch_size]
+        )
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        for pk, data in rows:
+            if evaluation is None or not incremental:
+                evaluation = logic.evaluate(data)
+            else:
+                evaluation = logic.update(evaluation, data)
+            yield pk, evaluation
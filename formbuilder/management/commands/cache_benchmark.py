@@ -0,0 +1,63 @@
+"""
+Benchmark the two-tier form cache under a Zipfian access pattern.
+"""
+import bisect
+import itertools
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from formbuilder.cache import TieredCache
+
+
+class Command(BaseCommand):
+    help = "Measure hit ratios and latency of the two-tier cache for Zipf-distributed keys"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=10000, help="Number of distinct keys")
+        parser.add_argument('--requests', type=int, default=100000, help="Number of reads")
+        parser.add_argument('--exponent', type=float, default=1.1, help="Zipf exponent (higher is more skewed)")
+        parser.add_argument('--value-bytes', type=int, default=20000, help="Approximate size of each cached value")
+        parser.add_argument('--local-bytes', type=int, default=32 * 1024 * 1024, help="Size of the local tier")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        weights = [1 / (rank ** options['exponent']) for rank in range(1, options['keys'] + 1)]
+        cumulative = list(itertools.accumulate(weights))
+        total = cumulative[-1]
+        keys = [bisect.bisect_left(cumulative, rng.random() * total) for _ in range(options['requests'])]
+
+        # A schema-like value of roughly the requested size
+        components = max(1, options['value_bytes'] // 60)
+        value = {'form': {'children': [{'key': f'field{i}', 'type': 'RsInput'} for i in range(components)]}}
+
+        cache = TieredCache(
+            f"formbuilder:bench:{time.time_ns()}",
+            max_bytes=options['local_bytes'],
+            revalidate_after=1.0,
+        )
+        loads = 0
+
+        def loader():
+            nonlocal loads
+            loads += 1
+            return value
+
+        start = time.perf_counter()
+        for key in keys:
+            cache.get(key, loader)
+        elapsed = time.perf_counter() - start
+
+        stats = cache.stats()
+        self.stdout.write(
+            f"{options['requests']} reads over {options['keys']} keys (zipf s={options['exponent']}) "
+            f"in {elapsed:.2f}s: {elapsed / options['requests'] * 1e6:.1f} us/read"
+        )
+        self.stdout.write(
+            f"local:  hit ratio {stats['local']['hit_ratio']:.3f}, {stats['local']['entries']} entries, "
+            f"{stats['local']['bytes'] // 1024} KiB, {stats['local']['evictions']} evictions"
+        )
+        self.stdout.write(f"remote: hit ratio {stats['remote']['hit_ratio']:.3f}")
+        self.stdout.write(f"loader calls: {loads}")
@@ -0,0 +1,48 @@
+"""
+Report bandwidth and CPU cost of each response encoding and level.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from formbuilder.compression import LEVEL_RANGES, compress, is_available
+
+
+class Command(BaseCommand):
+    help = "Measure compressed size and compression time of an API response per encoding and level"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=None,
+            help="Path to measure (defaults to the forms list API)"
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help="Number of timed runs per level"
+        )
+
+    def handle(self, *args, **options):
+        path = options['path'] or reverse('forms_api')
+        response = Client().get(path, HTTP_ACCEPT_ENCODING='identity')
+        body = response.content
+        size = len(body)
+        self.stdout.write(f"{path}: {size} bytes uncompressed")
+        self.stdout.write(f"{'encoding':<8} {'level':>5} {'bytes':>10} {'ratio':>7} {'ms':>9} {'MB/s':>8}")
+
+        for encoding, levels in LEVEL_RANGES.items():
+            if not is_available(encoding):
+                self.stdout.write(f"{encoding:<8} (not installed)")
+                continue
+            for level in levels:
+                start = time.perf_counter()
+                for _ in range(options['repeat']):
+                    compressed = compress(body, encoding, level)
+                elapsed = (time.perf_counter() - start) / options['repeat']
+                ratio = len(compressed) / size if size else 0
+                throughput = size / elapsed / 1e6 if elapsed else 0
+                self.stdout.write(
+                    f"{encoding:<8} {level:>5} {len(compressed):>10} {ratio:>7.3f} "
+                    f"{elapsed * 1000:>9.3f} {throughput:>8.1f}"
+                )
@@ -0,0 +1,131 @@
+"""
+Report duplicate and near-duplicate forms using stored schema fingerprints.
+"""
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from formbuilder.fingerprint import estimate_similarity
+from formbuilder.models import Form, SchemaBlob, SchemaBucket
+
+
+class Command(BaseCommand):
+    help = "Report duplicate and near-duplicate forms, for one form or globally"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--form', type=int, default=None,
+            help="Only report duplicates of the form with this id"
+        )
+        parser.add_argument(
+            '--threshold', type=float, default=0.8,
+            help="Minimum estimated similarity for near duplicates"
+        )
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help="Compute fingerprints for forms saved before fingerprints existed"
+        )
+        parser.add_argument(
+            '--prune-blobs', action='store_true',
+            help="Delete shared schema blobs no form refers to anymore"
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            self.backfill()
+        if options['prune_blobs']:
+            deleted, _ = SchemaBlob.objects.filter(forms__isnull=True).delete()
+            self.stdout.write(f"Pruned {deleted} unused schema blob(s)")
+
+        if options['form'] is not None:
+            self.report_form(options['form'], options['threshold'])
+        else:
+            self.report_all(options['threshold'])
+
+    def backfill(self):
+        forms = Form.objects.filter(schema_fingerprint='').select_related('schema_blob')
+        count = 0
+        for form in forms.iterator(chunk_size=500):
+            # Fingerprints describe the schema; they are not a user edit
+            form.save(update_modified=False)
+            count += 1
+        self.stdout.write(f"Fingerprinted {count} form(s)")
+
+    def report_form(self, form_id, threshold):
+        try:
+            form = Form.objects.get(pk=form_id)
+        except Form.DoesNotExist:
+            raise CommandError(f"Form {form_id} does not exist")
+
+        duplicates = form.find_duplicates(threshold)
+        if not duplicates:
+            self.stdout.write(f"No duplicates of form {form.pk} ({form.name})")
+            return
+        self.stdout.write(f"Duplicates of form {form.pk} ({form.name}):")
+        for duplicate, similarity in duplicates:
+            self.stdout.write(f"  {similarity:5.2f}  {duplicate.pk}  {duplicate.name}")
+
+    def report_all(self, threshold):
+        # Exact duplicates share a fingerprint (within a workspace)
+        exact_groups = (
+            Form.objects.exclude(schema_fingerprint='')
+            .values('workspace', 'schema_fingerprint')
+            .annotate(count=Count('id'))
+            .filter(count__gt=1)
+            .order_by('-count')
+        )
+        groups = [(group['workspace'], group['schema_fingerprint']) for group in exact_groups]
+        members = defaultdict(list)
+        forms = Form.objects.filter(schema_fingerprint__in={fingerprint for _, fingerprint in groups})
+        for pk, workspace, fingerprint in forms.values_list('pk', 'workspace', 'schema_fingerprint'):
+            members[workspace, fingerprint].append(pk)
+
+        self.stdout.write(f"Exact duplicate groups: {len(groups)}")
+        for workspace, fingerprint in groups:
+            self.stdout.write(f"  {fingerprint[:12]}  forms {sorted(members[workspace, fingerprint])}")
+
+        # Near duplicates share at least one LSH bucket
+        shared_buckets = (
+            SchemaBucket.objects.values('bucket')
+            .annotate(count=Count('id'))
+            .filter(count__gt=1)
+            .values_list('bucket', flat=True)
+        )
+        bucket_members = defaultdict(set)
+        for bucket, form_id in SchemaBucket.objects.filter(bucket__in=shared_buckets).values_list('bucket', 'form_id'):
+            bucket_members[bucket].add(form_id)
+
+        involved = set().union(*bucket_members.values())
+        signatures = {}
+        representatives = {}
+        first_of_group = {}
+        for pk, workspace, fingerprint, minhash in (
+            Form.objects.filter(pk__in=involved).order_by('pk')
+            .values_list('pk', 'workspace', 'schema_fingerprint', 'minhash')
+        ):
+            signatures[pk] = (workspace, minhash)
+            # The first form of each exact duplicate group stands for all
+            # of them, so a bucket of k clones is one candidate, not k²/2 pairs
+            representatives[pk] = first_of_group.setdefault((workspace, fingerprint), pk)
+
+        candidate_pairs = set()
+        for form_ids in bucket_members.values():
+            ordered = sorted({representatives[pk] for pk in form_ids if pk in representatives})
+            for i, first in enumerate(ordered):
+                for second in ordered[i + 1:]:
+                    if signatures[first][0] == signatures[second][0]:
+                        candidate_pairs.add((first, second))
+
+        near_pairs = []
+        for first, second in candidate_pairs:
+            similarity = estimate_similarity(signatures[first][1], signatures[second][1])
+            if similarity >= threshold:
+                near_pairs.append((similarity, first, second))
+
+        near_pairs.sort(reverse=True)
+        self.stdout.write(
+            f"Near duplicate pairs (similarity >= {threshold}, one form per exact duplicate group): {len(near_pairs)}"
+        )
+        for similarity, first, second in near_pairs:
+            self.stdout.write(f"  {similarity:5.2f}  forms {first} and {second}")
@@ -0,0 +1,46 @@
+"""
+Run the webhook delivery worker.
+"""
+import asyncio
+import signal
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+
+from formbuilder.webhooks import Worker, purge_delivered, retry_dead
+
+
+class Command(BaseCommand):
+    help = "Deliver queued webhook events until stopped (SIGTERM or Ctrl-C), or once with --drain"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drain', action='store_true', help="Exit once no event is due")
+        parser.add_argument('--retry-dead', action='store_true', help="Queue dead-lettered events again and exit")
+        parser.add_argument('--endpoint', type=int, help="With --retry-dead, only events of this endpoint")
+        parser.add_argument('--purge', action='store_true', help="Delete events delivered before RETENTION_HOURS and exit")
+
+    def handle(self, *args, **options):
+        if options['retry_dead']:
+            self.stdout.write(f"Queued {retry_dead(options['endpoint'])} dead-lettered event(s) again")
+            return
+        if options['purge']:
+            self.stdout.write(f"Deleted {purge_delivered()} delivered event(s)")
+            return
+
+        worker = Worker()
+        self.loop = self.stop = None
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self.request_stop)
+        async_to_sync(self.run)(worker, options['drain'])
+        self.stdout.write(f"Delivered {worker.delivered} event(s), {worker.failed} failed attempt(s)")
+
+    def request_stop(self, signum, frame):
+        # The event loop runs in a thread of its own; in-flight batches
+        # finish before the worker exits
+        if self.stop is not None:
+            self.loop.call_soon_threadsafe(self.stop.set)
+
+    async def run(self, worker, drain):
+        self.loop = asyncio.get_running_loop()
+        self.stop = asyncio.Event()
+        await worker.run(self.stop, drain=drain)
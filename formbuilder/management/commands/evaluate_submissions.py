@@ -0,0 +1,66 @@
+"""
+Re-evaluate the form logic of stored submissions.
+"""
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from formbuilder.logic import evaluate_stored, get_logic, same
+from formbuilder.models import Form, Submission
+
+
+class Command(BaseCommand):
+    help = (
+        "Evaluate conditions and calculated fields of stored submissions, e.g. after the logic of a form changed, "
+        "and report shown fields, missing required fields and stale calculated values"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--form', type=int, required=True)
+        parser.add_argument('--batch-size', type=int, default=5000, help="Submissions read per query")
+        parser.add_argument(
+            '--update-computed', action='store_true',
+            help="Store recomputed values of calculated fields that differ"
+        )
+        parser.add_argument('--full', action='store_true', help="Evaluate every submission from scratch")
+
+    def handle(self, *args, **options):
+        try:
+            form = Form.objects.get(pk=options['form'])
+        except Form.DoesNotExist:
+            raise CommandError(f"Form {options['form']} does not exist")
+        logic = get_logic(form)
+        for error in logic.errors:
+            self.stderr.write(f"Not evaluated: {error}")
+
+        shown, missing, stale = Counter(), Counter(), Counter()
+        keys = list(logic.visibility_of)
+        updates = []
+        count = 0
+        start = time.perf_counter()
+        for pk, evaluation in evaluate_stored(form, options['batch_size'], incremental=not options['full']):
+            count += 1
+            shown.update(key for key in keys if evaluation.visible(key))
+            missing.update(evaluation.missing_required())
+            computed = evaluation.computed()
+            changed = {key: value for key, value in computed.items() if not same(evaluation.data.get(key), value)}
+            stale.update(changed)
+            if changed and options['update_computed']:
+                updates.append(Submission(pk=pk, form=form, data={**evaluation.data, **changed}))
+                if len(updates) >= options['batch_size']:
+                    Submission.objects.bulk_update(updates, ['data'])
+                    updates = []
+        if updates:
+            Submission.objects.bulk_update(updates, ['data'])
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f"Form {form.pk}: {count} submissions in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.0f}/s), "
+            f"{logic.size} logic nodes"
+        )
+        for key in sorted(set(keys) | set(missing) | set(stale)):
+            self.stdout.write(
+                f"  {key}: shown in {shown[key] if key in logic.visibility_of else count}, "
+                f"required but empty in {missing[key]}, stale calculated value in {stale[key]}"
+            )
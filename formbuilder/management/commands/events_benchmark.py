@@ -0,0 +1,96 @@
+"""
+Benchmark idle Server-Sent Events subscribers held by one ASGI worker.
+"""
+import asyncio
+import resource
+import time
+import tracemalloc
+
+from asgiref.sync import sync_to_async
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from formbuilder.models import Form
+
+
+class Command(BaseCommand):
+    help = "Open idle SSE connections against the ASGI application and measure memory and fan-out latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=1000, help="Number of concurrent connections")
+        parser.add_argument('--events', type=int, default=5, help="Number of change events to fan out")
+
+    def handle(self, *args, **options):
+        form = Form.objects.create(name='Events benchmark', schema={'form': {'children': []}})
+        try:
+            # Rate limits would reject most of the connections from one client
+            with override_settings(FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []}):
+                application = get_asgi_application()
+            asyncio.run(self.run(application, form, options['subscribers'], options['events']))
+        finally:
+            Form.all_objects.filter(pk=form.pk).delete()
+
+    async def run(self, application, form, count, events):
+        path = f'/formbuilder/api/forms/{form.pk}/events/'
+        received = [0] * count
+        progress = asyncio.Condition()
+
+        def connect(i, inbox):
+            async def send(message):
+                if message['type'] == 'http.response.body' and b'event: ' in message.get('body', b''):
+                    received[i] += 1
+                    async with progress:
+                        progress.notify_all()
+
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+                'headers': [(b'host', b'localhost'), (b'accept', b'text/event-stream')],
+                'client': ('127.0.0.1', i), 'server': ('localhost', 80),
+            }
+            return application(scope, inbox.get, send)
+
+        async def wait_for(target):
+            async with progress:
+                await progress.wait_for(lambda: all(n >= target for n in received))
+
+        tracemalloc.start()
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+
+        inboxes = []
+        tasks = []
+        for i in range(count):
+            inbox = asyncio.Queue()
+            inbox.put_nowait({'type': 'http.request', 'body': b'', 'more_body': False})
+            inboxes.append(inbox)
+            tasks.append(asyncio.create_task(connect(i, inbox)))
+        await wait_for(1)
+
+        connected = time.perf_counter() - start
+        traced, _ = tracemalloc.get_traced_memory()
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        tracemalloc.stop()
+        self.stdout.write(f"{count} subscribers connected in {connected:.2f}s")
+        self.stdout.write(
+            f"memory: {traced / count / 1024:.1f} KiB per connection traced, "
+            f"peak RSS grew by {(rss_after - rss_before) / 1024:.1f} MiB"
+        )
+
+        latencies = []
+        for n in range(events):
+            form.name = f'Events benchmark {n}'
+            start = time.perf_counter()
+            await sync_to_async(form.save)()
+            await wait_for(n + 2)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        self.stdout.write(
+            f"fan-out of {events} events to {count} subscribers: "
+            f"median {latencies[len(latencies) // 2] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms"
+        )
+
+        for inbox in inboxes:
+            inbox.put_nowait({'type': 'http.disconnect'})
+        await asyncio.gather(*tasks, return_exceptions=True)
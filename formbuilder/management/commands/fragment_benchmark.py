@@ -0,0 +1,116 @@
+"""
+Benchmark storage and read-time resolution of schemas built from shared fragments.
+"""
+import json
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+
+from formbuilder import fragments
+from formbuilder.models import Form, Fragment
+
+
+def block(name, count):
+    return [
+        {
+            'key': f'{name}{i}', 'type': 'RsInput',
+            'props': {'label': {'value': f'{name.title()} line {i}'}, 'placeholder': {'value': f'Enter {name} {i}'}},
+            'schema': {'validations': [{'key': 'required'}]} if i == 0 else {},
+            'css': {'any': {'object': {'marginBottom': '8px'}}},
+        }
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Report storage saved by fragment references and the latency of resolving them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forms', type=int, default=500, help="Forms using the fragments")
+        parser.add_argument('--unrelated', type=int, default=500, help="Forms without fragments")
+        parser.add_argument('--fields', type=int, default=5, help="Own fields per form")
+
+    def handle(self, *args, **options):
+        address = Fragment.objects.create(name=f'Benchmark address {time.time()}')
+        contact = Fragment.objects.create(name=f'Benchmark contact {time.time()}')
+        fragments.create_version(address, block('address', 8))
+        fragments.create_version(contact, [
+            *block('contact', 4), {'$fragment': address.pk, 'version': 1, 'keyPrefix': 'home_'},
+        ])
+        form_ids = []
+        try:
+            for i in range(options['forms']):
+                form_ids.append(Form.objects.create(name=f'Fragment benchmark {i}', schema={'form': {'children': [
+                    *block(f'own{i}_', options['fields']),
+                    {'$fragment': address.pk, 'keyPrefix': 'billing_'},
+                    {'$fragment': address.pk, 'keyPrefix': 'shipping_'},
+                    {'$fragment': contact.pk, 'version': 1},
+                ]}}).pk)
+            for i in range(options['unrelated']):
+                form_ids.append(Form.objects.create(
+                    name=f'Fragment benchmark plain {i}', schema={'form': {'children': block(f'own{i}_', 10)}}
+                ).pk)
+            forms = list(Form.objects.filter(pk__in=form_ids[:options['forms']]))
+
+            stored = sum(len(json.dumps(form.get_schema())) for form in forms)
+            resolved = sum(len(json.dumps(form.get_resolved_schema())) for form in forms)
+            shared = sum(len(json.dumps(version.components)) for version in
+                         Fragment.objects.get(pk=address.pk).versions.all().union(contact.versions.all()))
+            components = forms[0].get_component_count()
+            self.stdout.write(
+                f"Storage for {len(forms)} forms of {components} components: {resolved / 1e6:.2f} MB inlined, "
+                f"{(stored + shared) / 1e6:.2f} MB with references ({1 - (stored + shared) / resolved:.0%} saved)"
+            )
+
+            def clear(local=True, remote=True, expanded=True):
+                if local:
+                    fragments.resolved_cache.local.clear()
+                if remote:
+                    cache.clear()
+                if expanded:
+                    fragments._expanded.clear()
+
+            for label, tiers in [
+                ("cold (nothing cached)", dict()),
+                ("fragment versions memoized", dict(expanded=False)),
+                ("Django cache", dict(remote=False, expanded=False)),
+                ("in-process cache", dict(local=False, remote=False, expanded=False)),
+            ]:
+                clear(**tiers)
+                hits = fragments.resolved_cache.remote_hits
+                start = time.perf_counter()
+                for form in forms:
+                    form.get_resolved_schema()
+                    if tiers:
+                        continue
+                    # Cold every time
+                    clear()
+                elapsed = time.perf_counter() - start
+                # Below 100% the cache evicted entries (LocMemCache keeps 300 by default)
+                ratio = (fragments.resolved_cache.remote_hits - hits) / len(forms)
+                self.stdout.write(
+                    f"Resolve one form, {label}: {elapsed / len(forms) * 1e6:.0f} us"
+                    f"{f' ({ratio:.0%} hits)' if label == 'Django cache' else ''}"
+                )
+
+            clear()
+            start = time.perf_counter()
+            fragments.resolve_forms(forms)
+            self.stdout.write(
+                f"Resolve all {len(forms)} forms at once, cold: {(time.perf_counter() - start) * 1000:.1f} ms"
+            )
+
+            before = dict(Form.objects.filter(pk__in=form_ids).values_list('pk', 'modified'))
+            start = time.perf_counter()
+            fragments.create_version(address, block('address', 9))
+            elapsed = time.perf_counter() - start
+            after = Form.objects.filter(pk__in=form_ids).values_list('pk', 'modified')
+            invalidated = sum(1 for pk, modified in after if modified != before[pk])
+            self.stdout.write(
+                f"New address version: {invalidated} of {len(form_ids)} forms invalidated "
+                f"in {elapsed * 1000:.1f} ms"
+            )
+        finally:
+            Form.all_objects.filter(pk__in=form_ids).delete()
+            Fragment.objects.filter(pk__in=[address.pk, contact.pk]).delete()
@@ -0,0 +1,87 @@
+"""
+Benchmark request latency with synchronous and queued file logging on a
+simulated slow disk.
+"""
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from formbuilder.log import JSONFormatter, QueuedFileHandler
+
+
+class Command(BaseCommand):
+    help = "Compare request latency with logging.FileHandler and QueuedFileHandler when disk writes are slow"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--path', default='/formbuilder/', help="Path requested")
+        parser.add_argument('--records', type=int, default=3, help="Extra log records per request")
+        parser.add_argument('--write-delay', type=float, default=0.002, help="Seconds added to every disk write")
+        parser.add_argument('--stall', type=float, default=0.2, help="Seconds of an occasional disk stall")
+        parser.add_argument('--stall-every', type=int, default=200, help="Writes between stalls")
+        parser.add_argument('--queue-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            sync_handler = logging.FileHandler(Path(directory) / 'sync.log')
+            self.run('FileHandler', sync_handler, sync_handler, options)
+
+            queued_handler = QueuedFileHandler(Path(directory) / 'queued.log', queue_size=options['queue_size'])
+            self.run('QueuedFileHandler', queued_handler, queued_handler.file_handler, options)
+            self.stdout.write(f"  dropped records: {queued_handler.dropped}")
+
+    def slow_down(self, handler, options):
+        """
+        Make every write of ``handler`` slow, with an occasional long stall
+        """
+        emit = handler.emit
+        writes = [0]
+
+        def slow_emit(record):
+            writes[0] += 1
+            time.sleep(options['stall'] if writes[0] % options['stall_every'] == 0 else options['write_delay'])
+            emit(record)
+        handler.emit = slow_emit
+
+    def run(self, label, handler, file_handler, options):
+        handler.setFormatter(JSONFormatter())
+        self.slow_down(file_handler, options)
+        # The request log and the records of the benchmark go to the handler only
+        loggers = [logging.getLogger('formbuilder'), logging.getLogger('formbuilder.requests')]
+        saved = [(logger.handlers, logger.propagate, logger.level) for logger in loggers]
+        for logger in loggers:
+            logger.handlers, logger.propagate, logger.level = [handler], False, logging.INFO
+        benchmark_logger = logging.getLogger('formbuilder.benchmark')
+
+        latencies = []
+        start = time.perf_counter()
+        try:
+            # Rate limits would reject most requests from one client
+            with override_settings(FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []}):
+                client = Client()
+                for _ in range(options['requests']):
+                    request_start = time.perf_counter()
+                    # Records logged by application code while handling the request
+                    for i in range(options['records']):
+                        benchmark_logger.info(f"record {i}", extra={'n': i})
+                    client.get(options['path'])
+                    latencies.append(time.perf_counter() - request_start)
+            elapsed = time.perf_counter() - start
+        finally:
+            for logger, (handlers, propagate, level) in zip(loggers, saved):
+                logger.handlers, logger.propagate, logger.level = handlers, propagate, level
+            handler.close()
+        drained = time.perf_counter() - start
+
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(
+            f"{label}: {options['requests']} requests in {elapsed:.2f}s, latency median "
+            f"{latencies[len(latencies) // 2] * 1000:.2f} ms, p99 {p99 * 1000:.2f} ms, "
+            f"max {latencies[-1] * 1000:.2f} ms; log written after {drained:.2f}s"
+        )
@@ -0,0 +1,104 @@
+"""
+Benchmark compiling and evaluating form logic with many conditional fields.
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from formbuilder.logic import compile_logic
+
+
+def generate_schema(fields, inputs, seed=0):
+    """
+    Build a schema with ``inputs`` plain inputs and ``fields`` components
+    that are conditionally shown or calculated from earlier fields, in
+    containers of ten, some of them conditional themselves
+    """
+    rng = random.Random(seed)
+    keys = [f'input{i}' for i in range(inputs)]
+    children = [{'key': key, 'type': 'RsNumber'} for key in keys]
+    container = None
+    for i in range(fields):
+        if i % 10 == 0:
+            container = {'key': f'panel{i // 10}', 'type': 'RsContainer', 'children': []}
+            if rng.random() < 0.3:
+                container['renderWhen'] = {'value': f'form.data.{rng.choice(keys)} !== 0'}
+            children.append(container)
+        source, other = rng.choice(keys), rng.choice(keys)
+        component = {'key': f'field{i}', 'type': 'RsNumber'}
+        if rng.random() < 0.5:
+            component['renderWhen'] = {'value': f'form.data.{source} > 50 || form.data.{other} % 3 === 0'}
+            component['schema'] = {'validations': [{'key': 'required'}]}
+        else:
+            component['props'] = {'value': {
+                'computeType': 'function',
+                'fnSource': f'return form.data.{source} * 2 + (form.data.{other} ?? 0)',
+            }}
+        container['children'].append(component)
+        keys.append(component['key'])
+    return {'form': {'children': children}}
+
+
+class Command(BaseCommand):
+    help = "Time compiling form logic, full and incremental evaluation, and batch re-evaluation"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fields', type=int, default=2000, help="Conditional and calculated fields")
+        parser.add_argument('--inputs', type=int, default=200, help="Plain input fields")
+        parser.add_argument('--submissions', type=int, default=2000, help="Submissions in the batch run")
+        parser.add_argument(
+            '--change-ratio', type=float, default=0.05,
+            help="Share of inputs that differ between consecutive submissions of the batch"
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(1)
+        schema = generate_schema(options['fields'], options['inputs'])
+        inputs = [f'input{i}' for i in range(options['inputs'])]
+
+        start = time.perf_counter()
+        logic = compile_logic(schema)
+        compile_time = time.perf_counter() - start
+        self.stdout.write(
+            f"Compiled {options['fields']} logic fields into {logic.size} nodes in {compile_time * 1000:.1f} ms"
+            f"{f', {len(logic.errors)} error(s)' if logic.errors else ''}"
+        )
+
+        data = {key: rng.randint(0, 100) for key in inputs}
+        runs = 200
+        start = time.perf_counter()
+        for _ in range(runs):
+            evaluation = logic.evaluate(data)
+        full = (time.perf_counter() - start) / runs
+        self.stdout.write(f"Full evaluation: {full * 1000:.3f} ms")
+
+        start = time.perf_counter()
+        for _ in range(runs):
+            key = rng.choice(inputs)
+            changed = {**evaluation.data, key: rng.randint(0, 100)}
+            evaluation = logic.update(evaluation, changed, [key])
+        incremental = (time.perf_counter() - start) / runs
+        self.stdout.write(
+            f"Update after one input changed: {incremental * 1000:.3f} ms ({full / incremental:.0f}x faster)"
+        )
+
+        records = []
+        record = dict(data)
+        for _ in range(options['submissions']):
+            record = dict(record)
+            for key in rng.sample(inputs, max(1, int(len(inputs) * options['change_ratio']))):
+                record[key] = rng.randint(0, 100)
+            records.append(record)
+
+        start = time.perf_counter()
+        full_missing = [logic.evaluate(record).missing_required() for record in records]
+        full_batch = time.perf_counter() - start
+        start = time.perf_counter()
+        batch_missing = [evaluation.missing_required() for evaluation in logic.evaluate_many(records)]
+        incremental_batch = time.perf_counter() - start
+        assert full_missing == batch_missing
+        self.stdout.write(
+            f"Batch of {len(records)} submissions ({options['change_ratio']:.0%} of inputs changing): "
+            f"full {len(records) / full_batch:.0f}/s, incremental {len(records) / incremental_batch:.0f}/s"
+        )
@@ -0,0 +1,40 @@
+"""
+Create upcoming submission partitions and apply submission retention.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from formbuilder.partitions import ensure_partitions, is_partitioned, list_partitions, purge_submissions
+
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly submission partitions and drop expired ones (run daily from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead', type=int, default=None,
+            help="Number of future months to create partitions for"
+        )
+        parser.add_argument(
+            '--retention-months', type=int, default=getattr(settings, 'FORMBUILDER_SUBMISSION_RETENTION_MONTHS', None),
+            help="Remove submissions older than this many whole months (aggregates keep counting them "
+                 "until rebuild_aggregates is run)"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help="Rows per DELETE when rows have to be deleted individually"
+        )
+
+    def handle(self, *args, **options):
+        if is_partitioned():
+            created = ensure_partitions(months_ahead=options['months_ahead'])
+            self.stdout.write(f"Partitions ensured: {', '.join(created)}")
+        else:
+            self.stdout.write("Submission table is not partitioned on this database; skipping partition creation")
+
+        if options['retention_months'] is not None:
+            result = purge_submissions(options['retention_months'], batch_size=options['batch_size'])
+            self.stdout.write(f"Retention ({options['retention_months']} months): {result}")
+
+        if is_partitioned():
+            self.stdout.write(f"Monthly partitions: {len(list_partitions())}")
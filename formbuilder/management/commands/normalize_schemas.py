@@ -0,0 +1,104 @@
+"""
+Backfill legacy form schemas into the canonical ``form.children`` layout.
+"""
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from formbuilder.models import Form
+from formbuilder.schema import is_legacy_schema, normalize_schema, verify_round_trip
+
+
+class Command(BaseCommand):
+    help = "Convert legacy form schemas to the canonical layout in resumable batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help="Number of rows fetched and updated per transaction"
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0.0,
+            help="Seconds to pause between batches to limit database load"
+        )
+        parser.add_argument(
+            '--checkpoint', default=str(Path(settings.BASE_DIR) / 'logs' / 'normalize_schemas.checkpoint'),
+            help="File recording the last processed primary key"
+        )
+        parser.add_argument(
+            '--reset', action='store_true',
+            help="Ignore the checkpoint and start from the first row"
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Verify conversions without writing them"
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = Path(options['checkpoint'])
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        last_pk = 0
+        if checkpoint.exists() and not options['reset']:
+            last_pk = int(checkpoint.read_text().strip() or 0)
+            self.stdout.write(f"Resuming after id {last_pk}")
+
+        total = Form.objects.filter(pk__gt=last_pk).count()
+        scanned = converted = 0
+        start = time.perf_counter()
+
+        while True:
+            rows = list(
+                Form.objects.filter(pk__gt=last_pk)
+                .select_related('schema_blob')
+                .order_by('pk')[:batch_size]
+            )
+            if not rows:
+                break
+
+            changed = []
+            for form in rows:
+                schema = form.get_schema()
+                if not is_legacy_schema(schema):
+                    continue
+                normalized = normalize_schema(schema)
+                if not verify_round_trip(schema, normalized):
+                    raise CommandError(f"Normalizing form {form.pk} would lose data; stopping before this batch")
+                form.schema = normalized
+                changed.append(form)
+
+            if changed and not dry_run:
+                # save() rather than bulk_update(): it also refreshes the
+                # fingerprints, LSH buckets and `modified`, which caches of
+                # the schema (component index, resolved schema) are keyed on
+                with transaction.atomic():
+                    for form in changed:
+                        form.save()
+
+            last_pk = rows[-1].pk
+            scanned += len(rows)
+            converted += len(changed)
+            if not dry_run:
+                checkpoint.parent.mkdir(parents=True, exist_ok=True)
+                checkpoint.write_text(str(last_pk))
+
+            elapsed = time.perf_counter() - start
+            rate = scanned / elapsed if elapsed else 0
+            self.stdout.write(
+                f"{scanned}/{total} rows scanned, {converted} converted, "
+                f"last id {last_pk}, {rate:.0f} rows/s"
+            )
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        elapsed = time.perf_counter() - start
+        rate = scanned / elapsed if elapsed else 0
+        action = "would be converted" if dry_run else "converted"
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {scanned} rows scanned, {converted} {action} in {elapsed:.1f}s ({rate:.0f} rows/s)"
+        ))
@@ -0,0 +1,90 @@
+"""
+Benchmark serving a published snapshot against reading the form through
+the API.
+"""
+import io
+import shutil
+import tempfile
+import time
+
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from formbuilder.cache import form_cache
+from formbuilder.models import Form
+from formbuilder.publishing import publish_form
+
+
+class Command(BaseCommand):
+    help = "Compare requests per second of the forms API and of a published snapshot served by WhiteNoise"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per measurement")
+        parser.add_argument('--fields', type=int, default=50, help="Components of the form")
+
+    def handle(self, *args, **options):
+        root = tempfile.mkdtemp(prefix='formbuilder-publish-benchmark-')
+        children = [
+            {'key': f'field{i}', 'type': 'RsInput', 'props': {'label': {'value': f'Field {i}'}}}
+            for i in range(options['fields'])
+        ]
+        form = None
+        try:
+            with override_settings(
+                DEBUG=False, ALLOWED_HOSTS=['*'], FORMBUILDER_PUBLISH_ROOT=root,
+                FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []},
+            ):
+                form = Form.objects.create(name='Publish benchmark', schema={'form': {'children': children}})
+                snapshot_url = publish_form(form)
+                # Middleware reads its settings when the handler loads it
+                handler = WSGIHandler()
+                api_url = reverse('forms_api_detail', args=[form.pk])
+
+                def uncached():
+                    cache.clear()
+                    form_cache.local.clear()
+
+                for label, url, before in [
+                    ("API, uncached", api_url, uncached),
+                    ("API, form cache", api_url, None),
+                    ("published snapshot", snapshot_url, None),
+                ]:
+                    for encoding in ['identity', 'gzip']:
+                        elapsed, size = self.run(handler, url, encoding, options['requests'], before)
+                        self.stdout.write(
+                            f"{label} ({encoding}): {options['requests'] / elapsed:,.0f} requests/s, "
+                            f"{size} bytes"
+                        )
+        finally:
+            if form is not None:
+                Form.all_objects.filter(pk=form.pk).delete()
+            shutil.rmtree(root, ignore_errors=True)
+
+    def run(self, handler, url, encoding, requests, before=None):
+        """
+        GET ``url`` ``requests`` times and return the total time and the
+        size of the last body
+        """
+        elapsed = 0.0
+        body = b''
+        for _ in range(requests):
+            if before:
+                before()
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': url, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_ACCEPT_ENCODING': encoding,
+                'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': io.StringIO(),
+            }
+            statuses = []
+            start = time.perf_counter()
+            response = handler(environ, lambda status, headers: statuses.append(status))
+            body = b''.join(response)
+            response.close()
+            elapsed += time.perf_counter() - start
+            if not statuses[0].startswith('200'):
+                raise RuntimeError(f"GET {url} returned {statuses[0]}")
+        return elapsed, len(body)
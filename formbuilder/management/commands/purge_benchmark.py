@@ -0,0 +1,97 @@
+"""
+Benchmark purging a deleted form with many submissions.
+"""
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from formbuilder.models import Form, Submission
+from formbuilder.softdelete import BatchPacer, get_config, purge_form
+
+
+class Command(BaseCommand):
+    help = "Purge a deleted form with many submissions, measuring batch durations and concurrent write latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help="Submissions of the purged form")
+        parser.add_argument('--pause-ratio', type=float, default=None, help="Override PAUSE_RATIO")
+        parser.add_argument(
+            '--compare', action='store_true',
+            help="Also time a single cascading DELETE of the same number of rows"
+        )
+
+    def handle(self, *args, **options):
+        config = get_config()
+        if options['pause_ratio'] is not None:
+            config['PAUSE_RATIO'] = options['pause_ratio']
+        bystander = Form.objects.create(name='Purge benchmark bystander', schema={'form': {'children': []}})
+        try:
+            form = self.create_form(options['rows'])
+            form.delete()
+            pacer = BatchPacer(config)
+            elapsed, latencies = self.with_writer(bystander, lambda: purge_form(form.pk, pacer, remove_tombstone=True))
+            self.report('batched purge', options['rows'], elapsed, latencies)
+            self.stdout.write(
+                f"  {pacer.batches} batches, longest {pacer.longest_batch * 1000:.1f} ms, "
+                f"final batch size {pacer.batch_size}, {pacer.retries} retried"
+            )
+
+            if options['compare']:
+                form = self.create_form(options['rows'])
+                elapsed, latencies = self.with_writer(bystander, lambda: Form.all_objects.filter(pk=form.pk).delete())
+                self.report('single DELETE', options['rows'], elapsed, latencies)
+        finally:
+            Form.all_objects.filter(name__startswith='Purge benchmark').delete()
+
+    def create_form(self, rows):
+        form = Form.objects.create(name='Purge benchmark', schema={'form': {'children': []}})
+        start = time.perf_counter()
+        for offset in range(0, rows, 10000):
+            Submission.objects.bulk_create(
+                Submission(form=form, data={'n': i, 'text': 'x' * 40}) for i in range(offset, min(rows, offset + 10000))
+            )
+        self.stdout.write(f"Created {rows} submissions in {time.perf_counter() - start:.1f}s")
+        return form
+
+    def with_writer(self, form, purge):
+        """
+        Run ``purge`` while another thread stores a submission every 10 ms,
+        and return the purge duration and the write latencies
+        """
+        latencies = []
+        stopped = threading.Event()
+
+        def write():
+            try:
+                while not stopped.wait(0.01):
+                    start = time.perf_counter()
+                    try:
+                        Submission.objects.create(form=form, data={'n': 0})
+                    except OperationalError:
+                        # Timed out waiting for a lock: count the full wait
+                        pass
+                    latencies.append(time.perf_counter() - start)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        start = time.perf_counter()
+        try:
+            purge()
+        finally:
+            elapsed = time.perf_counter() - start
+            stopped.set()
+            writer.join()
+        return elapsed, sorted(latencies)
+
+    def report(self, label, rows, elapsed, latencies):
+        self.stdout.write(f"{label}: {rows} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+        if latencies:
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            self.stdout.write(
+                f"  concurrent writes: {len(latencies)}, median {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+                f"p99 {p99 * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms"
+            )
@@ -0,0 +1,27 @@
+"""
+Remove the submissions of deleted forms and expired tombstones.
+"""
+from django.core.management.base import BaseCommand
+
+from formbuilder.softdelete import BatchPacer, get_config, purge_deleted_forms
+
+
+class Command(BaseCommand):
+    help = "Delete the rows of soft-deleted forms in small batches and drop expired tombstones (run daily from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--form', type=int, action='append', help="Only purge this deleted form (repeatable)")
+        parser.add_argument('--batch-size', type=int, default=None, help="Largest number of rows per DELETE")
+        parser.add_argument(
+            '--pause-ratio', type=float, default=None,
+            help="Pause after each batch, relative to its duration (0 to run flat out)"
+        )
+
+    def handle(self, *args, **options):
+        config = get_config()
+        if options['batch_size']:
+            config['BATCH_SIZE'] = options['batch_size']
+        if options['pause_ratio'] is not None:
+            config['PAUSE_RATIO'] = options['pause_ratio']
+        result = purge_deleted_forms(form_ids=options['form'], pacer=BatchPacer(config))
+        self.stdout.write(f"Purge: {result}")
@@ -0,0 +1,13 @@
+"""
+Remove expired uploads and orphaned upload files.
+"""
+from django.core.management.base import BaseCommand
+
+from formbuilder.uploads import purge_uploads
+
+
+class Command(BaseCommand):
+    help = "Delete uploads not finished or not submitted within EXPIRE_HOURS, and files without an upload (run hourly from cron)"
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Purge: {purge_uploads()}")
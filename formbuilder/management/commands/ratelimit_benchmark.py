@@ -0,0 +1,35 @@
+"""
+Benchmark the cost of rate limit checks.
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from formbuilder.ratelimit import MemoryBackend, get_backend
+
+
+class Command(BaseCommand):
+    help = "Measure the latency of token-bucket checks with the configured backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100000, help="Number of checks")
+        parser.add_argument('--clients', type=int, default=1000, help="Number of distinct client buckets")
+        parser.add_argument('--memory', action='store_true', help="Use the in-memory backend regardless of settings")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        backend = MemoryBackend() if options['memory'] else get_backend()
+        rng = random.Random(options['seed'])
+        keys = [f"formbuilder:rl:bench:{rng.randrange(options['clients'])}" for _ in range(options['requests'])]
+
+        allowed = 0
+        start = time.perf_counter()
+        for key in keys:
+            allowed += backend.consume(key, 10.0, 50)[0]
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f"{options['requests']} checks over {options['clients']} buckets with {type(backend).__name__}: "
+            f"{elapsed / options['requests'] * 1e6:.1f} us/check, {allowed} allowed"
+        )
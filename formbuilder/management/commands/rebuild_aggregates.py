@@ -0,0 +1,79 @@
+"""
+Recompute submission aggregates from the stored submissions.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+from django.db.models import Max
+
+from formbuilder.analytics import aggregate_records, merge_into
+from formbuilder.models import Form, FormAggregate, Submission
+
+
+class Command(BaseCommand):
+    help = "Rebuild per-field submission aggregates, e.g. after a backfill or a change to the statistics"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--form', type=int, action='append', default=None,
+            help="Only rebuild the aggregates of this form (can be repeated)"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help="Number of submissions aggregated per batch"
+        )
+
+    def handle(self, *args, **options):
+        forms = Form.objects.all()
+        if options['form']:
+            forms = forms.filter(pk__in=options['form'])
+
+        for form_id in forms.values_list('pk', flat=True).order_by('pk'):
+            start = time.perf_counter()
+            count = self.rebuild(form_id, options['batch_size'])
+            elapsed = time.perf_counter() - start
+            rate = count / elapsed if elapsed else 0
+            self.stdout.write(f"Form {form_id}: {count} submissions in {elapsed:.2f}s ({rate:.0f}/s)")
+
+    def rebuild(self, form_id, batch_size):
+        using = router.db_for_write(FormAggregate)
+        with transaction.atomic(using=using):
+            # Ingests take this lock before inserting, so once it is held
+            # every submission up to the high-water mark is committed and
+            # later ones get a higher pk
+            FormAggregate.objects.using(using).get_or_create(form_id=form_id)
+            FormAggregate.objects.using(using).select_for_update().get(form_id=form_id)
+            high_water = self.submissions(form_id, using).aggregate(pk=Max('pk'))['pk'] or 0
+
+        # Aggregate the bulk without the lock so ingests are not held up
+        rebuilt = FormAggregate(form_id=form_id, submission_count=0, fields={})
+        self.merge_batches(rebuilt, self.submissions(form_id, using).filter(pk__lte=high_water), batch_size)
+
+        with transaction.atomic(using=using):
+            aggregate = FormAggregate.objects.using(using).select_for_update().get(form_id=form_id)
+            # Submissions ingested while the bulk was aggregated
+            self.merge_batches(rebuilt, self.submissions(form_id, using).filter(pk__gt=high_water), batch_size)
+            aggregate.submission_count = rebuilt.submission_count
+            aggregate.fields = rebuilt.fields
+            aggregate.save()
+        return aggregate.submission_count
+
+    def submissions(self, form_id, using):
+        # Read from the primary: outside a transaction reads may be routed to
+        # a replica that has not caught up yet
+        return Submission.objects.using(using).filter(form_id=form_id)
+
+    def merge_batches(self, aggregate, submissions, batch_size):
+        last_pk = 0
+        while True:
+            rows = list(
+                submissions.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', 'data')[:batch_size]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            records = [data for _, data in rows]
+            merge_into(aggregate, len(records), aggregate_records(records))
@@ -0,0 +1,78 @@
+"""
+Benchmark rendering the builder, viewer, list and detail pages with and
+without the cached template loader and page shells.
+"""
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from formbuilder import shells
+from formbuilder.models import Form
+from formbuilder.views import FormBuilderView, FormDetailView, FormsListView, FormViewView
+
+LOADERS = ['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader']
+
+
+def templates(loaders):
+    engine = {**settings.TEMPLATES[0], 'APP_DIRS': False}
+    engine['OPTIONS'] = {**engine['OPTIONS'], 'loaders': loaders, 'debug': False}
+    return [engine]
+
+
+class Command(BaseCommand):
+    help = "Report the render time of each page view per template configuration"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Renders per view and configuration")
+        parser.add_argument('--forms', type=int, default=20, help="Forms on the list page")
+
+    def handle(self, *args, **options):
+        children = [{'key': f'field{i}', 'type': 'RsInput'} for i in range(20)]
+        forms = [
+            Form.objects.create(name=f'Render benchmark {i}', schema={'form': {'children': children}})
+            for i in range(options['forms'])
+        ]
+        form = forms[0]
+        views = [
+            ('FormBuilderView', FormBuilderView.as_view(), f'/formbuilder/{form.pk}/', {'form_id': form.pk}),
+            ('FormViewView', FormViewView.as_view(), f'/formbuilder/{form.pk}/view/', {'form_id': form.pk}),
+            ('FormsListView', FormsListView.as_view(), '/formbuilder/forms/', {}),
+            ('FormDetailView', FormDetailView.as_view(), f'/formbuilder/forms/{form.pk}/', {'pk': form.pk}),
+        ]
+        configs = [
+            ("uncached loader", templates(LOADERS), False),
+            ("cached loader", templates([('django.template.loaders.cached.Loader', LOADERS)]), False),
+            ("cached loader + shells", templates([('django.template.loaders.cached.Loader', LOADERS)]), True),
+        ]
+        factory = RequestFactory()
+        try:
+            results = {}
+            for label, engines, enabled in configs:
+                with override_settings(DEBUG=False, TEMPLATES=engines, FORMBUILDER_SHELLS={'ENABLED': enabled}):
+                    shells.clear()
+                    for name, view, path, kwargs in views:
+                        timings = []
+                        for _ in range(options['requests'] + 1):
+                            response = view(factory.get(path), **kwargs)
+                            start = time.perf_counter()
+                            response.render()
+                            timings.append(time.perf_counter() - start)
+                        # The first render builds the shell and fills the loader cache
+                        results[name, label] = statistics.median(timings[1:]), timings[0]
+
+            for name, *_ in views:
+                baseline = results[name, configs[0][0]][0]
+                self.stdout.write(name)
+                for label, *_ in configs:
+                    median, first = results[name, label]
+                    self.stdout.write(
+                        f"  {label}: {median * 1e6:.0f} us median ({baseline / median:.1f}x), "
+                        f"first render {first * 1e6:.0f} us"
+                    )
+        finally:
+            shells.clear()
+            Form.all_objects.filter(pk__in=[form.pk for form in forms]).delete()
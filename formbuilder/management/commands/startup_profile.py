@@ -0,0 +1,157 @@
+"""
+Profile worker startup: import times and time to first request.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Run in a fresh interpreter: set up Django the way a worker does and
+# serve one request, reporting wall-clock timestamps
+FIRST_REQUEST_SCRIPT = """
+import asyncio, io, json, sys, time
+interface, path, host = sys.argv[1:4]
+if interface == 'wsgi':
+    from django_form_builder.wsgi import application
+    loaded = time.time()
+    status = []
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+        'SERVER_NAME': host, 'SERVER_PORT': '443', 'HTTP_HOST': host,
+        'HTTP_X_FORWARDED_PROTO': 'https', 'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'https',
+        'wsgi.version': (1, 0), 'wsgi.multithread': False, 'wsgi.multiprocess': True,
+        'wsgi.run_once': False, 'SERVER_PROTOCOL': 'HTTP/1.1',
+    }
+    body = b''.join(application(environ, lambda s, headers, exc_info=None: status.append(s)))
+    status = int(status[0].split()[0])
+else:
+    from django_form_builder.asgi import application
+    loaded = time.time()
+    messages = []
+    async def run():
+        inbox = asyncio.Queue()
+        inbox.put_nowait({'type': 'http.request', 'body': b'', 'more_body': False})
+        async def send(message):
+            messages.append(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body'):
+                inbox.put_nowait({'type': 'http.disconnect'})
+        await application(scope, inbox.get, send)
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'https', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+        'headers': [(b'host', host.encode()), (b'x-forwarded-proto', b'https')],
+        'client': ('127.0.0.1', 0), 'server': (host, 443),
+    }
+    asyncio.run(run())
+    status = next(m['status'] for m in messages if m['type'] == 'http.response.start')
+print(json.dumps({'loaded': loaded, 'responded': time.time(), 'status': status}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Report import times at startup and time to first request for WSGI/ASGI workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=20,
+            help="Number of slowest modules and packages to list"
+        )
+        parser.add_argument(
+            '--runs', type=int, default=5,
+            help="Cold starts measured per interface"
+        )
+        parser.add_argument(
+            '--interface', choices=['wsgi', 'asgi', 'both'], default='both',
+            help="Worker interface to measure time to first request for"
+        )
+        parser.add_argument(
+            '--path', default='/formbuilder/api/forms/',
+            help="Path requested as the first request"
+        )
+        parser.add_argument(
+            '--skip-imports', action='store_true',
+            help="Only measure time to first request"
+        )
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        cwd = str(settings.BASE_DIR)
+        self.stdout.write(f"Settings: {settings.SETTINGS_MODULE}, {len(settings.INSTALLED_APPS)} installed apps")
+
+        if not options['skip_imports']:
+            self.report_imports(env, cwd, options['top'])
+
+        interfaces = ['wsgi', 'asgi'] if options['interface'] == 'both' else [options['interface']]
+        for interface in interfaces:
+            self.report_first_request(env, cwd, interface, options['path'], options['runs'])
+
+    def report_imports(self, env, cwd, top):
+        """
+        Import the project the way a worker does under ``-X importtime``
+        and list the slowest modules by self time and by top-level package
+        """
+        code = f"import django; django.setup(); import {settings.ROOT_URLCONF}"
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            env=env, cwd=cwd, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Importing the project failed:\n{result.stderr[-2000:]}")
+
+        modules = []
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            modules.append((name.strip(), int(self_us), int(cumulative_us)))
+
+        packages = defaultdict(int)
+        for name, self_us, _ in modules:
+            packages[name.split('.')[0]] += self_us
+        total = sum(packages.values())
+
+        self.stdout.write(f"\n{len(modules)} modules imported in {total / 1000:.1f} ms")
+        self.stdout.write("\nSlowest packages (self time):")
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"  {self_us / 1000:8.1f} ms  {100 * self_us / total:5.1f}%  {package}")
+        self.stdout.write("\nSlowest modules (self time, cumulative):")
+        for name, self_us, cumulative_us in sorted(modules, key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"  {self_us / 1000:8.1f} ms  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    def report_first_request(self, env, cwd, interface, path, runs):
+        """
+        Start ``runs`` fresh interpreters and time each one from launch to
+        the end of its first response
+        """
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+        setups, firsts, totals = [], [], []
+        for _ in range(runs):
+            started = time.time()
+            result = subprocess.run(
+                [sys.executable, '-c', FIRST_REQUEST_SCRIPT, interface, path, host],
+                env=env, cwd=cwd, capture_output=True, text=True,
+            )
+            if result.returncode != 0:
+                raise CommandError(f"{interface.upper()} worker failed:\n{result.stderr[-2000:]}")
+            timings = json.loads(result.stdout.strip().splitlines()[-1])
+            setups.append(timings['loaded'] - started)
+            firsts.append(timings['responded'] - timings['loaded'])
+            totals.append(timings['responded'] - started)
+
+        self.stdout.write(
+            f"\n{interface.upper()} time to first request over {runs} cold starts "
+            f"(GET {path} -> {timings['status']}):"
+        )
+        for label, values in (('application loaded', setups), ('first response', firsts), ('total', totals)):
+            self.stdout.write(
+                f"  {label:<20} median {statistics.median(values) * 1000:7.1f} ms, "
+                f"max {max(values) * 1000:7.1f} ms"
+            )
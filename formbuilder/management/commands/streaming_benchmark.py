@@ -0,0 +1,167 @@
+"""
+Benchmark peak memory and time to the first stored submission of the
+buffered batch endpoint and the streaming bulk endpoint.
+"""
+import io
+import json
+import threading
+import time
+import tracemalloc
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from formbuilder.models import Form, Submission
+
+
+class GeneratedBody(io.RawIOBase):
+    """
+    Request body of ``count`` submissions generated while it is read, so
+    the benchmark itself holds no copy of it. With ``rate`` set, reads
+    take as long as receiving the data at ``rate`` bytes per second.
+    """
+
+    def __init__(self, count, padding, rate=None):
+        self.parts = self.generate(count, padding)
+        self.pending = b''
+        self.rate = rate
+
+    @staticmethod
+    def generate(count, padding):
+        yield b'{"submissions": ['
+        for i in range(count):
+            record = {'name': f'Person {i}', 'age': i % 90, 'notes': 'x' * padding}
+            yield (b', ' if i else b'') + json.dumps(record).encode()
+        yield b']}'
+
+    @classmethod
+    def size(cls, count, padding):
+        return sum(len(part) for part in cls.generate(count, padding))
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        parts, length = [self.pending], len(self.pending)
+        while size < 0 or length < size:
+            part = next(self.parts, None)
+            if part is None:
+                break
+            parts.append(part)
+            length += len(part)
+        pending = b''.join(parts)
+        if size < 0:
+            size = length
+        data, self.pending = pending[:size], pending[size:]
+        if self.rate:
+            time.sleep(len(data) / self.rate)
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+class Command(BaseCommand):
+    help = "Compare the buffered batch endpoint and the streaming bulk endpoint by peak memory and time to first item"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--counts', default='2000,10000,50000', help="Comma-separated submissions per body")
+        parser.add_argument('--padding', type=int, default=200, help="Extra characters per submission")
+        parser.add_argument(
+            '--upload-seconds', type=float, default=2.0,
+            help="Duration of the simulated slow upload in the time to first item run"
+        )
+
+    def handle(self, *args, **options):
+        form = Form.objects.create(name='Streaming benchmark', schema={'form': {'children': []}})
+        try:
+            # DEBUG would keep every query in memory; the upload limit would
+            # refuse the larger bodies on the buffered endpoint
+            with override_settings(
+                DEBUG=False, ALLOWED_HOSTS=['*'], DATA_UPLOAD_MAX_MEMORY_SIZE=None,
+                FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []},
+            ):
+                # Middleware reads its settings when the handler loads it
+                handler = WSGIHandler()
+                for count in map(int, options['counts'].split(',')):
+                    size = GeneratedBody.size(count, options['padding'])
+                    self.stdout.write(f"{count} submissions, body {size / 1e6:.1f} MB:")
+                    for label, url in self.endpoints(form):
+                        body = GeneratedBody(count, options['padding'])
+                        tracemalloc.start()
+                        start = time.perf_counter()
+                        status = self.request(handler, url, body, size)
+                        elapsed = time.perf_counter() - start
+                        peak = tracemalloc.get_traced_memory()[1]
+                        tracemalloc.stop()
+                        self.stdout.write(
+                            f"  {label}: {status} in {elapsed:.2f}s, peak memory {peak / 1e6:.1f} MB "
+                            f"({peak / size:.1f}x body)"
+                        )
+
+                count = int(options['counts'].split(',')[0])
+                size = GeneratedBody.size(count, options['padding'])
+                self.stdout.write(f"Slow upload of {count} submissions over {options['upload_seconds']:.1f}s:")
+                for label, url in self.endpoints(form):
+                    Submission.objects.filter(form=form).delete()
+                    body = GeneratedBody(count, options['padding'], rate=size / options['upload_seconds'])
+                    first, elapsed = self.time_to_first(form, lambda: self.request(handler, url, body, size))
+                    self.stdout.write(
+                        f"  {label}: first submission stored after {first:.2f}s, request done after {elapsed:.2f}s"
+                    )
+        finally:
+            Form.all_objects.filter(pk=form.pk).delete()
+
+    def endpoints(self, form):
+        return [
+            ('buffered', reverse('submissions_api', args=[form.pk])),
+            ('streaming', reverse('submissions_api_bulk', args=[form.pk])),
+        ]
+
+    def request(self, handler, url, body, size):
+        """
+        Send ``body`` through the WSGI handler and return the response status
+        """
+        environ = {
+            'REQUEST_METHOD': 'POST', 'PATH_INFO': url, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(size),
+            'wsgi.input': body, 'wsgi.url_scheme': 'http', 'wsgi.errors': io.StringIO(),
+        }
+        statuses = []
+        response = handler(environ, lambda status, headers: statuses.append(status))
+        b''.join(response)
+        response.close()
+        return statuses[0]
+
+    def time_to_first(self, form, send):
+        """
+        Run ``send`` while another thread polls for the first stored
+        submission, and return when it appeared and when ``send`` returned
+        """
+        found = []
+        done = threading.Event()
+        start = time.perf_counter()
+
+        def poll():
+            try:
+                while not done.is_set():
+                    if Submission.objects.filter(form=form).exists():
+                        found.append(time.perf_counter() - start)
+                        return
+                    time.sleep(0.01)
+            finally:
+                connection.close()
+
+        poller = threading.Thread(target=poll)
+        poller.start()
+        try:
+            send()
+        finally:
+            elapsed = time.perf_counter() - start
+            done.set()
+            poller.join()
+        return (found[0] if found else elapsed), elapsed
@@ -0,0 +1,120 @@
+"""
+Benchmark concurrent resumable uploads through the upload API.
+"""
+import base64
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from formbuilder.models import Form, Upload
+from formbuilder.uploads import upload_path
+
+
+class Command(BaseCommand):
+    help = "Upload files concurrently in checksummed chunks and report throughput, chunk latency and peak memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,4,16', help="Comma-separated numbers of parallel uploads")
+        parser.add_argument('--size', type=int, default=16 * 1024 * 1024, help="Bytes per file")
+        parser.add_argument('--chunk-size', type=int, default=1024 * 1024, help="Bytes per PATCH")
+        parser.add_argument('--no-fsync', action='store_true', help="Do not fsync each chunk")
+
+    def handle(self, *args, **options):
+        form = Form.objects.create(
+            name='Upload benchmark', schema={'form': {'children': [{'key': 'file', 'type': 'RsUploader'}]}}
+        )
+        content = os.urandom(options['size'])
+        chunks = [content[i:i + options['chunk_size']] for i in range(0, len(content), options['chunk_size'])]
+        checksums = ['sha256 ' + base64.b64encode(hashlib.sha256(chunk).digest()).decode() for chunk in chunks]
+        expected = hashlib.sha256(content).digest()
+        try:
+            with tempfile.TemporaryDirectory() as root, override_settings(
+                DEBUG=False, ALLOWED_HOSTS=['*'], FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []},
+                FORMBUILDER_UPLOADS={'ROOT': root, 'FSYNC': not options['no_fsync']},
+            ):
+                # Middleware reads its settings when the handler loads it
+                handler = WSGIHandler()
+                for concurrency in map(int, options['concurrency'].split(',')):
+                    latencies, errors = [], []
+
+                    def upload():
+                        try:
+                            upload_id = self.upload(handler, form, chunks, checksums, latencies)
+                            file = upload_path(Upload.objects.get(pk=upload_id))
+                            if hashlib.sha256(file.read_bytes()).digest() != expected:
+                                errors.append(f"{upload_id}: content differs")
+                        except Exception as e:
+                            errors.append(repr(e))
+                        finally:
+                            connection.close()
+
+                    tracemalloc.start()
+                    start = time.perf_counter()
+                    threads = [threading.Thread(target=upload) for _ in range(concurrency)]
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+                    elapsed = time.perf_counter() - start
+                    peak = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+
+                    latencies.sort()
+                    total = concurrency * options['size']
+                    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+                    self.stdout.write(
+                        f"{concurrency} parallel upload(s) of {options['size'] / 1e6:.1f} MB: "
+                        f"{total / elapsed / 1e6:.1f} MB/s, chunk latency median "
+                        f"{latencies[len(latencies) // 2] * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms, "
+                        f"peak memory {peak / 1e6:.1f} MB (incl. {len(content) / 1e6:.1f} MB of test data)"
+                    )
+                    for error in errors:
+                        self.stderr.write(f"  {error}")
+        finally:
+            Form.all_objects.filter(pk=form.pk).delete()
+
+    def request(self, handler, method, url, body, content_type, headers=()):
+        environ = {
+            'REQUEST_METHOD': method, 'PATH_INFO': url, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'CONTENT_TYPE': content_type, 'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body), 'wsgi.url_scheme': 'http', 'wsgi.errors': io.StringIO(),
+            **{f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers},
+        }
+        statuses = []
+        response = handler(environ, lambda status, response_headers: statuses.append(status))
+        content = b''.join(response)
+        response.close()
+        if not statuses[0].startswith('2'):
+            raise RuntimeError(f"{method} {url}: {statuses[0]} {content[:200]!r}")
+        return json.loads(content)
+
+    def upload(self, handler, form, chunks, checksums, latencies):
+        """
+        Upload one file chunk by chunk and return the upload id
+        """
+        created = self.request(
+            handler, 'POST', reverse('uploads_api', args=[form.pk]),
+            json.dumps({'component_key': 'file', 'filename': 'data.bin', 'size': sum(map(len, chunks))}).encode(),
+            'application/json',
+        )
+        offset = 0
+        for chunk, checksum in zip(chunks, checksums):
+            start = time.perf_counter()
+            offset = self.request(
+                handler, 'PATCH', created['url'], chunk, 'application/offset+octet-stream',
+                [('Upload-Offset', str(offset)), ('Upload-Checksum', checksum)],
+            )['offset']
+            latencies.append(time.perf_counter() - start)
+        return created['id']
@@ -0,0 +1,72 @@
+"""
+Benchmark webhook delivery from the outbox to a local stub receiver.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from formbuilder.analytics import ingest_submissions
+from formbuilder.models import Form, OutboxEvent, WebhookEndpoint
+from formbuilder.webhooks import StubReceiver, deliver_outbox
+
+
+class Command(BaseCommand):
+    help = "Report the cost of queueing webhook events and delivery throughput in events per second"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=5000, help="Submissions stored per run")
+        parser.add_argument('--endpoints', type=int, default=4, help="Subscribed endpoints")
+        parser.add_argument('--batch-sizes', default='1,10,100', help="Comma-separated events per request")
+        parser.add_argument('--concurrency', type=int, default=32, help="Requests in flight")
+        parser.add_argument('--delay', type=float, default=0.005, help="Seconds the receiver takes per request")
+        parser.add_argument('--failure-rate', type=float, default=0.0, help="Share of requests answered with 503")
+
+    def handle(self, *args, **options):
+        if OutboxEvent.objects.pending().exists():
+            # The worker would deliver them along with the benchmark's events
+            raise CommandError("The outbox holds undelivered events, run this on a database without them")
+        form = Form.objects.create(name='Webhook benchmark', schema={'form': {'children': [{'key': 'n'}]}})
+        records = [{'n': i} for i in range(options['events'])]
+        try:
+            start = time.perf_counter()
+            self.ingest(form, records)
+            baseline = time.perf_counter() - start
+
+            for batch_size in map(int, options['batch_sizes'].split(',')):
+                failures = int(options['events'] * options['endpoints'] / batch_size * options['failure_rate'])
+                with StubReceiver(responses=[503] * failures, delay=options['delay']) as receiver:
+                    endpoints = [
+                        WebhookEndpoint.objects.create(url=f"{receiver.url}{i}/", form=form)
+                        for i in range(options['endpoints'])
+                    ]
+                    start = time.perf_counter()
+                    self.ingest(form, records)
+                    queueing = time.perf_counter() - start
+
+                    start = time.perf_counter()
+                    worker = deliver_outbox({
+                        'BATCH_SIZE': batch_size, 'CONCURRENCY': options['concurrency'],
+                        'CONNECTIONS_PER_HOST': options['concurrency'], 'BACKOFF_BASE': 0,
+                    })
+                    elapsed = time.perf_counter() - start
+                    received = len({event['id'] for event in receiver.events})
+                    self.stdout.write(
+                        f"Batches of {batch_size}: {worker.delivered / elapsed:.0f} events/s "
+                        f"({worker.delivered} events to {len(endpoints)} endpoint(s) in {elapsed:.2f} s, "
+                        f"{receiver.requests} requests over {receiver.connections} connections, "
+                        f"{worker.failed} failed deliveries retried); storing the submissions took "
+                        f"{queueing / baseline:.2f}x as long as without webhooks"
+                    )
+                    if received != worker.delivered:
+                        self.stderr.write(f"  receiver got {received} distinct events")
+                    for endpoint in endpoints:
+                        endpoint.delete()
+        finally:
+            OutboxEvent.objects.filter(endpoint__form=form).delete()
+            WebhookEndpoint.objects.filter(form=form).delete()
+            Form.all_objects.filter(pk=form.pk).delete()
+
+    @staticmethod
+    def ingest(form, records, batch_size=100):
+        for i in range(0, len(records), batch_size):
+            ingest_submissions(form, records[i:i + batch_size])
@@ -0,0 +1,73 @@
+"""
+Benchmark the requests of a small workspace as other workspaces grow.
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from formbuilder import workspaces
+from formbuilder.models import Form, Workspace
+from formbuilder.views import FormsAPIView
+
+SCHEMA = {'form': {'children': [{'key': f'field{i}', 'type': 'RsInput'} for i in range(5)]}}
+
+
+class Command(BaseCommand):
+    help = "Report the list and quota latency of a small workspace while another one grows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forms', type=int, default=20, help="Forms of the small workspace")
+        parser.add_argument(
+            '--others', type=int, nargs='+', default=[0, 10000, 50000],
+            help="Forms of the large workspace at each step"
+        )
+        parser.add_argument('--requests', type=int, default=50, help="Requests per measurement")
+
+    def handle(self, *args, **options):
+        small = Workspace.objects.create(name='Benchmark small', slug=f'benchmark-small-{time.time_ns()}')
+        large = Workspace.objects.create(name='Benchmark large', slug=f'benchmark-large-{time.time_ns()}')
+        view = FormsAPIView.as_view()
+        factory = RequestFactory()
+        try:
+            Form.objects.bulk_create(
+                Form(workspace=small, name=f'Workspace benchmark {i}', schema=SCHEMA) for i in range(options['forms'])
+            )
+            created = 0
+            for others in options['others']:
+                for offset in range(created, others, 10000):
+                    Form.objects.bulk_create(
+                        Form(workspace=large, name=f'Workspace benchmark {i}', schema=SCHEMA)
+                        for i in range(offset, min(others, offset + 10000))
+                    )
+                created = max(created, others)
+
+                with workspaces.activate(small):
+                    listed = self.median(lambda: view(factory.get('/formbuilder/api/forms/')), options['requests'])
+                    small_count = self.median(
+                        lambda: workspaces.remaining_quota(small, 'forms', Form.objects), options['requests']
+                    )
+                with workspaces.activate(large):
+                    large_count = self.median(
+                        lambda: workspaces.remaining_quota(large, 'forms', Form.objects), options['requests']
+                    )
+                self.stdout.write(
+                    f"{created} forms in the large workspace: small list {listed * 1000:.2f} ms, "
+                    f"small quota count {small_count * 1000:.2f} ms, large quota count {large_count * 1000:.2f} ms"
+                )
+
+            with workspaces.activate(small):
+                self.stdout.write("Plan of the small workspace's list:")
+                self.stdout.write(Form.objects.select_related('schema_blob').explain())
+        finally:
+            Form.all_objects.filter(workspace__in=[small, large]).delete()
+            Workspace.objects.filter(pk__in=[small.pk, large.pk]).delete()
+
+    def median(self, function, requests):
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings)
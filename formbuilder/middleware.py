@@ -0,0 +1,117 @@
+"""
+Middleware for the formbuilder app.
+"""
+import os
+import re
+
+from django.conf import settings as django_settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from whitenoise.middleware import WhiteNoiseMiddleware as BaseWhiteNoiseMiddleware
+from whitenoise.string_utils import ensure_leading_trailing_slash
+
+from .compression import compress, compress_async_stream, compress_stream, negotiate_encoding
+
+
+# Snapshot names carry a content hash, e.g. forms/12/schema.3f2a9c0d1e4b5a6f.json
+FINGERPRINTED_SNAPSHOT_RE = re.compile(r'\.[0-9a-f]{16}\.json$')
+
+
+class WhiteNoiseMiddleware(BaseWhiteNoiseMiddleware):
+    """
+    WhiteNoise middleware that also serves published form snapshots.
+
+    Static files are indexed once at startup, but snapshots are written while
+    the server is running. Requests below ``FORMBUILDER_PUBLISH_URL`` that
+    are not indexed yet are looked up on disk and added to the index on the
+    first hit, and dropped from it once deleted (possibly by another
+    process). Snapshots are fingerprinted, so they are served as immutable.
+    """
+
+    def __init__(self, get_response=None, settings=django_settings):
+        super().__init__(get_response, settings=settings)
+        self.publish_prefix = ensure_leading_trailing_slash(settings.FORMBUILDER_PUBLISH_URL)
+        publish_root = os.path.abspath(settings.FORMBUILDER_PUBLISH_ROOT)
+        self.publish_root = publish_root.rstrip(os.path.sep) + os.path.sep
+        self.directories.append((self.publish_root, self.publish_prefix))
+
+    def __call__(self, request):
+        path = request.path_info
+        if path.startswith(self.publish_prefix):
+            if path not in self.files:
+                static_file = self.find_file(path)
+                if static_file is not None:
+                    self.files[path] = static_file
+            elif not os.path.exists(self.publish_root + path[len(self.publish_prefix):]):
+                # The form was deleted
+                del self.files[path]
+        return super().__call__(request)
+
+    def immutable_file_test(self, path, url):
+        if url.startswith(self.publish_prefix):
+            return bool(FINGERPRINTED_SNAPSHOT_RE.search(url))
+        return super().immutable_file_test(path, url)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Compress responses with the best encoding the client accepts.
+
+    Works like Django's GZipMiddleware, but negotiates brotli and zstd when
+    they are installed, skips bodies smaller than
+    ``FORMBUILDER_COMPRESS_MIN_SIZE`` and compresses streaming responses
+    chunk by chunk, flushing each one. Static files never reach this
+    middleware because WhiteNoise serves its own precompressed variants.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(django_settings, 'FORMBUILDER_COMPRESS_MIN_SIZE', 1024)
+        self.encodings = getattr(django_settings, 'FORMBUILDER_COMPRESS_ENCODINGS', ['br', 'zstd', 'gzip'])
+        self.levels = getattr(django_settings, 'FORMBUILDER_COMPRESS_LEVELS', {})
+
+    def process_response(self, request, response):
+        # It's not worth attempting to compress really short responses
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        # Avoid compressing twice
+        if response.has_header('Content-Encoding'):
+            return response
+
+        # Event streams are long-lived and made of tiny events: compressing
+        # them gains little and defeats proxies that watch for them
+        if response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), self.encodings)
+        if encoding is None:
+            return response
+        level = self.levels.get(encoding)
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compress_async_stream(response.streaming_content, encoding, level)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, encoding, level)
+            # Delete the `Content-Length` header for streaming content, because
+            # we won't know the compressed size until we stream it
+            del response.headers['Content-Length']
+        else:
+            compressed_content = compress(response.content, encoding, level)
+            # Return the uncompressed content if compression didn't help
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers['Content-Length'] = str(len(response.content))
+
+        # The ETag describes the uncompressed representation, so it can only
+        # be a weak validator for the compressed one
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+
+        return response
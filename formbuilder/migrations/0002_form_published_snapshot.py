@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 05:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formbuilder', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='form',
+            name='published_at',
+            field=models.DateTimeField(blank=True, help_text='When the form was last published', null=True),
+        ),
+        migrations.AddField(
+            model_name='form',
+            name='published_snapshot',
+            field=models.CharField(blank=True, default='', help_text='Path of the published schema snapshot, relative to the publish root', max_length=255),
+        ),
+    ]
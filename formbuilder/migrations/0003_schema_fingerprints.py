@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-19 05:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formbuilder', '0002_form_published_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchemaBlob',
+            fields=[
+                ('fingerprint', models.CharField(help_text='Exact schema fingerprint', max_length=64, primary_key=True, serialize=False)),
+                ('schema', models.JSONField(help_text='Form schema in JSON format')),
+            ],
+            options={
+                'verbose_name': 'Schema Blob',
+                'verbose_name_plural': 'Schema Blobs',
+            },
+        ),
+        migrations.AddField(
+            model_name='form',
+            name='minhash',
+            field=models.JSONField(blank=True, default=list, editable=False, help_text='MinHash signature of the schema components, for near-duplicate detection'),
+        ),
+        migrations.AddField(
+            model_name='form',
+            name='schema_fingerprint',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='Hash of the canonical schema JSON, identical for identical schemas', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='form',
+            name='schema',
+            field=models.JSONField(blank=True, help_text='Form schema in JSON format (empty when stored in a shared schema blob)', null=True),
+        ),
+        migrations.AddField(
+            model_name='form',
+            name='schema_blob',
+            field=models.ForeignKey(blank=True, editable=False, help_text='Shared schema, when schema deduplication is enabled', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='forms', to='formbuilder.schemablob'),
+        ),
+        migrations.CreateModel(
+            name='SchemaBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.CharField(db_index=True, help_text='Band number followed by the band hash', max_length=18)),
+                ('form', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='formbuilder.form')),
+            ],
+            options={
+                'verbose_name': 'Schema Bucket',
+                'verbose_name_plural': 'Schema Buckets',
+            },
+        ),
+    ]
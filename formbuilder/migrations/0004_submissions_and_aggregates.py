@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-19 05:50
+
+import django.db.models.deletion
+import django_extensions.db.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formbuilder', '0003_schema_fingerprints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FormAggregate',
+            fields=[
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('form', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='aggregate', serialize=False, to='formbuilder.form')),
+                ('submission_count', models.PositiveIntegerField(default=0)),
+                ('fields', models.JSONField(default=dict, help_text='Mergeable statistics per field key')),
+            ],
+            options={
+                'verbose_name': 'Form Aggregate',
+                'verbose_name_plural': 'Form Aggregates',
+            },
+        ),
+        migrations.CreateModel(
+            name='Submission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('data', models.JSONField(help_text='Submitted values keyed by component key')),
+                ('form', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submissions', to='formbuilder.form')),
+            ],
+            options={
+                'verbose_name': 'Submission',
+                'verbose_name_plural': 'Submissions',
+                'ordering': ['-created'],
+                'indexes': [models.Index(fields=['form', '-created'], name='formbuilder_form_id_bc3add_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Converts the submission table to a PostgreSQL partitioned table.
+
+from django.db import migrations
+
+
+def partition_submissions(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    # The primary key of a partitioned table must include the partition key;
+    # Django keeps treating `id` as the primary key, which stays unique
+    # because it is generated from a single identity sequence.
+    schema_editor.execute("""
+        CREATE TABLE formbuilder_submission_partitioned (
+            id bigint GENERATED BY DEFAULT AS IDENTITY,
+            created timestamp with time zone NOT NULL,
+            modified timestamp with time zone NOT NULL,
+            data jsonb NOT NULL,
+            form_id bigint NOT NULL
+                REFERENCES formbuilder_form (id) DEFERRABLE INITIALLY DEFERRED,
+            PRIMARY KEY (id, created)
+        ) PARTITION BY RANGE (created)
+    """)
+    schema_editor.execute(
+        "CREATE TABLE formbuilder_submission_default "
+        "PARTITION OF formbuilder_submission_partitioned DEFAULT"
+    )
+    schema_editor.execute("""
+        INSERT INTO formbuilder_submission_partitioned (id, created, modified, data, form_id)
+        SELECT id, created, modified, data, form_id FROM formbuilder_submission
+    """)
+    schema_editor.execute("""
+        SELECT setval(
+            pg_get_serial_sequence('formbuilder_submission_partitioned', 'id'),
+            COALESCE((SELECT MAX(id) FROM formbuilder_submission_partitioned), 0) + 1,
+            false
+        )
+    """)
+    schema_editor.execute("DROP TABLE formbuilder_submission")
+    schema_editor.execute("ALTER TABLE formbuilder_submission_partitioned RENAME TO formbuilder_submission")
+    schema_editor.execute(
+        "CREATE INDEX formbuilder_form_id_bc3add_idx ON formbuilder_submission (form_id, created DESC)"
+    )
+    schema_editor.execute("CREATE INDEX formbuilder_submission_form_id_idx ON formbuilder_submission (form_id)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formbuilder', '0004_submissions_and_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_submissions, migrations.RunPython.noop),
+    ]
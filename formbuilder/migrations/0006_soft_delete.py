@@ -0,0 +1,22 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formbuilder', '0005_partition_submissions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='form',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='When the form was deleted; kept as a tombstone until purged', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='form',
+            index=models.Index(fields=['modified'], name='formbuilder_modifie_f9f546_idx'),
+        ),
+    ]
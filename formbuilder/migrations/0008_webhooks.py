@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:49
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django_extensions.db.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formbuilder', '0007_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEndpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('url', models.URLField(max_length=1000)),
+                ('secret', models.CharField(blank=True, help_text='Key of the HMAC signature of each request', max_length=255)),
+                ('events', models.JSONField(blank=True, default=list, help_text='Events to send, all when empty: form.created, form.updated, submission.created')),
+                ('is_active', models.BooleanField(default=True)),
+                ('form', models.ForeignKey(blank=True, help_text='Only send events of this form', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='webhook_endpoints', to='formbuilder.form')),
+            ],
+            options={
+                'verbose_name': 'Webhook Endpoint',
+                'verbose_name_plural': 'Webhook Endpoints',
+            },
+        ),
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(max_length=64)),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created', models.DateTimeField()),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(help_text='Due time of the next attempt, or end of the current lease')),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('dead_at', models.DateTimeField(blank=True, help_text='When the event was given up on', null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('endpoint', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outbox', to='formbuilder.webhookendpoint')),
+            ],
+            options={
+                'verbose_name': 'Outbox Event',
+                'verbose_name_plural': 'Outbox Events',
+                'indexes': [models.Index(condition=models.Q(('dead_at__isnull', True), ('delivered_at__isnull', True)), fields=['next_attempt_at'], name='formbuilder_outbox_due'), models.Index(fields=['delivered_at'], name='formbuilder_outbox_delivered')],
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.6 on 2026-10-19 06:58
+
+import django.db.models.deletion
+import django_extensions.db.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formbuilder', '0008_webhooks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Fragment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('version', models.PositiveIntegerField(default=0, editable=False, help_text='Latest version')),
+            ],
+            options={
+                'verbose_name': 'Fragment',
+                'verbose_name_plural': 'Fragments',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='form',
+            name='fragment_refs',
+            field=models.JSONField(blank=True, default=list, editable=False, help_text='[fragment id, version or null] of the shared fragments the schema references'),
+        ),
+        migrations.CreateModel(
+            name='FragmentReference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(blank=True, help_text='Pinned version, empty to follow the latest', null=True)),
+                ('form', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fragment_references', to='formbuilder.form')),
+                ('fragment', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='references', to='formbuilder.fragment')),
+            ],
+            options={
+                'verbose_name': 'Fragment Reference',
+                'verbose_name_plural': 'Fragment References',
+                'indexes': [models.Index(fields=['fragment', 'version'], name='formbuilder_fragmen_f86a8d_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='FragmentVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('components', models.JSONField(help_text='Components the references to this version stand for')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('fragment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='formbuilder.fragment')),
+            ],
+            options={
+                'verbose_name': 'Fragment Version',
+                'verbose_name_plural': 'Fragment Versions',
+                'constraints': [models.UniqueConstraint(fields=('fragment', 'version'), name='formbuilder_fragment_version_unique')],
+            },
+        ),
+    ]
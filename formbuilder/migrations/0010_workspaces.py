@@ -0,0 +1,112 @@
+# Generated by Django 5.2.6 on 2026-10-19 07:08
+
+import django.db.models.deletion
+import django_extensions.db.fields
+import formbuilder.workspaces
+from django.conf import settings
+from django.db import migrations, models
+
+# Existing rows are moved into the default workspace before the columns
+# become required
+
+
+def create_default_workspace(apps, schema_editor):
+    # Use the database being migrated, not the one the router picks
+    db = schema_editor.connection.alias
+    Workspace = apps.get_model('formbuilder', 'Workspace')
+    slug = getattr(settings, 'FORMBUILDER_WORKSPACES', {}).get('DEFAULT', 'default')
+    workspace, _ = Workspace.objects.using(db).get_or_create(slug=slug, defaults={'name': slug.title()})
+    for model in ('Form', 'Fragment', 'WebhookEndpoint'):
+        apps.get_model('formbuilder', model).objects.using(db).filter(workspace__isnull=True).update(workspace=workspace)
+    if schema_editor.connection.vendor == 'postgresql':
+        # Check the new foreign keys now: PostgreSQL cannot alter a table
+        # with pending deferred constraint checks in the same transaction
+        schema_editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formbuilder', '0009_fragments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Workspace',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('name', models.CharField(max_length=255)),
+                ('slug', models.SlugField(help_text='Sent in the X-Formbuilder-Workspace header', unique=True)),
+                ('max_forms', models.PositiveIntegerField(blank=True, help_text="Quota of forms, empty for FORMBUILDER_WORKSPACES['MAX_FORMS']", null=True)),
+                ('max_fragments', models.PositiveIntegerField(blank=True, help_text="Quota of fragments, empty for FORMBUILDER_WORKSPACES['MAX_FRAGMENTS']", null=True)),
+            ],
+            options={
+                'verbose_name': 'Workspace',
+                'verbose_name_plural': 'Workspaces',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='form',
+            name='formbuilder_modifie_f9f546_idx',
+        ),
+        migrations.AlterField(
+            model_name='form',
+            name='schema_fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Hash of the canonical schema JSON, identical for identical schemas', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='fragment',
+            name='name',
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AddField(
+            model_name='form',
+            name='workspace',
+            field=models.ForeignKey(db_index=False, null=True, help_text='Workspace owning the form', on_delete=django.db.models.deletion.PROTECT, related_name='forms', to='formbuilder.workspace'),
+        ),
+        migrations.AddField(
+            model_name='fragment',
+            name='workspace',
+            field=models.ForeignKey(db_index=False, null=True, help_text='Workspace owning the fragment', on_delete=django.db.models.deletion.PROTECT, related_name='fragments', to='formbuilder.workspace'),
+        ),
+        migrations.AddField(
+            model_name='webhookendpoint',
+            name='workspace',
+            field=models.ForeignKey(null=True, help_text='Only send events of this workspace', on_delete=django.db.models.deletion.CASCADE, related_name='webhook_endpoints', to='formbuilder.workspace'),
+        ),
+        migrations.RunPython(create_default_workspace, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='form',
+            name='workspace',
+            field=models.ForeignKey(db_index=False, default=formbuilder.workspaces.default_workspace_id, help_text='Workspace owning the form', on_delete=django.db.models.deletion.PROTECT, related_name='forms', to='formbuilder.workspace'),
+        ),
+        migrations.AlterField(
+            model_name='fragment',
+            name='workspace',
+            field=models.ForeignKey(db_index=False, default=formbuilder.workspaces.default_workspace_id, help_text='Workspace owning the fragment', on_delete=django.db.models.deletion.PROTECT, related_name='fragments', to='formbuilder.workspace'),
+        ),
+        migrations.AlterField(
+            model_name='webhookendpoint',
+            name='workspace',
+            field=models.ForeignKey(default=formbuilder.workspaces.default_workspace_id, help_text='Only send events of this workspace', on_delete=django.db.models.deletion.CASCADE, related_name='webhook_endpoints', to='formbuilder.workspace'),
+        ),
+        migrations.AddIndex(
+            model_name='form',
+            index=models.Index(fields=['workspace', '-created'], name='formbuilder_form_ws_created'),
+        ),
+        migrations.AddIndex(
+            model_name='form',
+            index=models.Index(fields=['workspace', 'modified'], name='formbuilder_form_ws_modified'),
+        ),
+        migrations.AddIndex(
+            model_name='form',
+            index=models.Index(fields=['workspace', 'schema_fingerprint'], name='formbuilder_form_ws_fprint'),
+        ),
+        migrations.AddConstraint(
+            model_name='fragment',
+            constraint=models.UniqueConstraint(fields=('workspace', 'name'), name='formbuilder_fragment_name_unique'),
+        ),
+    ]
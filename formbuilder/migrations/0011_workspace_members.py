@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-19 07:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('formbuilder', '0010_workspaces'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workspace',
+            name='members',
+            field=models.ManyToManyField(blank=True, help_text='Users allowed to act in the workspace, besides superusers', related_name='formbuilder_workspaces', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
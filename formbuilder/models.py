@@ -1,33 +1,279 @@
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.utils import timezone
 from django_extensions.db.models import TimeStampedModel
 import json
+import uuid
+
+from .cache import form_cache
+from .events import form_version, publish_form_changed, publish_form_deleted
+from .fragments import check_references, find_references, resolve_form, update_references
+from .fingerprint import find_duplicates, lsh_buckets, minhash_signature, schema_fingerprint, schema_shingles
+from .publishing import delete_snapshots, get_published_url, unpublish_form
+from .schema import build_component_index, is_legacy_schema, normalize_schema
+from .webhooks import invalidate_endpoints
+from .workspaces import TenantManager, cache_key, default_workspace_id, invalidate_workspace
+
+
+class Workspace(TimeStampedModel):
+    """
+    A tenant: the team owning a set of forms, fragments and webhook
+    endpoints (see formbuilder.workspaces)
+    """
+    name = models.CharField(max_length=255)
+    slug = models.SlugField(unique=True, help_text="Sent in the X-Formbuilder-Workspace header")
+    members = models.ManyToManyField(
+        settings.AUTH_USER_MODEL, blank=True, related_name='formbuilder_workspaces',
+        help_text="Users allowed to act in the workspace, besides superusers"
+    )
+    max_forms = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Quota of forms, empty for FORMBUILDER_WORKSPACES['MAX_FORMS']"
+    )
+    max_fragments = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Quota of fragments, empty for FORMBUILDER_WORKSPACES['MAX_FRAGMENTS']"
+    )
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = "Workspace"
+        verbose_name_plural = "Workspaces"
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            # Under its previous slug as well, if it changed
+            previous = type(self).objects.filter(pk=self.pk).values_list('slug', flat=True).first() if self.pk else None
+            super().save(*args, **kwargs)
+            for slug in {previous, self.slug} - {None}:
+                invalidate_workspace(slug)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            invalidate_workspace(self.slug)
+        return result
+
+
+class SchemaBlob(models.Model):
+    """
+    A schema stored once and shared by every form with identical content,
+    used when FORMBUILDER_DEDUPLICATE_SCHEMAS is enabled
+    """
+    fingerprint = models.CharField(max_length=64, primary_key=True, help_text="Exact schema fingerprint")
+    schema = models.JSONField(help_text="Form schema in JSON format")
+
+    class Meta:
+        verbose_name = "Schema Blob"
+        verbose_name_plural = "Schema Blobs"
+
+    def __str__(self):
+        return self.fingerprint
+
+
+class FormQuerySet(models.QuerySet):
+
+    def alive(self):
+        return self.filter(deleted_at__isnull=True)
+
+    def deleted(self):
+        return self.filter(deleted_at__isnull=False)
+
+    # Caches derived from the schema (component index, resolved schema) are
+    # keyed on `modified`, which only save() sets: bump it on bulk writes of
+    # the schema as well
+
+    def update(self, **kwargs):
+        if {'schema', 'schema_blob'} & kwargs.keys():
+            kwargs.setdefault('modified', timezone.now())
+        return super().update(**kwargs)
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        if {'schema', 'schema_blob'} & set(fields) and 'modified' not in fields:
+            objs, now = list(objs), timezone.now()
+            for obj in objs:
+                obj.modified = now
+            fields = [*fields, 'modified']
+        return super().bulk_update(objs, fields, batch_size=batch_size)
+
+
+class FormManager(TenantManager.from_queryset(FormQuerySet)):
+    """
+    Manager excluding soft-deleted forms and those of other workspaces
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().alive()
 
 
 class Form(TimeStampedModel):
     """
     Model to store form schemas created by the form builder
+
+    Deleting a form only marks it deleted (see ``delete()``): ``objects``
+    excludes deleted forms, ``all_objects`` includes them. Both only see the
+    forms of the workspace bound to the current request.
     """
+    # Not indexed alone: the indexes below start with it
+    workspace = models.ForeignKey(
+        Workspace, on_delete=models.PROTECT, default=default_workspace_id, db_index=False,
+        related_name='forms', help_text="Workspace owning the form"
+    )
     name = models.CharField(max_length=255, help_text="Name of the form")
-    schema = models.JSONField(help_text="Form schema in JSON format")
+    schema = models.JSONField(
+        null=True, blank=True,
+        help_text="Form schema in JSON format (empty when stored in a shared schema blob)"
+    )
+    schema_blob = models.ForeignKey(
+        SchemaBlob, null=True, blank=True, editable=False, on_delete=models.PROTECT,
+        related_name='forms', help_text="Shared schema, when schema deduplication is enabled"
+    )
+    schema_fingerprint = models.CharField(
+        max_length=64, blank=True, default='', editable=False,
+        help_text="Hash of the canonical schema JSON, identical for identical schemas"
+    )
+    minhash = models.JSONField(
+        default=list, blank=True, editable=False,
+        help_text="MinHash signature of the schema components, for near-duplicate detection"
+    )
     is_active = models.BooleanField(default=True, help_text="Whether the form is active")
+    published_snapshot = models.CharField(
+        max_length=255, blank=True, default='',
+        help_text="Path of the published schema snapshot, relative to the publish root"
+    )
+    published_at = models.DateTimeField(null=True, blank=True, help_text="When the form was last published")
+    deleted_at = models.DateTimeField(
+        null=True, blank=True, editable=False,
+        help_text="When the form was deleted; kept as a tombstone until purged"
+    )
+    fragment_refs = models.JSONField(
+        default=list, blank=True, editable=False,
+        help_text="[fragment id, version or null] of the shared fragments the schema references"
+    )
+
+    objects = FormManager()
+    all_objects = TenantManager.from_queryset(FormQuerySet)()
 
     class Meta:
         ordering = ['-created']
         verbose_name = "Form"
         verbose_name_plural = "Forms"
+        indexes = [
+            # Lists, newest first
+            models.Index(fields=['workspace', '-created'], name='formbuilder_form_ws_created'),
+            # Delta feed: forms changed or deleted since a point in time
+            models.Index(fields=['workspace', 'modified'], name='formbuilder_form_ws_modified'),
+            # Exact duplicates
+            models.Index(fields=['workspace', 'schema_fingerprint'], name='formbuilder_form_ws_fprint'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        form = super().from_db(db, field_names, values)
+        # Remember the stored schema, so change events can carry a patch.
+        # Only a reference: schemas are replaced on update, not mutated.
+        if form.__dict__.get('schema') is not None and form.__dict__.get('modified') is not None:
+            form._loaded_schema = (form.schema, form_version(form))
+        return form
+
+    def save(self, *args, **kwargs):
+        """
+        Store the schema in the canonical layout and refresh its fingerprints
+        """
+        schema = self.get_schema()
+        if is_legacy_schema(schema):
+            schema = normalize_schema(schema)
+            self.schema = schema
+
+        fingerprint = schema_fingerprint(schema)
+        fingerprint_changed = fingerprint != self.schema_fingerprint
+        previous_refs = self.fragment_refs
+        if fingerprint_changed:
+            self.schema_fingerprint = fingerprint
+            self.minhash = minhash_signature(schema_shingles(schema))
+            self.fragment_refs = find_references(schema)
+            check_references(self.fragment_refs, self.workspace_id)
+
+        if getattr(settings, 'FORMBUILDER_DEDUPLICATE_SCHEMAS', False):
+            self.schema_blob, _ = SchemaBlob.objects.get_or_create(
+                fingerprint=fingerprint, defaults={'schema': schema}
+            )
+            self.schema = None
+        elif self.schema is None:
+            # Move a previously shared schema back inline
+            self.schema = schema
+            self.schema_blob = None
+
+        if fingerprint_changed and kwargs.get('update_fields') is not None:
+            # The buckets below describe the new schema: store it with them
+            kwargs['update_fields'] = {
+                *kwargs['update_fields'], 'schema', 'schema_blob', 'schema_fingerprint', 'minhash', 'fragment_refs',
+            }
+
+        self._component_index = None
+        # No savepoint when called inside a transaction (e.g. together with
+        # its webhook events): a failure here fails the caller's block anyway
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if fingerprint_changed:
+                self.buckets.all().delete()
+                SchemaBucket.objects.bulk_create(
+                    SchemaBucket(form=self, bucket=bucket) for bucket in lsh_buckets(self.minhash)
+                )
+                if previous_refs or self.fragment_refs:
+                    update_references(self, previous_refs)
+            transaction.on_commit(lambda: form_cache.invalidate(cache_key(self.workspace_id, self.pk)))
+
+        previous_schema, previous_version = getattr(self, '_loaded_schema', None) or (None, None)
+        if isinstance(previous_schema, str):
+            previous_schema = json.loads(previous_schema)
+        transaction.on_commit(lambda: publish_form_changed(self, previous_schema, previous_version))
+        self._loaded_schema = (self.schema, form_version(self)) if self.schema is not None else None
+
+    def delete(self, *args, **kwargs):
+        """
+        Soft-delete the form.
+
+        The row stays as a tombstone, so clients syncing with the delta feed
+        learn about the deletion. Its submissions and other dependent rows
+        are removed later in small batches by ``purge_deleted_forms``.
+        """
+        pk, key = self.pk, cache_key(self.workspace_id, self.pk)
+        now = timezone.now()
+        with transaction.atomic():
+            if self.published_snapshot:
+                unpublish_form(self)
+            deleted = type(self).objects.filter(pk=pk).update(deleted_at=now, modified=now)
+            if deleted:
+                transaction.on_commit(lambda: form_cache.invalidate(key))
+                transaction.on_commit(lambda: publish_form_deleted(pk))
+                transaction.on_commit(lambda: delete_snapshots(pk))
+        self.deleted_at = self.modified = now
+        return deleted, {self._meta.label: deleted}
+
     def get_schema(self):
         """
         Return the schema as a Python object
         """
+        if self.schema is None and self.schema_blob_id:
+            return self.schema_blob.schema
         if isinstance(self.schema, str):
             return json.loads(self.schema)
         return self.schema
 
+    def get_resolved_schema(self):
+        """
+        Return the schema with its shared fragment references replaced by
+        the fragments' components
+        """
+        return resolve_form(self)
+
     def set_schema(self, schema_data):
         """
         Set the schema from a Python object
@@ -37,42 +283,293 @@ class Form(TimeStampedModel):
         else:
             self.schema = json.dumps(schema_data)
 
-    def get_component_count(self):
+    def get_published_url(self):
         """
-        Get the number of components in the form schema
-        Supports both old format (components directly in schema) and new format (components in form.children)
+        Return the URL of the published schema snapshot, or '' if unpublished
         """
-        schema = self.get_schema()
-        if not schema:
-            return 0
+        return get_published_url(self.published_snapshot)
 
-        # New format: components are in form.children
-        if 'form' in schema and 'children' in schema['form']:
-            return len(schema['form']['children'])
+    def find_duplicates(self, threshold=0.8):
+        """
+        Get (form, similarity) pairs of forms with identical or similar schemas
+        """
+        return find_duplicates(self, threshold)
 
-        # Old format: components are directly in schema
-        if 'components' in schema:
-            return len(schema['components'])
+    def get_component_index(self):
+        """
+        Get the flat index of all components, including nested ones
+
+        The index is built once per saved schema version and shared through
+        the cache, keyed by the form's modification time (see
+        ``FormQuerySet.update``).
+        """
+        index = getattr(self, '_component_index', None)
+        if index is not None:
+            return index
+
+        if self.pk and self.modified:
+            key = f"formbuilder:component_index:{cache_key(self.workspace_id, self.pk)}:{self.modified.timestamp()}"
+            index = cache.get(key)
+            if index is None:
+                index = self._build_component_index()
+                cache.set(key, index)
+        else:
+            index = self._build_component_index()
 
-        return 0
+        self._component_index = index
+        return index
+
+    def _build_component_index(self):
+        # Rows not yet converted by normalize_schemas are read in the legacy
+        # layout
+        return build_component_index(normalize_schema(self.get_resolved_schema()))
+
+    def get_component_count(self):
+        """
+        Get the number of components in the form schema, including nested ones
+        """
+        return len(self.get_component_index())
 
     def get_component_types(self):
         """
         Get a list of component types used in the form
-        Supports both old format (components directly in schema) and new format (components in form.children)
         """
-        schema = self.get_schema()
-        if not schema:
-            return []
+        return list(set(entry['type'] for entry in self.get_component_index()))
 
-        # New format: components are in form.children
-        if 'form' in schema and 'children' in schema['form']:
-            return list(set(component.get('type', 'unknown') for component in schema['form']['children']))
 
-        # Old format: components are directly in schema
-        if 'components' in schema:
-            return list(set(component.get('type', 'unknown') for component in schema['components']))
+class SchemaBucket(models.Model):
+    """
+    LSH bucket of a form's MinHash signature
 
-        return []
+    Forms sharing a bucket are near-duplicate candidates.
+    """
+    form = models.ForeignKey(Form, on_delete=models.CASCADE, related_name='buckets')
+    bucket = models.CharField(max_length=18, db_index=True, help_text="Band number followed by the band hash")
 
+    class Meta:
+        verbose_name = "Schema Bucket"
+        verbose_name_plural = "Schema Buckets"
 
+    def __str__(self):
+        return f"{self.form_id}:{self.bucket}"
+
+
+class Submission(TimeStampedModel):
+    """
+    Model to store data submitted through a form
+    """
+    form = models.ForeignKey(Form, on_delete=models.CASCADE, related_name='submissions')
+    data = models.JSONField(help_text="Submitted values keyed by component key")
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = "Submission"
+        verbose_name_plural = "Submissions"
+        indexes = [
+            models.Index(fields=['form', '-created']),
+        ]
+
+    def __str__(self):
+        return f"Submission {self.pk} to {self.form_id}"
+
+
+class FormAggregate(TimeStampedModel):
+    """
+    Incrementally maintained per-field statistics of a form's submissions
+
+    See formbuilder.analytics for the layout of ``fields``.
+    """
+    form = models.OneToOneField(Form, on_delete=models.CASCADE, primary_key=True, related_name='aggregate')
+    submission_count = models.PositiveIntegerField(default=0)
+    fields = models.JSONField(default=dict, help_text="Mergeable statistics per field key")
+
+    class Meta:
+        verbose_name = "Form Aggregate"
+        verbose_name_plural = "Form Aggregates"
+
+    def __str__(self):
+        return f"Aggregate of {self.form_id}"
+
+
+class UploadManager(TenantManager):
+    tenant_field = 'form__workspace'
+
+
+class Upload(TimeStampedModel):
+    """
+    A file uploaded in chunks for a file-upload component of a form
+
+    The file is written in place below ``FORMBUILDER_UPLOADS['ROOT']``;
+    ``offset`` is the number of bytes received and verified so far. Once
+    complete, the upload is linked to the submission that references its id
+    under ``component_key`` (see formbuilder.uploads).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    form = models.ForeignKey(Form, on_delete=models.CASCADE, related_name='uploads')
+    # The submission table is partitioned on PostgreSQL and its id alone is
+    # not a unique key there, so no database constraint
+    submission = models.ForeignKey(
+        Submission, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False, related_name='uploads'
+    )
+    component_key = models.CharField(max_length=255, help_text="Key of the file-upload component")
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=255, blank=True)
+    size = models.PositiveBigIntegerField(help_text="Total size in bytes")
+    offset = models.PositiveBigIntegerField(default=0, help_text="Bytes received")
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    objects = UploadManager()
+
+    class Meta:
+        verbose_name = "Upload"
+        verbose_name_plural = "Uploads"
+        indexes = [
+            models.Index(fields=['modified']),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+
+class WebhookEndpoint(TimeStampedModel):
+    """
+    A URL notified of form and submission events (see formbuilder.webhooks)
+    """
+    EVENTS = ['form.created', 'form.updated', 'submission.created']
+
+    workspace = models.ForeignKey(
+        Workspace, on_delete=models.CASCADE, default=default_workspace_id, related_name='webhook_endpoints',
+        help_text="Only send events of this workspace"
+    )
+    url = models.URLField(max_length=1000)
+    secret = models.CharField(max_length=255, blank=True, help_text="Key of the HMAC signature of each request")
+    events = models.JSONField(default=list, blank=True, help_text=f"Events to send, all when empty: {', '.join(EVENTS)}")
+    form = models.ForeignKey(
+        Form, on_delete=models.CASCADE, null=True, blank=True, related_name='webhook_endpoints',
+        help_text="Only send events of this form"
+    )
+    is_active = models.BooleanField(default=True)
+
+    objects = TenantManager()
+
+    class Meta:
+        verbose_name = "Webhook Endpoint"
+        verbose_name_plural = "Webhook Endpoints"
+
+    def __str__(self):
+        return self.url
+
+    def save(self, *args, **kwargs):
+        if self.form_id is not None:
+            self.workspace_id = self.form.workspace_id
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            invalidate_endpoints(self.workspace_id)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            invalidate_endpoints(self.workspace_id)
+        return result
+
+
+class OutboxQuerySet(models.QuerySet):
+
+    def pending(self):
+        return self.filter(delivered_at__isnull=True, dead_at__isnull=True)
+
+
+class OutboxEvent(models.Model):
+    """
+    An event waiting to be delivered to a webhook endpoint, or delivered or
+    dead-lettered
+    """
+    endpoint = models.ForeignKey(WebhookEndpoint, on_delete=models.CASCADE, related_name='outbox')
+    event = models.CharField(max_length=64)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created = models.DateTimeField()
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(help_text="Due time of the next attempt, or end of the current lease")
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    dead_at = models.DateTimeField(null=True, blank=True, help_text="When the event was given up on")
+    last_error = models.TextField(blank=True)
+
+    objects = OutboxQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Outbox Event"
+        verbose_name_plural = "Outbox Events"
+        indexes = [
+            # The worker's poll: due events, oldest first
+            models.Index(
+                fields=['next_attempt_at'], name='formbuilder_outbox_due',
+                condition=models.Q(delivered_at__isnull=True, dead_at__isnull=True),
+            ),
+            models.Index(fields=['delivered_at'], name='formbuilder_outbox_delivered'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.pk} to {self.endpoint_id}"
+
+
+class Fragment(TimeStampedModel):
+    """
+    A block of components shared by many forms, in immutable versions
+    (see formbuilder.fragments)
+    """
+    # Not indexed alone: the unique constraint below starts with it
+    workspace = models.ForeignKey(
+        Workspace, on_delete=models.PROTECT, default=default_workspace_id, db_index=False,
+        related_name='fragments', help_text="Workspace owning the fragment"
+    )
+    name = models.CharField(max_length=255)
+    version = models.PositiveIntegerField(default=0, editable=False, help_text="Latest version")
+
+    objects = TenantManager()
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = "Fragment"
+        verbose_name_plural = "Fragments"
+        constraints = [
+            models.UniqueConstraint(fields=['workspace', 'name'], name='formbuilder_fragment_name_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class FragmentVersion(models.Model):
+    fragment = models.ForeignKey(Fragment, on_delete=models.CASCADE, related_name='versions')
+    version = models.PositiveIntegerField()
+    components = models.JSONField(help_text="Components the references to this version stand for")
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Fragment Version"
+        verbose_name_plural = "Fragment Versions"
+        constraints = [
+            models.UniqueConstraint(fields=['fragment', 'version'], name='formbuilder_fragment_version_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.fragment_id} v{self.version}"
+
+
+class FragmentReference(models.Model):
+    """
+    Reverse index of ``Form.fragment_refs``: the forms referencing a fragment
+    """
+    form = models.ForeignKey(Form, on_delete=models.CASCADE, related_name='fragment_references')
+    fragment = models.ForeignKey(Fragment, on_delete=models.PROTECT, related_name='references')
+    version = models.PositiveIntegerField(null=True, blank=True, help_text="Pinned version, empty to follow the latest")
+
+    class Meta:
+        verbose_name = "Fragment Reference"
+        verbose_name_plural = "Fragment References"
+        indexes = [
+            models.Index(fields=['fragment', 'version']),
+        ]
+
+    def __str__(self):
+        return f"{self.form_id} -> {self.fragment_id} v{self.version or 'latest'}"
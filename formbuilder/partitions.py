@@ -0,0 +1,177 @@
+"""
+Time-based partitioning of the submission table.
+
+On PostgreSQL, ``formbuilder_submission`` is a declaratively partitioned
+table: one partition per calendar month of ``created``, optionally split
+further by a hash of ``form_id`` (FORMBUILDER_SUBMISSION_HASH_PARTITIONS).
+Partitions are created ahead of time by ensure_partitions(), which runs
+after ``migrate`` and from the ``manage_partitions`` command; a default
+partition catches anything outside the created ranges. Retention drops
+whole monthly partitions instead of deleting rows.
+
+Other databases (SQLite in development and tests) keep a plain table;
+retention falls back to deleting old rows in bounded batches.
+"""
+import datetime
+import re
+
+from django.conf import settings
+from django.db import connection as default_connection, transaction
+from django.utils import timezone
+
+from .models import Submission
+
+
+TABLE = 'formbuilder_submission'
+PARTITION_RE = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+def is_partitioned(connection=None):
+    """
+    Return whether the submission table is partitioned on this connection
+    """
+    connection = connection or default_connection
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE relname = %s", [TABLE])
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def month_start(day):
+    """
+    Return the first day of the month of a date
+    """
+    return datetime.date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    """
+    Return the first day of the month ``months`` after the month of a date
+    """
+    index = day.year * 12 + day.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    """
+    Return the name of the partition holding the given month
+    """
+    return f"{TABLE}_p{month.year:04d}{month.month:02d}"
+
+
+def create_partition(month, connection=None):
+    """
+    Create the partition of a month (and its hash subpartitions) if missing.
+
+    Rows of that month already in the default partition are moved into the
+    new partition, since PostgreSQL refuses to attach a range that the
+    default partition has rows for. Must run inside a transaction.
+    """
+    connection = connection or default_connection
+    name = partition_name(month)
+    bounds = [month.isoformat(), add_months(month, 1).isoformat()]
+    hash_partitions = getattr(settings, 'FORMBUILDER_SUBMISSION_HASH_PARTITIONS', 0)
+    subpartitioning = ' PARTITION BY HASH (form_id)' if hash_partitions else ''
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+        if cursor.fetchone()[0]:
+            return name
+
+        cursor.execute(f"CREATE TEMPORARY TABLE {name}_moved (LIKE {TABLE}) ON COMMIT DROP")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {TABLE}_default WHERE created >= %s AND created < %s RETURNING *) "
+            f"INSERT INTO {name}_moved SELECT * FROM moved",
+            bounds,
+        )
+        cursor.execute(
+            f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s){subpartitioning}",
+            bounds,
+        )
+        for remainder in range(hash_partitions):
+            cursor.execute(
+                f"CREATE TABLE {name}_h{remainder} PARTITION OF {name} "
+                f"FOR VALUES WITH (MODULUS {hash_partitions}, REMAINDER {remainder})"
+            )
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {name}_moved")
+    return name
+
+
+def list_partitions(connection=None):
+    """
+    Return {month: partition name} of the existing monthly partitions
+    """
+    connection = connection or default_connection
+    if not is_partitioned(connection):
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+            "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+            "WHERE parent.relname = %s",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if match:
+            partitions[datetime.date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def ensure_partitions(months_ahead=None, today=None, connection=None):
+    """
+    Create the partitions of the current month and the next ``months_ahead``
+    months. Returns the names of the partitions that were checked.
+    """
+    connection = connection or default_connection
+    if not is_partitioned(connection):
+        return []
+    if months_ahead is None:
+        months_ahead = getattr(settings, 'FORMBUILDER_SUBMISSION_PARTITIONS_AHEAD', 3)
+    current = month_start(today or timezone.now().date())
+    with transaction.atomic(using=connection.alias):
+        return [create_partition(add_months(current, i), connection) for i in range(months_ahead + 1)]
+
+
+def purge_submissions(retention_months, today=None, batch_size=10000, connection=None):
+    """
+    Remove submissions older than ``retention_months`` whole months.
+
+    Partitioned tables drop the expired monthly partitions, which is a
+    metadata-only operation. Remaining expired rows (in the default
+    partition, or everywhere on other databases) are deleted in batches of
+    ``batch_size`` so no single statement holds locks for long. Returns a
+    description of what was removed.
+    """
+    connection = connection or default_connection
+    cutoff = add_months(month_start(today or timezone.now().date()), -retention_months)
+
+    if is_partitioned(connection):
+        dropped = []
+        for month, name in sorted(list_partitions(connection).items()):
+            if add_months(month, 1) <= cutoff:
+                with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                    cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+                    cursor.execute(f"DROP TABLE {name}")
+                dropped.append(name)
+        summary = f"dropped {len(dropped)} partition(s): {', '.join(dropped) or '-'}, "
+    else:
+        summary = ''
+
+    cutoff_time = datetime.datetime.combine(cutoff, datetime.time.min, tzinfo=datetime.timezone.utc)
+    deleted = 0
+    while True:
+        ids = list(
+            Submission.objects.using(connection.alias)
+            .filter(created__lt=cutoff_time)
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        deleted += Submission.objects.using(connection.alias).filter(pk__in=ids).delete()[0]
+    return f"{summary}deleted {deleted} submission(s)"
@@ -0,0 +1,272 @@
+"""
+Opt-in sampling profiler for individual production requests.
+
+A request is profiled when it carries a valid signed X-Formbuilder-Profile
+header (tokens are issued on the staff profiles page) or when it is picked
+by the sampling rate set on that page. While a profiled request runs, a
+background thread samples the request thread's stack every few
+milliseconds, and the SQL queries and cache operations of the request are
+recorded. The result is stored as JSON in ``logs/profiles/`` with the view
+name and form id, and can be downloaded as folded stacks for flamegraph
+tools (flamegraph.pl, speedscope).
+
+When FORMBUILDER_PROFILING['ENABLED'] is off, the middleware removes itself
+from the middleware chain, so disabled profiling costs nothing.
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import wraps
+from pathlib import Path
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache, caches
+from django.core.exceptions import MiddlewareNotUsed
+
+from .querycount import QueryRecorder
+
+
+DEFAULT_PROFILING = {
+    'ENABLED': False,
+    'INTERVAL': 0.005,  # seconds between stack samples
+    'MAX_DEPTH': 128,  # frames kept per sample
+    'TOKEN_MAX_AGE': 3600,  # seconds a signed header token stays valid
+    'RATE_REFRESH': 10,  # seconds between reads of the shared sampling rate
+}
+
+HEADER = 'HTTP_X_FORMBUILDER_PROFILE'
+TOKEN_SALT = 'formbuilder.profiler'
+SAMPLE_RATE_KEY = 'formbuilder:profiler:sample_rate'
+CACHE_METHODS = ['get', 'get_many', 'set', 'set_many', 'add', 'delete', 'delete_many', 'incr', 'decr', 'touch']
+PROFILE_NAME_RE = re.compile(r'^[\w.-]+\.json$')
+
+
+def get_config():
+    """
+    Return the profiling settings merged over the defaults
+    """
+    return {**DEFAULT_PROFILING, **getattr(settings, 'FORMBUILDER_PROFILING', {})}
+
+
+def get_profile_dir():
+    return Path(settings.BASE_DIR) / 'logs' / 'profiles'
+
+
+def make_token():
+    """
+    Return a signed token enabling profiling of requests that send it in
+    the X-Formbuilder-Profile header
+    """
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(uuid.uuid4().hex)
+
+
+def check_token(token, max_age):
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=max_age)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def get_sample_rate():
+    """
+    Return the fraction of requests profiled, as set on the profiles page
+    """
+    return cache.get(SAMPLE_RATE_KEY, 0.0)
+
+
+def set_sample_rate(rate):
+    cache.set(SAMPLE_RATE_KEY, max(0.0, min(1.0, rate)), None)
+
+
+class SamplingProfiler:
+    """
+    Sample the stack of one thread from a background thread
+    """
+
+    def __init__(self, interval, max_depth, thread_id=None):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='formbuilder-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}")
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[';'.join(stack)] += 1
+            self.samples += 1
+
+
+class CacheRecorder:
+    """
+    Record the operations on every configured cache made by this thread.
+
+    Django cache connections are per thread, so instance-level wrappers only
+    see the operations of the request being profiled.
+    """
+
+    def __init__(self):
+        self.operations = []
+        self._wrapped = []
+
+    def __enter__(self):
+        for alias in settings.CACHES:
+            backend = caches[alias]
+            for method in CACHE_METHODS:
+                setattr(backend, method, self._wrap(alias, method, getattr(backend, method)))
+            self._wrapped.append(backend)
+        return self
+
+    def __exit__(self, *exc_info):
+        for backend in self._wrapped:
+            for method in CACHE_METHODS:
+                backend.__dict__.pop(method, None)
+        self._wrapped = []
+
+    def _wrap(self, alias, method, function):
+        @wraps(function)
+        def recorded(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                self.operations.append({
+                    'cache': alias,
+                    'op': method,
+                    'key': repr(args[0]) if args else repr(kwargs.get('key')),
+                    'time': time.perf_counter() - start,
+                })
+            if method in ('get', 'get_many'):
+                self.operations[-1]['hit'] = bool(result) if method == 'get_many' else result is not None
+            return result
+        return recorded
+
+
+def save_profile(profile):
+    """
+    Write a profile to logs/profiles/ and return its file name
+    """
+    directory = get_profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    view = re.sub(r'[^\w.-]', '_', profile['view'] or 'unresolved')
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{view}-{profile['form_id'] or 'none'}-{uuid.uuid4().hex[:8]}.json"
+    (directory / name).write_text(json.dumps(profile))
+    return name
+
+
+def list_profiles():
+    """
+    Return the stored profiles, newest first, as (name, size, mtime)
+    """
+    directory = get_profile_dir()
+    if not directory.exists():
+        return []
+    entries = [(path.name, path.stat()) for path in directory.glob('*.json')]
+    return [
+        (name, stat.st_size, stat.st_mtime)
+        for name, stat in sorted(entries, key=lambda entry: entry[1].st_mtime, reverse=True)
+    ]
+
+
+def load_profile(name):
+    """
+    Return a stored profile, or None for an unknown or invalid name
+    """
+    if not PROFILE_NAME_RE.match(name):
+        return None
+    path = get_profile_dir() / name
+    if not path.is_file():
+        return None
+    return json.loads(path.read_text())
+
+
+def folded_stacks(profile):
+    """
+    Return the stacks of a profile in the folded format of flamegraph.pl
+    """
+    return ''.join(f"{stack} {count}\n" for stack, count in profile['stacks'].items())
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests selected by signed header or sampling rate
+    """
+
+    def __init__(self, get_response):
+        config = get_config()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.config = config
+        self.sample_rate = 0.0
+        self.rate_checked_at = float('-inf')
+
+    def should_profile(self, request):
+        token = request.META.get(HEADER)
+        if token:
+            return check_token(token, self.config['TOKEN_MAX_AGE'])
+        now = time.monotonic()
+        if now - self.rate_checked_at > self.config['RATE_REFRESH']:
+            self.sample_rate = get_sample_rate()
+            self.rate_checked_at = now
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        profiler = SamplingProfiler(self.config['INTERVAL'], self.config['MAX_DEPTH'])
+        start = time.perf_counter()
+        with QueryRecorder(explain_slower_than=None) as queries, CacheRecorder() as cache_ops:
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        profile = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'form_id': (match.kwargs.get('form_id') or match.kwargs.get('pk')) if match else None,
+            'status': response.status_code,
+            'duration': duration,
+            'started_at': time.time() - duration,
+            'pid': os.getpid(),
+            'interval': profiler.interval,
+            'samples': profiler.samples,
+            'stacks': dict(profiler.stacks),
+            'queries': [
+                {key: query[key] for key in ('alias', 'sql', 'rows', 'bytes', 'time')}
+                for query in queries.queries
+            ],
+            'cache': cache_ops.operations,
+        }
+        response['X-Formbuilder-Profile-Id'] = save_profile(profile)
+        return response
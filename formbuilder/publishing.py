@@ -0,0 +1,116 @@
+"""
+Publishing of form schemas as immutable static snapshots.
+
+A published snapshot is a content-hashed JSON file written below
+``FORMBUILDER_PUBLISH_ROOT`` together with precompressed gzip/brotli
+variants, so that WhiteNoise can serve it with far-future cache headers
+without going through Django views or the database.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+from whitenoise.compress import Compressor
+
+
+def get_publish_root():
+    """
+    Return the directory published snapshots are written to.
+    """
+    return Path(settings.FORMBUILDER_PUBLISH_ROOT)
+
+
+def get_published_url(snapshot_path):
+    """
+    Return the public URL of a snapshot path relative to the publish root.
+    """
+    if not snapshot_path:
+        return ''
+    return f"{settings.FORMBUILDER_PUBLISH_URL}{snapshot_path}"
+
+
+def build_snapshot(form):
+    """
+    Serialize a form into the bytes stored in its published snapshot.
+
+    The payload mirrors the detail response of the forms API. Keys are sorted
+    so the same schema always produces the same bytes, and therefore the
+    same fingerprint.
+    """
+    payload = {
+        'id': form.id,
+        'name': form.name,
+        'schema': form.get_resolved_schema() or {},
+        'is_active': form.is_active,
+    }
+    return json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def _write_atomic(path, data):
+    """
+    Write data and its precompressed variants to path.
+
+    Everything is staged in a temporary directory and the snapshot itself is
+    moved in last, so once it exists its variants do too, even if an earlier
+    attempt died half way.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(dir=path.parent, prefix='.tmp-'))
+    try:
+        staged = staging / path.name
+        staged.write_bytes(data)
+        for variant in Compressor(quiet=True).compress(str(staged)):
+            os.replace(variant, path.with_name(os.path.basename(variant)))
+        os.replace(staged, path)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def publish_form(form):
+    """
+    Write a fingerprinted, precompressed snapshot of the form and record it.
+
+    Returns the public URL of the snapshot. Publishing an unchanged form is a
+    no-op apart from refreshing ``published_at``.
+    """
+    data = build_snapshot(form)
+    fingerprint = hashlib.sha256(data).hexdigest()[:16]
+    snapshot_path = f"forms/{form.id}/schema.{fingerprint}.json"
+    full_path = get_publish_root() / snapshot_path
+
+    if not full_path.exists():
+        _write_atomic(full_path, data)
+
+    form.published_snapshot = snapshot_path
+    form.published_at = timezone.now()
+    # Avoid bumping `modified`: publishing does not change the form itself
+    type(form).objects.filter(pk=form.pk).update(
+        published_snapshot=form.published_snapshot,
+        published_at=form.published_at,
+    )
+    return get_published_url(snapshot_path)
+
+
+def unpublish_form(form):
+    """
+    Stop referencing the published snapshot of a form.
+
+    Snapshot files are left in place so caches holding the old URL keep
+    working until they expire. They are removed when the form is deleted
+    (``delete_snapshots``).
+    """
+    form.published_snapshot = ''
+    form.published_at = None
+    type(form).objects.filter(pk=form.pk).update(published_snapshot='', published_at=None)
+
+
+def delete_snapshots(form_id):
+    """
+    Remove every snapshot file of a form, so none is served any longer.
+    """
+    shutil.rmtree(get_publish_root() / 'forms' / str(form_id), ignore_errors=True)
@@ -0,0 +1,168 @@
+"""
+Query budgets for views: count queries, rows fetched and bytes loaded.
+
+QueryRecorder wraps the database connections (every alias, replicas
+included, unless given a list) while a block runs and records every query
+with its database, parameters and duration, and how many rows and bytes
+were fetched from its cursor. The test suite uses it to check that no view
+does more work as tables grow (the N+1 pattern, or loading whole tables),
+by comparing the counts of the same request at several table sizes.
+
+With ``explain_slower_than`` (milliseconds), or the
+FORMBUILDER_EXPLAIN_SLOW_QUERIES environment variable, the plans of slow
+queries are captured with EXPLAIN and written to ``logs/explain/``.
+"""
+import contextlib
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+
+def _value_size(value):
+    if isinstance(value, (str, bytes, bytearray, memoryview)):
+        return len(value)
+    return 8
+
+
+class _CountingCursor:
+    """
+    Proxy of a DB-API cursor counting the rows and bytes it returns
+    """
+
+    def __init__(self, cursor, query, recorder):
+        self._cursor = cursor
+        self._query = query
+        self._recorder = recorder
+
+    def _count(self, rows):
+        self._query['rows'] += len(rows)
+        self._query['bytes'] += sum(_value_size(value) for row in rows for value in row)
+        return rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._count([row])
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        return self._count(self._cursor.fetchmany(*args, **kwargs))
+
+    def fetchall(self):
+        return self._count(self._cursor.fetchall())
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._count([row])
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class QueryRecorder:
+    """
+    Record the queries run on the connections of ``aliases`` (default:
+    every database) while the block runs
+    """
+
+    def __init__(self, aliases=None, explain_slower_than=None):
+        self.aliases = aliases
+        if explain_slower_than is None and os.environ.get('FORMBUILDER_EXPLAIN_SLOW_QUERIES'):
+            explain_slower_than = float(os.environ['FORMBUILDER_EXPLAIN_SLOW_QUERIES'])
+        self.explain_slower_than = explain_slower_than
+        self.queries = []
+
+    def __enter__(self):
+        self.queries = []
+        self._wrapped = []  # (cursor, proxy) to unwrap when the block ends
+        self._wrappers = contextlib.ExitStack()
+        for alias in (connections if self.aliases is None else self.aliases):
+            self._wrappers.enter_context(connections[alias].execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrappers.close()
+        # Connections outlive the block; leave their cursors as they were
+        for cursor, proxy in reversed(self._wrapped):
+            if cursor.cursor is proxy:
+                cursor.cursor = proxy._cursor
+        self._wrapped = []
+        if self.explain_slower_than is not None:
+            slow = [query for query in self.queries if query['time'] * 1000 >= self.explain_slower_than]
+            if slow:
+                self.dump_explain(slow)
+
+    def __call__(self, execute, sql, params, many, context):
+        query = {
+            'alias': context['connection'].alias, 'sql': sql, 'params': params, 'many': many,
+            'rows': 0, 'bytes': 0, 'time': 0.0,
+        }
+        self.queries.append(query)
+        cursor = context['cursor']
+        # Reuse this recorder's proxy if the cursor ran an earlier query;
+        # proxies of enclosing recorders stay wrapped underneath
+        proxy = cursor.cursor
+        while isinstance(proxy, _CountingCursor) and proxy._recorder is not self:
+            proxy = proxy._cursor
+        if isinstance(proxy, _CountingCursor):
+            proxy._query = query
+        else:
+            proxy = cursor.cursor = _CountingCursor(cursor.cursor, query, self)
+            self._wrapped.append((cursor, proxy))
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            query['time'] = time.perf_counter() - start
+
+    @property
+    def totals(self):
+        """
+        Return the number of queries, rows fetched and bytes loaded
+        """
+        return {
+            'queries': len(self.queries),
+            'rows': sum(query['rows'] for query in self.queries),
+            'bytes': sum(query['bytes'] for query in self.queries),
+        }
+
+    def explain(self, queries=None):
+        """
+        Return the EXPLAIN plans of the given (default: all) read queries
+        """
+        plans = []
+        for query in (self.queries if queries is None else queries):
+            if query['many'] or not query['sql'].lstrip().upper().startswith('SELECT'):
+                continue
+            connection = connections[query['alias']]
+            with connection.cursor() as cursor:
+                cursor.execute(f"{connection.ops.explain_query_prefix()} {query['sql']}", query['params'])
+                plan = '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+            plans.append(
+                f"-- {query['alias']}, {query['time'] * 1000:.2f} ms, {query['rows']} rows, {query['bytes']} bytes\n"
+                f"{query['sql']}\n-- params: {query['params']!r}\n{plan}\n"
+            )
+        return '\n'.join(plans)
+
+    def dump_explain(self, queries=None, label='queries'):
+        """
+        Write the EXPLAIN plans of queries to logs/explain/ and return the path
+        """
+        directory = Path(settings.BASE_DIR) / 'logs' / 'explain'
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.sql"
+        path.write_text(self.explain(queries))
+        return path
+
+    def summary(self):
+        """
+        Return a readable list of the recorded queries
+        """
+        return '\n'.join(
+            f"{i}. [{query['alias']}, {query['rows']} rows, {query['bytes']} B, {query['time'] * 1000:.2f} ms] {query['sql']}"
+            for i, query in enumerate(self.queries, 1)
+        )
@@ -0,0 +1,249 @@
+"""
+Rate limiting and admission control for the API.
+
+Requests are metered with token buckets: one per client, one per
+workspace and one per form.
+Buckets live in Redis when the default cache is Redis, updated atomically by
+a Lua script in a single round trip, and in process memory otherwise.
+A concurrency limiter sheds requests with 503 once a worker has too many in
+flight, before a queue builds up behind the database pool.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_RATE_LIMITS = {
+    'BACKEND': 'auto',  # 'auto', 'redis' or 'memory'
+    'CACHE_ALIAS': 'default',
+    'PATH_PREFIXES': ['/formbuilder/api/'],
+    'CLIENT': {'rate': 10.0, 'burst': 50},  # tokens per second, bucket size
+    'FORM': {'rate': 100.0, 'burst': 300},
+    'WORKSPACE': {'rate': 200.0, 'burst': 600},
+    'TRUST_X_FORWARDED_FOR': False,
+    'MAX_CONCURRENT_REQUESTS': 0,  # per process, 0 to disable
+}
+
+
+def get_config():
+    """
+    Return the rate limit settings merged over the defaults
+    """
+    return {**DEFAULT_RATE_LIMITS, **getattr(settings, 'FORMBUILDER_RATE_LIMITS', {})}
+
+
+class MemoryBackend:
+    """
+    Token buckets in process memory, bounded to ``max_keys`` buckets
+    """
+
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()  # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, burst, cost=1):
+        """
+        Take ``cost`` tokens from a bucket. Returns (allowed, retry_after).
+        """
+        now = self.clock()
+        with self._lock:
+            state = self._buckets.get(key)
+            if state is None:
+                tokens = burst
+            else:
+                tokens = min(burst, state[0] + (now - state[1]) * rate)
+                self._buckets.move_to_end(key)
+            if tokens >= cost:
+                allowed, retry_after = True, 0.0
+                tokens -= cost
+            else:
+                allowed, retry_after = False, (cost - tokens) / rate
+            self._buckets[key] = [tokens, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+
+# KEYS[1]: bucket key; ARGV: rate, burst, cost. Uses the Redis clock so all
+# workers agree on time.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisBackend:
+    """
+    Token buckets in Redis, updated atomically by a Lua script
+    """
+
+    def __init__(self, client):
+        self.script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def consume(self, key, rate, burst, cost=1):
+        try:
+            allowed, retry_after = self.script(keys=[key], args=[rate, burst, cost])
+        except Exception as e:
+            # Fail open: an unavailable limiter must not take the API down
+            logger.warning(f"Rate limiter unavailable, allowing request: {e}")
+            return True, 0.0
+        return bool(allowed), float(retry_after)
+
+
+def get_redis_client(cache_alias):
+    """
+    Return the redis-py client behind a Django cache, or None if the cache
+    is not Redis
+    """
+    cache = caches[cache_alias]
+    # Django's built-in RedisCache
+    if hasattr(cache, '_cache') and hasattr(cache._cache, 'get_client'):
+        return cache._cache.get_client(write=True)
+    # django-redis
+    if hasattr(cache, 'client') and hasattr(cache.client, 'get_client'):
+        return cache.client.get_client(write=True)
+    return None
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Return the process-wide rate limit backend
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = get_config()
+                client = None
+                if config['BACKEND'] in ('auto', 'redis'):
+                    client = get_redis_client(config['CACHE_ALIAS'])
+                    if client is None and config['BACKEND'] == 'redis':
+                        logger.warning("Rate limit cache is not Redis; using in-memory buckets")
+                _backend = RedisBackend(client) if client is not None else MemoryBackend()
+    return _backend
+
+
+def get_client_id(request, trust_x_forwarded_for=False):
+    """
+    Identify the client of a request: the user for authenticated requests,
+    the IP address otherwise
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    if trust_x_forwarded_for:
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+        if forwarded:
+            return f"ip:{forwarded.split(',')[0].strip()}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def throttled_response(retry_after, status=429, message='Too many requests'):
+    """
+    Return a JSON error response with a Retry-After header
+    """
+    response = JsonResponse({'error': message}, status=status)
+    response['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class RateLimitMiddleware:
+    """
+    Apply per-client, per-workspace and per-form token buckets to API requests
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = get_config()
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        config = self.config
+        if not request.path_info.startswith(tuple(config['PATH_PREFIXES'])):
+            return None
+
+        backend = get_backend()
+        client_id = get_client_id(request, config['TRUST_X_FORWARDED_FOR'])
+        allowed, retry_after = backend.consume(
+            f"formbuilder:rl:client:{client_id}", config['CLIENT']['rate'], config['CLIENT']['burst']
+        )
+        if not allowed:
+            return throttled_response(retry_after)
+
+        # Bound by WorkspaceMiddleware
+        workspace = getattr(request, 'workspace', None)
+        if workspace is not None:
+            allowed, retry_after = backend.consume(
+                f"formbuilder:rl:workspace:{workspace.pk}", config['WORKSPACE']['rate'], config['WORKSPACE']['burst']
+            )
+            if not allowed:
+                return throttled_response(retry_after)
+
+        form_id = view_kwargs.get('form_id')
+        if form_id is not None:
+            allowed, retry_after = backend.consume(
+                f"formbuilder:rl:form:{form_id}", config['FORM']['rate'], config['FORM']['burst']
+            )
+            if not allowed:
+                return throttled_response(retry_after)
+        return None
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Shed requests with 503 when too many are already in flight in this process
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limit = get_config()['MAX_CONCURRENT_REQUESTS']
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        if not self.limit:
+            return self.get_response(request)
+
+        with self._lock:
+            if self.in_flight >= self.limit:
+                return throttled_response(1, status=503, message='Server busy, retry later')
+            self.in_flight += 1
+        try:
+            return self.get_response(request)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
@@ -0,0 +1,165 @@
+"""
+Read replica routing.
+
+ReplicaRouter sends reads to the read replicas in DATABASES (every alias
+other than ``default``, unless FORMBUILDER_REPLICAS['ALIASES'] lists them)
+and all writes to the primary. Reads go to the primary instead when:
+
+- the request wrote to the database, or the client wrote within the last
+  ``PIN_SECONDS`` seconds (read-your-writes, tracked with a signed cookie
+  set by ReplicaPinningMiddleware). Outside requests (management commands,
+  workers), reads go to the primary for ``PIN_SECONDS`` after a write;
+- a transaction is open on the primary;
+- every replica lags more than ``MAX_LAG`` seconds behind the primary or is
+  unreachable. Lag is checked at most once per ``LAG_CHECK_INTERVAL``
+  seconds per replica and process.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_REPLICAS = {
+    'ALIASES': None,  # default: every database alias other than 'default'
+    'MAX_LAG': 5.0,  # seconds a replica may lag before reads fall back to the primary
+    'LAG_CHECK_INTERVAL': 5.0,  # seconds between lag checks of a replica
+    'PIN_SECONDS': 10,  # seconds a client reads from the primary after writing
+    'PRIMARY_ONLY_APPS': ['sessions'],  # apps always read from the primary
+}
+
+PIN_COOKIE = 'formbuilder_pin'
+
+# Whether reads of the current request must go to the primary, None outside
+# requests
+_pinned = contextvars.ContextVar('formbuilder_replica_pinned', default=None)
+
+# Outside requests: time.monotonic() until which reads go to the primary
+_pinned_until = contextvars.ContextVar('formbuilder_replica_pinned_until', default=float('-inf'))
+
+# LAG_QUERY returns the replay lag of a PostgreSQL standby in seconds, 0 when
+# it has replayed everything it received
+LAG_QUERY = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+def get_config():
+    """
+    Return the replica settings merged over the defaults
+    """
+    config = {**DEFAULT_REPLICAS, **getattr(settings, 'FORMBUILDER_REPLICAS', {})}
+    if config['ALIASES'] is None:
+        config['ALIASES'] = [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+    return config
+
+
+def is_pinned():
+    pinned = _pinned.get()
+    if pinned is None:
+        return time.monotonic() < _pinned_until.get()
+    return pinned
+
+
+class ReplicaRouter:
+    """
+    Route reads to healthy replicas and writes to the primary
+    """
+
+    def __init__(self):
+        self.config = get_config()
+        self.replicas = list(self.config['ALIASES'])
+        self._lag = {}  # alias -> (lag in seconds, checked at)
+        self._lock = threading.Lock()
+
+    def replica_lag(self, alias):
+        """
+        Return the replication lag of a replica in seconds, infinity if it
+        cannot be reached
+        """
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            return 0.0
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_QUERY)
+                return float(cursor.fetchone()[0])
+        except Exception as e:
+            logger.warning(f"Replica {alias} is unavailable: {e}")
+            return float('inf')
+
+    def healthy_replicas(self):
+        """
+        Return the replicas whose last checked lag is within MAX_LAG
+        """
+        now = time.monotonic()
+        healthy = []
+        for alias in self.replicas:
+            lag, checked_at = self._lag.get(alias, (None, float('-inf')))
+            if now - checked_at >= self.config['LAG_CHECK_INTERVAL']:
+                lag = self.replica_lag(alias)
+                with self._lock:
+                    self._lag[alias] = (lag, now)
+            if lag <= self.config['MAX_LAG']:
+                healthy.append(alias)
+        return healthy
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas or is_pinned():
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label in self.config['PRIMARY_ONLY_APPS']:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        healthy = self.healthy_replicas()
+        return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if _pinned.get() is None:
+            # Not in a request: a long-running process would otherwise stay
+            # on the primary for good after its first write
+            _pinned_until.set(time.monotonic() + self.config['PIN_SECONDS'])
+        else:
+            # Later reads of this request must see the write
+            _pinned.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+
+class ReplicaPinningMiddleware:
+    """
+    Give clients read-your-writes consistency across requests: after a
+    request that changes data, reads of the same client go to the primary
+    for PIN_SECONDS
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = get_config()['PIN_SECONDS']
+
+    def __call__(self, request):
+        # Signed with the time it was set, so clients cannot forge or extend
+        # the pin and keep their reads off the replicas
+        pin = request.get_signed_cookie(PIN_COOKIE, default=None, salt=PIN_COOKIE, max_age=self.pin_seconds)
+        token = _pinned.set(pin is not None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+
+        if request.method not in self.safe_methods:
+            response.set_signed_cookie(
+                PIN_COOKIE, '1', salt=PIN_COOKIE, max_age=self.pin_seconds, httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,160 @@
+"""
+Form schema normalization and traversal.
+
+FormEngine schemas keep their components in ``form.children``. Early forms
+were saved in a legacy layout with the components directly in a top-level
+``components`` list. Schemas are converted to the canonical layout when they
+are written, and the ``normalize_schemas`` management command backfills
+existing rows, so readers only ever deal with the canonical layout.
+
+Nested components are read through a flat component index built by
+build_component_index().
+"""
+import copy
+
+
+# Top-level keys of an empty FormEngine schema, matching the frontend defaults
+CANONICAL_DEFAULTS = {
+    'version': '1',
+    'tooltipType': 'RsTooltip',
+    'modalType': 'RsModal',
+    'localization': {},
+    'languages': [
+        {
+            'code': 'en',
+            'dialect': 'US',
+            'name': 'English',
+            'description': 'American English',
+            'bidi': 'ltr',
+        }
+    ],
+    'defaultLanguage': 'en-US',
+}
+
+
+def is_legacy_schema(schema):
+    """
+    Return whether a schema uses the legacy top-level ``components`` layout
+    """
+    return isinstance(schema, dict) and 'components' in schema and 'form' not in schema
+
+
+def normalize_schema(schema):
+    """
+    Convert a schema to the canonical ``form.children`` layout.
+
+    Canonical schemas are returned unchanged. For legacy schemas every
+    top-level key other than ``components`` is kept as-is, and missing
+    FormEngine keys are filled in from CANONICAL_DEFAULTS.
+    """
+    if not is_legacy_schema(schema):
+        return schema
+
+    normalized = copy.deepcopy(CANONICAL_DEFAULTS)
+    normalized.update({key: value for key, value in schema.items() if key != 'components'})
+    normalized['form'] = {
+        'key': 'Screen',
+        'type': 'Screen',
+        'props': {},
+        'children': schema['components'] or [],
+    }
+    return normalized
+
+
+def verify_round_trip(original, normalized):
+    """
+    Check that nothing from the original schema was lost by normalization.
+
+    The legacy schema must be recoverable from the normalized one: the
+    components must be the ``form.children`` and every other top-level key
+    must be carried over with the same value.
+    """
+    if not is_legacy_schema(original):
+        return normalized == original
+
+    if normalized.get('form', {}).get('children') != (original['components'] or []):
+        return False
+    return all(
+        normalized.get(key) == value
+        for key, value in original.items()
+        if key != 'components'
+    )
+
+
+def iter_components(schema):
+    """
+    Yield (component, parent_id, depth, position) for every component in a
+    schema, in pre-order.
+
+    Containers (panels, repeaters, ...) keep nested components in their own
+    ``children``, so the tree is walked with an explicit stack rather than
+    recursion; arbitrarily deep schemas cannot hit the recursion limit.
+    Stored schemas are bounded by JSON (de)serialization before that: each
+    component level nests two JSON levels, SQLite rejects more than 2000
+    (998 component levels) and CPython's json module fails at about 5000
+    component levels on 3.13 (about 500 before 3.12, bound by
+    ``sys.getrecursionlimit()``).
+    ``parent_id`` is the pre-order number of the parent component, or None
+    for top-level components.
+    """
+    root = (schema or {}).get('form') or {}
+    stack = [(child, None, 0, position) for position, child in _reversed_children(root)]
+    count = 0
+    while stack:
+        component, parent, depth, position = stack.pop()
+        if not isinstance(component, dict):
+            continue
+        yield component, parent, depth, position
+        stack.extend((child, count, depth + 1, pos) for pos, child in _reversed_children(component))
+        count += 1
+
+
+def _reversed_children(component):
+    """
+    Return (position, child) pairs in reverse, so popping from a stack
+    visits children in document order
+    """
+    children = component.get('children') or []
+    return reversed(list(enumerate(children)))
+
+
+def build_component_index(schema):
+    """
+    Build a flat, pre-order index of every component in a schema.
+
+    Each entry is a dict with:
+        id: position of the entry in the index
+        parent: id of the parent entry, or None for top-level components
+        depth: 0 for top-level components
+        position: position of the component among its siblings
+        type: component type ('unknown' if missing)
+        key: component key (None if missing)
+
+    Paths are not stored on the entries, because their total size grows
+    quadratically with nesting depth; use component_path() instead.
+    """
+    return [
+        {
+            'id': entry_id,
+            'parent': parent,
+            'depth': depth,
+            'position': position,
+            'type': component.get('type', 'unknown'),
+            'key': component.get('key'),
+        }
+        for entry_id, (component, parent, depth, position) in enumerate(iter_components(schema))
+    ]
+
+
+def component_path(index, entry_id):
+    """
+    Return the key path of an index entry from the top level, e.g.
+    'address/street'. Components without a key use their position.
+    """
+    parts = []
+    entry = index[entry_id]
+    while entry is not None:
+        key = entry['key']
+        parts.append(str(key if key is not None else entry['position']))
+        entry = index[entry['parent']] if entry['parent'] is not None else None
+    return '/'.join(reversed(parts))
@@ -0,0 +1,107 @@
+"""
+Page shells: templates rendered once per process, leaving only their
+per-request parts to render on each request.
+
+The builder, viewer, list and detail pages are mostly the same HTML on
+every request: navigation, stylesheet links (``{% static %}``, ``{% url %}``)
+and the Vite asset tags, which are looked up in ``frontend/dist/index.html``.
+Templates mark the parts that depend on the request with
+``{% dynamic %}`` ... ``{% enddynamic %}`` (``{% load shells %}``).
+
+The first request for a template renders it without any context, with a
+placeholder for each dynamic part, and splits the result into static
+chunks. Later requests render only the dynamic parts with their context
+and join them with the chunks. Anything outside a dynamic part must not
+depend on the context, and dynamic parts must not sit inside tags that
+do (``{% if %}``, ``{% for %}``, ...).
+
+Shells are kept per process, so they are built again on deploy. Without
+shells (``ENABLED`` off, or ``DEBUG``), a dynamic part simply renders its
+contents.
+"""
+import re
+
+from django.conf import settings
+from django.template.context import make_context
+from django.template.response import TemplateResponse
+from django.urls import get_script_prefix
+
+DEFAULT_SHELLS = {
+    'ENABLED': True,  # never with DEBUG, so template edits show up
+}
+
+# Context key under which a shell being built collects its dynamic parts
+BUILD_KEY = '_formbuilder_shell_parts'
+
+PLACEHOLDER = '\x00shell:{}\x00'
+PLACEHOLDER_RE = re.compile('\x00shell:(\\d+)\x00')
+
+# (template path, script prefix) -> Shell
+_shells = {}
+
+
+def get_config():
+    """
+    Return the shell settings merged over the defaults
+    """
+    return {**DEFAULT_SHELLS, **getattr(settings, 'FORMBUILDER_SHELLS', {})}
+
+
+def enabled():
+    return get_config()['ENABLED'] and not settings.DEBUG
+
+
+class Shell:
+    """
+    A template split into static chunks and the dynamic parts between them
+    """
+
+    def __init__(self, template):
+        self.template = template
+        parts = []
+        html = template.render({BUILD_KEY: parts})
+        pieces = PLACEHOLDER_RE.split(html)
+        self.chunks = pieces[0::2]
+        self.parts = [parts[int(index)] for index in pieces[1::2]]
+
+    def render(self, context=None, request=None):
+        template = self.template.template
+        context = make_context(context, request, autoescape=self.template.backend.engine.autoescape)
+        # Same setup as Template.render: context processors, render state
+        with context.render_context.push_state(template), context.bind_template(template):
+            html = [self.chunks[0]]
+            for part, chunk in zip(self.parts, self.chunks[1:]):
+                html.append(part.nodelist.render(context))
+                html.append(chunk)
+        return ''.join(html)
+
+
+def get_shell(template):
+    """
+    Return the shell of a template, building it on first use
+    """
+    # {% url %} in the static chunks depends on the script prefix
+    key = (template.origin.name, get_script_prefix())
+    shell = _shells.get(key)
+    if shell is None:
+        # Concurrent first requests may both build it, with the same result
+        shell = _shells[key] = Shell(template)
+    return shell
+
+
+def clear():
+    _shells.clear()
+
+
+class ShellTemplateResponse(TemplateResponse):
+    """
+    TemplateResponse rendered through the shell of its template
+    """
+
+    @property
+    def rendered_content(self):
+        if not enabled():
+            return super().rendered_content
+        template = self.resolve_template(self.template_name)
+        context = self.resolve_context(self.context_data)
+        return get_shell(template).render(context, self._request)
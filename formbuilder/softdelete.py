@@ -0,0 +1,197 @@
+"""
+Soft delete of forms: tombstones, the delta feed and batched purging.
+
+Deleting a form only sets its ``deleted_at`` (and ``modified``) timestamp.
+The row stays behind as a tombstone, so clients polling the delta feed
+(``GET /api/forms/?since=...``) learn about deletions as well as changes.
+
+``purge_deleted_forms`` (run by the ``purge_deleted_forms`` command from
+cron) removes the submissions and other rows depending on deleted forms in
+small batches, each in its own short transaction. Batches shrink when they
+take longer than ``BATCH_SECONDS`` and grow back when they are fast; after
+each batch the purge pauses for ``PAUSE_RATIO`` times the batch duration,
+so concurrent writers always get their turn. On PostgreSQL a batch that
+cannot get its locks within ``LOCK_TIMEOUT`` gives up and is retried with
+exponential backoff. Tombstones themselves are removed once they are older
+than ``TOMBSTONE_DAYS``; clients whose last sync is older than that must
+reload the full list.
+"""
+import datetime
+import logging
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, models, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_SOFT_DELETE = {
+    'TOMBSTONE_DAYS': 30,  # days deleted forms stay in the delta feed
+    'SYNC_OVERLAP': 10,  # seconds the next sync overlaps the previous one
+    'BATCH_SIZE': 5000,  # initial and largest number of rows deleted per batch
+    'MIN_BATCH_SIZE': 100,
+    'BATCH_SECONDS': 0.25,  # target duration of a batch
+    'PAUSE_RATIO': 1.0,  # pause after a batch, relative to its duration
+    'LOCK_TIMEOUT': 1.0,  # seconds a batch waits for locks (PostgreSQL)
+    'MAX_BACKOFF': 30.0,  # longest pause after a failed batch
+    'MAX_RETRIES': 10,  # consecutive failed batches before giving up
+}
+
+
+def get_config():
+    """
+    Return the soft delete settings merged over the defaults
+    """
+    return {**DEFAULT_SOFT_DELETE, **getattr(settings, 'FORMBUILDER_SOFT_DELETE', {})}
+
+
+def tombstone_cutoff(now=None):
+    """
+    Return the time before which tombstones may have been purged
+    """
+    return (now or timezone.now()) - datetime.timedelta(days=get_config()['TOMBSTONE_DAYS'])
+
+
+def changes_since(since):
+    """
+    Return ``(changed, deleted, next_since)``: the forms changed and the
+    forms deleted after ``since``, and the value to pass as ``since`` on the
+    next sync.
+
+    ``next_since`` lies SYNC_OVERLAP seconds before the query, so changes
+    committed by transactions still running (or not yet replicated) are
+    picked up by the next sync; clients must apply changes idempotently.
+    """
+    from .models import Form
+
+    next_since = timezone.now() - datetime.timedelta(seconds=get_config()['SYNC_OVERLAP'])
+    forms = Form.all_objects.select_related('schema_blob').order_by('modified')
+    if since is not None:
+        forms = forms.filter(modified__gt=since)
+    changed, deleted = [], []
+    for form in forms:
+        (deleted if form.deleted_at else changed).append(form)
+    return changed, deleted, next_since
+
+
+class BatchPacer:
+    """
+    Run delete batches in short transactions, adapting the batch size to
+    BATCH_SECONDS and pausing between batches
+    """
+
+    def __init__(self, config=None, using=DEFAULT_DB_ALIAS, sleep=time.sleep):
+        self.config = config or get_config()
+        self.using = using
+        self.sleep = sleep
+        self.batch_size = self.config['BATCH_SIZE']
+        self.batches = 0
+        self.retries = 0
+        self.longest_batch = 0.0
+        self._failures = 0
+
+    def run(self, delete):
+        """
+        Run ``delete()`` in a transaction and return the number of rows it
+        deleted, or 0 when the batch failed and should be retried
+        """
+        connection = connections[self.using]
+        start = time.perf_counter()
+        try:
+            with transaction.atomic(using=self.using):
+                if connection.vendor == 'postgresql' and self.config['LOCK_TIMEOUT']:
+                    with connection.cursor() as cursor:
+                        cursor.execute(f"SET LOCAL lock_timeout = '{int(self.config['LOCK_TIMEOUT'] * 1000)}ms'")
+                deleted = delete()
+        except OperationalError as e:
+            # Lock timeout or a busy database: back off and retry smaller
+            self._failures += 1
+            self.retries += 1
+            if self._failures > self.config['MAX_RETRIES']:
+                raise
+            backoff = min(self.config['MAX_BACKOFF'], self.config['BATCH_SECONDS'] * 2 ** self._failures)
+            logger.warning(f"Purge batch of {self.batch_size} rows failed ({e}), retrying in {backoff:.1f}s")
+            self.batch_size = max(self.config['MIN_BATCH_SIZE'], self.batch_size // 2)
+            self.sleep(backoff)
+            return 0
+
+        elapsed = time.perf_counter() - start
+        self._failures = 0
+        self.batches += 1
+        self.longest_batch = max(self.longest_batch, elapsed)
+        target = self.config['BATCH_SECONDS']
+        if elapsed > target:
+            self.batch_size = max(self.config['MIN_BATCH_SIZE'], int(self.batch_size * target / elapsed))
+        elif elapsed < target / 2:
+            self.batch_size = min(self.config['BATCH_SIZE'], self.batch_size * 2)
+        self.sleep(elapsed * self.config['PAUSE_RATIO'])
+        return deleted
+
+
+def dependent_querysets(form_id, using=DEFAULT_DB_ALIAS):
+    """
+    Yield querysets of the rows that cascade from a form
+    """
+    from .models import Form
+
+    for relation in Form._meta.related_objects:
+        if relation.on_delete is models.CASCADE and not relation.many_to_many:
+            yield relation.related_model._base_manager.using(using).filter(**{relation.field.name: form_id})
+
+
+def delete_in_batches(queryset, pacer):
+    """
+    Delete the rows of a queryset in batches and return how many were deleted
+    """
+    manager = queryset.model._base_manager.using(pacer.using)
+    total = 0
+    while True:
+        # Select outside the batch transaction, so it only holds the DELETE
+        ids = list(queryset.values_list('pk', flat=True)[:pacer.batch_size])
+        if not ids:
+            return total
+        total += pacer.run(lambda: manager.filter(pk__in=ids).delete()[0])
+
+
+def purge_form(form_id, pacer=None, remove_tombstone=False):
+    """
+    Delete the rows depending on a deleted form in batches, then the form
+    itself if ``remove_tombstone`` is set. Returns the number of rows deleted.
+    """
+    from .models import Form
+    from .publishing import delete_snapshots
+
+    # Normally removed on delete already
+    delete_snapshots(form_id)
+    pacer = pacer or BatchPacer()
+    deleted = sum(delete_in_batches(queryset, pacer) for queryset in dependent_querysets(form_id, pacer.using))
+    if remove_tombstone:
+        deleted += Form.all_objects.using(pacer.using).filter(pk=form_id, deleted_at__isnull=False).delete()[0]
+    return deleted
+
+
+def purge_deleted_forms(form_ids=None, pacer=None):
+    """
+    Purge the dependent rows of all deleted forms (or of ``form_ids``), and
+    the tombstones older than TOMBSTONE_DAYS. Returns a description of what
+    was removed.
+    """
+    from .models import Form
+
+    pacer = pacer or BatchPacer()
+    forms = Form.all_objects.using(pacer.using).deleted()
+    if form_ids is not None:
+        forms = forms.filter(pk__in=form_ids)
+    cutoff = tombstone_cutoff()
+
+    rows = tombstones = 0
+    for form_id, deleted_at in forms.order_by('deleted_at').values_list('pk', 'deleted_at'):
+        expired = deleted_at < cutoff
+        rows += purge_form(form_id, pacer, remove_tombstone=expired)
+        tombstones += expired
+    return (
+        f"deleted {rows} row(s) of deleted forms, including {tombstones} expired tombstone(s), "
+        f"in {pacer.batches} batch(es) (longest {pacer.longest_batch * 1000:.0f} ms, {pacer.retries} retried)"
+    )
@@ -0,0 +1,269 @@
+"""
+Incremental parsing of large JSON request bodies.
+
+``iter_items`` reads a request (or any file-like object) in chunks and
+yields the items of one JSON array as soon as each item has arrived, so
+bulk endpoints can store items while the upload is still in progress and
+never hold more than one item (at most ``MAX_ITEM_SIZE``) plus one read
+chunk in memory. The array may be the whole body or the value of one
+member of a top-level object, e.g. ``{"submissions": [...]}``.
+
+Each item is decoded on its own by the C decoder of the json module
+(``JSONDecoder.raw_decode``) directly from the read buffer; the scanner
+itself only steps over whitespace and separators. ``iter_lines`` does the
+same for newline-delimited JSON.
+"""
+import codecs
+import json
+from itertools import islice
+
+from django.conf import settings
+
+
+DEFAULT_STREAMING = {
+    'MAX_BODY_SIZE': 512 * 1024 * 1024,  # bytes per streamed request
+    'MAX_ITEM_SIZE': 1024 * 1024,  # bytes per array item
+    'CHUNK_SIZE': 64 * 1024,  # bytes read from the request at a time
+    'BATCH_SIZE': 500,  # items stored per transaction
+}
+
+WHITESPACE = ' \t\r\n'
+NUMBER_CHARS = '0123456789+-.eE'
+
+
+class StreamingJSONError(ValueError):
+    """
+    The body is not valid JSON of the expected shape
+    """
+
+
+class TooLarge(StreamingJSONError):
+    """
+    An item or the whole body exceeds its size limit
+    """
+
+
+def get_config():
+    """
+    Return the streaming settings merged over the defaults
+    """
+    return {**DEFAULT_STREAMING, **getattr(settings, 'FORMBUILDER_STREAMING', {})}
+
+
+def batched(iterable, size):
+    """
+    Yield lists of up to ``size`` items
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class JSONScanner:
+    """
+    Cursor over a JSON document read incrementally from a file-like object.
+
+    ``buffer[position:]`` is the decoded input not consumed yet. Values are
+    decoded with ``JSONDecoder.raw_decode`` from the buffer; a value cut off
+    by the end of the buffer is decoded again once more input has arrived.
+    """
+
+    def __init__(self, stream, chunk_size, max_body_size=None):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.max_body_size = max_body_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+        self.bytes_read = 0
+        self.eof = False
+
+    def fill(self):
+        """
+        Read the next chunk, returning False at the end of the input
+        """
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        self.bytes_read += len(chunk)
+        if self.max_body_size is not None and self.bytes_read > self.max_body_size:
+            raise TooLarge(f"Body exceeds {self.max_body_size} bytes")
+        try:
+            text = self.decoder.decode(chunk, final=not chunk)
+        except UnicodeDecodeError as e:
+            raise StreamingJSONError(f"Invalid UTF-8: {e}") from None
+        self.buffer = self.buffer[self.position:] + text
+        self.position = 0
+        self.eof = not chunk
+        return not self.eof
+
+    def peek(self):
+        """
+        Skip whitespace and return the next character, '' at the end of the input
+        """
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise StreamingJSONError(f"Expected {char!r}, found {found or 'end of input'!r}")
+        self.position += 1
+
+    def read_value(self, limit):
+        """
+        Decode and return the next value, which may be at most ``limit``
+        characters long
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError as e:
+                # Incomplete or invalid: only more input can tell
+                if len(self.buffer) - self.position > limit:
+                    raise TooLarge(f"Value exceeds {limit} characters") from None
+                if not self.fill():
+                    raise StreamingJSONError(f"Invalid JSON: {e.msg}") from None
+                continue
+            if (
+                isinstance(value, (int, float)) and not self.buffer[end:].strip(NUMBER_CHARS)
+                and self.fill()
+            ):
+                # A number cut off at the end of the buffer, e.g. "12" of "1234"
+                # or "1" of "1.5", may continue in the next chunk
+                continue
+            break
+        if end - self.position > limit:
+            raise TooLarge(f"Value exceeds {limit} characters")
+        self.position = end
+        return value
+
+    def array_items(self, limit):
+        """
+        Yield the decoded items of the array starting at the cursor
+        """
+        self.expect('[')
+        if self.peek() == ']':
+            self.position += 1
+            return
+        index = 0
+        while True:
+            try:
+                item = self.read_value(limit)
+            except StreamingJSONError as e:
+                raise type(e)(f"Item {index}: {e}") from None
+            yield item
+            index += 1
+            char = self.peek()
+            self.position += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise StreamingJSONError(f"Expected ',' or ']' after item {index - 1}")
+
+    def end(self):
+        if self.peek() != '':
+            raise StreamingJSONError("Unexpected data after the document")
+
+
+def iter_items(stream, key=None, max_item_size=None, max_body_size=None, chunk_size=None):
+    """
+    Yield the items of the top-level array, or of the array under ``key``
+    of the top-level object, while reading ``stream``
+    """
+    config = get_config()
+    max_item_size = max_item_size or config['MAX_ITEM_SIZE']
+    scanner = JSONScanner(
+        stream, chunk_size or config['CHUNK_SIZE'],
+        max_body_size if max_body_size is not None else config['MAX_BODY_SIZE'],
+    )
+    if key is None:
+        yield from scanner.array_items(max_item_size)
+        scanner.end()
+        return
+
+    found = False
+    scanner.expect('{')
+    if scanner.peek() == '}':
+        scanner.position += 1
+    else:
+        while True:
+            if scanner.peek() != '"':
+                raise StreamingJSONError("Expected a member name")
+            name = scanner.read_value(max_item_size)
+            scanner.expect(':')
+            if name == key and not found:
+                found = True
+                yield from scanner.array_items(max_item_size)
+            else:
+                # Other members are decoded and discarded, so each must fit MAX_ITEM_SIZE
+                scanner.read_value(max_item_size)
+            char = scanner.peek()
+            scanner.position += 1
+            if char == '}':
+                break
+            if char != ',':
+                raise StreamingJSONError(f"Expected ',' or '}}' after member {name!r}")
+    scanner.end()
+    if not found:
+        raise StreamingJSONError(f"Missing {key!r} array")
+
+
+def iter_lines(stream, max_item_size=None, max_body_size=None, chunk_size=None):
+    """
+    Yield the items of a newline-delimited JSON body while reading ``stream``
+    """
+    config = get_config()
+    max_item_size = max_item_size or config['MAX_ITEM_SIZE']
+    max_body_size = max_body_size if max_body_size is not None else config['MAX_BODY_SIZE']
+    chunk_size = chunk_size or config['CHUNK_SIZE']
+
+    pending = b''
+    bytes_read = 0
+    index = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        bytes_read += len(chunk)
+        if max_body_size is not None and bytes_read > max_body_size:
+            raise TooLarge(f"Body exceeds {max_body_size} bytes")
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop() if chunk else b''
+        if len(pending) > max_item_size:
+            raise TooLarge(f"Item {index}: exceeds {max_item_size} bytes")
+        for line in lines:
+            if not line.strip():
+                continue
+            if len(line) > max_item_size:
+                raise TooLarge(f"Item {index}: exceeds {max_item_size} bytes")
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise StreamingJSONError(f"Item {index}: invalid JSON: {e}") from None
+            index += 1
+        if not chunk:
+            return
+
+
+def iter_request(request, key):
+    """
+    Yield the items of a request body: the array under ``key`` of a JSON
+    object, or one item per line for ``application/x-ndjson``
+    """
+    config = get_config()
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > config['MAX_BODY_SIZE']:
+        # Refuse before reading anything
+        raise TooLarge(f"Body exceeds {config['MAX_BODY_SIZE']} bytes")
+    if request.content_type == 'application/x-ndjson':
+        return iter_lines(request)
+    return iter_items(request, key)
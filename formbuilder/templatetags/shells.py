@@ -0,0 +1,35 @@
+"""
+Template tags marking the per-request parts of page shells.
+"""
+from django import template
+
+from ..shells import BUILD_KEY, PLACEHOLDER
+
+register = template.Library()
+
+
+class DynamicNode(template.Node):
+    def __init__(self, nodelist):
+        self.nodelist = nodelist
+
+    def render(self, context):
+        parts = context.get(BUILD_KEY)
+        if parts is None:
+            return self.nodelist.render(context)
+        # Building a shell: leave a placeholder, rendered on each request
+        parts.append(self)
+        return PLACEHOLDER.format(len(parts) - 1)
+
+
+@register.tag
+def dynamic(parser, token):
+    """
+    Mark a part of a page shell that depends on the request.
+
+    Usage:
+        {% load shells %}
+        <h1>{% dynamic %}{{ form.name }}{% enddynamic %}</h1>
+    """
+    nodelist = parser.parse(('enddynamic',))
+    parser.delete_first_token()
+    return DynamicNode(nodelist)
@@ -0,0 +1,32 @@
+"""
+Template tags keeping the request's workspace in page links.
+"""
+from urllib.parse import urlencode
+
+from django import template
+from django.urls import reverse
+
+from .. import workspaces
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def workspace_url(context, view_name, *args, **query):
+    """
+    Like {% url %}, for a page of the workspace bound to the request: links
+    to pages cannot send the workspace header, so a workspace other than
+    the default one is named in the query string. Keyword arguments are
+    added to the query string as well. Use inside {% dynamic %} parts.
+
+    Usage:
+        {% load workspaces %}
+        <a href="{% workspace_url 'form_detail' form.pk %}">View</a>
+        <a href="{% workspace_url 'forms_list' page=2 %}">Next</a>
+    """
+    url = reverse(view_name, args=args)
+    workspace = getattr(context.get('request'), 'workspace', None)
+    config = workspaces.get_config()
+    if workspace is not None and workspace.slug != config['DEFAULT']:
+        query[config['QUERY_PARAMETER']] = workspace.slug
+    return f"{url}?{urlencode(query)}" if query else url
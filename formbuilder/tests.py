@@ -1,3 +1,2614 @@
-from django.test import TestCase
+"""
+Tests for the formbuilder app.
 
-# Create your tests here.
+The query budget tests request each view at several table sizes. The
+number of queries, rows fetched and bytes loaded must stay the same as
+tables grow, except for the metrics a view is expected to scale with (e.g.
+the forms list API returns every form). Set
+FORMBUILDER_EXPLAIN_SLOW_QUERIES=<ms> to dump the EXPLAIN plans of slow
+queries to logs/explain/ while the suite runs.
+"""
+import asyncio
+import base64
+import contextvars
+import datetime
+import hashlib
+import importlib
+import io
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+import uuid
+import zlib
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import events, fragments, partitions, profiler, publishing, ratelimit, shells, softdelete, webhooks, workspaces
+from .analytics import MAX_TRACKED_VALUES, OTHER_VALUE, FieldStats, HyperLogLog, TDigest, ingest_submissions
+from .apps import create_submission_partitions
+from .cache import LRUCache, TieredCache, form_cache
+from .compression import compress_stream, negotiate_encoding
+from .fingerprint import estimate_similarity, lsh_buckets, minhash_signature, schema_fingerprint, schema_shingles
+from .log import JSONFormatter, QueuedFileHandler, RequestLogContextMiddleware, bind_context, get_context
+from .logic import LogicError, Parser, compile_logic, evaluate_stored, get_logic
+from .middleware import CompressionMiddleware
+from .models import (
+    Form, FormAggregate, Fragment, FragmentReference, FragmentVersion, OutboxEvent, Submission, Upload, WebhookEndpoint,
+    Workspace,
+)
+from .publishing import build_snapshot
+from .querycount import QueryRecorder
+from .schema import (
+    build_component_index, component_path, is_legacy_schema, iter_components, normalize_schema, verify_round_trip,
+)
+from .routers import PIN_COOKIE, ReplicaPinningMiddleware, ReplicaRouter, is_pinned
+from .softdelete import BatchPacer, purge_deleted_forms
+from .streaming import StreamingJSONError, TooLarge, iter_items, iter_lines
+from .uploads import purge_uploads, upload_path
+from .webhooks import StubReceiver, deliver_outbox, retry_dead
+
+
+# Table sizes each view is measured at, both above the list page size
+SIZES = (40, 80)
+
+# Relative growth of bytes loaded tolerated between sizes, since stored
+# values differ slightly in length
+BYTES_TOLERANCE = 0.1
+
+SCHEMA = {
+    'form': {
+        'children': [
+            {'key': 'name', 'type': 'RsInput', 'props': {'label': 'Name'}},
+            {'key': 'age', 'type': 'RsNumber', 'props': {'label': 'Age'}},
+            {
+                'key': 'address', 'type': 'RsContainer',
+                'children': [{'key': 'city', 'type': 'RsInput', 'props': {'label': 'City'}}],
+            },
+        ]
+    }
+}
+
+
+class QueryBudgetMixin:
+    """
+    Assertions that the work done by a request does not scale with the
+    size of the tables
+    """
+    metrics = ('queries', 'rows', 'bytes')
+
+    def grow_forms(self, size):
+        missing = size - Form.objects.count()
+        Form.objects.bulk_create(
+            Form(name=f'Form {i}', schema=SCHEMA, schema_fingerprint='x') for i in range(missing)
+        )
+
+    def grow_submissions(self, size):
+        missing = size - self.form.submissions.count()
+        ingest_submissions(self.form, [{'name': f'n{i}', 'age': i} for i in range(missing)])
+
+    def grow_all(self, size):
+        self.grow_forms(size)
+        self.grow_submissions(size)
+
+    def measure(self, request):
+        # Measure the cold path: nothing cached from earlier requests
+        cache.clear()
+        form_cache.local.clear()
+        with QueryRecorder() as recorder:
+            response = request()
+        self.assertLess(response.status_code, 400, response.content[:500])
+        return recorder
+
+    def assertQueryBudget(self, request, grow=None, max_queries=None, scaling=()):
+        """
+        Request at each of SIZES and check that every metric not listed in
+        ``scaling`` is the same at all sizes, and that no size needs more
+        than ``max_queries`` queries
+        """
+        grow = grow or self.grow_all
+        results = []
+        for size in SIZES:
+            grow(size)
+            recorder = self.measure(request)
+            results.append((size, recorder))
+            if max_queries is not None and recorder.totals['queries'] > max_queries:
+                self.fail(
+                    f"{recorder.totals['queries']} queries at size {size}, budget is {max_queries}:\n"
+                    f"{recorder.summary()}\nEXPLAIN plans in {recorder.dump_explain(label=self.id())}"
+                )
+
+        (small_size, small), (large_size, large) = results[0], results[-1]
+        for metric in self.metrics:
+            if metric in scaling:
+                continue
+            limit = small.totals[metric] * (1 + BYTES_TOLERANCE if metric == 'bytes' else 1)
+            if large.totals[metric] > limit:
+                self.fail(
+                    f"{metric} scale with table size: {small.totals[metric]} at {small_size} rows, "
+                    f"{large.totals[metric]} at {large_size} rows\n{large.summary()}\n"
+                    f"EXPLAIN plans in {large.dump_explain(label=self.id())}"
+                )
+        return results[-1][1]
+
+
+@override_settings(FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []})
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp(prefix='formbuilder-tests-')
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.enterContext(self.settings(FORMBUILDER_PUBLISH_ROOT=root))
+        self.form = Form.objects.create(name='Subject', schema=SCHEMA)
+
+
+class QueryRecorderTests(TestCase):
+
+    def test_counts_and_unwraps(self):
+        Form.objects.create(name='First', schema=SCHEMA)
+        Form.objects.create(name='Second', schema=SCHEMA)
+        with connection.cursor() as cursor:
+            raw = cursor.cursor
+            with QueryRecorder() as outer:
+                cursor.execute("SELECT name FROM formbuilder_form ORDER BY id")
+                self.assertEqual(cursor.fetchall(), [('First',), ('Second',)])
+                with QueryRecorder() as inner:
+                    cursor.execute("SELECT id FROM formbuilder_form")
+                    cursor.fetchall()
+                self.assertIsNot(cursor.cursor, raw)
+            # The connection's cursor is left as it was
+            self.assertIs(cursor.cursor, raw)
+
+        self.assertEqual(outer.totals, {'queries': 2, 'rows': 4, 'bytes': len('FirstSecond') + 16})
+        self.assertEqual(inner.totals, {'queries': 1, 'rows': 2, 'bytes': 16})
+        # Nothing is recorded once the blocks have ended
+        Form.objects.count()
+        self.assertEqual(outer.totals['queries'], 2)
+
+
+class PageViewQueryTests(QueryBudgetTestCase):
+
+    def test_form_builder(self):
+        self.assertQueryBudget(lambda: self.client.get(reverse('form_builder')), max_queries=0)
+
+    def test_form_builder_with_id(self):
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('form_builder_with_id', args=[self.form.pk])), max_queries=1
+        )
+
+    def test_form_view(self):
+        self.assertQueryBudget(lambda: self.client.get(reverse('form_view', args=[self.form.pk])), max_queries=1)
+
+    def test_forms_list(self):
+        self.assertQueryBudget(lambda: self.client.get(reverse('forms_list')), max_queries=2)
+
+    def test_forms_list_second_page(self):
+        self.assertQueryBudget(lambda: self.client.get(reverse('forms_list'), {'page': 2}), max_queries=2)
+
+    def test_form_detail(self):
+        self.assertQueryBudget(lambda: self.client.get(reverse('form_detail', args=[self.form.pk])), max_queries=2)
+
+
+class FormsAPIQueryTests(QueryBudgetTestCase):
+
+    def test_list(self):
+        # Returns every form, so rows and bytes grow with the table by design
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('forms_api')), max_queries=1, scaling=('rows', 'bytes')
+        )
+
+    def test_detail(self):
+        self.assertQueryBudget(lambda: self.client.get(reverse('forms_api_detail', args=[self.form.pk])), max_queries=1)
+
+    def test_create(self):
+        self.assertQueryBudget(
+            lambda: self.client.post(
+                reverse('forms_api'), json.dumps({'name': 'New', 'schema': SCHEMA}), content_type='application/json'
+            ),
+            # Including the count of the workspace's forms for its quota
+            max_queries=7,
+        )
+
+    def test_update(self):
+        schemas = iter(range(len(SIZES)))
+        self.assertQueryBudget(
+            lambda: self.client.put(
+                reverse('forms_api_detail', args=[self.form.pk]),
+                json.dumps({'name': 'Renamed', 'schema': {**SCHEMA, 'revision': next(schemas)}}),
+                content_type='application/json',
+            ),
+            max_queries=8,
+        )
+
+    def test_changes(self):
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('forms_api'), {'since': timezone.now().isoformat()}), max_queries=1
+        )
+
+    def test_delete(self):
+        def delete():
+            form = Form.objects.create(name='Doomed', schema=SCHEMA)
+            ingest_submissions(form, [{'name': 'x'}])
+            return self.measure(lambda: self.client.delete(reverse('forms_api_detail', args=[form.pk])))
+
+        small = delete()
+        self.grow_all(SIZES[-1])
+        large = delete()
+        self.assertEqual(small.totals['queries'], large.totals['queries'], large.summary())
+
+
+class WorkspaceQueryTests(QueryBudgetTestCase):
+    """
+    Requests of a small workspace do not scale with the forms of others
+    (grow_forms adds them to the default workspace)
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.workspace = Workspace.objects.create(name='Small', slug='small')
+        member = get_user_model().objects.create_user('member', password='secret')
+        self.workspace.members.add(member)
+        self.client.force_login(member)
+        with workspaces.activate(self.workspace):
+            self.form = Form.objects.create(name='Small form', schema=SCHEMA)
+
+    def test_list(self):
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('forms_api'), headers={'X-Formbuilder-Workspace': 'small'}),
+            # Including the session, user, workspace and membership lookups,
+            # as measure() clears the caches
+            grow=self.grow_forms, max_queries=5,
+        )
+
+    def test_list_page(self):
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('forms_list'), headers={'X-Formbuilder-Workspace': 'small'}),
+            grow=self.grow_forms, max_queries=6,
+        )
+
+
+class PublishAPIQueryTests(QueryBudgetTestCase):
+
+    def test_publish(self):
+        self.assertQueryBudget(
+            lambda: self.client.post(reverse('forms_api_publish', args=[self.form.pk])), max_queries=2
+        )
+
+    def test_unpublish(self):
+        self.assertQueryBudget(
+            lambda: self.client.delete(reverse('forms_api_publish', args=[self.form.pk])), max_queries=2
+        )
+
+
+class PublishingTests(TestCase):
+    """
+    Snapshots written on publish and served by WhiteNoise
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix='formbuilder-published-')
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.enterContext(self.settings(
+            FORMBUILDER_PUBLISH_ROOT=self.root, FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []},
+        ))
+        self.form = Form.objects.create(name='Published', schema=SCHEMA)
+
+    def publish(self):
+        response = self.client.post(reverse('forms_api_publish', args=[self.form.pk]))
+        self.assertEqual(response.status_code, 200)
+        return response.json()['published_url']
+
+    def test_build_snapshot(self):
+        data = build_snapshot(self.form)
+        self.assertEqual(data, build_snapshot(Form.objects.get(pk=self.form.pk)))
+        self.assertEqual(json.loads(data), {
+            'id': self.form.pk, 'name': 'Published', 'schema': SCHEMA, 'is_active': True,
+        })
+
+    def test_publish(self):
+        url = self.publish()
+        self.assertRegex(url, rf'^/published/forms/{self.form.pk}/schema\.[0-9a-f]{{16}}\.json$')
+        path = Path(self.root) / url.removeprefix('/published/')
+        self.assertTrue(path.with_name(path.name + '.gz').exists())
+        form = Form.objects.get(pk=self.form.pk)
+        self.assertEqual(form.get_published_url(), url)
+
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        # Unchanged schemas keep their URL, changed ones get a new one
+        self.assertEqual(self.publish(), url)
+        form.name = 'Renamed'
+        form.save()
+        self.assertNotEqual(self.publish(), url)
+        self.assertTrue(path.exists())
+
+    def test_publish_after_failed_compression(self):
+        class FailingCompressor(publishing.Compressor):
+            def compress(self, path):
+                raise OSError('disk full')
+
+        self.addCleanup(setattr, publishing, 'Compressor', publishing.Compressor)
+        publishing.Compressor = FailingCompressor
+        with self.assertRaises(OSError):
+            publishing.publish_form(self.form)
+        # Nothing left behind that would be served uncompressed forever
+        self.assertEqual([path for path in Path(self.root).rglob('*') if path.is_file()], [])
+
+        publishing.Compressor = FailingCompressor.__bases__[0]
+        path = Path(self.root) / self.publish().removeprefix('/published/')
+        self.assertTrue(path.with_name(path.name + '.gz').exists())
+
+    def test_unpublish_and_delete(self):
+        url = self.publish()
+        self.assertEqual(self.client.delete(reverse('forms_api_publish', args=[self.form.pk])).status_code, 200)
+        self.assertEqual(Form.objects.get(pk=self.form.pk).published_snapshot, '')
+        # Still served to caches holding the URL
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Form.objects.get(pk=self.form.pk).delete()
+        self.assertFalse((Path(self.root) / 'forms' / str(self.form.pk)).exists())
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.post(reverse('forms_api_publish', args=[self.form.pk])).status_code, 404)
+
+
+class SubmissionsAPIQueryTests(QueryBudgetTestCase):
+
+    def test_list(self):
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('submissions_api', args=[self.form.pk]), {'limit': 2}), max_queries=2
+        )
+
+    def test_create(self):
+        self.assertQueryBudget(
+            lambda: self.client.post(
+                reverse('submissions_api_create'),
+                json.dumps({'form_id': self.form.pk, 'data': {'name': 'Ada', 'age': 36}}),
+                content_type='application/json',
+            ),
+            # One more while the webhook endpoints are not cached yet
+            max_queries=7,
+        )
+
+    def test_create_batch(self):
+        self.assertQueryBudget(
+            lambda: self.client.post(
+                reverse('submissions_api', args=[self.form.pk]),
+                json.dumps({'submissions': [{'name': 'Ada', 'age': 36}, {'name': 'Alan', 'age': 41}]}),
+                content_type='application/json',
+            ),
+            # One more while the webhook endpoints are not cached yet
+            max_queries=7,
+        )
+
+    def test_summary(self):
+        # The aggregate row holds a bounded number of tracked values, but its
+        # sketches fill up as submissions arrive
+        self.assertQueryBudget(
+            lambda: self.client.get(reverse('submissions_api_summary', args=[self.form.pk])),
+            max_queries=2, scaling=('bytes',),
+        )
+
+
+class CacheStatsAPIQueryTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        staff = get_user_model().objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+
+    def test_stats(self):
+        # Session and user lookups only
+        self.assertQueryBudget(lambda: self.client.get(reverse('cache_stats_api')), max_queries=2)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    """
+    Routing decisions of ReplicaRouter, with replica lag given per test.
+    Not a TestCase: its wrapping transaction would send every read to the
+    primary.
+    """
+    databases = {'default'}
+
+    def make_router(self, lags=None):
+        with override_settings(FORMBUILDER_REPLICAS={'ALIASES': ['replica1', 'replica2'], 'MAX_LAG': 5.0}):
+            router = ReplicaRouter()
+        router.replica_lag = lambda alias: (lags or {}).get(alias, 0.0)
+        return router
+
+    def route(self, function):
+        # Each call starts unpinned, like a new request
+        return contextvars.Context().run(function)
+
+    def test_reads_go_to_replicas(self):
+        router = self.make_router()
+        self.assertIn(self.route(lambda: router.db_for_read(Form)), {'replica1', 'replica2'})
+        self.assertEqual(self.route(lambda: router.db_for_write(Form)), 'default')
+
+    def test_reads_after_write_go_to_primary(self):
+        router = self.make_router()
+
+        def write_then_read():
+            router.db_for_write(Form)
+            return router.db_for_read(Form)
+        self.assertEqual(self.route(write_then_read), 'default')
+
+    def test_writes_outside_requests_pin_for_a_while(self):
+        router = self.make_router()
+
+        def write_then_read(pin_seconds):
+            router.config['PIN_SECONDS'] = pin_seconds
+            router.db_for_write(Form)
+            return router.db_for_read(Form)
+        self.assertEqual(self.route(lambda: write_then_read(10)), 'default')
+        # Commands and workers go back to the replicas once the pin expires
+        self.assertIn(self.route(lambda: write_then_read(0)), {'replica1', 'replica2'})
+
+    def test_lagging_replicas_are_skipped(self):
+        router = self.make_router({'replica1': 60.0})
+        self.assertEqual(self.route(lambda: router.db_for_read(Form)), 'replica2')
+        router = self.make_router({'replica1': 60.0, 'replica2': float('inf')})
+        self.assertEqual(self.route(lambda: router.db_for_read(Form)), 'default')
+
+    def test_primary_only_apps(self):
+        router = self.make_router()
+        self.assertEqual(self.route(lambda: router.db_for_read(Session)), 'default')
+
+    def test_reads_in_transaction_go_to_primary(self):
+        router = self.make_router()
+
+        def read_in_transaction():
+            with transaction.atomic():
+                return router.db_for_read(Form)
+        self.assertEqual(self.route(read_in_transaction), 'default')
+
+    def test_pinning_middleware(self):
+        factory = RequestFactory()
+        seen = []
+        middleware = ReplicaPinningMiddleware(lambda request: seen.append(is_pinned()) or HttpResponse())
+
+        response = self.route(lambda: middleware(factory.post('/')))
+        pin = response.cookies[PIN_COOKIE].value
+        self.assertTrue(pin)
+
+        request = factory.get('/')
+        request.COOKIES[PIN_COOKIE] = pin
+        response = self.route(lambda: middleware(request))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.route(lambda: middleware(factory.get('/')))
+        self.assertEqual(seen, [False, True, False])
+
+        # Forged, tampered with or expired pins are ignored
+        def read_with_pin(value):
+            request = factory.get('/')
+            request.COOKIES[PIN_COOKIE] = value
+            self.route(lambda: middleware(request))
+        for forged in [str(time.time() + 10 ** 9), 'inf', 'nan', pin[:-1] + ('A' if pin[-1] != 'A' else 'B')]:
+            read_with_pin(forged)
+        middleware.pin_seconds = 0
+        read_with_pin(pin)
+        middleware.pin_seconds = 10
+        self.assertEqual(seen, [False, True, False] + [False] * 5)
+
+        # A write in a request pins the rest of the request only
+        router = self.make_router()
+
+        def write_in_request():
+            middleware.get_response = lambda request: HttpResponse(router.db_for_write(Form))
+            middleware(factory.post('/'))
+            return router.db_for_read(Form)
+        self.assertIn(self.route(write_in_request), {'replica1', 'replica2'})
+
+
+@override_settings(FORMBUILDER_COMPRESS_MIN_SIZE=100, FORMBUILDER_COMPRESS_ENCODINGS=['br', 'zstd', 'gzip'])
+class CompressionTests(SimpleTestCase):
+    """
+    Content negotiation and compression of responses
+    """
+    body = json.dumps({'forms': [{'id': i, 'name': f'Form {i}'} for i in range(50)]}).encode()
+
+    def respond(self, response, accept='gzip'):
+        request = RequestFactory().get('/formbuilder/api/forms/', headers={'Accept-Encoding': accept})
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_negotiate_encoding(self):
+        self.assertEqual(negotiate_encoding('gzip, deflate', ['br', 'gzip']), 'gzip')
+        self.assertEqual(negotiate_encoding('gzip;q=0.5, identity', ['gzip']), 'gzip')
+        self.assertEqual(negotiate_encoding('*', ['gzip']), 'gzip')
+        self.assertIsNone(negotiate_encoding('gzip;q=0', ['gzip']))
+        self.assertIsNone(negotiate_encoding('*;q=0, identity', ['gzip']))
+        self.assertIsNone(negotiate_encoding('', ['gzip']))
+        # Unavailable encodings are skipped
+        self.assertIsNone(negotiate_encoding('unknown', ['unknown', 'gzip']))
+
+    def test_compress(self):
+        response = HttpResponse(self.body, content_type='application/json')
+        response['ETag'] = '"abc"'
+        response = self.respond(response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(zlib.decompress(response.content, 31), self.body)
+
+        # Weak ETags stay as they are
+        response = HttpResponse(self.body)
+        response['ETag'] = 'W/"abc"'
+        self.assertEqual(self.respond(response)['ETag'], 'W/"abc"')
+
+    def test_not_compressed(self):
+        response = self.respond(HttpResponse(self.body), accept='identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.content, self.body)
+
+        # Below the minimum size
+        response = self.respond(HttpResponse(b'{"id": 1}'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        # Already encoded
+        response = HttpResponse(self.body)
+        response['Content-Encoding'] = 'identity'
+        self.assertEqual(self.respond(response).content, self.body)
+
+        # Incompressible
+        response = self.respond(HttpResponse(os.urandom(1000)))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming(self):
+        chunks = [self.body[:500], self.body[500:]]
+        response = self.respond(StreamingHttpResponse(iter(chunks)))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        decompressor = zlib.decompressobj(31)
+        # Each chunk can be decoded as soon as it arrives
+        compressed = iter(response.streaming_content)
+        self.assertEqual(decompressor.decompress(next(compressed)), chunks[0])
+        self.assertEqual(b''.join(decompressor.decompress(data) for data in compressed), chunks[1])
+
+        response = self.respond(StreamingHttpResponse(iter(chunks), content_type='text/event-stream'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_compress_stream(self):
+        compressed = list(compress_stream([b'a' * 10, b'', b'b' * 10], 'gzip'))
+        self.assertEqual(zlib.decompress(b''.join(compressed), 31), b'a' * 10 + b'b' * 10)
+
+
+LEGACY_SCHEMA = {
+    'components': SCHEMA['form']['children'],
+    'localization': {'en-US': {'name': {'label': 'Name'}}},
+    'custom': [1, 2],
+}
+
+
+class SchemaNormalizationTests(SimpleTestCase):
+
+    def test_normalize(self):
+        normalized = normalize_schema(LEGACY_SCHEMA)
+        self.assertFalse(is_legacy_schema(normalized))
+        self.assertEqual(normalized['form']['children'], LEGACY_SCHEMA['components'])
+        self.assertEqual(normalized['localization'], LEGACY_SCHEMA['localization'])
+        self.assertEqual(normalized['custom'], [1, 2])
+        self.assertEqual(normalized['defaultLanguage'], 'en-US')
+        self.assertTrue(verify_round_trip(LEGACY_SCHEMA, normalized))
+        # Canonical schemas are left alone
+        self.assertIs(normalize_schema(SCHEMA), SCHEMA)
+        self.assertTrue(verify_round_trip(SCHEMA, SCHEMA))
+        self.assertEqual(normalize_schema({'components': None})['form']['children'], [])
+
+    def test_round_trip_detects_loss(self):
+        normalized = normalize_schema(LEGACY_SCHEMA)
+        self.assertFalse(verify_round_trip(LEGACY_SCHEMA, {**normalized, 'custom': [1]}))
+        self.assertFalse(verify_round_trip(LEGACY_SCHEMA, {key: v for key, v in normalized.items() if key != 'custom'}))
+        self.assertFalse(verify_round_trip(
+            LEGACY_SCHEMA, {**normalized, 'form': {**normalized['form'], 'children': []}}
+        ))
+        self.assertFalse(verify_round_trip(SCHEMA, normalized))
+
+
+def nested_schema(depth):
+    """
+    Return a schema of ``depth`` containers, each inside the previous one
+    """
+    root = component = {'key': 'c0', 'type': 'RsContainer', 'children': []}
+    for i in range(1, depth):
+        child = {'key': f'c{i}', 'type': 'RsContainer', 'children': []}
+        component['children'].append(child)
+        component = child
+    return {'form': {'key': 'Screen', 'type': 'Screen', 'children': [root]}}
+
+
+# Deep enough to need iteration, and stored by every supported database and
+# Python version (see iter_components)
+STORABLE_DEPTH = 450
+
+
+class ComponentIndexTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_build_component_index(self):
+        index = build_component_index(SCHEMA)
+        self.assertEqual(
+            [(entry['id'], entry['parent'], entry['depth'], entry['position'], entry['key']) for entry in index],
+            [(0, None, 0, 0, 'name'), (1, None, 0, 1, 'age'), (2, None, 0, 2, 'address'), (3, 2, 1, 0, 'city')],
+        )
+        self.assertEqual(index[3]['type'], 'RsInput')
+        self.assertEqual(component_path(index, 3), 'address/city')
+        # Components without a key use their position; non-components are skipped
+        index = build_component_index(with_children({'type': 'RsInput'}, 'text'))
+        self.assertEqual([(entry['key'], component_path(index, 0)) for entry in index], [(None, '0')])
+        self.assertEqual(build_component_index(None), [])
+        self.assertEqual(build_component_index({'form': {}}), [])
+
+    def test_deep_schema(self):
+        index = build_component_index(nested_schema(10000))
+        self.assertEqual(len(index), 10000)
+        self.assertEqual(index[-1]['depth'], 9999)
+        self.assertEqual(component_path(index, 9999).count('/'), 9999)
+
+        form = Form.objects.create(name='Deep', schema=nested_schema(STORABLE_DEPTH))
+        form = Form.objects.get(pk=form.pk)
+        self.assertEqual(form.get_component_count(), STORABLE_DEPTH)
+        self.assertEqual(form.get_component_index()[-1]['parent'], STORABLE_DEPTH - 2)
+
+    def test_index_cache(self):
+        form = Form.objects.create(name='Indexed', schema=SCHEMA)
+        self.assertEqual(Form.objects.get(pk=form.pk).get_component_count(), 4)
+        # Served from the cache, without looking at the schema
+        unsaved = Form.objects.get(pk=form.pk)
+        unsaved.schema = nested_schema(1)
+        self.assertEqual(unsaved.get_component_count(), 4)
+
+        # Bulk writes of the schema bump `modified`, so the cached index is not reused
+        Form.objects.filter(pk=form.pk).update(schema=nested_schema(3))
+        self.assertEqual(Form.objects.get(pk=form.pk).get_component_count(), 3)
+        stale = Form.objects.get(pk=form.pk)
+        stale.schema = SCHEMA
+        Form.objects.bulk_update([stale], ['schema'])
+        self.assertEqual(Form.objects.get(pk=form.pk).get_component_count(), 4)
+
+
+def fields_schema(*keys):
+    return with_children(*({'key': key, 'type': 'RsInput', 'props': {'label': key.title()}} for key in keys))
+
+
+FIELDS = [f'field{i}' for i in range(20)]
+
+
+class FingerprintTests(TestCase):
+
+    def test_signatures_are_stable(self):
+        schema = {'form': {'children': [{'key': 'name', 'type': 'RsInput'}]}}
+        reordered = {'form': {'children': [{'type': 'RsInput', 'key': 'name'}]}}
+        self.assertEqual(schema_fingerprint(schema), schema_fingerprint(reordered))
+        # Fixed across processes and deploys: stored signatures are compared with new ones
+        self.assertEqual(schema_fingerprint(schema), 'b583b442a72ec7dbed3dcee2fe552eb28a74b2625138d080d30cfe2549170aed')
+        signature = minhash_signature(schema_shingles(schema))
+        self.assertEqual(signature[:4], [2857066838, 1401420878, 3927212103, 2191814342])
+        self.assertEqual(signature, minhash_signature(schema_shingles(reordered)))
+        self.assertEqual(lsh_buckets(signature)[:2], ['00f07ad6a2e40341d0', '0149bbb7d4e0e1df2a'])
+        self.assertEqual(minhash_signature(set()), [])
+        self.assertEqual(lsh_buckets([]), [])
+
+    def test_similarity(self):
+        signature = minhash_signature(schema_shingles(fields_schema(*FIELDS)))
+        one_changed = minhash_signature(schema_shingles(fields_schema(*FIELDS[1:], 'other')))
+        half_changed = minhash_signature(schema_shingles(fields_schema(*FIELDS[10:], *FIELDS[:10], 'x')))
+        self.assertEqual(estimate_similarity(signature, signature), 1.0)
+        self.assertGreater(estimate_similarity(signature, one_changed), 0.8)
+        self.assertEqual(estimate_similarity(signature, []), 0.0)
+
+        form = Form.objects.create(name='Original', schema=fields_schema(*FIELDS))
+        clone = Form.objects.create(name='Clone', schema=fields_schema(*FIELDS))
+        near = Form.objects.create(name='Near', schema=fields_schema(*FIELDS[1:], 'other'))
+        Form.objects.create(name='Different', schema=fields_schema(*(f'other{i}' for i in range(20))))
+        Form.objects.create(name='Half', schema=fields_schema(*FIELDS[:10], *(f'other{i}' for i in range(10))))
+        self.assertLess(estimate_similarity(signature, half_changed), 1.0)
+
+        duplicates = [(duplicate.pk, similarity) for duplicate, similarity in form.find_duplicates()]
+        self.assertEqual(duplicates[0], (clone.pk, 1.0))
+        self.assertEqual([pk for pk, _ in duplicates], [clone.pk, near.pk])
+        self.assertEqual([duplicate.pk for duplicate, _ in form.find_duplicates(threshold=1.0)], [clone.pk])
+
+        # Other workspaces are not compared
+        other = Workspace.objects.create(name='Other', slug='other')
+        Form.objects.create(name='Foreign clone', schema=fields_schema(*FIELDS), workspace=other)
+        self.assertEqual(len(form.find_duplicates()), 2)
+
+    def test_save_update_fields(self):
+        form = Form.objects.create(name='Original', schema=fields_schema(*FIELDS))
+        form.schema = fields_schema('changed')
+        form.name = 'Renamed'
+        form.save(update_fields=['name'])
+        stored = Form.objects.get(pk=form.pk)
+        self.assertEqual(stored.schema_fingerprint, schema_fingerprint(stored.get_schema()))
+        self.assertEqual(set(stored.buckets.values_list('bucket', flat=True)), set(lsh_buckets(stored.minhash)))
+
+    def test_dedupe_command(self):
+        for i in range(30):
+            Form.objects.create(name=f'Clone {i}', schema=fields_schema(*FIELDS))
+        near = Form.objects.create(name='Near', schema=fields_schema(*FIELDS[1:], 'other'))
+        Form.objects.create(name='Different', schema=fields_schema('unrelated'))
+        first = Form.objects.order_by('pk').first()
+
+        out = io.StringIO()
+        call_command('dedupe_forms', stdout=out)
+        report = out.getvalue()
+        self.assertIn("Exact duplicate groups: 1", report)
+        # The 30 clones are compared as one form
+        self.assertIn("one form per exact duplicate group): 1", report)
+        self.assertIn(f"forms {first.pk} and {near.pk}", report)
+
+        out = io.StringIO()
+        call_command('dedupe_forms', form=near.pk, threshold=0.8, stdout=out)
+        self.assertEqual(out.getvalue().count('Clone'), 30)
+        self.assertNotIn('Different', out.getvalue())
+
+
+class NormalizeSchemasCommandTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='formbuilder-checkpoint-')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.checkpoint = Path(directory) / 'normalize.checkpoint'
+        self.canonical = Form.objects.create(name='Canonical', schema=SCHEMA)
+        self.legacy = Form.objects.create(name='Legacy', schema=SCHEMA)
+        # Written before normalization on save existed
+        Form.objects.filter(pk=self.legacy.pk).update(schema=LEGACY_SCHEMA, schema_fingerprint='', minhash=[])
+        self.legacy.buckets.all().delete()
+
+    def normalize(self, **options):
+        out = io.StringIO()
+        call_command('normalize_schemas', checkpoint=str(self.checkpoint), stdout=out, **options)
+        return out.getvalue()
+
+    def test_backfill(self):
+        stale = Form.objects.get(pk=self.legacy.pk)
+        # Read in the legacy layout until converted
+        self.assertEqual(stale.get_component_count(), 4)
+        self.assertEqual(sorted(stale.get_component_types()), sorted(self.canonical.get_component_types()))
+        legacy_logic = {**LEGACY_SCHEMA, 'components': [{'key': 'total', 'props': computed('return 1 + 1')}]}
+        Form.objects.filter(pk=self.legacy.pk).update(schema=legacy_logic)
+        self.assertEqual(get_logic(Form.objects.get(pk=self.legacy.pk)).computed, ['total'])
+        Form.objects.filter(pk=self.legacy.pk).update(schema=LEGACY_SCHEMA)
+
+        self.assertIn('1 would be converted', self.normalize(dry_run=True))
+        self.assertTrue(is_legacy_schema(Form.objects.get(pk=self.legacy.pk).get_schema()))
+        self.assertFalse(self.checkpoint.exists())
+
+        self.assertIn('1 converted', self.normalize())
+        form = Form.objects.get(pk=self.legacy.pk)
+        self.assertEqual(form.get_schema(), normalize_schema(LEGACY_SCHEMA))
+        self.assertEqual(form.schema_fingerprint, schema_fingerprint(form.get_schema()))
+        self.assertTrue(form.buckets.exists())
+        # A new modification time: the component index is built again
+        self.assertGreater(form.modified, stale.modified)
+        self.assertEqual(form.get_component_count(), 4)
+        self.assertEqual(self.checkpoint.read_text(), str(self.legacy.pk))
+
+        # Resumes after the checkpoint
+        self.assertIn('Resuming after id', self.normalize())
+        self.assertIn('0 rows scanned', self.normalize())
+
+
+class SketchTests(SimpleTestCase):
+    """
+    Accuracy and merging of the analytics sketches
+    """
+
+    def test_hyperloglog(self):
+        # Standard error is 1.04 / sqrt(1024), about 3.3%: allow three of them
+        for distinct in (50, 1000, 20000):
+            sketch = HyperLogLog()
+            for i in range(distinct):
+                sketch.add(f'value {i}')
+                sketch.add(f'value {i}')
+            self.assertLess(abs(sketch.count() - distinct) / distinct, 0.1, distinct)
+
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(5000):
+            first.add(i)
+            second.add(i + 2500)
+        first.merge(second)
+        self.assertLess(abs(first.count() - 7500) / 7500, 0.1)
+        self.assertEqual(HyperLogLog.from_state(first.to_state()).count(), first.count())
+        self.assertEqual(HyperLogLog().count(), 0)
+
+    def test_tdigest(self):
+        values = list(range(10000))
+        random.Random(1).shuffle(values)
+        digest = TDigest()
+        for value in values:
+            digest.add(value)
+        # Within 1% of the range, and tighter at the tails
+        for q, tolerance in ((0.5, 100), (0.9, 100), (0.99, 20)):
+            self.assertAlmostEqual(digest.quantile(q), q * 9999, delta=tolerance)
+        self.assertLess(len(digest.centroids), 500)
+
+        first, second = TDigest(), TDigest()
+        first.add_sorted(sorted(values[:5000]))
+        second.add_sorted(sorted(values[5000:]))
+        first.merge(second)
+        self.assertAlmostEqual(first.quantile(0.5), 4999.5, delta=100)
+        restored = TDigest.from_state(first.to_state())
+        self.assertEqual(restored.quantile(0.9), first.quantile(0.9))
+        self.assertIsNone(TDigest().quantile(0.5))
+
+    def test_field_stats(self):
+        stats = FieldStats()
+        stats.add_many([1, 2, None, '', 3.5, True])
+        other = FieldStats()
+        other.add_many(['a', ['a', 'b'], 10])
+        stats.merge(FieldStats.from_state(other.to_state()))
+        summary = stats.summary(10)
+        self.assertEqual(summary['filled'], 7)
+        self.assertEqual(summary['fill_rate'], 0.7)
+        self.assertEqual(summary['values'], {'a': 2, 'true': 1, 'b': 1})
+        self.assertEqual(summary['numeric']['count'], 4)
+        self.assertEqual((summary['numeric']['min'], summary['numeric']['max']), (1.0, 10.0))
+        self.assertEqual(summary['numeric']['mean'], 16.5 / 4)
+        self.assertEqual(summary['distinct'], 7)
+
+        stats = FieldStats()
+        stats.add_many([f'choice {i}' for i in range(MAX_TRACKED_VALUES + 5)])
+        self.assertEqual(len(stats.values), MAX_TRACKED_VALUES + 1)
+        self.assertEqual(stats.values[OTHER_VALUE], 5)
+
+
+@override_settings(FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []})
+class SubmissionAnalyticsTests(TestCase):
+
+    def setUp(self):
+        self.form = Form.objects.create(name='Survey', schema=SCHEMA)
+
+    def test_batches_merge_into_the_aggregate(self):
+        ingest_submissions(self.form, [{'name': 'Ann', 'age': 30}, {'name': 'Bob'}])
+        ingest_submissions(self.form, [{'name': 'Ann', 'age': 50}])
+        aggregate = FormAggregate.objects.get(form=self.form)
+        self.assertEqual(aggregate.submission_count, 3)
+        self.assertEqual(aggregate.fields['name']['values'], {'Ann': 2, 'Bob': 1})
+        self.assertEqual(aggregate.fields['age']['count'], 2)
+
+        # Same result as aggregating everything at once
+        merged = aggregate.fields
+        call_command('rebuild_aggregates', form=[self.form.pk], stdout=io.StringIO())
+        rebuilt = FormAggregate.objects.get(form=self.form).fields
+        self.assertEqual(rebuilt['name']['values'], merged['name']['values'])
+        self.assertEqual(rebuilt['age']['sum'], merged['age']['sum'])
+
+    def test_summary(self):
+        ingest_submissions(self.form, [{'name': 'Ann', 'age': i} for i in range(100)] + [{'name': 'Bob'}])
+        response = self.client.get(reverse('submissions_api_summary', args=[self.form.pk]))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['submission_count'], 101)
+        self.assertEqual(data['fields']['name']['values'], {'Ann': 100, 'Bob': 1})
+        self.assertEqual(data['fields']['name']['distinct'], 2)
+        self.assertAlmostEqual(data['fields']['age']['fill_rate'], 100 / 101)
+        self.assertAlmostEqual(data['fields']['age']['numeric']['p50'], 49.5, delta=2)
+        # Fields nobody filled in, but not their containers
+        self.assertEqual(data['fields']['city'], {'filled': 0, 'fill_rate': 0.0, 'distinct': 0})
+        self.assertNotIn('address', data['fields'])
+        self.assertEqual(self.client.get(reverse('submissions_api_summary', args=[0])).status_code, 404)
+
+    def test_rebuild_after_retention(self):
+        ingest_submissions(self.form, [{'name': 'Old'}, {'name': 'New'}])
+        Submission.objects.filter(data__name='Old').delete()
+        # Aggregates are not decremented until rebuilt
+        self.assertEqual(FormAggregate.objects.get(form=self.form).submission_count, 2)
+        call_command('rebuild_aggregates', stdout=io.StringIO())
+        aggregate = FormAggregate.objects.get(form=self.form)
+        self.assertEqual(aggregate.submission_count, 1)
+        self.assertEqual(aggregate.fields['name']['values'], {'New': 1})
+
+    def test_rebuild_keeps_concurrent_ingests(self):
+        from formbuilder.management.commands import rebuild_aggregates
+
+        ingest_submissions(self.form, [{'name': 'Ann'}, {'name': 'Bob'}])
+        aggregate_records = rebuild_aggregates.aggregate_records
+        calls = []
+
+        def aggregate_during_ingest(records):
+            # An ingest arrives while the bulk is aggregated without the lock
+            if not calls:
+                ingest_submissions(self.form, [{'name': 'Cid'}])
+            calls.append(len(records))
+            return aggregate_records(records)
+
+        rebuild_aggregates.aggregate_records = aggregate_during_ingest
+        self.addCleanup(setattr, rebuild_aggregates, 'aggregate_records', aggregate_records)
+        call_command('rebuild_aggregates', form=[self.form.pk], stdout=io.StringIO())
+        # The bulk up to the high-water mark, then the late submission
+        self.assertEqual(calls, [2, 1])
+        aggregate = FormAggregate.objects.get(form=self.form)
+        self.assertEqual(aggregate.submission_count, 3)
+        self.assertEqual(aggregate.fields['name']['values'], {'Ann': 1, 'Bob': 1, 'Cid': 1})
+
+    def test_list_pagination(self):
+        ingest_submissions(self.form, [{'name': f'n{i}'} for i in range(5)])
+        url = reverse('submissions_api', args=[self.form.pk])
+        self.assertEqual(len(self.client.get(url, {'limit': 2, 'offset': 1}).json()['submissions']), 2)
+        for params in ({'limit': -1}, {'offset': -1}, {'limit': 'x'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+
+class PartitionTests(TestCase):
+    """
+    Partition naming and ranges, and the fallback on unpartitioned databases
+    """
+
+    def test_months(self):
+        self.assertEqual(partitions.month_start(datetime.date(2024, 2, 29)), datetime.date(2024, 2, 1))
+        self.assertEqual(partitions.add_months(datetime.date(2024, 11, 15), 2), datetime.date(2025, 1, 1))
+        self.assertEqual(partitions.add_months(datetime.date(2024, 1, 31), -1), datetime.date(2023, 12, 1))
+        self.assertEqual(partitions.add_months(datetime.date(2024, 3, 1), -27), datetime.date(2021, 12, 1))
+        name = partitions.partition_name(datetime.date(2024, 3, 1))
+        self.assertEqual(name, 'formbuilder_submission_p202403')
+        self.assertEqual(partitions.PARTITION_RE.match(name).groups(), ('2024', '03'))
+        self.assertIsNone(partitions.PARTITION_RE.match('formbuilder_submission_default'))
+
+    @unittest.skipIf(connection.vendor == 'postgresql', "Checks the fallback of other databases")
+    def test_unpartitioned(self):
+        self.assertFalse(partitions.is_partitioned())
+        self.assertEqual(partitions.ensure_partitions(), [])
+        self.assertEqual(partitions.list_partitions(), {})
+        tables = connection.introspection.table_names()
+        # Neither the migration nor the post_migrate hook create partitions
+        migration = importlib.import_module('formbuilder.migrations.0005_partition_submissions')
+        executed = []
+        migration.partition_submissions(None, types.SimpleNamespace(connection=connection, execute=executed.append))
+        self.assertEqual(executed, [])
+        create_submission_partitions(sender=None, using='default')
+        self.assertEqual(connection.introspection.table_names(), tables)
+
+    def test_retention(self):
+        form = Form.objects.create(name='Retained', schema=SCHEMA)
+        ingest_submissions(form, [{'name': f'n{i}'} for i in range(5)])
+        old = datetime.datetime(2024, 1, 31, 23, 59, tzinfo=datetime.timezone.utc)
+        Submission.objects.filter(pk__in=Submission.objects.order_by('pk').values('pk')[:3]).update(created=old)
+        today = datetime.date(2024, 4, 10)
+
+        result = partitions.purge_submissions(3, today=today, batch_size=2)
+        self.assertTrue(result.endswith('deleted 0 submission(s)'), result)
+        result = partitions.purge_submissions(2, today=today, batch_size=2)
+        self.assertTrue(result.endswith('deleted 3 submission(s)'), result)
+        self.assertEqual(Submission.objects.filter(form=form).count(), 2)
+
+    @unittest.skipIf(connection.vendor == 'postgresql', "Checks the fallback of other databases")
+    def test_command(self):
+        out = io.StringIO()
+        call_command('manage_partitions', retention_months=1, stdout=out)
+        self.assertIn('not partitioned', out.getvalue())
+        self.assertIn('Retention (1 months): deleted 0 submission(s)', out.getvalue())
+
+
+class CacheTests(TestCase):
+    """
+    The in-process LRU and the two-tier cache in front of the Django cache
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.loads = []
+
+    def loader(self, value):
+        def load():
+            self.loads.append(value)
+            return value
+        return load
+
+    def test_lru_eviction(self):
+        lru = LRUCache(max_bytes=100, ttl=60)
+        lru.set('a', 'A', 40, 0, now=0)
+        lru.set('b', 'B', 40, 0, now=0)
+        lru.get('a', now=1)
+        lru.set('c', 'C', 40, 0, now=1)
+        # The least recently used entry goes first
+        self.assertIsNone(lru.get('b', now=1))
+        self.assertEqual(lru.get('a', now=1)[0], 'A')
+        self.assertEqual((len(lru), lru.size, lru.evictions), (2, 80, 1))
+        # Entries larger than the whole cache are not stored
+        lru.set('huge', 'H', 101, 0, now=1)
+        self.assertIsNone(lru.get('huge', now=1))
+        lru.set('a', 'A2', 10, 0, now=1)
+        self.assertEqual(lru.size, 50)
+
+    def test_lru_ttl(self):
+        lru = LRUCache(max_bytes=100, ttl=10)
+        lru.set('a', 'A', 1, 0, now=0)
+        self.assertIsNotNone(lru.get('a', now=9.9))
+        self.assertIsNone(lru.get('a', now=10))
+        self.assertEqual((lru.expirations, lru.size), (1, 0))
+        self.assertEqual((lru.hits, lru.misses), (1, 1))
+
+    def test_tiers(self):
+        first = TieredCache('test:tiers', revalidate_after=60)
+        self.assertEqual(first.get('k', self.loader('v1')), 'v1')
+        self.assertEqual(first.get('k', self.loader('v2')), 'v1')
+        self.assertEqual(self.loads, ['v1'])
+        self.assertEqual(first.local.hits, 1)
+
+        # Another process fills its local tier from the Django cache
+        second = TieredCache('test:tiers', revalidate_after=60)
+        self.assertEqual(second.get('k'), 'v1')
+        self.assertEqual((second.remote_hits, self.loads), (1, ['v1']))
+
+        # None is not cached; a miss without a loader returns None
+        self.assertIsNone(first.get('none', self.loader(None)))
+        self.assertIsNone(first.get('none'))
+        self.assertEqual(first.get('none', self.loader('late')), 'late')
+
+        stats = first.stats()
+        self.assertEqual(stats['local']['entries'], 2)
+        self.assertEqual(stats['remote']['misses'], 4)
+
+    def test_invalidation(self):
+        first = TieredCache('test:invalidation', revalidate_after=60)
+        second = TieredCache('test:invalidation', revalidate_after=0)
+        stale = TieredCache('test:invalidation', revalidate_after=60)
+        for tiered in (first, second, stale):
+            tiered.get('k', self.loader('v1'))
+
+        first.invalidate('k')
+        # Locally: immediately. Elsewhere: once the version stamp is re-checked
+        self.assertEqual(first.get('k', self.loader('v2')), 'v2')
+        self.assertEqual(second.get('k', self.loader('v3')), 'v2')
+        self.assertEqual(second.revalidations, 1)
+        self.assertEqual(stale.get('k', self.loader('v4')), 'v1')
+        self.assertEqual(self.loads, ['v1', 'v2'])
+
+        # A version stamp evicted from the Django cache restarts from scratch
+        cache.delete('test:invalidation:v:k')
+        first.invalidate('k')
+        self.assertEqual(first.get('k', self.loader('v5')), 'v5')
+
+    def test_stats_view(self):
+        self.assertEqual(self.client.get(reverse('cache_stats_api')).status_code, 302)
+        staff = get_user_model().objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        form_cache.local.clear()
+        data = self.client.get(reverse('cache_stats_api')).json()
+        self.assertEqual(set(data['form_cache']), {'local', 'remote'})
+        self.assertEqual(data['form_cache']['local']['entries'], 0)
+
+
+class RateLimitTests(TestCase):
+    """
+    Token buckets, their middleware and load shedding
+    """
+
+    def setUp(self):
+        ratelimit._backend = None
+        self.addCleanup(setattr, ratelimit, '_backend', None)
+
+    def limits(self, **config):
+        return self.settings(FORMBUILDER_RATE_LIMITS={'BACKEND': 'memory', **config})
+
+    def test_token_bucket(self):
+        now = [0.0]
+        backend = ratelimit.MemoryBackend(max_keys=2, clock=lambda: now[0])
+        self.assertEqual([backend.consume('a', rate=2, burst=3)[0] for _ in range(4)], [True, True, True, False])
+        self.assertEqual(backend.consume('a', rate=2, burst=3), (False, 0.5))
+        now[0] = 0.5
+        self.assertEqual(backend.consume('a', rate=2, burst=3), (True, 0.0))
+        self.assertFalse(backend.consume('a', rate=2, burst=3)[0])
+        # Refills up to the burst only
+        now[0] = 100
+        self.assertEqual(backend.consume('a', rate=2, burst=3, cost=3), (True, 0.0))
+        self.assertFalse(backend.consume('a', rate=2, burst=3)[0])
+
+        # The least recently used bucket is dropped beyond max_keys, i.e. starts full again
+        backend.consume('b', rate=1, burst=1)
+        backend.consume('c', rate=1, burst=1)
+        self.assertTrue(backend.consume('a', rate=2, burst=3)[0])
+
+    def test_client_bucket(self):
+        with self.limits(CLIENT={'rate': 1.0, 'burst': 2}):
+            statuses = [self.client.get(reverse('forms_api')).status_code for _ in range(3)]
+            self.assertEqual(statuses, [200, 200, 429])
+            response = self.client.get(reverse('forms_api'))
+            self.assertEqual(response['Retry-After'], '1')
+            self.assertEqual(response.json(), {'error': 'Too many requests'})
+            # Another client has its own bucket; pages are not limited
+            self.assertEqual(self.client.get(reverse('forms_api'), REMOTE_ADDR='10.0.0.2').status_code, 200)
+            self.assertEqual(self.client.get(reverse('forms_list')).status_code, 200)
+
+    def test_form_bucket(self):
+        form = Form.objects.create(name='Popular', schema=SCHEMA)
+        other = Form.objects.create(name='Quiet', schema=SCHEMA)
+        with self.limits(FORM={'rate': 0.1, 'burst': 2}):
+            url = reverse('forms_api_detail', args=[form.pk])
+            statuses = [self.client.get(url, REMOTE_ADDR=f'10.0.0.{i}').status_code for i in range(3)]
+            self.assertEqual(statuses, [200, 200, 429])
+            self.assertEqual(self.client.get(url)['Retry-After'], '10')
+            self.assertEqual(self.client.get(reverse('forms_api_detail', args=[other.pk])).status_code, 200)
+
+    def test_client_id(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='1.2.3.4, 10.0.0.9')
+        self.assertEqual(ratelimit.get_client_id(request), 'ip:10.0.0.1')
+        self.assertEqual(ratelimit.get_client_id(request, trust_x_forwarded_for=True), 'ip:1.2.3.4')
+        request.user = get_user_model()(pk=7)
+        self.assertEqual(ratelimit.get_client_id(request), 'user:7')
+
+    def test_backend_choice(self):
+        # The test cache is not Redis
+        self.assertIsNone(ratelimit.get_redis_client('default'))
+        for backend in ('auto', 'redis', 'memory'):
+            ratelimit._backend = None
+            with self.settings(FORMBUILDER_RATE_LIMITS={'BACKEND': backend}):
+                self.assertIsInstance(ratelimit.get_backend(), ratelimit.MemoryBackend)
+        self.assertIs(ratelimit.get_backend(), ratelimit.get_backend())
+
+    def test_concurrency_limit(self):
+        statuses = []
+
+        def view(request):
+            # A second request arriving while this one is in flight
+            statuses.append(middleware(request).status_code)
+            return HttpResponse()
+
+        with self.limits(MAX_CONCURRENT_REQUESTS=1):
+            middleware = ratelimit.ConcurrencyLimitMiddleware(view)
+        response = middleware(RequestFactory().get('/'))
+        self.assertEqual((response.status_code, statuses), (200, [503]))
+        # Released once done
+        self.assertEqual(middleware.in_flight, 0)
+
+
+def json_copy(value):
+    # copy.deepcopy recurses too deep for the deepest storable schemas
+    return json.loads(json.dumps(value))
+
+
+def apply_patch(document, patch):
+    """
+    Apply a JSON Patch of add, remove and replace operations
+    """
+    document = json_copy(document)
+    for operation in patch:
+        if not operation['path']:
+            document = json_copy(operation['value'])
+            continue
+        *parents, last = [
+            token.replace('~1', '/').replace('~0', '~') for token in operation['path'].split('/')[1:]
+        ]
+        target = document
+        for token in parents:
+            target = target[int(token) if isinstance(target, list) else token]
+        if isinstance(target, list):
+            if operation['op'] == 'add' and last == '-':
+                target.append(json_copy(operation['value']))
+            elif operation['op'] == 'remove':
+                del target[int(last)]
+            else:
+                target[int(last)] = json_copy(operation['value'])
+        elif operation['op'] == 'remove':
+            del target[last]
+        else:
+            target[last] = json_copy(operation['value'])
+    return document
+
+
+class EventTests(TestCase):
+    """
+    Change events: schema patches, broker fan-out and stream resumption
+    """
+
+    def setUp(self):
+        self.addCleanup(setattr, events, '_broker', None)
+        events._broker = None
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def subscribe(self, broker, channel):
+        async def subscribe():
+            return broker.subscribe(channel)
+        return self.loop.run_until_complete(subscribe())
+
+    def receive(self, subscription):
+        return self.loop.run_until_complete(asyncio.wait_for(subscription.get(), 1))
+
+    def test_json_patch(self):
+        cases = [
+            (SCHEMA, with_children(SCHEMA['form']['children'][0], *ADDRESS)),
+            (SCHEMA, {**SCHEMA, 'form': {**SCHEMA['form'], 'props': {'a/b': 1, 'c~d': [1, 2]}}}),
+            ({'a/b': 1, 'c~d': [1, 2, 3], 'e': {'f': 1}}, {'a/b': 2, 'c~d': [1], 'e': [1]}),
+            ([1, {'a': [1]}], [2, {'a': [1, 2, 3]}, None]),
+            ({'a': 1}, [1]),
+            (SCHEMA, SCHEMA),
+        ]
+        for old, new in cases:
+            patch = events.json_patch(old, new)
+            self.assertEqual(apply_patch(old, patch), new)
+        self.assertEqual(events.json_patch(SCHEMA, SCHEMA), [])
+
+    def test_deep_json_patch(self):
+        old = nested_schema(STORABLE_DEPTH)
+        new = json_copy(old)
+        component = new['form']
+        while component['children']:
+            component = component['children'][0]
+        component['props'] = {'label': 'Deepest'}
+
+        patch = events.json_patch(old, new)
+        self.assertEqual(apply_patch(old, patch), new)
+        # Replaced at the depth bound instead of recursing further
+        self.assertEqual(len(patch), 1)
+        self.assertEqual(patch[0]['op'], 'replace')
+        self.assertEqual(patch[0]['path'].count('/'), events.MAX_PATCH_DEPTH)
+
+    def test_fan_out(self):
+        broker = events.Broker(events.InProcessBackend(), queue_size=2)
+        first, second = self.subscribe(broker, 'form:1'), self.subscribe(broker, 'form:1')
+        other = self.subscribe(broker, 'form:2')
+        self.assertEqual(broker.subscriber_count('form:1'), 2)
+        self.assertEqual(broker.subscriber_count(), 3)
+
+        # Published from another thread, delivered in the subscribers' loop
+        thread = threading.Thread(target=broker.publish, args=('form:1', b'one'))
+        thread.start()
+        thread.join()
+        self.assertEqual((self.receive(first), self.receive(second)), (b'one', b'one'))
+        self.assertTrue(other.queue.empty())
+
+        # A slow subscriber loses its oldest events
+        for frame in [b'two', b'three', b'four']:
+            broker.publish('form:1', frame)
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual((self.receive(first), self.receive(first)), (b'three', b'four'))
+        self.assertEqual(first.dropped, 1)
+
+        for subscription in (first, second, other):
+            broker.unsubscribe(subscription)
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    def test_save_publishes_patch(self):
+        form = Form.objects.create(name='Live', schema=SCHEMA)
+        subscription = self.subscribe(events.get_broker(), events.form_channel(form.pk))
+        previous_version = events.form_version(form)
+
+        schema = with_children(SCHEMA['form']['children'][0], *ADDRESS)
+        with self.captureOnCommitCallbacks(execute=True):
+            form.schema = schema
+            form.save()
+        frame = self.receive(subscription).decode()
+        self.assertTrue(frame.startswith(f"id: {events.form_version(form)}\nevent: changed\n"))
+        data = json.loads(frame.split('data: ', 1)[1])
+        self.assertEqual(data['base_version'], previous_version)
+        self.assertEqual(apply_patch(SCHEMA, data['patch']), schema)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            form.delete()
+        self.assertIn('event: deleted', self.receive(subscription).decode())
+
+    def test_resume(self):
+        def first_event(last_event_id):
+            async def read():
+                stream = events.stream_form_events(1, 'v2', last_event_id)
+                try:
+                    self.assertTrue((await anext(stream)).startswith(b'retry: '))
+                    return (await anext(stream)).decode()
+                finally:
+                    await stream.aclose()
+            return self.loop.run_until_complete(read())
+
+        self.assertTrue(first_event(None).startswith('id: v2\nevent: version\n'))
+        self.assertTrue(first_event('v2').startswith('id: v2\nevent: version\n'))
+        # Changed while the client was disconnected: refetch, no patch
+        event = first_event('v1')
+        self.assertTrue(event.startswith('id: v2\nevent: changed\n'))
+        self.assertEqual(json.loads(event.split('data: ', 1)[1]), {'form_id': 1, 'version': 'v2'})
+        self.assertEqual(events.get_broker().subscriber_count(), 0)
+
+    def test_stream_under_wsgi(self):
+        form = Form.objects.create(name='Live', schema=SCHEMA)
+        # The test client is a WSGI handler, like runserver
+        response = self.client.get(reverse('forms_api_events', args=[form.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = iter(response.streaming_content)
+        self.assertTrue(next(stream).startswith(b'retry: '))
+        self.assertIn(b'event: version', next(stream))
+
+        # Sent as they are published, not once the stream ends
+        events.get_broker().publish(events.form_channel(form.pk), b'event: test\n\n')
+        self.assertEqual(next(stream), b'event: test\n\n')
+        response.close()
+        self.assertEqual(events.get_broker().subscriber_count(), 0)
+
+
+class SoftDeleteTests(TestCase):
+    """
+    Tombstones of deleted forms, the delta feed and the batched purge
+    """
+
+    def setUp(self):
+        cache.clear()
+        form_cache.local.clear()
+        self.form = Form.objects.create(name='Doomed', schema=SCHEMA)
+        ingest_submissions(self.form, [{'name': f'n{i}'} for i in range(25)])
+        self.bystander = Form.objects.create(name='Bystander', schema=SCHEMA)
+        ingest_submissions(self.bystander, [{'name': 'kept'}])
+
+    def make_pacer(self, **config):
+        self.pauses = []
+        return BatchPacer({**softdelete.get_config(), 'PAUSE_RATIO': 0, **config}, sleep=self.pauses.append)
+
+    def test_delete_leaves_tombstone(self):
+        response = self.client.delete(reverse('forms_api_detail', args=[self.form.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Form.objects.filter(pk=self.form.pk).exists())
+        self.assertIsNotNone(Form.all_objects.get(pk=self.form.pk).deleted_at)
+        self.assertEqual(Submission.objects.filter(form_id=self.form.pk).count(), 25)
+        self.assertEqual(self.client.get(reverse('forms_api_detail', args=[self.form.pk])).status_code, 404)
+        self.assertEqual(self.client.delete(reverse('forms_api_detail', args=[self.form.pk])).status_code, 404)
+
+    def test_changes_since(self):
+        since = timezone.now()
+        created = Form.objects.create(name='Created', schema=SCHEMA)
+        self.bystander.name = 'Renamed'
+        self.bystander.save()
+        self.form.delete()
+
+        response = self.client.get(reverse('forms_api'), {'since': since.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([form['id'] for form in data['forms']], [created.pk, self.bystander.pk])
+        self.assertEqual([form['id'] for form in data['deleted']], [self.form.pk])
+        self.assertLess(parse_datetime(data['next_since']), timezone.now())
+
+        # The full list leaves out deleted forms
+        data = self.client.get(reverse('forms_api')).json()
+        self.assertNotIn(self.form.pk, [form['id'] for form in data['forms']])
+        self.assertIn('next_since', data)
+
+    def test_changes_since_invalid(self):
+        self.assertEqual(self.client.get(reverse('forms_api'), {'since': 'yesterday'}).status_code, 400)
+        long_ago = timezone.now() - datetime.timedelta(days=softdelete.get_config()['TOMBSTONE_DAYS'] + 1)
+        self.assertEqual(self.client.get(reverse('forms_api'), {'since': long_ago.isoformat()}).status_code, 410)
+
+    def test_purge(self):
+        self.form.delete()
+        pacer = self.make_pacer(BATCH_SIZE=10)
+        purge_deleted_forms(pacer=pacer)
+        self.assertFalse(Submission.objects.filter(form_id=self.form.pk).exists())
+        self.assertFalse(FormAggregate.objects.filter(form_id=self.form.pk).exists())
+        self.assertGreaterEqual(pacer.batches, 3)
+        # The tombstone outlives the rows until it expires
+        self.assertTrue(Form.all_objects.filter(pk=self.form.pk).exists())
+        self.assertEqual(Submission.objects.filter(form=self.bystander).count(), 1)
+
+        expired = timezone.now() - datetime.timedelta(days=softdelete.get_config()['TOMBSTONE_DAYS'] + 1)
+        Form.all_objects.filter(pk=self.form.pk).update(deleted_at=expired)
+        purge_deleted_forms(pacer=self.make_pacer())
+        self.assertFalse(Form.all_objects.filter(pk=self.form.pk).exists())
+        self.assertTrue(Form.objects.filter(pk=self.bystander.pk).exists())
+
+    def test_pacer_backs_off(self):
+        pacer = self.make_pacer(BATCH_SIZE=1000, MAX_RETRIES=2)
+
+        def locked():
+            raise OperationalError('canceling statement due to lock timeout')
+        self.assertEqual(pacer.run(locked), 0)
+        self.assertEqual(pacer.run(locked), 0)
+        self.assertEqual(pacer.batch_size, 250)
+        self.assertEqual(len(self.pauses), 2)
+        self.assertLess(self.pauses[0], self.pauses[1])
+        with self.assertRaises(OperationalError):
+            pacer.run(locked)
+
+        # A successful batch resets the retry count
+        pacer = self.make_pacer(MAX_RETRIES=1)
+        pacer.run(locked)
+        self.assertEqual(pacer.run(lambda: 5), 5)
+        self.assertEqual(pacer.run(locked), 0)
+
+
+class StreamingParserTests(SimpleTestCase):
+    """
+    Incremental parsing of JSON arrays and newline-delimited JSON
+    """
+
+    def parse(self, body, key=None, **kwargs):
+        return list(iter_items(io.BytesIO(body.encode()), key, **kwargs))
+
+    def test_items_split_across_chunks(self):
+        items = [1234, -1.5e10, 'é"\\', None, True, {'a': [1, {'b': 'c'}]}, [], {}]
+        body = json.dumps({'meta': {'x': [1, 2]}, 'items': items, 'after': 'z'}, ensure_ascii=False)
+        for chunk_size in (1, 2, 3, 64):
+            self.assertEqual(self.parse(body, 'items', chunk_size=chunk_size), items)
+            self.assertEqual(self.parse(json.dumps(items, indent=2), chunk_size=chunk_size), items)
+        self.assertEqual(self.parse('{"items": []}', 'items'), [])
+
+    def test_items_are_yielded_as_they_arrive(self):
+        stream = io.BytesIO(b'{"items": [{"n": 1}, {"n": 2}, ' + b' ' * 10000 + b'{"n": 3}]}')
+        items = iter_items(stream, 'items', chunk_size=64)
+        self.assertEqual(next(items), {'n': 1})
+        self.assertLess(stream.tell(), 100)
+
+    def test_invalid_bodies(self):
+        for body, key in [
+            ('{"items": [1, 2', 'items'), ('[1 2]', None), ('[1,]', None), ('{"other": []}', 'items'),
+            ('[1] x', None), ('', None), ('{"items": {}}', 'items'),
+        ]:
+            with self.subTest(body=body), self.assertRaises(StreamingJSONError):
+                self.parse(body, key, chunk_size=4)
+
+    def test_size_limits(self):
+        with self.assertRaisesRegex(TooLarge, 'Item 1'):
+            self.parse(json.dumps([1, 'x' * 100]), max_item_size=50, chunk_size=8)
+        with self.assertRaises(TooLarge):
+            self.parse(json.dumps(['x' * 40] * 10), max_body_size=200, chunk_size=8)
+        # Members around the array must fit the item size as well
+        with self.assertRaises(TooLarge):
+            self.parse(json.dumps({'junk': 'x' * 100, 'items': []}), 'items', max_item_size=50)
+
+    def test_lines(self):
+        body = b'{"a": 1}\n\n{"b": [2]}\r\n{"c": 3}'
+        for chunk_size in (1, 5, 64):
+            self.assertEqual(list(iter_lines(io.BytesIO(body), chunk_size=chunk_size)), [{'a': 1}, {'b': [2]}, {'c': 3}])
+        with self.assertRaisesRegex(StreamingJSONError, 'Item 1'):
+            list(iter_lines(io.BytesIO(b'{}\n{"a": \n')))
+        with self.assertRaises(TooLarge):
+            list(iter_lines(io.BytesIO(b'{"a": "' + b'x' * 100 + b'"}'), max_item_size=50, chunk_size=8))
+
+
+@override_settings(FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []})
+class StreamingAPITests(TestCase):
+    """
+    Bulk submissions and form import endpoints
+    """
+
+    def setUp(self):
+        self.form = Form.objects.create(name='Bulk', schema=SCHEMA)
+        self.url = reverse('submissions_api_bulk', args=[self.form.pk])
+
+    def post(self, url, body, content_type='application/json'):
+        if not isinstance(body, (str, bytes)):
+            body = json.dumps(body)
+        return self.client.post(url, body, content_type=content_type)
+
+    @override_settings(FORMBUILDER_STREAMING={'BATCH_SIZE': 4})
+    def test_bulk_submissions(self):
+        records = [{'name': f'n{i}', 'age': i} for i in range(10)]
+        response = self.post(self.url, {'submissions': records})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'stored': 10})
+        self.assertEqual(Submission.objects.filter(form=self.form).count(), 10)
+        self.assertEqual(FormAggregate.objects.get(form=self.form).submission_count, 10)
+
+        body = '\n'.join(json.dumps(record) for record in records[:3])
+        response = self.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.json(), {'stored': 3})
+
+    @override_settings(FORMBUILDER_STREAMING={'BATCH_SIZE': 4, 'MAX_ITEM_SIZE': 100})
+    def test_bulk_submissions_stop_at_bad_item(self):
+        records = [{'name': f'n{i}'} for i in range(9)]
+        response = self.post(self.url, {'submissions': records + [{'name': 'x' * 200}]})
+        self.assertEqual(response.status_code, 413)
+        # Complete batches before the oversized item are kept
+        self.assertEqual(response.json()['stored'], 8)
+        self.assertEqual(Submission.objects.filter(form=self.form).count(), 8)
+
+        response = self.post(self.url, {'submissions': [{'name': 'a'}, 'b']})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['stored'], 0)
+        self.assertEqual(self.post(self.url, '{"submissions": [{}').status_code, 400)
+        self.assertEqual(self.post(reverse('submissions_api_bulk', args=[0]), {'submissions': []}).status_code, 404)
+
+    @override_settings(FORMBUILDER_STREAMING={'MAX_BODY_SIZE': 1000})
+    def test_body_size_limit(self):
+        response = self.post(self.url, {'submissions': [{'name': 'x' * 100}] * 20})
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()['stored'], 0)
+
+    def test_import_forms(self):
+        response = self.post(reverse('forms_api_import'), {'forms': [
+            {'name': 'One', 'schema': SCHEMA}, {'name': 'Two', 'schema': {'form': {'children': []}}},
+        ]})
+        self.assertEqual(response.status_code, 201)
+        imported = response.json()['imported']
+        self.assertEqual([form['name'] for form in imported], ['One', 'Two'])
+        self.assertEqual(Form.objects.get(pk=imported[0]['id']).get_schema(), SCHEMA)
+
+        response = self.post(reverse('forms_api_import'), {'forms': [{'name': 'Three', 'schema': {}}, {'name': 'Four'}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([form['name'] for form in response.json()['imported']], ['Three'])
+
+
+@override_settings(FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []})
+class UploadTests(TestCase):
+    """
+    Resumable chunked uploads and their link to submissions
+    """
+
+    def setUp(self):
+        root = tempfile.mkdtemp(prefix='formbuilder-uploads-')
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.enterContext(self.settings(FORMBUILDER_UPLOADS={'ROOT': root, 'FSYNC': False}))
+        schema = {'form': {'children': [*SCHEMA['form']['children'], {'key': 'resume', 'type': 'RsUploader'}]}}
+        self.form = Form.objects.create(name='Application', schema=schema)
+        self.content = bytes(range(256)) * 40
+
+    def create(self, **data):
+        return self.client.post(
+            reverse('uploads_api', args=[self.form.pk]),
+            json.dumps({'component_key': 'resume', 'filename': 'cv.pdf', 'size': len(self.content), **data}),
+            content_type='application/json',
+        )
+
+    def patch(self, url, offset, chunk, checksum=None):
+        headers = {'Upload-Offset': str(offset)}
+        if checksum:
+            headers['Upload-Checksum'] = checksum
+        return self.client.patch(url, chunk, content_type='application/offset+octet-stream', headers=headers)
+
+    def sha256(self, data):
+        return 'sha256 ' + base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+    def test_upload_in_chunks(self):
+        response = self.create()
+        self.assertEqual(response.status_code, 201)
+        url = response['Location']
+        for offset in range(0, len(self.content), 4000):
+            chunk = self.content[offset:offset + 4000]
+            response = self.patch(url, offset, chunk, self.sha256(chunk))
+            self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(response.json()['completed'])
+        upload = Upload.objects.get(pk=response.json()['id'])
+        self.assertEqual(upload_path(upload).read_bytes(), self.content)
+
+        response = self.client.head(url)
+        self.assertEqual(response['Upload-Offset'], str(len(self.content)))
+        self.assertEqual(self.patch(url, len(self.content), b'x').status_code, 409)
+
+        ingest_submissions(self.form, [{'name': 'Ann', 'resume': str(upload.pk)}, {'name': 'Bob'}])
+        upload.refresh_from_db()
+        self.assertEqual(upload.submission.data['name'], 'Ann')
+        self.assertEqual(self.client.delete(url).status_code, 409)
+
+    def test_rejected_chunks(self):
+        url = self.create()['Location']
+        self.assertEqual(self.patch(url, 0, self.content[:100], self.sha256(b'other')).status_code, 460)
+        self.assertEqual(self.patch(url, 50, self.content[:100]).status_code, 409)
+        self.assertEqual(self.patch(url, 0, self.content + b'x').status_code, 413)
+        self.assertEqual(self.patch(url, 0, b'x', 'crc32 AAAA').status_code, 400)
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '0')
+
+        # Bytes beyond the offset, e.g. of a chunk cut off by a crash, are overwritten on resume
+        upload = Upload.objects.get()
+        upload_path(upload).write_bytes(b'garbage' * 100)
+        self.assertEqual(self.patch(url, 0, self.content).status_code, 200)
+        self.assertEqual(upload_path(upload).read_bytes(), self.content)
+
+    def test_create_validation(self):
+        self.assertEqual(self.create(component_key='photo').status_code, 400)
+        self.assertEqual(self.create(size=-1).status_code, 400)
+        with override_settings(FORMBUILDER_UPLOADS={**settings.FORMBUILDER_UPLOADS, 'MAX_SIZE': 10}):
+            self.assertEqual(self.create().status_code, 413)
+        self.assertEqual(self.client.head(reverse('upload_api', args=[uuid.uuid4()])).status_code, 404)
+
+    def test_link_only_matching_component(self):
+        upload = Upload.objects.get(pk=self.create(size=0).json()['id'])
+        self.assertIsNotNone(upload.completed_at)
+        ingest_submissions(self.form, [{'name': str(upload.pk)}])
+        upload.refresh_from_db()
+        self.assertIsNone(upload.submission_id)
+
+    def test_purge(self):
+        kept = Upload.objects.get(pk=self.create().json()['id'])
+        expired = Upload.objects.get(pk=self.create().json()['id'])
+        Upload.objects.filter(pk=expired.pk).update(modified=timezone.now() - datetime.timedelta(days=2))
+        orphan = upload_path(expired).with_name(uuid.uuid4().hex)
+        orphan.touch()
+        os.utime(orphan, (time.time() - 3600,) * 2)
+        purge_uploads()
+        self.assertEqual(list(Upload.objects.values_list('pk', flat=True)), [kept.pk])
+        self.assertFalse(upload_path(expired).exists())
+        self.assertFalse(orphan.exists())
+        self.assertTrue(upload_path(kept).exists())
+
+
+def computed(source):
+    return {'value': {'computeType': 'function', 'fnSource': source}}
+
+
+REQUIRED = {'validations': [{'key': 'required'}]}
+
+LOGIC_SCHEMA = {
+    'form': {
+        'children': [
+            {'key': 'age', 'type': 'RsNumber'},
+            {'key': 'country', 'type': 'RsInput'},
+            {'key': 'consent', 'type': 'RsCheckbox', 'renderWhen': {'value': 'form.data.age < 18'}, 'schema': REQUIRED},
+            {
+                'key': 'us', 'type': 'RsContainer', 'renderWhen': {'value': "form.data.country === 'US'"},
+                'children': [
+                    {'key': 'state', 'type': 'RsInput', 'schema': REQUIRED},
+                    {'key': 'zip', 'type': 'RsInput', 'renderWhen': {'value': 'form.data.state.length > 0'}},
+                ],
+            },
+            {'key': 'price', 'type': 'RsNumber'},
+            {'key': 'quantity', 'type': 'RsNumber'},
+            {'key': 'total', 'type': 'RsNumber', 'props': computed('return form.data.price * form.data.quantity;')},
+            {
+                'key': 'shipping', 'type': 'RsNumber', 'renderWhen': {'value': 'form.data.total < 100'},
+                'props': computed('return form.data.country === "US" ? 5 : 20'),
+            },
+        ]
+    }
+}
+
+
+class LogicTests(SimpleTestCase):
+    """
+    Compilation and incremental evaluation of conditions and calculated fields
+    """
+
+    def setUp(self):
+        self.logic = compile_logic(LOGIC_SCHEMA)
+
+    def test_expressions(self):
+        for source, data, expected in [
+            ('form.data.a + form.data.b * 2', {'a': 1, 'b': '3'}, 7),
+            ("'n' + form.data.a", {'a': 1.0}, 'n1'),
+            ('form.data.a / 0', {'a': 1}, math.inf),
+            ('form.data.a >= 18 && form.data.b', {'a': '20', 'b': 'yes'}, 'yes'),
+            ('form.data.a ?? form.data.b ?? 3', {}, 3),
+            ('form.data.a == 1 && form.data.a !== 1', {'a': '1'}, True),
+            ('form.data.a ? 1 : form.data.b ? 2 : 3', {'b': []}, 2),
+            ("form.data['a b'].includes('x') && form.data.c.length", {'a b': ['x'], 'c': 'abc'}, 3),
+            ('Math.max(form.data.a, 2) - Math.round(2.5)', {'a': 10}, 7),
+            ('true === 1 || null == undefined', {}, True),
+        ]:
+            with self.subTest(source=source):
+                logic = compile_logic({'form': {'children': [{'key': 'out', 'props': computed(f'return {source}')}]}})
+                self.assertEqual(logic.errors, [])
+                self.assertEqual(logic.evaluate(data).value('out'), expected)
+
+    def test_unsupported_expressions(self):
+        for source in ['window.alert(1)', 'form.x', 'form.data.a.constructor', 'Math.random()', 'a = 1', '1 +']:
+            with self.subTest(source=source), self.assertRaises(LogicError):
+                Parser(source).parse()
+        logic = compile_logic({'form': {'children': [
+            {'key': 'a', 'props': computed('if (x) { return 1 }')},
+            {'key': 'b', 'props': computed('return form.data.c')},
+            {'key': 'c', 'props': computed('return form.data.b')},
+        ]}})
+        self.assertEqual(len(logic.errors), 3)
+        self.assertIsNone(logic.evaluate({'b': 1}).value('b'))
+
+    def test_expression_limits(self):
+        deep = [
+            '(' * 500 + '1' + ')' * 500,
+            ' + '.join(['form.data.a'] * 2000),
+            '-' * 2000 + '1',
+            'Math.abs(' * 300 + '1' + ')' * 300,
+            '1 ? ' * 300 + '1' + ' : 0' * 300,
+            "'" + 'x' * 20000 + "'",
+        ]
+        for source in deep:
+            with self.subTest(source=source[:20]), self.assertRaises(LogicError):
+                Parser(source).parse()
+        # Reported per field, the others still evaluate
+        logic = compile_logic({'form': {'children': [
+            {'key': f'deep{i}', 'props': computed(f'return {source}')} for i, source in enumerate(deep)
+        ] + [{'key': 'sum', 'props': computed('return ' + ' + '.join(['form.data.a'] * 100))}]}})
+        self.assertEqual(len(logic.errors), len(deep))
+        self.assertTrue(all(error.startswith('deep') for error in logic.errors))
+        self.assertIn('nested deeper than', logic.errors[0])
+        self.assertIn('longer than', logic.errors[-1])
+        self.assertEqual(logic.evaluate({'a': 2}).value('sum'), 200)
+
+    def test_numbers_are_doubles(self):
+        logic = compile_logic({'form': {'children': [
+            {'key': 'power', 'props': computed('return Math.pow(10, form.data.a)')},
+            {'key': 'negative', 'props': computed('return Math.pow(-10, form.data.a + 1)')},
+            {'key': 'product', 'props': computed('return form.data.b * form.data.b')},
+            {'key': 'exact', 'props': computed('return form.data.c + 1')},
+            {'key': 'floor', 'props': computed('return Math.floor(form.data.b)')},
+        ]}})
+        start = time.perf_counter()
+        evaluation = logic.evaluate({'a': 10 ** 7, 'b': 10 ** 400, 'c': 2 ** 53})
+        self.assertLess(time.perf_counter() - start, 1)
+        # Infinity, like the browser, which JSON cannot hold
+        self.assertEqual(evaluation.value('power'), math.inf)
+        self.assertEqual(evaluation.value('negative'), -math.inf)
+        self.assertEqual(evaluation.value('floor'), math.inf)
+        self.assertEqual(
+            evaluation.computed(), {'power': None, 'negative': None, 'product': None, 'exact': 2 ** 53, 'floor': None}
+        )
+        json.dumps(evaluation.computed())
+        self.assertEqual(logic.evaluate({'a': 2, 'b': 3, 'c': 1}).computed(), {
+            'power': 100, 'negative': -1000, 'product': 9, 'exact': 2, 'floor': 3,
+        })
+
+    def test_visibility_and_required(self):
+        evaluation = self.logic.evaluate({'age': 30, 'country': 'US', 'price': 20, 'quantity': 3})
+        self.assertFalse(evaluation.visible('consent'))
+        self.assertTrue(evaluation.visible('state'))
+        self.assertFalse(evaluation.visible('zip'))
+        self.assertEqual(evaluation.missing_required(), ['state'])
+        self.assertEqual(evaluation.computed(), {'total': 60, 'shipping': 5})
+
+        # Children of a hidden container are hidden, so not required
+        evaluation = self.logic.evaluate({'age': 12, 'country': 'FR', 'price': 50, 'quantity': 3})
+        self.assertFalse(evaluation.visible('state'))
+        self.assertEqual(evaluation.missing_required(), ['consent'])
+        self.assertEqual(evaluation.computed(), {'total': 150, 'shipping': None})
+
+    def test_update_matches_full_evaluation(self):
+        rng = random.Random(0)
+        choices = {
+            'age': [None, 10, '18', 40], 'country': ['US', 'FR', None], 'state': ['', 'CA'],
+            'price': [None, 10, '30'], 'quantity': [1, 5, 'x'], 'consent': [True, None],
+        }
+        evaluation = self.logic.evaluate({})
+        for _ in range(500):
+            data = {key: rng.choice(values) for key, values in choices.items() if rng.random() < 0.8}
+            updated = self.logic.update(evaluation, data)
+            self.assertEqual(repr(updated.values), repr(self.logic.evaluate(data).values), data)
+            evaluation = updated
+
+    def test_update_only_recomputes_downstream(self):
+        evaluation = self.logic.evaluate({'age': 30, 'country': 'US', 'state': 'CA', 'price': 2, 'quantity': 3})
+        calls = []
+        functions = self.logic.functions
+        try:
+            self.logic.functions = [
+                (lambda index, function: lambda values, data: calls.append(index) or function(values, data))(i, f)
+                for i, f in enumerate(functions)
+            ]
+            updated = self.logic.update(evaluation, {**evaluation.data, 'quantity': 4}, ['quantity'])
+        finally:
+            self.logic.functions = functions
+        self.assertEqual(updated.value('total'), 8)
+        # quantity, total and the visibility of shipping; shipping itself stays shown, so is not recomputed
+        self.assertEqual(len(calls), 3)
+
+
+@override_settings(FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []})
+class LogicAPITests(TestCase):
+    """
+    Form logic applied to stored submissions
+    """
+
+    def setUp(self):
+        self.form = Form.objects.create(name='Order', schema=LOGIC_SCHEMA)
+
+    def post(self, url, body):
+        return self.client.post(url, json.dumps(body), content_type='application/json')
+
+    def test_submissions_are_checked(self):
+        url = reverse('submissions_api', args=[self.form.pk])
+        response = self.post(url, {'data': {'age': 12, 'price': 10, 'quantity': 2}})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['missing'], [{'index': 0, 'fields': ['consent']}])
+
+        response = self.post(url, {'data': {'age': 12, 'consent': True, 'price': 10, 'quantity': 2, 'total': 1}})
+        self.assertEqual(response.status_code, 201)
+        # Calculated values are the server's
+        self.assertEqual(Submission.objects.get(pk=response.json()['id']).data['total'], 20)
+
+        response = self.post(reverse('submissions_api_bulk', args=[self.form.pk]), {'submissions': [
+            {'age': 40}, {'age': 40, 'country': 'US'},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['missing'], [{'index': 1, 'fields': ['state']}])
+
+    def test_evaluate_stored(self):
+        records = [{'age': age, 'country': 'US', 'state': 'CA' if age > 20 else ''} for age in range(10, 40)]
+        ingest_submissions(self.form, records)
+        logic = compile_logic(LOGIC_SCHEMA)
+        results = list(evaluate_stored(self.form, batch_size=7))
+        self.assertEqual(len(results), 30)
+        for (pk, evaluation), record in zip(results, records):
+            self.assertEqual(evaluation.missing_required(), logic.evaluate(record).missing_required())
+
+
+
+@override_settings(FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []})
+class WebhookTests(TestCase):
+    """
+    Outbox writes and delivery to a local receiver
+    """
+
+    def setUp(self):
+        self.form = Form.objects.create(name='Orders', schema=SCHEMA)
+
+    def post(self, url, body):
+        return self.client.post(url, json.dumps(body), content_type='application/json')
+
+    def test_events_are_queued_with_the_change(self):
+        every = WebhookEndpoint.objects.create(url='http://example.com/all/')
+        forms_only = WebhookEndpoint.objects.create(url='http://example.com/forms/', events=['form.created'])
+        WebhookEndpoint.objects.create(url='http://example.com/other/', form=Form.objects.create(name='Other'))
+        WebhookEndpoint.objects.create(url='http://example.com/off/', is_active=False)
+
+        created = self.post(reverse('forms_api'), {'name': 'New', 'schema': SCHEMA}).json()
+        self.client.put(
+            reverse('forms_api_detail', args=[created['id']]), json.dumps({'name': 'Renamed'}),
+            content_type='application/json',
+        )
+        self.post(reverse('submissions_api', args=[self.form.pk]), {'submissions': [{'name': 'a'}, {'name': 'b'}]})
+
+        events = list(OutboxEvent.objects.order_by('pk').values_list('endpoint', 'event'))
+        self.assertEqual(events, [
+            (every.pk, 'form.created'), (forms_only.pk, 'form.created'), (every.pk, 'form.updated'),
+            (every.pk, 'submission.created'), (every.pk, 'submission.created'),
+        ])
+        self.assertEqual(OutboxEvent.objects.get(event='form.updated').payload['name'], 'Renamed')
+
+        # Nothing is queued for a change that is rolled back
+        with self.assertRaises(ZeroDivisionError), transaction.atomic():
+            ingest_submissions(self.form, [{'name': 'c'}])
+            1 / 0
+        self.assertEqual(OutboxEvent.objects.count(), 5)
+
+    def test_delivery_in_signed_batches(self):
+        with StubReceiver(secret='key') as receiver:
+            WebhookEndpoint.objects.create(url=receiver.url, secret='key')
+            ingest_submissions(self.form, [{'age': i} for i in range(250)])
+            worker = deliver_outbox({'BATCH_SIZE': 100})
+
+        self.assertEqual(worker.delivered, 250)
+        self.assertEqual([len(batch) for batch in receiver.batches], [100, 100, 50])
+        self.assertEqual(sorted(event['data']['data']['age'] for event in receiver.events), list(range(250)))
+        self.assertFalse(OutboxEvent.objects.pending().exists())
+
+    def test_retries_and_dead_letters(self):
+        config = {'MAX_ATTEMPTS': 3, 'BACKOFF_BASE': 0}
+        with StubReceiver(responses=[500, 503, 500, 500]) as receiver:
+            failing = WebhookEndpoint.objects.create(url=receiver.url)
+            ingest_submissions(self.form, [{'age': 1}])
+            worker = deliver_outbox(config)
+            event = OutboxEvent.objects.get()
+            self.assertEqual((worker.delivered, event.attempts, event.last_error[:8]), (0, 3, 'HTTP 500'))
+            self.assertIsNotNone(event.dead_at)
+
+            # Dead-lettered events are only sent again on request
+            self.assertEqual(deliver_outbox(config).delivered, 0)
+            self.assertEqual(retry_dead(failing.pk), 1)
+            deliver_outbox(config)
+        event.refresh_from_db()
+        self.assertIsNotNone(event.delivered_at)
+        self.assertEqual([batch[0]['id'] for batch in receiver.batches], [event.pk])
+
+    def test_unreachable_endpoint(self):
+        with StubReceiver() as receiver:
+            url = receiver.url
+        WebhookEndpoint.objects.create(url=url)
+        ingest_submissions(self.form, [{'age': 1}])
+        deliver_outbox({'MAX_ATTEMPTS': 2, 'BACKOFF_BASE': 0})
+        self.assertIn('ConnectionRefusedError', OutboxEvent.objects.get().last_error)
+
+    def test_backoff(self):
+        config = {**webhooks.get_config(), 'BACKOFF_BASE': 10, 'BACKOFF_MAX': 100}
+        self.assertTrue(5 <= webhooks.backoff(1, config) <= 10)
+        self.assertTrue(20 <= webhooks.backoff(3, config) <= 40)
+        self.assertTrue(50 <= webhooks.backoff(20, config) <= 100)
+        self.assertEqual(webhooks.backoff(1, config, retry_after=60), 60)
+
+
+
+ADDRESS = [
+    {'key': 'street', 'type': 'RsInput', 'schema': {'validations': [{'key': 'required'}]}},
+    {'key': 'city', 'type': 'RsInput'},
+]
+
+
+def with_children(*children):
+    return {'form': {'children': list(children)}}
+
+
+@override_settings(FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []})
+class FragmentTests(TestCase):
+    """
+    Shared fragments referenced from schemas and resolved at read time
+    """
+
+    def setUp(self):
+        cache.clear()
+        form_cache.local.clear()
+        fragments.resolved_cache.local.clear()
+        response = self.post(reverse('fragments_api'), {'name': 'Address', 'components': ADDRESS})
+        self.fragment = Fragment.objects.get(pk=response.json()['id'])
+
+    def post(self, url, body):
+        return self.client.post(url, json.dumps(body), content_type='application/json')
+
+    def put(self, url, body):
+        return self.client.put(url, json.dumps(body), content_type='application/json')
+
+    def keys(self, form_id, **params):
+        schema = self.client.get(reverse('forms_api_detail', args=[form_id]), params).json()['schema']
+        return [component.get('key', component.get('$fragment')) for component, *_ in iter_components(schema)]
+
+    def test_resolution(self):
+        contact = Fragment.objects.create(name='Contact')
+        fragments.create_version(contact, [
+            {'key': 'email', 'type': 'RsInput'}, {'$fragment': self.fragment.pk, 'version': 1, 'keyPrefix': 'home_'},
+        ])
+        form = Form.objects.create(name='Order', schema=with_children(
+            {'key': 'name', 'type': 'RsInput'},
+            {'$fragment': self.fragment.pk, 'keyPrefix': 'billing_'},
+            {'key': 'panel', 'type': 'RsContainer', 'children': [{'$fragment': contact.pk, 'version': 1}]},
+        ))
+        self.assertEqual(form.fragment_refs, [[self.fragment.pk, None], [contact.pk, 1]])
+        self.assertEqual(self.keys(form.pk), [
+            'name', 'billing_street', 'billing_city', 'panel', 'email', 'home_street', 'home_city',
+        ])
+        self.assertEqual(self.keys(form.pk, resolve='false'), ['name', self.fragment.pk, 'panel', contact.pk])
+        self.assertEqual(form.get_component_count(), 7)
+        # The stored fragment is not modified by prefixing
+        self.assertEqual(FragmentVersion.objects.get(fragment=self.fragment).components, ADDRESS)
+
+        # Forms without references are returned as stored
+        plain = Form.objects.create(name='Plain', schema=SCHEMA)
+        self.assertIs(plain.get_resolved_schema(), plain.get_schema())
+
+    def test_new_version_invalidates_dependent_forms_only(self):
+        following = Form.objects.create(name='Following', schema=with_children({'$fragment': self.fragment.pk}))
+        pinned = Form.objects.create(name='Pinned', schema=with_children({'$fragment': self.fragment.pk, 'version': 1}))
+        unrelated = Form.objects.create(name='Unrelated', schema=SCHEMA)
+        for form in (following, pinned, unrelated):
+            self.keys(form.pk)
+        before = dict(Form.objects.values_list('pk', 'modified'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.put(
+                reverse('fragments_api_detail', args=[self.fragment.pk]), {'components': [*ADDRESS, {'key': 'zip'}]}
+            )
+        self.assertEqual(response.json()['version'], 2)
+        after = dict(Form.objects.values_list('pk', 'modified'))
+        self.assertGreater(after[following.pk], before[following.pk])
+        self.assertEqual(after[pinned.pk], before[pinned.pk])
+        self.assertEqual(after[unrelated.pk], before[unrelated.pk])
+
+        self.assertEqual(self.keys(following.pk), ['street', 'city', 'zip'])
+        self.assertEqual(self.keys(pinned.pk), ['street', 'city'])
+        listed = {form['id']: form['schema'] for form in self.client.get(reverse('forms_api')).json()['forms']}
+        self.assertEqual(len(listed[following.pk]['form']['children']), 3)
+        response = self.client.get(reverse('fragments_api_detail', args=[self.fragment.pk]), {'version': 1})
+        self.assertEqual(response.json()['components'], ADDRESS)
+
+    def test_submissions_use_resolved_schema(self):
+        form = Form.objects.create(name='Order', schema=with_children({'$fragment': self.fragment.pk}))
+        response = self.post(reverse('submissions_api', args=[form.pk]), {'data': {'city': 'Oslo'}})
+        self.assertEqual(response.json()['missing'], [{'index': 0, 'fields': ['street']}])
+
+    def test_reverse_index(self):
+        form = Form.objects.create(name='Order', schema=with_children({'$fragment': self.fragment.pk}))
+        self.assertEqual(list(FragmentReference.objects.values_list('form', 'fragment', 'version')), [
+            (form.pk, self.fragment.pk, None),
+        ])
+        form.schema = SCHEMA
+        form.save()
+        self.assertFalse(FragmentReference.objects.exists())
+        self.assertEqual(form.fragment_refs, [])
+
+    def test_invalid_references(self):
+        for schema in [
+            with_children({'$fragment': 999}),
+            with_children({'$fragment': self.fragment.pk, 'version': 5}),
+            with_children({'$fragment': 'address'}),
+        ]:
+            with self.subTest(schema=schema):
+                response = self.post(reverse('forms_api'), {'name': 'Bad', 'schema': schema})
+                self.assertEqual(response.status_code, 400)
+        response = self.post(reverse('fragments_api'), {
+            'name': 'Nested', 'components': [{'$fragment': self.fragment.pk}],
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('must name a version', response.json()['error'])
+        self.assertFalse(Fragment.objects.filter(name='Nested').exists())
+
+        # A fragment without versions cannot be referenced, pinned or not
+        empty = Fragment.objects.create(name='Empty')
+        for reference in [{'$fragment': empty.pk}, {'$fragment': empty.pk, 'version': 1}]:
+            with self.subTest(reference=reference):
+                response = self.post(reverse('forms_api'), {'name': 'Bad', 'schema': with_children(reference)})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('no version', response.json()['error'])
+
+    def test_unresolvable_form_fails_alone(self):
+        good = Form.objects.create(name='Good', schema=with_children({'$fragment': self.fragment.pk}))
+        broken = Form.objects.create(name='Broken', schema=SCHEMA)
+        # Stored before references to fragments without versions were refused
+        empty = Fragment.objects.create(name='Empty')
+        Form.objects.filter(pk=broken.pk).update(
+            schema=with_children({'$fragment': empty.pk}), fragment_refs=[[empty.pk, None]]
+        )
+
+        since = (timezone.now() - datetime.timedelta(minutes=1)).isoformat()
+        for response in [self.client.get(reverse('forms_api')), self.client.get(reverse('forms_api'), {'since': since})]:
+            listed = {form['id']: form for form in response.json()['forms']}
+            self.assertEqual(
+                [component['key'] for component in listed[good.pk]['schema']['form']['children']], ['street', 'city']
+            )
+            self.assertNotIn('error', listed[good.pk])
+            self.assertEqual(listed[broken.pk]['schema'], with_children({'$fragment': empty.pk}))
+            self.assertIn(f'[{empty.pk}]', listed[broken.pk]['error'])
+        response = self.client.get(reverse('forms_api_detail', args=[broken.pk]))
+        self.assertIn('without versions', response.json()['error'])
+
+        errors = {}
+        self.assertEqual(list(fragments.resolve_forms([good, Form.objects.get(pk=broken.pk)], errors)), [good.pk])
+        self.assertEqual(list(errors), [broken.pk])
+        with self.assertRaises(fragments.FragmentError):
+            Form.objects.get(pk=broken.pk).get_resolved_schema()
+
+    def test_webhooks_send_resolved_schemas(self):
+        WebhookEndpoint.objects.create(url='http://example.com/hook/', events=['form.created', 'form.updated'])
+        following = Form.objects.create(name='Following', schema=SCHEMA)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.put(
+                reverse('forms_api_detail', args=[following.pk]),
+                {'schema': with_children({'$fragment': self.fragment.pk})},
+            )
+        self.assertEqual(response.status_code, 200)
+        Form.objects.create(name='Pinned', schema=with_children({'$fragment': self.fragment.pk, 'version': 1}))
+
+        # A new version of the fragment changes the forms following it
+        with self.captureOnCommitCallbacks(execute=True):
+            self.put(reverse('fragments_api_detail', args=[self.fragment.pk]), {'components': [*ADDRESS, {'key': 'zip'}]})
+        payloads = list(
+            OutboxEvent.objects.filter(event='form.updated').order_by('pk').values_list('payload', flat=True)
+        )
+        self.assertEqual([payload['id'] for payload in payloads], [following.pk, following.pk])
+        self.assertEqual(
+            [[component['key'] for component in payload['schema']['form']['children']] for payload in payloads],
+            [['street', 'city'], ['street', 'city', 'zip']],
+        )
+        self.assertGreater(parse_datetime(payloads[1]['updated_at']), parse_datetime(payloads[0]['updated_at']))
+
+    def test_admin_creates_first_version(self):
+        admin_user = get_user_model().objects.create_superuser('admin', password='secret')
+        self.client.force_login(admin_user)
+        workspace = Workspace.objects.get(slug='default')
+        url = reverse('admin:formbuilder_fragment_add')
+        self.assertContains(self.client.get(url), 'name="components"')
+
+        response = self.client.post(url, {
+            'workspace': workspace.pk, 'name': 'Bad', 'components': json.dumps([{'$fragment': self.fragment.pk}]),
+            'versions-TOTAL_FORMS': 0, 'versions-INITIAL_FORMS': 0,
+        })
+        self.assertContains(response, 'must name a version')
+        self.assertFalse(Fragment.objects.filter(name='Bad').exists())
+
+        response = self.client.post(url, {
+            'workspace': workspace.pk, 'name': 'Phone', 'components': json.dumps([{'key': 'phone'}]),
+            'versions-TOTAL_FORMS': 0, 'versions-INITIAL_FORMS': 0,
+        })
+        self.assertEqual(response.status_code, 302)
+        phone = Fragment.objects.get(name='Phone')
+        self.assertEqual(phone.version, 1)
+        self.assertEqual(phone.versions.get().components, [{'key': 'phone'}])
+
+
+@override_settings(FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []})
+class WorkspaceTests(TestCase):
+    """
+    Tenant scoping of queries, cache keys and quotas
+    """
+
+    def setUp(self):
+        # Cached webhook endpoints of rolled back tests would outlive them
+        cache.clear()
+        self.addCleanup(cache.clear)
+        workspaces.workspace_cache.local.clear()
+        self.addCleanup(workspaces.workspace_cache.local.clear)
+        self.acme = Workspace.objects.create(name='Acme', slug='acme', max_forms=2)
+        self.member = get_user_model().objects.create_user('member', password='secret')
+        self.acme.members.add(self.member)
+        self.client.force_login(self.member)
+        self.form = Form.objects.create(name='Default form', schema=SCHEMA)
+
+    def request(self, method, url, body=None, workspace='acme'):
+        headers = {'X-Formbuilder-Workspace': workspace} if workspace else {}
+        if body is None:
+            return getattr(self.client, method)(url, headers=headers)
+        return getattr(self.client, method)(url, json.dumps(body), content_type='application/json', headers=headers)
+
+    def test_requests_only_see_their_workspace(self):
+        created = self.request('post', reverse('forms_api'), {'name': 'Acme form', 'schema': SCHEMA}).json()
+        self.assertEqual(Form.objects.get(pk=created['id']).workspace, self.acme)
+
+        listed = self.request('get', reverse('forms_api')).json()['forms']
+        self.assertEqual([form['id'] for form in listed], [created['id']])
+        listed = self.request('get', reverse('forms_api'), workspace=None).json()['forms']
+        self.assertEqual([form['id'] for form in listed], [self.form.pk])
+        self.assertContains(self.request('get', reverse('forms_list')), 'Acme form')
+        self.assertNotContains(self.request('get', reverse('forms_list')), 'Default form')
+
+        other = reverse('forms_api_detail', args=[self.form.pk])
+        self.assertEqual(self.request('get', other).status_code, 404)
+        self.assertEqual(self.request('put', other, {'name': 'Taken'}).status_code, 404)
+        self.assertEqual(self.request('delete', other).status_code, 404)
+        self.assertEqual(self.request('get', reverse('form_detail', args=[self.form.pk])).status_code, 404)
+        response = self.request('post', reverse('submissions_api', args=[self.form.pk]), {'data': {'name': 'a'}})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Form.objects.get(pk=self.form.pk).name, 'Default form')
+
+        # Unbound code (commands, workers) sees every workspace
+        self.assertEqual(Form.objects.count(), 2)
+        with workspaces.activate(self.acme):
+            self.assertEqual(list(Form.objects.values_list('pk', flat=True)), [created['id']])
+        self.assertEqual(self.request('get', reverse('forms_api'), workspace='nope').status_code, 404)
+
+    def test_foreign_workspace_is_refused(self):
+        other = Workspace.objects.create(name='Other', slug='other')
+        with workspaces.activate(other):
+            foreign = Form.objects.create(name='Foreign form', schema=SCHEMA)
+        url = reverse('forms_api_detail', args=[foreign.pk])
+        for method, body in [('get', None), ('put', {'name': 'Taken'}), ('delete', None)]:
+            response = self.request(method, url, body, workspace='other')
+            self.assertEqual(response.status_code, 403)
+            self.assertEqual(response.json(), {'error': "Not a member of workspace other"})
+        response = self.request('post', reverse('forms_api'), {'name': 'Planted', 'schema': SCHEMA}, workspace='other')
+        self.assertEqual(response.status_code, 403)
+        # Nor through the query parameter of EventSource and page links
+        self.assertEqual(self.client.get(reverse('forms_list'), {'workspace': 'other'}).status_code, 403)
+        self.assertEqual(Form.objects.get(pk=foreign.pk).name, 'Foreign form')
+        self.assertFalse(Form.objects.filter(name='Planted').exists())
+
+        # Anonymous callers only get the default workspace
+        self.client.logout()
+        self.assertEqual(self.request('get', reverse('forms_api')).status_code, 403)
+        self.assertEqual(self.request('get', reverse('forms_api'), workspace=None).status_code, 200)
+        self.assertEqual(self.request('get', reverse('forms_api'), workspace='default').status_code, 200)
+
+        # Members of the workspace and superusers are let in
+        other.members.add(self.member)
+        self.client.force_login(self.member)
+        self.assertEqual(self.request('get', url, workspace='other').status_code, 200)
+        self.client.force_login(get_user_model().objects.create_superuser('admin', password='secret'))
+        self.assertEqual(self.request('get', reverse('forms_api'), workspace='acme').status_code, 200)
+
+    def test_browse_pages_of_a_workspace(self):
+        with workspaces.activate(self.acme):
+            forms = [Form.objects.create(name=f'Acme form {i}', schema=SCHEMA) for i in range(21)]
+        # First on the first page
+        form = forms[-1]
+        response = self.client.get(reverse('forms_list'), {'workspace': 'acme'})
+        self.assertNotContains(response, 'Default form')
+        self.assertContains(response, 'data-workspace="acme"')
+        for url in [
+            reverse('form_detail', args=[form.pk]), reverse('form_builder_with_id', args=[form.pk]),
+            reverse('forms_list') + '?page=2', reverse('forms_list'), reverse('form_builder'),
+        ]:
+            self.assertContains(response, f'href="{url}{"&amp;" if "?" in url else "?"}workspace=acme"')
+
+        # Follow the links of the list to the detail page, and back
+        response = self.client.get(reverse('form_detail', args=[form.pk]), {'workspace': 'acme'})
+        self.assertContains(response, 'Acme form 20')
+        for url in [
+            reverse('form_view', args=[form.pk]), reverse('form_builder_with_id', args=[form.pk]), reverse('forms_list'),
+        ]:
+            self.assertContains(response, f'href="{url}?workspace=acme"')
+        self.assertContains(self.client.get(reverse('forms_list'), {'page': 2, 'workspace': 'acme'}), 'Acme form')
+        self.assertContains(
+            self.client.get(reverse('form_builder_with_id', args=[form.pk]), {'workspace': 'acme'}), 'workspace: "acme"'
+        )
+        self.assertContains(
+            self.client.get(reverse('form_view', args=[form.pk]), {'workspace': 'acme'}), 'workspace: "acme"'
+        )
+
+        # Pages of the default workspace keep their plain links
+        response = self.client.get(reverse('forms_list'))
+        self.assertContains(response, f'href="{reverse("form_detail", args=[self.form.pk])}"')
+        self.assertNotContains(response, '?workspace=')
+
+    def test_workspaces_api(self):
+        Workspace.objects.create(name='Other', slug='other')
+        response = self.request('get', reverse('workspaces_api'))
+        self.assertEqual(response.json(), {
+            'workspaces': [{'slug': 'acme', 'name': 'Acme'}, {'slug': 'default', 'name': 'Default'}],
+            'current': 'acme',
+        })
+        self.client.logout()
+        response = self.request('get', reverse('workspaces_api'), workspace=None)
+        self.assertEqual(response.json(), {'workspaces': [{'slug': 'default', 'name': 'Default'}], 'current': 'default'})
+
+    def test_cache_keys_are_namespaced(self):
+        url = reverse('forms_api_detail', args=[self.form.pk])
+        self.assertEqual(self.request('get', url, workspace='default').status_code, 200)
+        # Cached for the default workspace only
+        self.assertEqual(self.request('get', url).status_code, 404)
+
+    def test_quotas(self):
+        for i in range(2):
+            response = self.request('post', reverse('forms_api'), {'name': f'Acme {i}', 'schema': SCHEMA})
+            self.assertEqual(response.status_code, 201)
+        response = self.request('post', reverse('forms_api'), {'name': 'Acme 2', 'schema': SCHEMA})
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('quota of 2 forms', response.json()['error'])
+
+        # Deleted forms do not count; imports stop at the quota
+        Form.objects.filter(workspace=self.acme).first().delete()
+        response = self.request('post', reverse('forms_api_import'), {'forms': [
+            {'name': 'Imported 0', 'schema': SCHEMA}, {'name': 'Imported 1', 'schema': SCHEMA},
+        ]})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual([form['name'] for form in response.json()['imported']], ['Imported 0'])
+
+        with override_settings(FORMBUILDER_WORKSPACES={'MAX_FRAGMENTS': 0}):
+            response = self.request('post', reverse('fragments_api'), {'name': 'Address', 'components': ADDRESS})
+        self.assertEqual(response.status_code, 403)
+
+    def test_fragments_and_webhooks_are_scoped(self):
+        fragment = Fragment.objects.create(name='Address')
+        fragments.create_version(fragment, ADDRESS)
+        # Same name in another workspace
+        response = self.request('post', reverse('fragments_api'), {'name': 'Address', 'components': ADDRESS})
+        self.assertEqual(response.status_code, 201)
+        response = self.request('post', reverse('forms_api'), {
+            'name': 'Borrowing', 'schema': with_children({'$fragment': fragment.pk}),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.request('get', reverse('fragments_api_detail', args=[fragment.pk])).status_code, 404)
+
+        endpoint = WebhookEndpoint.objects.create(url='http://example.com/default/')
+        self.request('post', reverse('forms_api'), {'name': 'Acme form', 'schema': SCHEMA})
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.request('post', reverse('forms_api'), {'name': 'Default form', 'schema': SCHEMA}, workspace=None)
+        self.assertEqual(list(OutboxEvent.objects.values_list('endpoint', flat=True)), [endpoint.pk])
+
+
+class ShellTests(TestCase):
+    """
+    Page shells rendered once, with only their dynamic parts per request
+    """
+
+    def setUp(self):
+        shells.clear()
+        self.addCleanup(shells.clear)
+        self.forms = [Form.objects.create(name=name, schema=SCHEMA) for name in ('First & <b>', 'Second')]
+
+    def pages(self, form):
+        return [
+            reverse('form_builder'),
+            reverse('form_builder_with_id', args=[form.pk]),
+            reverse('form_view', args=[form.pk]),
+            reverse('forms_list'),
+            reverse('form_detail', args=[form.pk]),
+        ]
+
+    def test_same_html_as_full_render(self):
+        for form in self.forms:
+            for url in self.pages(form):
+                with self.subTest(url=url):
+                    with override_settings(FORMBUILDER_SHELLS={'ENABLED': False}):
+                        expected = self.client.get(url).content
+                    # Builds the shell, then renders from it
+                    self.assertEqual(self.client.get(url).content, expected)
+                    self.assertEqual(self.client.get(url).content, expected)
+        self.assertEqual(len(shells._shells), 4)
+        self.assertContains(self.client.get(reverse('form_view', args=[self.forms[0].pk])), 'First &amp; &lt;b&gt;')
+
+    def test_static_parts_rendered_once(self):
+        url = reverse('form_view', args=[self.forms[0].pk])
+        self.client.get(url)
+        shell, = shells._shells.values()
+        shell.chunks = [chunk.replace('Base Styles', 'Cached shell') for chunk in shell.chunks]
+        content = self.client.get(url).content.decode()
+        self.assertIn('Cached shell', content)
+        self.assertIn('formName: "First &amp; &lt;b&gt;"', content)
+
+
+class StartupTests(SimpleTestCase):
+    """
+    Production worker startup: settings profile and deferred imports
+    """
+
+    # Set up Django the way a worker does and report what got loaded
+    SCRIPT = """
+import json, sys
+import django
+django.setup()
+from django.conf import settings
+import django_form_builder.urls
+print(json.dumps({
+    'installed_apps': settings.INSTALLED_APPS,
+    'development_only_apps': settings.DEVELOPMENT_ONLY_APPS,
+    'modules': sorted(name for name in sys.modules if name.split('.')[0] in ('numpy', 'dotenv')),
+}))
+"""
+
+    def test_production_startup(self):
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'django_form_builder.settings.production',
+            'SECRET_KEY': 'test', 'ALLOWED_HOSTS': 'forms.example.com',
+            'CORS_ALLOWED_ORIGINS': 'https://forms.example.com',
+            'DB_NAME': 'test', 'DB_USER': 'test', 'DB_PASSWORD': 'test', 'DB_HOST': 'localhost',
+            'EMAIL_HOST': 'localhost', 'EMAIL_HOST_USER': 'test', 'EMAIL_HOST_PASSWORD': 'test',
+            'DEFAULT_FROM_EMAIL': 'forms@example.com', 'ADMIN_EMAIL': 'admin@example.com',
+            'REDIS_URL': 'redis://localhost:6379/0',
+        }
+        result = subprocess.run(
+            [sys.executable, '-c', self.SCRIPT], env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        loaded = json.loads(result.stdout.strip().splitlines()[-1])
+
+        self.assertTrue(loaded['development_only_apps'])
+        for app in loaded['development_only_apps']:
+            self.assertNotIn(app, loaded['installed_apps'])
+        self.assertIn('formbuilder', loaded['installed_apps'])
+        # numpy is imported by the first percentile computation, not at startup
+        self.assertNotIn('numpy', loaded['modules'])
+        # python-dotenv only when there is a .env file to read
+        self.assertEqual('dotenv' in loaded['modules'], (settings.BASE_DIR / '.env').exists())
+
+
+class ProfilerTests(TestCase):
+    """
+    Sampled request profiles and the staff profiles page
+    """
+
+    def setUp(self):
+        cache.clear()
+        root = tempfile.mkdtemp(prefix='formbuilder-profiles-')
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.enterContext(self.settings(
+            BASE_DIR=Path(root), FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []},
+            FORMBUILDER_PROFILING={'ENABLED': True, 'INTERVAL': 0.001, 'RATE_REFRESH': 0},
+        ))
+        self.form = Form.objects.create(name='Profiled', schema=SCHEMA)
+        self.url = reverse('forms_api_detail', args=[self.form.pk])
+
+    def test_disabled(self):
+        with self.settings(FORMBUILDER_PROFILING={'ENABLED': False}):
+            with self.assertRaises(MiddlewareNotUsed):
+                profiler.ProfilingMiddleware(lambda request: HttpResponse())
+            self.assertNotIn('X-Formbuilder-Profile-Id', self.client.get(self.url).headers)
+
+    def test_profile_selection(self):
+        self.assertNotIn('X-Formbuilder-Profile-Id', self.client.get(self.url).headers)
+        self.assertNotIn(
+            'X-Formbuilder-Profile-Id', self.client.get(self.url, headers={'X-Formbuilder-Profile': 'forged'}).headers
+        )
+
+        cache.clear()
+        form_cache.local.clear()
+        response = self.client.get(self.url, headers={'X-Formbuilder-Profile': profiler.make_token()})
+        profile = profiler.load_profile(response['X-Formbuilder-Profile-Id'])
+        self.assertEqual((profile['view'], profile['form_id'], profile['status']), ('forms_api_detail', self.form.pk, 200))
+        self.assertTrue(any('formbuilder_form' in query['sql'] for query in profile['queries']))
+        self.assertTrue(any(operation['op'] == 'get' for operation in profile['cache']))
+        self.assertEqual(sum(profile['stacks'].values()), profile['samples'])
+
+        profiler.set_sample_rate(1)
+        self.assertIn('X-Formbuilder-Profile-Id', self.client.get(self.url).headers)
+        self.assertEqual(len(profiler.list_profiles()), 2)
+
+    def test_sampling(self):
+        def busy():
+            deadline = time.perf_counter() + 0.05
+            while time.perf_counter() < deadline:
+                pass
+
+        sampler = profiler.SamplingProfiler(0.001, 3)
+        sampler.start()
+        busy()
+        sampler.stop()
+        self.assertGreater(sampler.samples, 0)
+        self.assertEqual(sum(sampler.stacks.values()), sampler.samples)
+        stack, count = sampler.stacks.most_common(1)[0]
+        # Innermost frames, outermost first
+        self.assertEqual(len(stack.split(';')), 3)
+        self.assertTrue(stack.endswith(f'{__name__}:ProfilerTests.test_sampling.<locals>.busy'))
+        self.assertEqual(
+            profiler.folded_stacks({'stacks': {'a;b': 2, 'a;c': 1}}), 'a;b 2\na;c 1\n'
+        )
+
+    def test_profiles_page(self):
+        page = reverse('profiles')
+        self.assertEqual(self.client.get(page).status_code, 302)  # staff only
+        staff = get_user_model().objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(page).status_code, 200)
+
+        response = self.client.post(page, {'sample_rate': '0.25'})
+        self.assertRedirects(response, page)
+        self.assertEqual(profiler.get_sample_rate(), 0.25)
+        self.assertRedirects(self.client.post(page, {'sample_rate': 'often'}), page)
+        self.assertEqual(profiler.get_sample_rate(), 0.25)
+        self.client.post(page, {'sample_rate': '5'})
+        self.assertEqual(profiler.get_sample_rate(), 1)
+
+    def test_download(self):
+        name = profiler.save_profile({'view': 'forms_api_detail', 'form_id': 1, 'stacks': {'a;b': 2}})
+        staff = get_user_model().objects.create_user('staff', password='secret', is_staff=True)
+        url = reverse('profile_download', args=[name])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(staff)
+
+        response = self.client.get(url)
+        self.assertEqual(response.json()['stacks'], {'a;b': 2})
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="{name}"')
+        response = self.client.get(url, {'format': 'folded'})
+        self.assertEqual(response.content, b'a;b 2\n')
+        self.assertIn('.folded"', response['Content-Disposition'])
+        for unknown in ['missing.json', 'profile.txt', '..json']:
+            self.assertEqual(self.client.get(reverse('profile_download', args=[unknown])).status_code, 404)
+
+
+class LoggingTests(SimpleTestCase):
+    """
+    Queued JSON file logging and request log context
+    """
+
+    def make_logger(self, **kwargs):
+        directory = tempfile.mkdtemp(prefix='formbuilder-tests-')
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = Path(directory) / 'test.log'
+        handler = QueuedFileHandler(path, **kwargs)
+        handler.setFormatter(JSONFormatter())
+        logger = logging.getLogger(f'formbuilder.tests.{self._testMethodName}')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        self.addCleanup(handler.close)
+        return logger, handler, path
+
+    def read(self, path):
+        return [json.loads(line) for line in path.read_text().splitlines()]
+
+    def test_json_lines_with_context(self):
+        logger, handler, path = self.make_logger()
+
+        def log():
+            bind_context(request_id='abc', form_id=3)
+            logger.info('hello %s', 'world', extra={'n': 1})
+            try:
+                raise ValueError('broken')
+            except ValueError:
+                logger.exception('failed')
+        contextvars.Context().run(log)
+        handler.close()
+
+        hello, failed = self.read(path)
+        self.assertEqual(hello['message'], 'hello world')
+        self.assertEqual((hello['request_id'], hello['form_id'], hello['n']), ('abc', 3, 1))
+        self.assertEqual(failed['level'], 'ERROR')
+        self.assertIn('ValueError: broken', failed['exception'])
+
+    def test_full_queue_drops_and_reports(self):
+        logger, handler, path = self.make_logger(queue_size=2)
+        entered, release = threading.Event(), threading.Event()
+        emit = handler.file_handler.emit
+
+        def stalled_emit(record):
+            entered.set()
+            release.wait(5)
+            emit(record)
+        handler.file_handler.emit = stalled_emit
+
+        # The listener is stuck writing the first record; two more fit the queue
+        logger.info('first')
+        self.assertTrue(entered.wait(5))
+        for i in range(5):
+            logger.info(f'queued {i}')
+        self.assertEqual(handler.dropped, 3)
+
+        release.set()
+        deadline = time.monotonic() + 5
+        while handler.queue.qsize() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        logger.info('after')
+        handler.close()
+        messages = [entry['message'] for entry in self.read(path)]
+        self.assertEqual(messages, [
+            'first', 'queued 0', 'queued 1', 'after', 'Dropped 3 log record(s): the log queue was full',
+        ])
+
+    def test_request_context_middleware(self):
+        seen = []
+
+        def view(request):
+            middleware.process_view(request, view, (), {'form_id': 7})
+            seen.append(get_context())
+            return HttpResponse()
+        middleware = RequestLogContextMiddleware(view)
+
+        request = RequestFactory().get('/forms/', HTTP_X_REQUEST_ID='req-1')
+        with self.assertLogs('formbuilder.requests') as logs:
+            response = contextvars.Context().run(middleware, request)
+        self.assertEqual(response['X-Request-ID'], 'req-1')
+        self.assertEqual(seen, [{'request_id': 'req-1', 'method': 'GET', 'path': '/forms/', 'view': 'view', 'form_id': 7}])
+        self.assertEqual(logs.records[0].status, 200)
+        self.assertGreaterEqual(logs.records[0].duration_ms, 0)
+
+        # Requests without an id get a fresh one
+        response = contextvars.Context().run(middleware, RequestFactory().get('/'))
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+
+# A replica that is a separate database in tests, not a mirror of the primary
+SEPARATE_REPLICA = (
+    'replica1' in settings.DATABASES and not settings.DATABASES['replica1'].get('TEST', {}).get('MIRROR')
+)
+
+
+@unittest.skipUnless(SEPARATE_REPLICA, "needs a second, separate database configured as 'replica1'")
+@override_settings(FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []})
+class ReplicaRoutingIntegrationTests(TransactionTestCase):
+    """
+    Reads through the API with the primary and replica as separate databases.
+    Nothing replicates between them, so rows written to the primary are only
+    visible to reads routed to the primary.
+    """
+    databases = {'default', 'replica1'} if SEPARATE_REPLICA else {'default'}
+    # Keep the default workspace created by the migrations for the next test
+    serialized_rollback = True
+
+    def setUp(self):
+        cache.clear()
+        form_cache.local.clear()
+
+    def test_read_your_writes(self):
+        response = self.client.post(
+            reverse('forms_api'), json.dumps({'name': 'New', 'schema': SCHEMA}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        url = reverse('forms_api_detail', args=[response.json()['id']])
+
+        # The writing client is pinned to the primary
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        # Other clients read from the replica, which never got the row
+        cache.clear()
+        form_cache.local.clear()
+        self.assertEqual(self.client_class().get(url).status_code, 404)
+
+
+@unittest.skipUnless(SEPARATE_REPLICA, "needs a second, separate database configured as 'replica1'")
+@override_settings(FORMBUILDER_RATE_LIMITS={'PATH_PREFIXES': []})
+class ReplicaQueryBudgetTests(QueryBudgetMixin, TransactionTestCase):
+    """
+    Query budgets of reads routed to the replica, outside the transaction
+    of TestCase that keeps every read on the primary. The forms are only
+    written to the replica, so a request finding them read it there.
+    """
+    databases = {'default', 'replica1'} if SEPARATE_REPLICA else {'default'}
+    serialized_rollback = True
+
+    def grow_forms(self, size):
+        replica = Form.objects.using('replica1')
+        workspace = Workspace.objects.using('replica1').get(slug='default')
+        replica.bulk_create(
+            Form(workspace=workspace, name=f'Replica form {i}', schema=SCHEMA) for i in range(replica.count(), size)
+        )
+
+    def test_list_page(self):
+        recorder = self.assertQueryBudget(lambda: self.client.get(reverse('forms_list')), grow=self.grow_forms)
+        self.assertIn('replica1', {query['alias'] for query in recorder.queries}, recorder.summary())
+        self.assertContains(self.client.get(reverse('forms_list')), 'Replica form ')
@@ -0,0 +1,295 @@
+"""
+Resumable chunked uploads for file-upload components.
+
+The protocol follows tus (https://tus.io) in spirit:
+
+1. ``POST api/forms/<id>/uploads/`` with ``{component_key, filename, size}``
+   creates an upload and an empty file.
+2. ``PATCH api/uploads/<upload id>/`` appends the request body at the
+   offset given in the ``Upload-Offset`` header. An optional
+   ``Upload-Checksum: <algorithm> <base64 digest>`` header covers the chunk.
+3. ``HEAD api/uploads/<upload id>/`` returns the current ``Upload-Offset``,
+   from which an interrupted upload resumes.
+
+Chunks are written straight from the request stream into the final file
+at their offset, hashing them on the way, so the file never passes through
+memory as a whole and needs no assembly step or second read once the last
+chunk has arrived. A chunk counts only once it is on disk (fsynced) and
+``offset`` has been advanced; a chunk whose checksum does not match is cut
+off again. Without a checksum, the bytes of an interrupted chunk are kept,
+so the client can resume in the middle of it.
+
+A submission refers to a completed upload by putting the upload id under
+the component key, e.g. ``{"resume": "<upload id>"}``; ``link_uploads``
+links the upload to the submission when the submission is stored.
+"""
+import base64
+import binascii
+import datetime
+import fcntl
+import hashlib
+import os
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+DEFAULT_UPLOADS = {
+    'ROOT': None,  # directory uploads are written to, BASE_DIR / 'uploads' when unset
+    'MAX_SIZE': 2 * 1024 * 1024 * 1024,  # bytes per file
+    'READ_SIZE': 1024 * 1024,  # bytes read from the request at a time
+    'FSYNC': True,  # flush each chunk to disk before acknowledging it
+    'EXPIRE_HOURS': 24,  # unfinished or never submitted uploads are removed after this
+}
+
+CHECKSUM_ALGORITHMS = ('sha256', 'sha1', 'md5')
+
+
+class UploadError(Exception):
+    """
+    Base class of upload errors, with the HTTP status to respond with
+    """
+    status = 400
+
+
+class UploadTooLarge(UploadError):
+    status = 413
+
+
+class OffsetMismatch(UploadError):
+    """
+    The chunk does not start where the upload currently ends
+    """
+    status = 409
+
+
+class UploadLocked(UploadError):
+    """
+    Another request is writing to the same upload
+    """
+    status = 423
+
+
+class ChecksumMismatch(UploadError):
+    status = 460
+
+
+def get_config():
+    """
+    Return the upload settings merged over the defaults
+    """
+    config = {**DEFAULT_UPLOADS, **getattr(settings, 'FORMBUILDER_UPLOADS', {})}
+    config['ROOT'] = Path(config['ROOT'] or Path(settings.BASE_DIR) / 'uploads')
+    return config
+
+
+def upload_path(upload, root=None):
+    """
+    Return the path of the file of an upload
+    """
+    return (root or get_config()['ROOT']) / str(upload.form_id) / upload.id.hex
+
+
+def create_upload(form, component_key, filename, size, content_type=''):
+    """
+    Create an upload for a component of a form, with an empty file
+    """
+    from .models import Upload
+
+    config = get_config()
+    if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+        raise UploadError("size must be a non-negative integer")
+    if size > config['MAX_SIZE']:
+        raise UploadTooLarge(f"Files may be at most {config['MAX_SIZE']} bytes")
+    if not filename or not isinstance(filename, str):
+        raise UploadError("filename is required")
+    if component_key not in {entry['key'] for entry in form.get_component_index()}:
+        raise UploadError(f"Form has no component {component_key!r}")
+
+    upload = Upload(
+        form=form, component_key=component_key, filename=os.path.basename(filename)[:255],
+        content_type=(content_type or '')[:255], size=size, completed_at=timezone.now() if size == 0 else None,
+    )
+    path = upload_path(upload, config['ROOT'])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+    upload.save()
+    return upload
+
+
+def parse_checksum(header):
+    """
+    Parse an ``Upload-Checksum`` header into a hash object and the
+    expected digest
+    """
+    try:
+        algorithm, encoded = header.split()
+        expected = base64.b64decode(encoded, validate=True)
+    except (ValueError, binascii.Error):
+        raise UploadError("Upload-Checksum must be '<algorithm> <base64 digest>'") from None
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise UploadError(f"Unsupported checksum algorithm {algorithm!r}, use one of {', '.join(CHECKSUM_ALGORITHMS)}")
+    return hashlib.new(algorithm), expected
+
+
+def write_chunk(upload, offset, stream, length, checksum=None):
+    """
+    Write ``length`` bytes read from ``stream`` at ``offset`` of an upload
+    and return the upload with its new offset.
+
+    The file is locked for the duration of the write, so concurrent
+    requests for the same upload fail with UploadLocked instead of
+    interleaving their bytes.
+    """
+    from .models import Upload
+
+    config = get_config()
+    digest = parse_checksum(checksum) if checksum else None
+    if length is None:
+        raise UploadError("Content-Length is required")
+
+    path = upload_path(upload, config['ROOT'])
+    try:
+        file = open(path, 'r+b')
+    except FileNotFoundError:
+        raise UploadError("The file of this upload is gone, start a new upload") from None
+    with file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadLocked("Another request is writing to this upload") from None
+
+        # Another request may have moved the offset since the upload was loaded
+        current, completed_at = Upload.objects.values_list('offset', 'completed_at').get(pk=upload.pk)
+        if completed_at is not None:
+            raise OffsetMismatch("Upload is already complete")
+        if offset != current:
+            raise OffsetMismatch(f"Upload-Offset must be {current}")
+        if offset + length > upload.size:
+            raise UploadTooLarge(f"Chunk ends after the declared size of {upload.size} bytes")
+
+        # Bytes after the offset are left over from a chunk that failed
+        file.truncate(offset)
+        file.seek(offset)
+        received = 0
+        hasher = digest[0] if digest else None
+        while received < length:
+            try:
+                data = stream.read(min(config['READ_SIZE'], length - received))
+            except OSError:
+                # Client went away
+                data = b''
+            if not data:
+                break
+            if hasher:
+                hasher.update(data)
+            file.write(data)
+            received += len(data)
+
+        if digest and (received < length or hasher.digest() != digest[1]):
+            file.truncate(offset)
+            if received < length:
+                raise UploadError(f"Chunk incomplete: received {received} of {length} bytes")
+            raise ChecksumMismatch("Checksum does not match the chunk")
+        file.flush()
+        if config['FSYNC']:
+            os.fsync(file.fileno())
+
+        now = timezone.now()
+        upload.offset = offset + received
+        upload.completed_at = now if upload.offset == upload.size else None
+        upload.modified = now
+        Upload.objects.filter(pk=upload.pk, offset=offset).update(
+            offset=upload.offset, completed_at=upload.completed_at, modified=now
+        )
+    return upload
+
+
+def delete_upload(upload):
+    """
+    Delete an upload and its file
+    """
+    upload_path(upload).unlink(missing_ok=True)
+    upload.delete()
+
+
+def upload_ids(value):
+    """
+    Yield the upload ids a submitted value may refer to: a UUID string or a
+    list of them
+    """
+    for item in value if isinstance(value, list) else [value]:
+        if isinstance(item, str) and len(item) in (32, 36):
+            try:
+                yield uuid.UUID(item)
+            except ValueError:
+                pass
+
+
+def link_uploads(form, submissions):
+    """
+    Link the completed uploads that stored submissions refer to under their
+    component key. Costs one query when some value looks like an upload id,
+    none otherwise.
+    """
+    from .models import Upload
+
+    references = {}
+    for submission in submissions:
+        for key, value in submission.data.items():
+            for upload_id in upload_ids(value):
+                references[upload_id, key] = submission
+    if not references:
+        return []
+
+    uploads = Upload.objects.filter(
+        form=form, pk__in={upload_id for upload_id, _ in references},
+        completed_at__isnull=False, submission__isnull=True,
+    )
+    linked = []
+    for upload in uploads:
+        submission = references.get((upload.pk, upload.component_key))
+        if submission is not None:
+            upload.submission = submission
+            linked.append(upload)
+    Upload.objects.bulk_update(linked, ['submission'])
+    return linked
+
+
+def purge_uploads(now=None):
+    """
+    Delete uploads not finished, or not submitted, within EXPIRE_HOURS, and
+    files whose upload no longer exists (e.g. of purged forms). Returns a
+    description of what was removed.
+    """
+    from .models import Upload
+
+    config = get_config()
+    now = now or timezone.now()
+    expired = Upload.objects.filter(
+        modified__lt=now - datetime.timedelta(hours=config['EXPIRE_HOURS']), submission__isnull=True
+    )
+    count = 0
+    for upload in expired.iterator():
+        delete_upload(upload)
+        count += 1
+
+    orphans = 0
+    # Files younger than a minute may belong to an upload being created
+    cutoff = time.time() - 60
+    if config['ROOT'].is_dir():
+        for directory in config['ROOT'].iterdir():
+            if not directory.is_dir() or not directory.name.isdigit():
+                continue
+            files = {
+                upload_id: path for path in directory.iterdir() if path.stat().st_mtime < cutoff
+                for upload_id in upload_ids(path.name)
+            }
+            known = set(Upload.objects.filter(pk__in=files).values_list('pk', flat=True))
+            for upload_id, path in files.items():
+                if upload_id not in known:
+                    path.unlink(missing_ok=True)
+                    orphans += 1
+    return f"deleted {count} expired upload(s) and {orphans} orphaned file(s)"
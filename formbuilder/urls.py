@@ -4,7 +4,20 @@ from .views import (
     FormsListView,
     FormDetailView,
     FormViewView,
-    FormsAPIView
+    FormsAPIView,
+    FormPublishAPIView,
+    SubmissionsAPIView,
+    SubmissionsBulkAPIView,
+    FormsImportAPIView,
+    FragmentsAPIView,
+    UploadsAPIView,
+    UploadAPIView,
+    WorkspacesAPIView,
+    SubmissionSummaryAPIView,
+    FormEventsAPIView,
+    CacheStatsAPIView,
+    ProfilesView,
+    ProfileDownloadView
 )
 
 urlpatterns = [
@@ -17,5 +30,22 @@ urlpatterns = [
 
     # API endpoints
     path("api/forms/", FormsAPIView.as_view(), name="forms_api"),
+    path("api/forms/import/", FormsImportAPIView.as_view(), name="forms_api_import"),
     path("api/forms/<int:form_id>/", FormsAPIView.as_view(), name="forms_api_detail"),
+    path("api/forms/<int:form_id>/publish/", FormPublishAPIView.as_view(), name="forms_api_publish"),
+    path("api/forms/<int:form_id>/events/", FormEventsAPIView.as_view(), name="forms_api_events"),
+    path("api/forms/<int:form_id>/submissions/", SubmissionsAPIView.as_view(), name="submissions_api"),
+    path("api/forms/<int:form_id>/submissions/bulk/", SubmissionsBulkAPIView.as_view(), name="submissions_api_bulk"),
+    path("api/forms/<int:form_id>/submissions/summary/", SubmissionSummaryAPIView.as_view(), name="submissions_api_summary"),
+    path("api/forms/<int:form_id>/uploads/", UploadsAPIView.as_view(), name="uploads_api"),
+    path("api/uploads/<uuid:upload_id>/", UploadAPIView.as_view(), name="upload_api"),
+    path("api/fragments/", FragmentsAPIView.as_view(), name="fragments_api"),
+    path("api/fragments/<int:fragment_id>/", FragmentsAPIView.as_view(), name="fragments_api_detail"),
+    path("api/workspaces/", WorkspacesAPIView.as_view(), name="workspaces_api"),
+    path("api/submissions/", SubmissionsAPIView.as_view(), name="submissions_api_create"),
+    path("api/cache/stats/", CacheStatsAPIView.as_view(), name="cache_stats_api"),
+
+    # Staff tools
+    path("profiles/", ProfilesView.as_view(), name="profiles"),
+    path("profiles/<str:name>/", ProfileDownloadView.as_view(), name="profile_download"),
 ]
@@ -1,17 +1,34 @@
-from django.shortcuts import render, get_object_or_404
+from django.contrib import admin
+from django.shortcuts import redirect, render, get_object_or_404
 from django.views.generic import TemplateView, ListView, DetailView
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.core.handlers.asgi import ASGIRequest
+import datetime
 import json
-from .models import Form
+from .analytics import ingest_submissions, summarize
+from .cache import form_cache
+from .events import iter_sync, stream_form_events
+from .fragments import FragmentError, create_version, resolve_forms
+from .logic import check_submissions
+from . import profiler, softdelete, streaming, uploads, webhooks, workspaces
+from .models import Form, Fragment, FragmentVersion, Submission, Upload, Workspace
+from .publishing import publish_form, unpublish_form
+from .shells import ShellTemplateResponse
 
 
 class FormBuilderView(TemplateView):
     template_name = "formbuilder/form_builder.html"
+    response_class = ShellTemplateResponse
 
     def get_context_data(self, **kwargs):
         """
@@ -43,6 +60,7 @@ class FormsListView(ListView):
     """
     model = Form
     template_name = "formbuilder/forms_list.html"
+    response_class = ShellTemplateResponse
     context_object_name = "forms"
     paginate_by = 20
 
@@ -50,20 +68,16 @@ class FormsListView(ListView):
         """
         Get queryset with additional context
         """
-        queryset = Form.objects.all()
-
-        # Add component counts
-        for form in queryset:
-            form.component_count = form.get_component_count()
-            form.component_types = form.get_component_types()
-
-        return queryset
+        return Form.objects.select_related('schema_blob')
 
     def get_context_data(self, **kwargs):
         """
-        Add additional context data
+        Add component counts for the forms of the current page only
         """
         context = super().get_context_data(**kwargs)
+        for form in context['object_list']:
+            form.component_count = form.get_component_count()
+            form.component_types = form.get_component_types()
         return context
 
 
@@ -73,6 +87,7 @@ class FormDetailView(DetailView):
     """
     model = Form
     template_name = "formbuilder/form_detail.html"
+    response_class = ShellTemplateResponse
     context_object_name = "form"
 
     def get_context_data(self, **kwargs):
@@ -94,6 +109,7 @@ class FormViewView(TemplateView):
     View to render a form for viewing/submission
     """
     template_name = "formbuilder/form_view.html"
+    response_class = ShellTemplateResponse
 
     def get_context_data(self, **kwargs):
         """
@@ -111,6 +127,8 @@ class FormViewView(TemplateView):
                 context['form'] = form
                 context['form_id'] = form_id
                 context['form_name'] = form.name
+                # Published forms are read from their static snapshot
+                context['snapshot_url'] = form.get_published_url()
             except Exception as e:
                 context['form'] = None
                 context['form_id'] = None
@@ -128,33 +146,80 @@ class FormsAPIView(View):
     """
 
     def get(self, request, form_id=None):
-        """Get all forms or a specific form"""
+        """
+        Get all forms, the forms changed since a point in time, or a specific form.
+        Schemas have their shared fragments resolved, unless ?resolve=false (for editing).
+        """
+        if form_id and request.GET.get('resolve') == 'false':
+            form_data = self.load_form(form_id, resolve=False)
+            if form_data is None:
+                return JsonResponse({'error': 'Form not found'}, status=404)
+            return JsonResponse(form_data)
         if form_id:
-            try:
-                form = Form.objects.get(id=form_id)
-                return JsonResponse({
-                    'id': form.id,
-                    'name': form.name,
-                    'schema': form.schema or {},
-                    'created_at': form.created.isoformat(),
-                    'updated_at': form.modified.isoformat(),
-                    'is_active': form.is_active
-                })
-            except Form.DoesNotExist:
+            key = workspaces.cache_key(workspaces.get_current_or_default().pk, form_id)
+            form_data = form_cache.get(key, lambda: self.load_form(form_id))
+            if form_data is None:
                 return JsonResponse({'error': 'Form not found'}, status=404)
+            return JsonResponse(form_data)
+        elif 'since' in request.GET:
+            return self.get_changes(request.GET['since'])
         else:
-            forms = Form.objects.all()
-            forms_data = []
-            for form in forms:
-                forms_data.append({
-                    'id': form.id,
-                    'name': form.name,
-                    'schema': form.schema or {},
-                    'created_at': form.created.isoformat(),
-                    'updated_at': form.modified.isoformat(),
-                    'is_active': form.is_active
-                })
-            return JsonResponse({'forms': forms_data})
+            next_since = timezone.now() - datetime.timedelta(seconds=softdelete.get_config()['SYNC_OVERLAP'])
+            forms = list(Form.objects.select_related('schema_blob'))
+            errors = {}
+            schemas = resolve_forms(forms, errors)
+            forms_data = [self.describe(form, schemas, errors) for form in forms]
+            return JsonResponse({'forms': forms_data, 'next_since': next_since.isoformat()})
+
+    def get_changes(self, since):
+        """Get the forms changed and deleted after `since` (ISO 8601)"""
+        since = parse_datetime(since)
+        if since is None:
+            return JsonResponse({'error': 'Invalid since, expected an ISO 8601 timestamp'}, status=400)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since, datetime.timezone.utc)
+        if since < softdelete.tombstone_cutoff():
+            # Deletions that old may have been purged: the client must resync
+            return JsonResponse({'error': 'since is older than the tombstone retention, reload all forms'}, status=410)
+
+        changed, deleted, next_since = softdelete.changes_since(since)
+        errors = {}
+        schemas = resolve_forms(changed, errors)
+        return JsonResponse({
+            'forms': [self.describe(form, schemas, errors) for form in changed],
+            'deleted': [{'id': form.id, 'deleted_at': form.deleted_at.isoformat()} for form in deleted],
+            'next_since': next_since.isoformat(),
+        })
+
+    @staticmethod
+    def describe(form, schemas, errors):
+        """
+        Describe a form with its schema from ``schemas``. A form whose
+        fragments cannot be resolved is described with its stored schema
+        and the error.
+        """
+        entry = {
+            'id': form.id,
+            'name': form.name,
+            'schema': schemas.get(form.pk, form.get_schema()) or {},
+            'created_at': form.created.isoformat(),
+            'updated_at': form.modified.isoformat(),
+            'is_active': form.is_active
+        }
+        if form.pk in errors:
+            entry['error'] = errors[form.pk]
+        return entry
+
+    @staticmethod
+    def load_form(form_id, resolve=True):
+        """Load the API representation of a form, or None if it does not exist"""
+        try:
+            form = Form.objects.select_related('schema_blob').get(id=form_id)
+        except Form.DoesNotExist:
+            return None
+        errors = {}
+        schemas = resolve_forms([form], errors) if resolve else {form.pk: form.get_schema()}
+        return FormsAPIView.describe(form, schemas, errors)
 
     def post(self, request):
         """Create a new form"""
@@ -168,16 +233,20 @@ class FormsAPIView(View):
             if 'schema' not in data:
                 return JsonResponse({'error': 'Schema is required'}, status=400)
 
-            # Create the form
-            form = Form.objects.create(
-                name=data['name'],
-                schema=data['schema']
-            )
+            workspaces.check_quota(workspaces.get_current_or_default(), 'forms', Form.objects)
+
+            # Create the form, with its webhook events in the same transaction
+            with transaction.atomic():
+                form = Form.objects.create(
+                    name=data['name'],
+                    schema=data['schema']
+                )
+                webhooks.enqueue_form_saved(form, created=True)
 
             return JsonResponse({
                 'id': form.id,
                 'name': form.name,
-                'schema': form.schema or {},
+                'schema': form.get_resolved_schema() or {},
                 'created_at': form.created.isoformat(),
                 'updated_at': form.modified.isoformat(),
                 'is_active': form.is_active
@@ -185,6 +254,10 @@ class FormsAPIView(View):
 
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except FragmentError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except workspaces.QuotaExceeded as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
@@ -202,12 +275,14 @@ class FormsAPIView(View):
             if 'is_active' in data:
                 form.is_active = data['is_active']
 
-            form.save()
+            with transaction.atomic():
+                form.save()
+                webhooks.enqueue_form_saved(form, created=False)
 
             return JsonResponse({
                 'id': form.id,
                 'name': form.name,
-                'schema': form.schema or {},
+                'schema': form.get_resolved_schema() or {},
                 'created_at': form.created.isoformat(),
                 'updated_at': form.modified.isoformat(),
                 'is_active': form.is_active
@@ -217,11 +292,13 @@ class FormsAPIView(View):
             return JsonResponse({'error': 'Form not found'}, status=404)
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except FragmentError as e:
+            return JsonResponse({'error': str(e)}, status=400)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
     def delete(self, request, form_id):
-        """Delete a form"""
+        """Delete a form (it stays as a tombstone in the delta feed until purged)"""
         try:
             form = Form.objects.get(id=form_id)
             form.delete()
@@ -232,3 +309,467 @@ class FormsAPIView(View):
             return JsonResponse({'error': str(e)}, status=500)
 
 
+@method_decorator(csrf_exempt, name='dispatch')
+class FormPublishAPIView(View):
+    """
+    API view to publish a form as a static schema snapshot
+    """
+
+    def post(self, request, form_id):
+        """Publish the current schema of a form"""
+        try:
+            form = Form.objects.get(id=form_id)
+            url = publish_form(form)
+            return JsonResponse({
+                'id': form.id,
+                'published_url': url,
+                'published_at': form.published_at.isoformat(),
+            })
+        except Form.DoesNotExist:
+            return JsonResponse({'error': 'Form not found'}, status=404)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+
+    def delete(self, request, form_id):
+        """Unpublish a form"""
+        try:
+            form = Form.objects.get(id=form_id)
+            unpublish_form(form)
+            return JsonResponse({'message': 'Form unpublished successfully'})
+        except Form.DoesNotExist:
+            return JsonResponse({'error': 'Form not found'}, status=404)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class SubmissionsAPIView(View):
+    """
+    API view to store and list form submissions
+    """
+
+    def get(self, request, form_id=None):
+        """Get the most recent submissions of a form"""
+        if not Form.objects.filter(id=form_id).exists():
+            return JsonResponse({'error': 'Form not found'}, status=404)
+        try:
+            limit = min(int(request.GET.get('limit', 100)), 1000)
+            offset = int(request.GET.get('offset', 0))
+        except ValueError:
+            return JsonResponse({'error': 'Invalid limit or offset'}, status=400)
+        if limit < 0 or offset < 0:
+            return JsonResponse({'error': 'Invalid limit or offset'}, status=400)
+
+        submissions = Submission.objects.filter(form_id=form_id)[offset:offset + limit]
+        return JsonResponse({
+            'submissions': [
+                {
+                    'id': submission.id,
+                    'form_id': submission.form_id,
+                    'data': submission.data,
+                    'submitted_at': submission.created.isoformat(),
+                }
+                for submission in submissions
+            ]
+        })
+
+    def post(self, request, form_id=None):
+        """
+        Store one submission ({form_id, data}) or a batch ({form_id, submissions: [...]}).
+        Calculated fields are computed and shown required fields checked by the form logic.
+        """
+        try:
+            data = json.loads(request.body)
+            form_id = form_id or data.get('form_id')
+            form = Form.objects.get(id=form_id)
+
+            if 'submissions' in data:
+                records = data['submissions']
+            elif 'data' in data:
+                records = [data['data']]
+            else:
+                return JsonResponse({'error': 'Data is required'}, status=400)
+
+            if not isinstance(records, list) or not all(isinstance(record, dict) for record in records):
+                return JsonResponse({'error': 'Submission data must be an object'}, status=400)
+
+            missing = check_submissions(form, records)
+            if missing:
+                return JsonResponse({
+                    'error': 'Required fields are missing',
+                    'missing': [{'index': index, 'fields': fields} for index, fields in missing.items()],
+                }, status=400)
+
+            submissions = ingest_submissions(form, records)
+            serialized = [
+                {
+                    'id': submission.id,
+                    'form_id': form.id,
+                    'form_name': form.name,
+                    'submitted_at': submission.created.isoformat(),
+                }
+                for submission in submissions
+            ]
+            if 'submissions' in data:
+                return JsonResponse({'submissions': serialized}, status=201)
+            return JsonResponse(serialized[0], status=201)
+
+        except Form.DoesNotExist:
+            return JsonResponse({'error': 'Form not found'}, status=404)
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class SubmissionsBulkAPIView(View):
+    """
+    API view to store a large batch of submissions while it is uploaded.
+
+    The body ({submissions: [...]} or newline-delimited JSON) is parsed
+    incrementally and stored BATCH_SIZE submissions per transaction, so it
+    is never held in memory as a whole. Batches stored before an invalid or
+    oversized item stay stored; the response reports how many there are.
+    """
+
+    def post(self, request, form_id):
+        """Store the submissions of the request body"""
+        try:
+            form = Form.objects.get(id=form_id)
+        except Form.DoesNotExist:
+            return JsonResponse({'error': 'Form not found'}, status=404)
+
+        stored = 0
+        try:
+            records = streaming.iter_request(request, 'submissions')
+            for batch in streaming.batched(records, streaming.get_config()['BATCH_SIZE']):
+                if not all(isinstance(record, dict) for record in batch):
+                    return JsonResponse({'error': 'Submission data must be an object', 'stored': stored}, status=400)
+                missing = check_submissions(form, batch)
+                if missing:
+                    return JsonResponse({
+                        'error': 'Required fields are missing',
+                        'missing': [{'index': stored + index, 'fields': fields} for index, fields in missing.items()],
+                        'stored': stored,
+                    }, status=400)
+                ingest_submissions(form, batch)
+                stored += len(batch)
+        except streaming.TooLarge as e:
+            return JsonResponse({'error': str(e), 'stored': stored}, status=413)
+        except streaming.StreamingJSONError as e:
+            return JsonResponse({'error': str(e), 'stored': stored}, status=400)
+        return JsonResponse({'stored': stored}, status=201)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class FormsImportAPIView(View):
+    """
+    API view to create many forms from one upload ({forms: [{name, schema}, ...]}
+    or newline-delimited JSON), parsed incrementally like the bulk submissions
+    """
+
+    def post(self, request):
+        """Create the forms of the request body"""
+        imported = []
+        workspace = workspaces.get_current_or_default()
+        remaining = workspaces.remaining_quota(workspace, 'forms', Form.objects)
+        try:
+            for index, item in enumerate(streaming.iter_request(request, 'forms')):
+                if not isinstance(item, dict) or not item.get('name') or 'schema' not in item:
+                    return JsonResponse(
+                        {'error': f"Item {index}: name and schema are required", 'imported': imported}, status=400
+                    )
+                if remaining is not None and len(imported) >= remaining:
+                    return JsonResponse({
+                        'error': f"Item {index}: {workspaces.quota_message(workspace, 'forms')}", 'imported': imported,
+                    }, status=workspaces.QuotaExceeded.status)
+                try:
+                    with transaction.atomic():
+                        form = Form.objects.create(name=item['name'], schema=item['schema'])
+                        webhooks.enqueue_form_saved(form, created=True)
+                except FragmentError as e:
+                    return JsonResponse({'error': f"Item {index}: {e}", 'imported': imported}, status=400)
+                imported.append({'id': form.id, 'name': form.name})
+        except streaming.TooLarge as e:
+            return JsonResponse({'error': str(e), 'imported': imported}, status=413)
+        except streaming.StreamingJSONError as e:
+            return JsonResponse({'error': str(e), 'imported': imported}, status=400)
+        return JsonResponse({'imported': imported}, status=201)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class FragmentsAPIView(View):
+    """
+    API view to list and create shared component fragments, and to store
+    new versions of them
+    """
+
+    def get(self, request, fragment_id=None):
+        """Get all fragments, or the components of one (latest version, or ?version=)"""
+        if fragment_id is None:
+            fragments = Fragment.objects.annotate(form_count=Count('references__form', distinct=True))
+            return JsonResponse({'fragments': [
+                {'id': fragment.id, 'name': fragment.name, 'version': fragment.version, 'form_count': fragment.form_count}
+                for fragment in fragments
+            ]})
+        try:
+            fragment = Fragment.objects.get(id=fragment_id)
+            version = int(request.GET.get('version', fragment.version))
+            fragment_version = fragment.versions.get(version=version)
+        except (Fragment.DoesNotExist, FragmentVersion.DoesNotExist):
+            return JsonResponse({'error': 'Fragment not found'}, status=404)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid version'}, status=400)
+        return JsonResponse({
+            'id': fragment.id,
+            'name': fragment.name,
+            'version': fragment_version.version,
+            'latest_version': fragment.version,
+            'components': fragment_version.components,
+        })
+
+    def post(self, request):
+        """Create a fragment ({name, components}) with its first version"""
+        try:
+            data = json.loads(request.body)
+            if not data.get('name') or 'components' not in data:
+                return JsonResponse({'error': 'Name and components are required'}, status=400)
+            workspaces.check_quota(workspaces.get_current_or_default(), 'fragments', Fragment.objects)
+            with transaction.atomic():
+                fragment = Fragment.objects.create(name=data['name'])
+                create_version(fragment, data['components'])
+            return JsonResponse({'id': fragment.id, 'name': fragment.name, 'version': fragment.version}, status=201)
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except (FragmentError, IntegrityError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except workspaces.QuotaExceeded as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+
+    def put(self, request, fragment_id):
+        """Store {components} as the next version of a fragment"""
+        try:
+            fragment = Fragment.objects.get(id=fragment_id)
+            data = json.loads(request.body)
+            if 'components' not in data:
+                return JsonResponse({'error': 'Components are required'}, status=400)
+            create_version(fragment, data['components'])
+            return JsonResponse({'id': fragment.id, 'name': fragment.name, 'version': fragment.version})
+        except Fragment.DoesNotExist:
+            return JsonResponse({'error': 'Fragment not found'}, status=404)
+        except json.JSONDecodeError:
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except FragmentError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+
+def upload_response(upload, status=200):
+    """Describe an upload, with the offset in tus headers as well"""
+    response = JsonResponse({
+        'id': str(upload.id),
+        'form_id': upload.form_id,
+        'component_key': upload.component_key,
+        'filename': upload.filename,
+        'size': upload.size,
+        'offset': upload.offset,
+        'completed': upload.completed_at is not None,
+        'url': reverse('upload_api', args=[upload.id]),
+    }, status=status)
+    response['Upload-Offset'] = upload.offset
+    response['Upload-Length'] = upload.size
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+class WorkspacesAPIView(View):
+    """
+    API view to list the workspaces the user may select
+    """
+
+    def get(self, request):
+        """Get the default workspace and those the user is a member of"""
+        default = workspaces.get_config()['DEFAULT']
+        choices = Workspace.objects.all()
+        if not request.user.is_superuser:
+            choices = choices.filter(slug=default)
+            if request.user.is_authenticated:
+                choices |= Workspace.objects.filter(members=request.user)
+        return JsonResponse({
+            'workspaces': [{'slug': workspace.slug, 'name': workspace.name} for workspace in choices.distinct()],
+            'current': request.workspace.slug,
+        })
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class UploadsAPIView(View):
+    """
+    API view to start a resumable upload for a file-upload component
+    """
+
+    def post(self, request, form_id):
+        """Create an upload ({component_key, filename, size, content_type})"""
+        try:
+            data = json.loads(request.body)
+            form = Form.objects.get(id=form_id)
+            upload = uploads.create_upload(
+                form, data.get('component_key'), data.get('filename'), data.get('size'), data.get('content_type', '')
+            )
+        except Form.DoesNotExist:
+            return JsonResponse({'error': 'Form not found'}, status=404)
+        except (json.JSONDecodeError, AttributeError):
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except uploads.UploadError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+        response = upload_response(upload, status=201)
+        response['Location'] = reverse('upload_api', args=[upload.id])
+        return response
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class UploadAPIView(View):
+    """
+    API view to get the offset of, append a chunk to, or cancel an upload
+    """
+
+    def get(self, request, upload_id):
+        """Get an upload; HEAD returns its offset in Upload-Offset"""
+        try:
+            return upload_response(Upload.objects.get(id=upload_id))
+        except Upload.DoesNotExist:
+            return JsonResponse({'error': 'Upload not found'}, status=404)
+
+    def patch(self, request, upload_id):
+        """Append the body at Upload-Offset, verified against Upload-Checksum if sent"""
+        try:
+            upload = Upload.objects.get(id=upload_id)
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.headers['Content-Length']) if request.headers.get('Content-Length') else None
+            upload = uploads.write_chunk(upload, offset, request, length, request.headers.get('Upload-Checksum'))
+        except Upload.DoesNotExist:
+            return JsonResponse({'error': 'Upload not found'}, status=404)
+        except ValueError:
+            return JsonResponse({'error': 'Upload-Offset and Content-Length must be integers'}, status=400)
+        except uploads.UploadError as e:
+            response = JsonResponse({'error': str(e)}, status=e.status)
+            if isinstance(e, uploads.ChecksumMismatch):
+                response.reason_phrase = 'Checksum Mismatch'
+            return response
+        return upload_response(upload)
+
+    def delete(self, request, upload_id):
+        """Cancel an upload that was not submitted, removing its file"""
+        try:
+            upload = Upload.objects.get(id=upload_id)
+        except Upload.DoesNotExist:
+            return JsonResponse({'error': 'Upload not found'}, status=404)
+        if upload.submission_id is not None:
+            return JsonResponse({'error': 'Upload belongs to a submission'}, status=409)
+        uploads.delete_upload(upload)
+        return JsonResponse({'message': 'Upload deleted successfully'})
+
+
+class SubmissionSummaryAPIView(View):
+    """
+    API view to return per-field statistics of a form's submissions
+    """
+
+    def get(self, request, form_id):
+        """Get the submission summary of a form"""
+        try:
+            form = Form.objects.select_related('schema_blob').get(id=form_id)
+            return JsonResponse({'form_id': form.id, **summarize(form)})
+        except Form.DoesNotExist:
+            return JsonResponse({'error': 'Form not found'}, status=404)
+
+
+class FormEventsAPIView(View):
+    """
+    Server-Sent Events stream of change notifications for a form.
+    Served natively under ASGI; under WSGI (including runserver) each
+    connection holds a worker thread while it is open (see iter_sync).
+    """
+
+    async def get(self, request, form_id):
+        """Stream change events of a form"""
+        modified = await Form.objects.filter(id=form_id).values_list('modified', flat=True).afirst()
+        if modified is None:
+            return JsonResponse({'error': 'Form not found'}, status=404)
+
+        stream = stream_form_events(form_id, modified.isoformat(), request.headers.get('Last-Event-ID'))
+        if not isinstance(request, ASGIRequest):
+            stream = iter_sync(stream)
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # disable proxy buffering in nginx
+        return response
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class CacheStatsAPIView(View):
+    """
+    API view to report the form cache hit ratios of this worker process
+    """
+
+    def get(self, request):
+        """Get per-tier cache statistics"""
+        return JsonResponse({'form_cache': form_cache.stats()})
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class ProfilesView(TemplateView):
+    """
+    Staff page to set the profiling sampling rate and download request profiles
+    """
+    template_name = "admin/formbuilder/profiles.html"
+
+    def get_context_data(self, **kwargs):
+        """
+        Add stored profiles, the sampling rate and a fresh header token
+        """
+        context = super().get_context_data(**kwargs)
+        config = profiler.get_config()
+        context.update(admin.site.each_context(self.request))
+        context.update({
+            'title': 'Request profiles',
+            'enabled': config['ENABLED'],
+            'sample_rate': profiler.get_sample_rate(),
+            'rate_refresh': config['RATE_REFRESH'],
+            'token': profiler.make_token(),
+            'token_max_age': config['TOKEN_MAX_AGE'],
+            'profiles': [
+                (name, size, datetime.datetime.fromtimestamp(mtime))
+                for name, size, mtime in profiler.list_profiles()
+            ],
+        })
+        return context
+
+    def post(self, request):
+        """Set the sampling rate"""
+        try:
+            profiler.set_sample_rate(float(request.POST.get('sample_rate', 0)))
+        except ValueError:
+            pass
+        # Post/redirect/get: reloading the page does not resubmit the form
+        return redirect('profiles')
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class ProfileDownloadView(View):
+    """
+    Download a stored profile as JSON or as folded stacks
+    """
+
+    def get(self, request, name):
+        """Get a profile"""
+        profile = profiler.load_profile(name)
+        if profile is None:
+            raise Http404("Profile not found")
+        if request.GET.get('format') == 'folded':
+            response = HttpResponse(profiler.folded_stacks(profile), content_type='text/plain')
+            filename = name.replace('.json', '.folded')
+        else:
+            response = JsonResponse(profile)
+            filename = name
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
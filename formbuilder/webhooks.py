@@ -0,0 +1,632 @@
+"""
+Webhook notifications through a transactional outbox.
+
+Creating or updating a form through the forms API and storing submissions
+write one ``OutboxEvent`` row per subscribed ``WebhookEndpoint`` in the
+same transaction as the change itself (``enqueue``). Nothing is sent from
+the request: an event exists exactly when its change was committed, and
+the receiver's latency never adds to the request's.
+
+The ``deliver_webhooks`` worker delivers the outbox on an asyncio event
+loop:
+
+* Due events are claimed in bulk by pushing their ``next_attempt_at`` out
+  by ``LEASE`` seconds (``SELECT ... FOR UPDATE SKIP LOCKED`` on
+  PostgreSQL, so several workers can run side by side). An event whose
+  worker dies is delivered again once its lease runs out.
+* Claimed events are grouped per endpoint and POSTed ``BATCH_SIZE`` at a
+  time as ``{"events": [...]}``, up to ``CONCURRENCY`` requests at once,
+  over keep-alive connections pooled per host (``ConnectionPool``).
+* A batch fails as a whole on a network error, a timeout or a non-2xx
+  response. Its events are retried with exponential backoff and jitter
+  (honouring ``Retry-After``) and are dead-lettered, i.e. marked
+  ``dead_at`` and no longer retried, after ``MAX_ATTEMPTS`` attempts.
+
+Delivery is at least once and batches of one endpoint may overlap, so
+receivers should deduplicate and order events by their ``id``. Each
+request is signed: ``X-Formbuilder-Signature`` is the hex HMAC-SHA256 of
+``<X-Formbuilder-Timestamp>.<body>`` keyed with the endpoint's secret.
+
+``StubReceiver`` is a local receiver for tests and the benchmark.
+"""
+import asyncio
+import datetime
+import hashlib
+import hmac
+import json
+import logging
+import random
+import ssl
+import threading
+import time
+from collections import defaultdict, deque
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_WEBHOOKS = {
+    'BATCH_SIZE': 100,  # events per request to an endpoint
+    'CONCURRENCY': 32,  # requests in flight per worker
+    'CONNECTIONS_PER_HOST': 8,  # keep-alive connections per receiving host
+    'TIMEOUT': 10,  # seconds per request, including connecting
+    'LEASE': 60,  # seconds claimed events are hidden from other workers
+    'POLL_INTERVAL': 1.0,  # seconds between outbox polls when it is empty
+    'MAX_ATTEMPTS': 10,  # failed attempts before an event is dead-lettered
+    'BACKOFF_BASE': 5,  # seconds before the first retry, doubled on each attempt
+    'BACKOFF_MAX': 3600,  # longest delay between attempts
+    'RETENTION_HOURS': 72,  # delivered events are deleted after this
+}
+
+ENDPOINTS_CACHE_KEY = 'formbuilder:webhook_endpoints'
+
+USER_AGENT = 'formbuilder-webhooks/1'
+
+
+def get_config():
+    """
+    Return the webhook settings merged over the defaults
+    """
+    return {**DEFAULT_WEBHOOKS, **getattr(settings, 'FORMBUILDER_WEBHOOKS', {})}
+
+
+# Enqueueing
+
+def active_endpoints(workspace_id):
+    """
+    Return ``(id, form_id, events)`` of the active endpoints of a workspace,
+    cached until one of them changes
+    """
+    from .models import WebhookEndpoint
+
+    key = f"{ENDPOINTS_CACHE_KEY}:{workspace_id}"
+    endpoints = cache.get(key)
+    if endpoints is None:
+        endpoints = list(
+            WebhookEndpoint.objects.filter(workspace=workspace_id, is_active=True).values_list('id', 'form_id', 'events')
+        )
+        cache.set(key, endpoints)
+    return endpoints
+
+
+def invalidate_endpoints(workspace_id):
+    # Again after the commit, in case a concurrent request cached the
+    # endpoints as they were before it
+    key = f"{ENDPOINTS_CACHE_KEY}:{workspace_id}"
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def subscribed_endpoints(event, form):
+    """
+    Return the ids of the active endpoints subscribed to an event of a form
+    """
+    return [
+        endpoint_id for endpoint_id, endpoint_form_id, events in active_endpoints(form.workspace_id)
+        if endpoint_form_id in (None, form.pk) and (not events or event in events)
+    ]
+
+
+def enqueue(event, form, payloads):
+    """
+    Add an event to the outbox of every endpoint subscribed to it, for each
+    of ``payloads``. Call inside the transaction making the change.
+    """
+    from .models import OutboxEvent
+
+    endpoints = subscribed_endpoints(event, form)
+    if not endpoints or not payloads:
+        return
+    now = timezone.now()
+    OutboxEvent.objects.bulk_create(
+        OutboxEvent(endpoint_id=endpoint_id, event=event, payload=payload, created=now, next_attempt_at=now)
+        for endpoint_id in endpoints
+        for payload in payloads
+    )
+
+
+def form_payload(form, schema=None):
+    """
+    Return the webhook payload of a form, with its schema resolved (or
+    ``schema``) as the forms API returns it
+    """
+    if schema is None:
+        schema = form.get_resolved_schema()
+    return {
+        'id': form.id,
+        'name': form.name,
+        'schema': schema or {},
+        'created_at': form.created,
+        'updated_at': form.modified,
+        'is_active': form.is_active,
+    }
+
+
+def enqueue_form_saved(form, created):
+    enqueue('form.created' if created else 'form.updated', form, [form_payload(form)])
+
+
+def enqueue_forms_updated(forms):
+    """
+    Enqueue ``form.updated`` for forms changed without being saved, by a
+    new version of a fragment they follow. ``forms`` need only their pk and
+    workspace; those with subscribers are loaded and resolved together.
+    """
+    from .fragments import resolve_forms
+    from .models import Form
+
+    subscribed = [form.pk for form in forms if subscribed_endpoints('form.updated', form)]
+    if not subscribed:
+        return
+    forms = list(Form.objects.filter(pk__in=subscribed).select_related('schema_blob'))
+    schemas = resolve_forms(forms, errors={})
+    for form in forms:
+        # A form that no longer resolves is sent with its stored schema
+        enqueue('form.updated', form, [form_payload(form, schemas.get(form.pk) or form.get_schema())])
+
+
+def enqueue_submissions(form, submissions):
+    enqueue('submission.created', form, [
+        {'id': submission.id, 'form_id': form.pk, 'data': submission.data, 'submitted_at': submission.created}
+        for submission in submissions
+    ])
+
+
+# Outbox bookkeeping, run by the worker in a thread
+
+def claim_events(limit, lease):
+    """
+    Claim up to ``limit`` due events for ``lease`` seconds and return them,
+    with their endpoints
+    """
+    from .models import OutboxEvent, WebhookEndpoint
+
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.pending().filter(next_attempt_at__lte=now)
+            .order_by('next_attempt_at')
+            .select_for_update(skip_locked=True)[:limit]
+        )
+        if events:
+            OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+                next_attempt_at=now + datetime.timedelta(seconds=lease)
+            )
+    endpoints = WebhookEndpoint.objects.in_bulk({event.endpoint_id for event in events})
+    for event in events:
+        event.endpoint = endpoints[event.endpoint_id]
+    return events
+
+
+def backoff(attempts, config, retry_after=None):
+    """
+    Return the seconds to wait before attempt ``attempts + 1``
+    """
+    delay = min(config['BACKOFF_MAX'], config['BACKOFF_BASE'] * 2 ** (attempts - 1))
+    # Jitter, so events that failed together are not retried together
+    delay *= random.uniform(0.5, 1.0)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, config['BACKOFF_MAX']))
+    return delay
+
+
+def record_results(results, config):
+    """
+    Store the outcome of delivered batches, given as ``(events, error,
+    retry_after)`` with ``error`` None on success
+    """
+    from .models import OutboxEvent
+
+    now = timezone.now()
+    delivered = []
+    updates = []
+    for events, error, retry_after in results:
+        if error is None:
+            delivered.extend(event.pk for event in events)
+            continue
+        # Events claimed together mostly share their number of attempts
+        by_attempts = defaultdict(list)
+        for event in events:
+            by_attempts[event.attempts + 1].append(event.pk)
+        for attempts, pks in by_attempts.items():
+            if attempts >= config['MAX_ATTEMPTS']:
+                logger.warning("%d webhook event(s) to %s dead-lettered: %s", len(pks), events[0].endpoint.url, error)
+                changes = {'dead_at': now}
+            else:
+                delay = backoff(attempts, config, retry_after)
+                changes = {'next_attempt_at': now + datetime.timedelta(seconds=delay)}
+            updates.append((pks, {'attempts': attempts, 'last_error': error[:1000], **changes}))
+
+    with transaction.atomic():
+        if delivered:
+            OutboxEvent.objects.filter(pk__in=delivered).update(delivered_at=now, last_error='')
+        for pks, changes in updates:
+            OutboxEvent.objects.filter(pk__in=pks).update(**changes)
+
+
+def purge_delivered(retention_hours=None, batch_size=5000):
+    """
+    Delete events delivered more than ``retention_hours`` ago, in batches.
+    Returns the number deleted.
+    """
+    from .models import OutboxEvent
+
+    if retention_hours is None:
+        retention_hours = get_config()['RETENTION_HOURS']
+    cutoff = timezone.now() - datetime.timedelta(hours=retention_hours)
+    deleted = 0
+    while True:
+        pks = list(OutboxEvent.objects.filter(delivered_at__lt=cutoff).values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        deleted += OutboxEvent.objects.filter(pk__in=pks).delete()[0]
+
+
+def retry_dead(endpoint_id=None):
+    """
+    Queue dead-lettered events again, with a fresh number of attempts.
+    Returns how many.
+    """
+    from .models import OutboxEvent
+
+    events = OutboxEvent.objects.filter(dead_at__isnull=False)
+    if endpoint_id is not None:
+        events = events.filter(endpoint_id=endpoint_id)
+    return events.update(dead_at=None, attempts=0, next_attempt_at=timezone.now())
+
+
+# HTTP client
+
+class HTTPError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Minimal asyncio HTTP/1.1 client keeping connections alive per host
+
+    Only what webhook delivery needs: POST a body, read the status, headers
+    and body of the response (Content-Length, chunked or until close).
+    """
+
+    def __init__(self, per_host=8, timeout=10):
+        self.per_host = per_host
+        self.timeout = timeout
+        self.idle = defaultdict(deque)
+        self.slots = defaultdict(lambda: asyncio.Semaphore(self.per_host))
+        self.ssl_context = None
+        self.opened = 0
+
+    async def post(self, url, body, headers):
+        """
+        POST ``body`` and return ``(status, headers, body)``
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise HTTPError(f"Unsupported URL {url!r}")
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        host = parts.netloc.rsplit('@', 1)[-1]
+        head = [f"POST {path} HTTP/1.1", f"Host: {host}", f"User-Agent: {USER_AGENT}",
+                f"Content-Length: {len(body)}", *(f"{name}: {value}" for name, value in headers.items())]
+        request = ('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body
+
+        async with self.slots[key]:
+            return await asyncio.wait_for(self._send(key, request), self.timeout)
+
+    async def _send(self, key, request):
+        # A pooled connection may have been closed by the server meanwhile;
+        # retry once on a new one if it fails before any response arrives.
+        while True:
+            reused = bool(self.idle[key])
+            reader, writer = self.idle[key].popleft() if reused else await self._connect(key)
+            try:
+                writer.write(request)
+                await writer.drain()
+                status_line = await reader.readline()
+                if not status_line:
+                    raise ConnectionResetError("Connection closed before the response")
+            except (ConnectionError, OSError):
+                writer.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                # Timed out: the connection is in an unknown state
+                writer.close()
+                raise
+            try:
+                status, headers, body, keep_alive = await self._read_response(status_line, reader)
+            except BaseException:
+                writer.close()
+                raise
+            if keep_alive:
+                self.idle[key].append((reader, writer))
+            else:
+                writer.close()
+            return status, headers, body
+
+    async def _connect(self, key):
+        scheme, hostname, port = key
+        context = None
+        if scheme == 'https':
+            if self.ssl_context is None:
+                self.ssl_context = ssl.create_default_context()
+            context = self.ssl_context
+        self.opened += 1
+        return await asyncio.open_connection(hostname, port, ssl=context)
+
+    @staticmethod
+    async def _read_response(status_line, reader):
+        try:
+            version, status = status_line.decode('latin-1').split()[:2]
+            status = int(status)
+        except ValueError:
+            raise HTTPError(f"Invalid status line {status_line[:100]!r}")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if not size:
+                    # Trailers end with an empty line
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return status, headers, body, keep_alive
+
+    def close(self):
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+        self.idle.clear()
+
+
+def sign(secret, timestamp, body):
+    return hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+
+
+def parse_retry_after(value):
+    """
+    Return the seconds of a Retry-After header (delay or HTTP date), or None
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - timezone.now()).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+# Worker
+
+class Worker:
+    """
+    Delivers the outbox until stopped; see the module docstring
+    """
+
+    def __init__(self, config=None):
+        self.config = {**get_config(), **(config or {})}
+        self.delivered = 0
+        self.failed = 0
+
+    async def run(self, stop=None, drain=False):
+        """
+        Deliver due events until ``stop`` (an asyncio.Event) is set, or with
+        ``drain`` until no event is due
+        """
+        config = self.config
+        stop = stop or asyncio.Event()
+        pool = ConnectionPool(config['CONNECTIONS_PER_HOST'], config['TIMEOUT'])
+        slots = asyncio.Semaphore(config['CONCURRENCY'])
+        results = asyncio.Queue()
+        recorder = asyncio.create_task(self.record(results))
+        in_flight = set()
+        purged_at = 0
+        settled = False
+        try:
+            while not stop.is_set():
+                if time.monotonic() - purged_at > 3600:
+                    await sync_to_async(purge_delivered)(config['RETENTION_HOURS'])
+                    purged_at = time.monotonic()
+
+                free = config['CONCURRENCY'] - len(in_flight)
+                if free <= 0:
+                    await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                # Claim only what free request slots can take right away, so
+                # leases do not run out while events wait for a slot
+                events = await sync_to_async(claim_events)(free * config['BATCH_SIZE'], config['LEASE'])
+                for endpoint, batch in self.batches(events):
+                    task = asyncio.create_task(self.deliver(pool, slots, endpoint, batch, results))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+
+                if events:
+                    settled = False
+                elif in_flight:
+                    await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                elif drain:
+                    if settled:
+                        break
+                    # Failed events may fall due again once recorded
+                    await results.join()
+                    settled = True
+                else:
+                    try:
+                        await asyncio.wait_for(stop.wait(), config['POLL_INTERVAL'])
+                    except asyncio.TimeoutError:
+                        pass
+            if in_flight:
+                await asyncio.wait(in_flight)
+            await results.join()
+        finally:
+            recorder.cancel()
+            pool.close()
+
+    def batches(self, events):
+        by_endpoint = defaultdict(list)
+        for event in events:
+            by_endpoint[event.endpoint_id].append(event)
+        size = self.config['BATCH_SIZE']
+        for endpoint_events in by_endpoint.values():
+            for i in range(0, len(endpoint_events), size):
+                yield endpoint_events[0].endpoint, endpoint_events[i:i + size]
+
+    async def deliver(self, pool, slots, endpoint, events, results):
+        """
+        POST one batch of events to an endpoint and queue the outcome
+        """
+        body = json.dumps({'events': [
+            {'id': event.pk, 'event': event.event, 'created': event.created.isoformat(), 'data': event.payload}
+            for event in events
+        ]}, separators=(',', ':')).encode()
+        timestamp = str(int(time.time()))
+        headers = {'Content-Type': 'application/json', 'X-Formbuilder-Timestamp': timestamp}
+        if endpoint.secret:
+            headers['X-Formbuilder-Signature'] = sign(endpoint.secret, timestamp, body)
+
+        error = retry_after = None
+        try:
+            async with slots:
+                status, response_headers, response_body = await pool.post(endpoint.url, body, headers)
+            if not 200 <= status < 300:
+                error = f"HTTP {status}: {response_body[:200].decode('utf-8', 'replace')}"
+                retry_after = parse_retry_after(response_headers.get('retry-after'))
+        except asyncio.TimeoutError:
+            error = f"Timed out after {self.config['TIMEOUT']}s"
+        except (OSError, asyncio.IncompleteReadError, HTTPError, ValueError) as e:
+            error = f"{type(e).__name__}: {e}"
+
+        if error is None:
+            self.delivered += len(events)
+        else:
+            self.failed += len(events)
+        results.put_nowait((events, error, retry_after))
+
+    async def record(self, results):
+        """
+        Store delivery outcomes, all those queued meanwhile in one transaction
+        """
+        while True:
+            batch = [await results.get()]
+            while not results.empty():
+                batch.append(results.get_nowait())
+            try:
+                await sync_to_async(record_results)(batch, self.config)
+            except Exception:
+                # The events are delivered again once their lease runs out
+                logger.exception("Could not record the delivery of %d webhook batch(es)", len(batch))
+            for _ in batch:
+                results.task_done()
+
+
+def deliver_outbox(config=None):
+    """
+    Deliver events until none is due and return the worker, for tests and
+    one-off runs
+    """
+    worker = Worker(config)
+    async_to_sync(worker.run)(drain=True)
+    return worker
+
+
+# Local receiver
+
+class StubReceiver:
+    """
+    Local HTTP receiver recording the batches posted to it, for tests and
+    the benchmark. It serves from an event loop in a thread of its own while
+    used as a context manager. ``responses`` lists the statuses returned to
+    the first requests (200 afterwards); ``delay`` is added to every response.
+    """
+
+    def __init__(self, responses=(), delay=0.0, secret=''):
+        self.responses = list(responses)
+        self.delay = delay
+        self.secret = secret
+        self.batches = []
+        self.requests = 0
+        self.connections = 0
+
+    @property
+    def url(self):
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/hooks/"
+
+    @property
+    def events(self):
+        return [event for batch in self.batches for event in batch]
+
+    def __enter__(self):
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(asyncio.start_server(self.handle, '127.0.0.1', 0))
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b''):
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                self.requests += 1
+                status = self.responses.pop(0) if self.responses else 200
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                if status == 200:
+                    signature = headers.get('x-formbuilder-signature', '')
+                    if self.secret and not hmac.compare_digest(
+                        signature, sign(self.secret, headers.get('x-formbuilder-timestamp', ''), body)
+                    ):
+                        status = 401
+                    else:
+                        self.batches.append(json.loads(body)['events'])
+                writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Length: 0\r\n\r\n".encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,214 @@
+"""
+Workspaces: the tenants owning forms, fragments and webhook endpoints.
+
+One deployment serves many teams. ``WorkspaceMiddleware`` binds every
+request below ``PATH_PREFIXES`` to a workspace, the one named by the
+``X-Formbuilder-Workspace`` header (or, on GET requests, the ``workspace``
+query parameter, as EventSource and page links cannot send headers) or
+else the default workspace. The name alone grants nothing: a workspace
+other than the default one is only bound for its members
+(``Workspace.members``) and superusers, any other caller gets a 403. The
+default workspace is open to every caller, as it was before workspaces
+existed. Pages keep the workspace in their links (``{% workspace_url %}``).
+The managers of tenant-owned models (``TenantManager``) then filter every
+query by it, so a view cannot read or change another tenant's rows.
+Code running outside such a request (management commands, workers, the
+admin) is not bound and sees every workspace; ``activate()`` binds one
+explicitly.
+
+Tenant tables are indexed with the workspace first, so lists, lookups and
+counts read only the rows of the requesting tenant, however many other
+tenants there are. Cache keys of tenant data are namespaced by workspace
+(``cache_key()``): an id belonging to another tenant never hits a cached
+entry.
+
+Quotas limit the forms and fragments of a workspace (``MAX_FORMS`` and
+``MAX_FRAGMENTS``, overridden per workspace). They are checked by the API
+when creating, without locking, so concurrent requests may exceed them by
+a few rows. Request rates are limited per workspace by the ``WORKSPACE``
+bucket of the rate limits.
+"""
+import contextlib
+import contextvars
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models, transaction
+from django.http import JsonResponse
+
+from .cache import TieredCache
+from .log import bind_context
+
+DEFAULT_WORKSPACES = {
+    'DEFAULT': 'default',  # slug of the workspace of requests naming none
+    'HEADER': 'X-Formbuilder-Workspace',
+    'QUERY_PARAMETER': 'workspace',  # on GET requests only, for EventSource and page links
+    'PATH_PREFIXES': ['/formbuilder/'],
+    'MAX_FORMS': 10000,  # per workspace, None for no limit
+    'MAX_FRAGMENTS': 1000,
+}
+
+_current = contextvars.ContextVar('formbuilder_workspace', default=None)
+
+# slug -> Workspace
+workspace_cache = TieredCache('formbuilder:workspace')
+
+
+class QuotaExceeded(Exception):
+    status = 403
+
+
+def get_config():
+    """
+    Return the workspace settings merged over the defaults
+    """
+    return {**DEFAULT_WORKSPACES, **getattr(settings, 'FORMBUILDER_WORKSPACES', {})}
+
+
+def get_workspace(slug):
+    """
+    Return the workspace with a slug, or None
+    """
+    from .models import Workspace
+
+    return workspace_cache.get(slug, lambda: Workspace.objects.filter(slug=slug).first())
+
+
+def invalidate_workspace(slug):
+    # Again after the commit, in case a concurrent request cached the
+    # workspace as it was before it
+    workspace_cache.invalidate(slug)
+    transaction.on_commit(lambda: workspace_cache.invalidate(slug))
+
+
+def is_member(user, workspace):
+    """
+    Return whether a user may act in a workspace
+    """
+    if workspace.slug == get_config()['DEFAULT'] or user.is_superuser:
+        return True
+    return user.is_authenticated and workspace.members.filter(pk=user.pk).exists()
+
+
+def get_current():
+    """
+    Return the workspace bound to the current request, or None
+    """
+    return _current.get()
+
+
+def get_current_or_default():
+    """
+    Return the workspace bound to the current request, or the default one
+    """
+    workspace = _current.get()
+    if workspace is None:
+        slug = get_config()['DEFAULT']
+        workspace = get_workspace(slug)
+        if workspace is None:
+            raise ImproperlyConfigured(f"The default workspace {slug!r} does not exist")
+    return workspace
+
+
+def default_workspace_id():
+    """
+    Default of the workspace column of tenant-owned models
+    """
+    return get_current_or_default().pk
+
+
+@contextlib.contextmanager
+def activate(workspace):
+    """
+    Scope the queries of tenant-owned models to ``workspace`` (None for all)
+    """
+    token = _current.set(workspace)
+    try:
+        yield workspace
+    finally:
+        _current.reset(token)
+
+
+def cache_key(workspace_id, key):
+    """
+    Return ``key`` in the cache namespace of a workspace
+    """
+    return f"{workspace_id}:{key}"
+
+
+class TenantManager(models.Manager):
+    """
+    Manager filtering every query by the workspace bound to the current
+    request. Subclasses of models owned through a parent set
+    ``tenant_field`` to the path of the workspace, e.g. ``form__workspace``.
+    """
+    tenant_field = 'workspace'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        workspace = _current.get()
+        if workspace is not None:
+            queryset = queryset.filter(**{self.tenant_field: workspace.pk})
+        return queryset
+
+
+def get_quota(workspace, name):
+    """
+    Return the limit of ``name`` ('forms' or 'fragments') in a workspace,
+    None for no limit
+    """
+    limit = getattr(workspace, f'max_{name}')
+    return limit if limit is not None else get_config()[f'MAX_{name.upper()}']
+
+
+def remaining_quota(workspace, name, queryset):
+    """
+    Return how many more rows of ``queryset``'s model a workspace may
+    create under its quota ``name``, None for no limit
+    """
+    limit = get_quota(workspace, name)
+    if limit is None:
+        return None
+    return max(0, limit - queryset.filter(workspace=workspace.pk).count())
+
+
+def check_quota(workspace, name, queryset, adding=1):
+    """
+    Raise QuotaExceeded unless a workspace may create ``adding`` more rows
+    """
+    remaining = remaining_quota(workspace, name, queryset)
+    if remaining is not None and remaining < adding:
+        raise QuotaExceeded(quota_message(workspace, name))
+
+
+def quota_message(workspace, name):
+    return f"Workspace {workspace.slug} has reached its quota of {get_quota(workspace, name)} {name}"
+
+
+class WorkspaceMiddleware:
+    """
+    Bind requests below PATH_PREFIXES to the workspace they name, if the
+    user is one of its members. Runs after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.config = get_config()
+        self.header = 'HTTP_' + self.config['HEADER'].upper().replace('-', '_')
+
+    def __call__(self, request):
+        if not request.path_info.startswith(tuple(self.config['PATH_PREFIXES'])):
+            return self.get_response(request)
+        slug = request.META.get(self.header)
+        if not slug and request.method == 'GET':
+            slug = request.GET.get(self.config['QUERY_PARAMETER'])
+        slug = slug or self.config['DEFAULT']
+        workspace = get_workspace(slug)
+        if workspace is None:
+            return JsonResponse({'error': f"Workspace {slug} not found"}, status=404)
+        if not is_member(request.user, workspace):
+            return JsonResponse({'error': f"Not a member of workspace {slug}"}, status=403)
+        request.workspace = workspace
+        bind_context(workspace=workspace.slug)
+        with activate(workspace):
+            return self.get_response(request)
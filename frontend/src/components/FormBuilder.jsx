@@ -4,6 +4,7 @@ import { builderViewWithCss } from "@react-form-builder/components-rsuite";
 import { LAYOUT } from '../constants/styles';
 import { DjangoFormStorage } from '../services/formStorage';
 import FormNameEditor from './FormNameEditor';
+import WorkspaceSelector from './WorkspaceSelector';
 
 /**
  * Form Builder Component
@@ -46,6 +47,7 @@ const FormBuilder = () => {
   try {
     return (
       <div style={LAYOUT.formBuilder}>
+        <WorkspaceSelector />
         <FormNameEditor
           formId={formId}
           initialName={initialFormName}
@@ -12,13 +12,14 @@ const FormViewerComponent = () => {
   // Get form ID from URL configuration passed by Django template
   const formId = window.FORM_VIEW_CONFIG?.formId || null;
   const formName = window.FORM_VIEW_CONFIG?.formName || null;
+  const snapshotUrl = window.FORM_VIEW_CONFIG?.snapshotUrl || null;
 
   const [formData, setFormData] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
 
   // Create an instance of our Django form storage with the form ID
-  const formStorage = new DjangoFormStorage(formId);
+  const formStorage = new DjangoFormStorage(formId, null, snapshotUrl);
 
   useEffect(() => {
     const loadForm = async () => {
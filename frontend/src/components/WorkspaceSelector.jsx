@@ -0,0 +1,48 @@
+import React, { useState, useEffect } from 'react';
+import { workspacesApi } from '../services/api';
+import { SPACING, FONT_SIZES } from '../constants/styles';
+
+/**
+ * Workspace Selector Component
+ * Lists the workspaces the user is a member of and switches between them
+ */
+const WorkspaceSelector = () => {
+  const [workspaces, setWorkspaces] = useState([]);
+  const [current, setCurrent] = useState(null);
+
+  useEffect(() => {
+    workspacesApi.getAll()
+      .then((data) => {
+        setWorkspaces(data.workspaces);
+        setCurrent(data.current);
+      })
+      .catch((error) => console.error('Error loading workspaces:', error));
+  }, []);
+
+  const handleChange = (e) => {
+    // The open form belongs to the previous workspace: start over in the
+    // new one, whose slug the page then keeps in its links and requests
+    const builder = window.location.pathname.replace(/\/formbuilder\/.*/, '/formbuilder/');
+    window.location.assign(`${builder}?workspace=${encodeURIComponent(e.target.value)}`);
+  };
+
+  // Nothing to choose from
+  if (workspaces.length < 2) {
+    return null;
+  }
+
+  return (
+    <label style={{ display: 'block', padding: SPACING.sm, fontSize: FONT_SIZES.sm }}>
+      Workspace{' '}
+      <select value={current || ''} onChange={handleChange}>
+        {workspaces.map((workspace) => (
+          <option key={workspace.slug} value={workspace.slug}>
+            {workspace.name}
+          </option>
+        ))}
+      </select>
+    </label>
+  );
+};
+
+export default WorkspaceSelector;
@@ -13,10 +13,17 @@ const config = {
     // Forms endpoints
     FORMS: {
       LIST: '/formbuilder/api/forms/',
+      CHANGES: (since) => `/formbuilder/api/forms/?since=${encodeURIComponent(since)}`,
       CREATE: '/formbuilder/api/forms/',
       DETAIL: (id) => `/formbuilder/api/forms/${id}/`,
       UPDATE: (id) => `/formbuilder/api/forms/${id}/`,
       DELETE: (id) => `/formbuilder/api/forms/${id}/`,
+      EVENTS: (id) => `/formbuilder/api/forms/${id}/events/`,
+    },
+
+    // Workspaces the user may select
+    WORKSPACES: {
+      LIST: '/formbuilder/api/workspaces/',
     },
 
 
@@ -34,6 +41,11 @@ const config = {
     'Content-Type': 'application/json',
   },
 
+  // The page's workspace is sent in this header (EventSource, which cannot
+  // send headers, uses the `workspace` query parameter instead). Django
+  // only accepts workspaces the logged-in user is a member of.
+  WORKSPACE_HEADER: 'X-Formbuilder-Workspace',
+
   // Request timeout (in milliseconds)
   REQUEST_TIMEOUT: 10000,
 
@@ -72,6 +84,8 @@ export const getApiEndpoint = (endpoint, ...params) => {
 export const defaultFetchConfig = {
   headers: config.DEFAULT_HEADERS,
   timeout: config.REQUEST_TIMEOUT,
+  // Send the session cookie, which workspace membership is checked against
+  credentials: 'include',
 };
 
 /**
@@ -5,6 +5,14 @@
 
 import { getApiEndpoint, defaultFetchConfig, logApiCall, config } from '../config';
 
+/**
+ * Slug of the workspace of the page, which Django renders into the page
+ * configuration (and keeps in the `workspace` query parameter of links)
+ * @returns {string|null} Slug, or null outside a Django page
+ */
+export const getWorkspace = () =>
+  (window.FORM_BUILDER_CONFIG || window.FORM_VIEW_CONFIG)?.workspace || null;
+
 /**
  * Generic API request function
  * @param {string} endpoint - API endpoint
@@ -13,15 +21,21 @@ import { getApiEndpoint, defaultFetchConfig, logApiCall, config } from '../confi
  */
 const apiRequest = async (endpoint, options = {}) => {
   const url = getApiEndpoint(endpoint);
-  const config = {
+  const workspace = getWorkspace();
+  const fetchConfig = {
     ...defaultFetchConfig,
     ...options,
+    headers: {
+      ...defaultFetchConfig.headers,
+      ...(workspace ? { [config.WORKSPACE_HEADER]: workspace } : {}),
+      ...options.headers,
+    },
   };
 
-  logApiCall(url, config.method || 'GET', config.body);
+  logApiCall(url, fetchConfig.method || 'GET', fetchConfig.body);
 
   try {
-    const response = await fetch(url, config);
+    const response = await fetch(url, fetchConfig);
 
     if (!response.ok) {
       throw new Error(`HTTP error! status: ${response.status}`);
@@ -47,6 +61,16 @@ export const formsApi = {
     return response.json();
   },
 
+  /**
+   * Get the forms changed and deleted since a previous sync
+   * @param {string} since - `next_since` of the previous getAll/getChanges response
+   * @returns {Promise} {forms, deleted: [{id, deleted_at}], next_since}; fails with status 410 when a full reload is needed
+   */
+  getChanges: async (since) => {
+    const response = await apiRequest(config.API_ENDPOINTS.FORMS.CHANGES(since));
+    return response.json();
+  },
+
   /**
    * Get a specific form by ID
    * @param {string|number} id - Form ID
@@ -57,6 +81,38 @@ export const formsApi = {
     return response.json();
   },
 
+  /**
+   * Get a published form snapshot
+   * @param {string} url - Snapshot URL as rendered by Django
+   * @returns {Promise} Form data
+   */
+  getSnapshot: async (url) => {
+    const response = await apiRequest(url);
+    return response.json();
+  },
+
+  /**
+   * Subscribe to live change notifications of a form
+   * @param {string|number} id - Form ID
+   * @param {function} onChange - Called with {form_id, version, base_version, patch} after each save; without a patch, refetch the form
+   * @param {function} onDelete - Called when the form is deleted
+   * @returns {function} Function closing the subscription
+   */
+  subscribe: (id, onChange, onDelete) => {
+    // EventSource cannot send the workspace header
+    const url = new URL(getApiEndpoint(config.API_ENDPOINTS.FORMS.EVENTS(id)), window.location.href);
+    const workspace = getWorkspace();
+    if (workspace) {
+      url.searchParams.set('workspace', workspace);
+    }
+    const source = new EventSource(url, { withCredentials: true });
+    source.addEventListener('changed', (event) => onChange(JSON.parse(event.data)));
+    if (onDelete) {
+      source.addEventListener('deleted', (event) => onDelete(JSON.parse(event.data)));
+    }
+    return () => source.close();
+  },
+
   /**
    * Create a new form
    * @param {object} formData - Form data
@@ -97,6 +153,19 @@ export const formsApi = {
   },
 };
 
+/**
+ * Workspaces API service
+ */
+export const workspacesApi = {
+  /**
+   * Get the workspaces the user may select
+   * @returns {Promise} {workspaces: [{slug, name}], current}
+   */
+  getAll: async () => {
+    const response = await apiRequest(config.API_ENDPOINTS.WORKSPACES.LIST);
+    return response.json();
+  },
+};
 
 /**
  * Generic API service for custom endpoints
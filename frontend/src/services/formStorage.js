@@ -11,16 +11,42 @@ import { formsApi } from './api';
  * Works directly with form IDs from URL parameters
  */
 export class DjangoFormStorage {
-  constructor(formId = null, getFormName = null) {
+  constructor(formId = null, getFormName = null, snapshotUrl = null) {
     this.formId = formId;
     this.getFormName = getFormName; // Function to get current form name
+    this.snapshotUrl = snapshotUrl; // Published static snapshot, if any
+    this.forms = null; // Forms by ID, as of the last sync
+    this.since = null; // `next_since` of the last sync
+  }
+
+  /**
+   * Sync the local list of forms with the server: everything on the first
+   * call, only the forms changed or deleted since then afterwards
+   */
+  async syncForms() {
+    if (this.forms && this.since) {
+      try {
+        const changes = await formsApi.getChanges(this.since);
+        changes.forms.forEach(form => this.forms.set(form.id, form));
+        changes.deleted.forEach(({ id }) => this.forms.delete(id));
+        this.since = changes.next_since;
+        return [...this.forms.values()];
+      } catch (error) {
+        // The server no longer has tombstones that old (410): reload everything
+        console.warn('Delta sync failed, reloading all forms:', error);
+      }
+    }
+
+    const response = await formsApi.getAll();
+    // Django API returns {forms: [...]}, so we need to access the forms array
+    this.forms = new Map((response.forms || []).map(form => [form.id, form]));
+    this.since = response.next_since;
+    return [...this.forms.values()];
   }
 
   async getFormNames() {
     try {
-      const response = await formsApi.getAll();
-      // Django API returns {forms: [...]}, so we need to access the forms array
-      const forms = response.forms || [];
+      const forms = await this.syncForms();
 
       // Return array of strings as expected by React Form Builder
       return forms.map(form => form.name);
@@ -33,8 +59,7 @@ export class DjangoFormStorage {
   async removeForm(formName) {
     try {
       // For now, we'll need to find the form by name since the library expects names
-      const response = await formsApi.getAll();
-      const forms = response.forms || [];
+      const forms = await this.syncForms();
       const form = forms.find(f => f.name === formName);
 
       if (!form) {
@@ -43,6 +68,7 @@ export class DjangoFormStorage {
       }
 
       await formsApi.delete(form.id);
+      this.forms.delete(form.id);
       return true;
     } catch (error) {
       console.error('Error removing form:', error);
@@ -77,9 +103,14 @@ export class DjangoFormStorage {
     // If we have a formId from URL, use it directly
     if (this.formId) {
       try {
-        const formData = await formsApi.getById(this.formId);
+        // Prefer the published snapshot, which is served as a static file
+        const formData = this.snapshotUrl
+          ? await formsApi.getSnapshot(this.snapshotUrl)
+          : await formsApi.getById(this.formId);
         if (formData && formData.schema) {
-          // Check if this is the old format and transform it
+          // The backend normalizes schemas to the FormEngine layout, but rows
+          // not backfilled yet by normalize_schemas and snapshots published
+          // before it may still be in the old layout
           const schema = formData.schema;
           if (schema.components && !schema.form) {
             // Old format: transform to React Form Builder format
@@ -123,8 +154,7 @@ export class DjangoFormStorage {
 
     // Fallback: find form by name (for compatibility with library's form management)
     try {
-      const response = await formsApi.getAll();
-      const forms = response.forms || [];
+      const forms = await this.syncForms();
       const form = forms.find(f => f.name === formName);
 
       if (form) {
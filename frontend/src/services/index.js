@@ -3,5 +3,5 @@
  * Export all API services from a single entry point
  */
 
-export { formsApi, submissionsApi, api } from './api';
+export { formsApi, submissionsApi, workspacesApi, getWorkspace, api } from './api';
 export { default as api } from './api';
@@ -104,7 +104,7 @@ def test_api_endpoints():
         if response.status_code == 200:
             form_data = response.json()
             print(f"✅ Retrieved form: {form_data['name']}")
-            print(f"   Schema components: {len(form_data['schema']['components'])}")
+            print(f"   Schema components: {len(form_data['schema']['form']['children'])}")
         else:
             print(f"❌ Get specific form failed. Status: {response.status_code}")
             return False